@@ -0,0 +1,8 @@
+"""
+GoHijau EUDR cost-driver and emissions pipeline.
+
+Keep this module free of heavy imports: the CLI and every worker process
+import it on startup.
+"""
+
+__version__ = "0.1.0"
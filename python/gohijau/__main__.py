@@ -0,0 +1,5 @@
+import sys
+
+from gohijau.cli import main
+
+sys.exit(main())
@@ -0,0 +1,393 @@
+"""
+End-to-end pipeline throughput benchmark over a synthetic EUDR corpus.
+
+Generates regulation-like PDFs of configurable size, then runs every stage
+(PDF extraction -> analysis -> extraction -> expansion -> process matching ->
+cost inference) against an in-process synthetic mock LLM server and reports
+per-stage wall time, rows/sec, peak memory and output sizes:
+
+    python -m gohijau benchmark --paragraphs 2000 --processes 100 --latency fixed:0.05
+"""
+
+import contextlib
+import io
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from typing import Any, Dict, List, Optional
+
+_SUBJECTS = [
+    "Operators", "Traders", "Competent authorities", "Suppliers in producer countries",
+    "Exporters of relevant commodities", "Smallholders", "Member States",
+]
+_OBLIGATIONS = [
+    "shall collect the geolocation coordinates of all plots of land where the commodities were produced",
+    "shall exercise due diligence prior to placing relevant products on the market",
+    "shall keep records of the due diligence statement for five years",
+    "shall carry out a risk assessment of the supply chain",
+    "shall ensure full traceability of relevant commodities through the supply chain",
+    "shall submit information on the quantity and supplier of each product",
+    "may be subject to checks and verification by competent authorities",
+    "shall use satellite monitoring to establish that no deforestation occurred after the cut-off date",
+    "shall be liable to penalties proportionate to the environmental damage",
+    "shall cooperate with the Commission on the benchmarking of countries",
+]
+_QUALIFIERS = [
+    "in accordance with this Regulation", "without undue delay", "where appropriate",
+    "taking into account the risk classification of the country of production",
+    "for each relevant commodity", "on the basis of verifiable information",
+]
+_ROLES = ["Exporter", "Smallholder", "Trader", "Processor", "Cooperative"]
+_STAGES = ["Production", "Collection", "Processing", "Export"]
+_PROCESS_ACTIONS = [
+    "Collect plot geolocation for", "Prepare due diligence statement for", "Keep supply chain records for",
+    "Commission third-party audit of", "Run deforestation monitoring on", "Assess supply chain risk for",
+]
+_COMMODITIES = ["palm oil", "rubber", "cocoa", "coffee", "timber", "soya", "cattle"]
+
+
+def _sentence(rng: random.Random) -> str:
+    return f"{rng.choice(_SUBJECTS)} {rng.choice(_OBLIGATIONS)} {rng.choice(_QUALIFIERS)}."
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_minimal_pdf(path: str, pages: List[List[str]]):
+    """
+    Write a text-only PDF (Helvetica, one text line per list entry) without
+    any third-party dependency. Empty strings produce blank lines.
+    """
+    objects: List[bytes] = []
+    # 1: catalog, 2: pages, 3: font; pages and contents follow
+    page_ids = []
+    body_objects = []
+    next_id = 4
+    for lines in pages:
+        stream = ["BT", "/F1 10 Tf", "12 TL", "50 800 Td"]
+        for line in lines:
+            stream.append(f"({_pdf_escape(line)}) Tj T*")
+        stream.append("ET")
+        data = "\n".join(stream).encode("latin-1", errors="replace")
+        content_id, page_id = next_id, next_id + 1
+        next_id += 2
+        body_objects.append((content_id, b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream"))
+        body_objects.append((page_id, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode("latin-1")))
+        page_ids.append(page_id)
+
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+    objects = [
+        (1, b"<< /Type /Catalog /Pages 2 0 R >>"),
+        (2, f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode("latin-1")),
+        (3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"),
+    ] + body_objects
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id, content in objects:
+        offsets[obj_id] = out.tell()
+        out.write(b"%d 0 obj\n" % obj_id + content + b"\nendobj\n")
+    xref_at = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for obj_id in range(1, len(objects) + 1):
+        out.write(b"%010d 00000 n \n" % offsets[obj_id])
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_at))
+    with open(path, "wb") as f:
+        f.write(out.getvalue())
+
+
+def generate_corpus(pdf_dir: str, paragraphs: int, paragraphs_per_page: int = 6, pages_per_document: int = 40,
+                    seed: int = 0, duplicate_rate: float = 0.0) -> Dict[str, int]:
+    """
+    Write synthetic EUDR-like PDFs containing roughly `paragraphs` paragraphs.
+
+    Each paragraph is three obligation sentences on one line; every few
+    paragraphs an "Article N" header starts a new article. A share
+    `duplicate_rate` of pages repeats an earlier page, half of them verbatim
+    and half with one qualifier changed, like recitals and articles quoted
+    again in corrigenda and guidance documents.
+
+    Returns:
+        dict: Number of documents, pages and paragraphs written
+    """
+    rng = random.Random(seed)
+    os.makedirs(pdf_dir, exist_ok=True)
+    pages: List[List[str]] = []
+    history: List[List[str]] = []
+    documents = 0
+    article = 0
+    written = 0
+    while written < paragraphs:
+        lines: List[str] = []
+        if history and rng.random() < duplicate_rate:
+            lines = list(rng.choice(history))
+            if rng.random() < 0.5:
+                i = rng.randrange(len(lines))
+                qualifier = next((q for q in _QUALIFIERS if q in lines[i]), None)
+                if qualifier:
+                    lines[i] = lines[i].replace(qualifier, rng.choice(_QUALIFIERS), 1)
+            written += sum(1 for line in lines if not line.startswith("Article "))
+        else:
+            for _ in range(min(paragraphs_per_page, paragraphs - written)):
+                if written % 4 == 0:
+                    article += 1
+                    lines.append(f"Article {article}")
+                lines.append(" ".join(_sentence(rng) for _ in range(3)))
+                written += 1
+            history.append(lines)
+        pages.append(lines)
+        if len(pages) == pages_per_document or written >= paragraphs:
+            documents += 1
+            write_minimal_pdf(os.path.join(pdf_dir, f"synthetic_eudr_{documents:04d}.pdf"), pages)
+            pages = []
+    return {"documents": documents, "paragraphs": written}
+
+
+def generate_processes(n: int, seed: int = 0):
+    """Synthetic EUDR process sheet with Process, Roles and Stage columns."""
+    import pandas as pd
+
+    rng = random.Random(seed)
+    return pd.DataFrame({
+        "Process": [f"{rng.choice(_PROCESS_ACTIONS)} {rng.choice(_COMMODITIES)} shipments" for _ in range(n)],
+        "Roles": [rng.choice(_ROLES) for _ in range(n)],
+        "Stage": [rng.choice(_STAGES) for _ in range(n)],
+    })
+
+
+class StageTimer:
+    """Collects wall time, throughput, memory and output size per stage."""
+
+    def __init__(self, output_dir: str, output_format: str = "xlsx", trace_memory: bool = False,
+                 verbose: bool = False):
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self.trace_memory = trace_memory
+        self.verbose = verbose
+        self.stages: List[Dict[str, Any]] = []
+
+    def run(self, name: str, input_rows: int, fn, *args, **kwargs):
+        """Run one stage, save its DataFrame output and record the metrics."""
+        if self.trace_memory:
+            tracemalloc.start()
+        sink = contextlib.nullcontext() if self.verbose else contextlib.redirect_stdout(io.StringIO())
+        start = time.perf_counter()
+        with sink:
+            result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        traced_peak = None
+        if self.trace_memory:
+            traced_peak = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.stop()
+
+        output_rows = len(result)
+        output_bytes = self._save(name, result)
+        stats = {
+            "stage": name,
+            "input_rows": input_rows,
+            "output_rows": output_rows,
+            "seconds": round(elapsed, 3),
+            "rows_per_sec": round(input_rows / elapsed, 1) if elapsed > 0 else None,
+            "peak_rss_mb": round(_peak_rss_mb(), 1),
+            "traced_peak_mb": round(traced_peak, 1) if traced_peak is not None else None,
+            "output_mb": round(output_bytes / 2**20, 3),
+        }
+        self.stages.append(stats)
+        print(f"  {name:<16} {elapsed:8.2f}s  {stats['rows_per_sec'] or 0:>10.1f} rows/s  "
+              f"{output_rows:>8} rows out  {stats['output_mb']:>8.2f} MB", file=sys.stderr)
+        return result
+
+    def _save(self, name: str, df) -> int:
+        path = os.path.join(self.output_dir, f"bench_{name}.{self.output_format}")
+        if self.output_format == "xlsx":
+            # Lists of responses are stored as their string form, as in the real pipeline;
+            # Excel truncates long cells just like it does there
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", UserWarning)
+                df.astype(str).to_excel(path, index=False)
+        else:
+            df.to_pickle(path)
+        return os.path.getsize(path)
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def run_benchmark(paragraphs: int = 500, processes: int = 50, work_dir: Optional[str] = None,
+                  latency: str = "0", error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                  output_format: str = "xlsx", trace_memory: bool = False, verbose: bool = False,
+                  seed: int = 0, duplicate_rate: float = 0.0, dedup: bool = True, pipelined: bool = False,
+                  queue_size: int = 32) -> Dict[str, Any]:
+    """
+    Generate a corpus and run every stage against a local synthetic LLM.
+
+    Args:
+        paragraphs (int): Paragraphs in the synthetic corpus
+        processes (int): Rows in the synthetic EUDR process sheet
+        work_dir (str): Directory for PDFs and stage outputs (temporary if None)
+        latency (str): Mock LLM latency distribution (see gohijau.mockllm.LatencyModel)
+        error_rate (float): Share of mock requests answered with HTTP 500
+        rate_limit_rate (float): Share of mock requests answered with HTTP 429
+        output_format (str): "xlsx" like the real pipeline, or "pickle"
+        trace_memory (bool): Measure per-stage Python allocation peaks (slower)
+        verbose (bool): Keep the stages' own progress output
+        seed (int): Seed for the corpus and the mock server
+        duplicate_rate (float): Share of corpus pages that repeat an earlier page
+        dedup (bool): Analyze one canonical copy of duplicate paragraphs
+        pipelined (bool): Stream analysis -> extraction -> expansion instead of running them in turn
+        queue_size (int): Capacity of the pipelined mode's inter-stage queues
+
+    Returns:
+        dict: Corpus description and one metrics dict per stage
+    """
+    from gohijau.mockllm import MockLLM, server_url, start_server
+
+    work_dir = work_dir or tempfile.mkdtemp(prefix="gohijau_bench_")
+    pdf_dir = os.path.join(work_dir, "pdfs")
+    output_dir = os.path.join(work_dir, "output")
+    os.makedirs(output_dir, exist_ok=True)
+
+    server = start_server(MockLLM(mode="synthetic", latency=latency, error_rate=error_rate,
+                                  rate_limit_rate=rate_limit_rate, seed=seed), port=0)
+    os.environ["PERPLEXITY_BASE_URL"] = server_url(server)
+    os.environ["GEMINI_API_ENDPOINT"] = server_url(server)
+
+    # Imported after the environment points at the mock server
+    import pandas as pd
+    from gohijau.concurrency import controller_metrics, reset_controllers
+    from gohijau.hedging import latency_metrics, reset_latency_policies
+    from gohijau.eudr import cost_inference, expansion, extraction, process_match
+    from gohijau.eudr.analysis import EUDRCostAnalyzer
+    from gohijau.eudr.pipeline import run_pipeline
+    from gohijau.pdf.dedup import annotate_duplicates
+    from gohijau.pdf.eudr_processor import EUDRPDFProcessor
+
+    print(f"Generating corpus of {paragraphs} paragraphs in {pdf_dir}", file=sys.stderr)
+    corpus = generate_corpus(pdf_dir, paragraphs, seed=seed, duplicate_rate=duplicate_rate)
+    timer = StageTimer(output_dir, output_format, trace_memory, verbose)
+    reset_controllers()
+    reset_latency_policies()
+    streaming: Dict[str, Any] = {}
+    costs: Dict[str, Any] = {}
+
+    try:
+        print("Running stages:", file=sys.stderr)
+        processor = EUDRPDFProcessor(pdf_dir, output_dir)
+        df_paragraphs = timer.run(
+            "pdf_extraction", corpus["paragraphs"],
+            lambda: processor.process_all_pdfs().to_dataframe(),
+        )
+        if dedup:
+            def deduplicate(records):
+                corpus["dedup"] = annotate_duplicates(records)
+                return pd.DataFrame(records)
+
+            df_paragraphs = timer.run("dedup", len(df_paragraphs), deduplicate, df_paragraphs.to_dict("records"))
+
+        if pipelined:
+            def run_pipelined():
+                result = run_pipeline(df_paragraphs, queue_size=queue_size, output_dir=output_dir)
+                streaming.update(result["metrics"])
+                return result["expanded"]
+
+            df_expanded = timer.run("pipeline", len(df_paragraphs), run_pipelined)
+        else:
+            analyzer = EUDRCostAnalyzer(df=df_paragraphs, output_dir=output_dir)
+            df_analysis = timer.run(
+                "analysis", len(df_paragraphs),
+                analyzer.process_all_rows, sleep_interval=0, start_row=0, pickle_every=0, excel_every=0,
+            )
+
+            df_drivers = timer.run("extraction", len(df_analysis), extraction.extract_cost_drivers, df_analysis)
+
+            df_expanded = timer.run(
+                "expansion", len(df_drivers),
+                expansion.expand_dataframe, df_drivers, checkpoint_prefix=None, sleep_interval=0,
+            )
+
+        _, driver_list, driver_lookup = process_match.prepare_cost_drivers(df_expanded)
+        df_processes = generate_processes(processes, seed)
+        df_matched = timer.run(
+            "matching", len(df_processes),
+            process_match.match_processes, df_processes, driver_list, driver_lookup, delay_seconds=0,
+        )
+
+        df_costs = timer.run(
+            "cost_inference", len(df_matched),
+            lambda: cost_inference.map_citations(cost_inference.infer_costs(df_matched.copy(), delay_seconds=0)),
+        )
+        nominal = df_costs[cost_inference.NEW_NOMINAL_COST_COLUMN].astype(str)
+        costs.update(rows=len(df_costs), failed=int(nominal.str.startswith(cost_inference.FAILED_PREFIX).sum()))
+        if cost_inference.INFERENCE_SOURCE_COLUMN in df_costs.columns:
+            counts = df_costs[cost_inference.INFERENCE_SOURCE_COLUMN].value_counts()
+            costs["by_source"] = {str(source): int(n) for source, n in counts.items()}
+    finally:
+        with server.mock.lock:
+            llm_stats = json.loads(json.dumps(server.mock.stats))
+        server.shutdown()
+
+    return {"work_dir": work_dir, "corpus": corpus, "processes": processes, "latency": latency,
+            "stages": timer.stages, "llm": llm_stats, "concurrency": controller_metrics(),
+            "latency_policy": latency_metrics(), "pipeline": streaming or None,
+            "costs": costs or None}
+
+
+def print_report(report: Dict[str, Any]):
+    """Print the per-stage metrics as a table."""
+    header = f"{'stage':<16}{'in':>9}{'out':>9}{'seconds':>10}{'rows/s':>11}{'rss MB':>9}{'traced MB':>11}{'out MB':>9}"
+    print(f"\nCorpus: {report['corpus']['documents']} documents, {report['corpus']['paragraphs']} paragraphs; "
+          f"{report['processes']} processes; mock latency {report['latency']}")
+    dedup = report["corpus"].get("dedup")
+    if dedup:
+        print(f"Dedup: {dedup['canonical']} canonical of {dedup['paragraphs']} extracted paragraphs "
+              f"({dedup['exact']} exact, {dedup['near']} near duplicates)")
+    print(header)
+    print("-" * len(header))
+    for s in report["stages"]:
+        traced = f"{s['traced_peak_mb']:.1f}" if s["traced_peak_mb"] is not None else "-"
+        print(f"{s['stage']:<16}{s['input_rows']:>9}{s['output_rows']:>9}{s['seconds']:>10.2f}"
+              f"{(s['rows_per_sec'] or 0):>11.1f}{s['peak_rss_mb']:>9.1f}{traced:>11}{s['output_mb']:>9.2f}")
+    total = sum(s["seconds"] for s in report["stages"])
+    print("-" * len(header))
+    print(f"{'total':<16}{'':>18}{total:>10.2f}")
+    seconds = {s["stage"]: s["seconds"] for s in report["stages"]}
+    if report.get("pipeline"):
+        from gohijau.eudr.pipeline import pipeline_summary
+
+        print(pipeline_summary(report["pipeline"]))
+    elif "expansion" in seconds:
+        print(f"Batch: no expansion before analysis + extraction finish "
+              f"({seconds['analysis'] + seconds['extraction']:.1f}s); stages 2-4 took "
+              f"{seconds['analysis'] + seconds['extraction'] + seconds['expansion']:.1f}s")
+    costs = report.get("costs")
+    if costs:
+        sources = f", by source {costs['by_source']}" if costs.get("by_source") else ""
+        print(f"Cost inference: {costs['rows']} rows, {costs['failed']} failed{sources}")
+    llm = report["llm"]
+    print(f"\nLLM requests: {llm['requests']} {llm['by_api']}, statuses {llm['by_status']}, "
+          f"peak concurrency {llm['peak_in_flight']}")
+    for name, m in report.get("concurrency", {}).items():
+        backoffs = f", {m['decreases']} back-off(s)" if m["decreases"] else ""
+        print(f"  {name}: window {m['window']:.2f} (peak {m['peak_window']:.2f}, max {m['max_window']:g}), "
+              f"429={m['throttle']} 5xx={m['server']} timeouts={m['timeout']}{backoffs}")
+    for name, m in report.get("latency_policy", {}).items():
+        if m["p95"] is None:
+            continue
+        hedged = f", hedged {m['hedges']}/{m['requests']} ({m['hedge_wins']} won)" if m["hedge"] else ""
+        print(f"  {name}: p50 {m['p50']:.2f}s p95 {m['p95']:.2f}s p99 {m['p99']:.2f}s, "
+              f"timeout {m['timeout']:.1f}s{hedged}")
+    print(f"Outputs in {report['work_dir']}")
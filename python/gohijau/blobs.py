@@ -0,0 +1,293 @@
+"""
+Compressed, content-addressed storage for raw LLM responses.
+
+Raw analyses and expansion answers are most of the data volume. The same
+text is often stored more than once: duplicate paragraphs share an
+analysis, and `output_content` is a slice of `raw_response`. Each distinct
+text is stored here once as a compressed blob, keyed by its SHA-1. Other
+tables keep only the blob id next to their parsed fields, and the text is
+decompressed when something actually reads it.
+
+    blob_dictionaries (id, data, samples)
+    blobs             (id, digest, codec, dictionary_id, size, data)
+
+Compression is zstd when the `zstandard` package is installed, and zlib
+otherwise. With zstd, `train_dictionary` builds a dictionary from the
+stored responses. They share long stretches of prompt-shaped boilerplate, so
+even short responses compress well against the dictionary. New blobs use
+the latest dictionary, and existing blobs can be recompressed with it.
+Blobs record their codec and dictionary, so a store written with zstd needs
+zstd to read, while zlib and raw blobs can always be read.
+"""
+
+import hashlib
+import sqlite3
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+CODEC_ZSTD = "zstd"
+CODEC_ZLIB = "zlib"
+CODEC_RAW = "raw" # Texts that do not get smaller when compressed
+
+ZSTD_LEVEL = 12
+ZLIB_LEVEL = 9
+DICTIONARY_SIZE = 112640 # Bytes; zstd's default dictionary size
+MIN_DICTIONARY_SAMPLES = 32 # Fewer samples than this give a dictionary that barely helps
+CACHE_SIZE = 256 # Decompressed texts kept in memory per store
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blob_dictionaries (
+    id      INTEGER PRIMARY KEY,
+    data    BLOB NOT NULL,
+    samples INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    id            INTEGER PRIMARY KEY,
+    digest        BLOB NOT NULL UNIQUE, -- SHA-1 of the UTF-8 text
+    codec         TEXT NOT NULL,
+    dictionary_id INTEGER REFERENCES blob_dictionaries (id),
+    size          INTEGER NOT NULL,     -- Uncompressed bytes
+    data          BLOB NOT NULL
+);
+"""
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def default_codec() -> str:
+    """zstd if `zstandard` is installed, zlib otherwise."""
+    return CODEC_ZSTD if _zstandard() is not None else CODEC_ZLIB
+
+
+class BlobStore:
+    """
+    Blob table on an open SQLite connection. Writes do not commit; they
+    belong to the caller's transaction.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, codec: Optional[str] = None):
+        """
+        Args:
+            conn (Connection): Connection to the store file
+            codec (str): 'zstd' or 'zlib' for new blobs (default: zstd if installed)
+        """
+        self.conn = conn
+        self.conn.executescript(_SCHEMA)
+        self.codec = codec or default_codec()
+        if self.codec == CODEC_ZSTD and _zstandard() is None:
+            raise ImportError("The zstd codec needs the 'zstandard' package (pip install zstandard)")
+        self._dictionaries: Dict[int, bytes] = {}
+        self._compressor = None
+        self._compressor_dictionary: Optional[int] = None
+        self._decompressors: Dict[Optional[int], object] = {}
+        self._cache: "OrderedDict[int, str]" = OrderedDict()
+
+    # ------------------------------------------------------------------
+    # Codecs
+    # ------------------------------------------------------------------
+    def _dictionary(self, dictionary_id: int) -> bytes:
+        if dictionary_id not in self._dictionaries:
+            row = self.conn.execute("SELECT data FROM blob_dictionaries WHERE id = ?", (dictionary_id,)).fetchone()
+            if row is None:
+                raise KeyError(f"Blob dictionary {dictionary_id} is missing")
+            self._dictionaries[dictionary_id] = row[0]
+        return self._dictionaries[dictionary_id]
+
+    def latest_dictionary(self) -> Optional[int]:
+        """Id of the newest trained dictionary, if any."""
+        return self.conn.execute("SELECT MAX(id) FROM blob_dictionaries").fetchone()[0]
+
+    def _compress(self, data: bytes):
+        """data -> (codec, dictionary id, payload)."""
+        if self.codec == CODEC_ZSTD:
+            zstandard = _zstandard()
+            dictionary_id = self.latest_dictionary()
+            if self._compressor is None or self._compressor_dictionary != dictionary_id:
+                dict_data = (zstandard.ZstdCompressionDict(self._dictionary(dictionary_id))
+                             if dictionary_id is not None else None)
+                self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dict_data)
+                self._compressor_dictionary = dictionary_id
+            payload = self._compressor.compress(data)
+        else:
+            dictionary_id = None
+            payload = zlib.compress(data, ZLIB_LEVEL)
+        if len(payload) >= len(data):
+            return CODEC_RAW, None, data
+        return self.codec, dictionary_id, payload
+
+    def _decompress(self, codec: str, dictionary_id: Optional[int], payload: bytes) -> bytes:
+        if codec == CODEC_RAW:
+            return payload
+        if codec == CODEC_ZLIB:
+            return zlib.decompress(payload)
+        if codec == CODEC_ZSTD:
+            zstandard = _zstandard()
+            if zstandard is None:
+                raise ImportError("This store holds zstd blobs; install 'zstandard' to read it")
+            if dictionary_id not in self._decompressors:
+                dict_data = (zstandard.ZstdCompressionDict(self._dictionary(dictionary_id))
+                             if dictionary_id is not None else None)
+                self._decompressors[dictionary_id] = zstandard.ZstdDecompressor(dict_data=dict_data)
+            return self._decompressors[dictionary_id].decompress(payload)
+        raise ValueError(f"Unknown blob codec '{codec}'")
+
+    # ------------------------------------------------------------------
+    # Reads and writes
+    # ------------------------------------------------------------------
+    def put(self, text: Optional[str]) -> Optional[int]:
+        """
+        Store `text` unless an identical blob exists.
+
+        Returns:
+            int: Blob id, or None for None
+        """
+        if text is None:
+            return None
+        data = text.encode('utf-8')
+        digest = hashlib.sha1(data).digest()
+        row = self.conn.execute("SELECT id FROM blobs WHERE digest = ?", (digest,)).fetchone()
+        if row is not None:
+            return row[0]
+        codec, dictionary_id, payload = self._compress(data)
+        return self.conn.execute(
+            "INSERT INTO blobs (digest, codec, dictionary_id, size, data) VALUES (?, ?, ?, ?, ?)",
+            (digest, codec, dictionary_id, len(data), payload)).lastrowid
+
+    def get(self, blob_id: Optional[int]) -> Optional[str]:
+        """Text of one blob (None for None). Recently read texts are cached."""
+        if blob_id is None:
+            return None
+        if blob_id in self._cache:
+            self._cache.move_to_end(blob_id)
+            return self._cache[blob_id]
+        row = self.conn.execute("SELECT codec, dictionary_id, data FROM blobs WHERE id = ?", (blob_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"Blob {blob_id} not found")
+        text = self._decompress(*row).decode('utf-8')
+        self._cache[blob_id] = text
+        if len(self._cache) > CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return text
+
+    def get_many(self, blob_ids: Iterable[Optional[int]]) -> Dict[int, str]:
+        """Texts of several blobs in one query (ids that are None are skipped)."""
+        wanted = sorted({blob_id for blob_id in blob_ids if blob_id is not None})
+        texts = {}
+        # SQLite limits the number of bound parameters per statement
+        for start in range(0, len(wanted), 500):
+            chunk = wanted[start:start + 500]
+            marks = ",".join("?" * len(chunk))
+            for blob_id, codec, dictionary_id, payload in self.conn.execute(
+                    f"SELECT id, codec, dictionary_id, data FROM blobs WHERE id IN ({marks})", chunk):
+                texts[blob_id] = self._decompress(codec, dictionary_id, payload).decode('utf-8')
+        return texts
+
+    # ------------------------------------------------------------------
+    # Dictionaries
+    # ------------------------------------------------------------------
+    def train_dictionary(self, size: int = DICTIONARY_SIZE, recompress: bool = True) -> Optional[int]:
+        """
+        Train a zstd dictionary on the stored blobs and use it for new blobs.
+
+        Args:
+            size (int): Dictionary size in bytes
+            recompress (bool): Also recompress every existing blob with it
+
+        Returns:
+            int: Dictionary id, or None if zstd is not in use or there are
+                too few blobs to train on
+        """
+        if self.codec != CODEC_ZSTD:
+            print(f"Dictionary training needs the zstd codec (blobs use {self.codec})")
+            return None
+        samples = [text.encode('utf-8') for text in self.get_many(
+            row[0] for row in self.conn.execute("SELECT id FROM blobs")).values()]
+        if len(samples) < MIN_DICTIONARY_SAMPLES:
+            print(f"Only {len(samples)} blobs stored; need at least {MIN_DICTIONARY_SAMPLES} to train a dictionary")
+            return None
+        dictionary = _zstandard().train_dictionary(size, samples)
+        with self.conn:
+            dictionary_id = self.conn.execute("INSERT INTO blob_dictionaries (data, samples) VALUES (?, ?)",
+                                              (dictionary.as_bytes(), len(samples))).lastrowid
+        print(f"Trained a {len(dictionary.as_bytes())}-byte dictionary on {len(samples)} blobs")
+        if recompress:
+            self.recompress()
+        return dictionary_id
+
+    def recompress(self) -> int:
+        """
+        Recompress every blob with the current codec and latest dictionary,
+        and drop dictionaries no blob uses any more.
+
+        Returns:
+            int: Blobs rewritten
+        """
+        rows = self.conn.execute("SELECT id, codec, dictionary_id, data FROM blobs").fetchall()
+        with self.conn:
+            for blob_id, codec, dictionary_id, payload in rows:
+                new_codec, new_dictionary, new_payload = self._compress(self._decompress(codec, dictionary_id,
+                                                                                         payload))
+                self.conn.execute("UPDATE blobs SET codec = ?, dictionary_id = ?, data = ? WHERE id = ?",
+                                  (new_codec, new_dictionary, new_payload, blob_id))
+            self.conn.execute("DELETE FROM blob_dictionaries WHERE id NOT IN "
+                              "(SELECT dictionary_id FROM blobs WHERE dictionary_id IS NOT NULL) AND id != "
+                              "(SELECT MAX(id) FROM blob_dictionaries)")
+        return len(rows)
+
+    def prune(self, referenced: Iterable[int]) -> int:
+        """
+        Delete blobs whose ids are not in `referenced`.
+
+        Returns:
+            int: Blobs deleted
+        """
+        keep = set(referenced)
+        orphans = [(row[0],) for row in self.conn.execute("SELECT id FROM blobs") if row[0] not in keep]
+        self.conn.executemany("DELETE FROM blobs WHERE id = ?", orphans)
+        for (blob_id,) in orphans:
+            self._cache.pop(blob_id, None)
+        return len(orphans)
+
+    def stats(self) -> Dict[str, object]:
+        """Blob count, codec mix, uncompressed and stored bytes."""
+        count, raw, stored = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(data)), 0) FROM blobs").fetchone()
+        codecs = dict(self.conn.execute("SELECT codec, COUNT(*) FROM blobs GROUP BY codec"))
+        dictionary_bytes = self.conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(data)), 0) FROM blob_dictionaries").fetchone()[0]
+        return {
+            "blobs": count,
+            "codecs": codecs,
+            "text_mb": round(raw / 2**20, 3),
+            "stored_mb": round((stored + dictionary_bytes) / 2**20, 3),
+            "ratio": round(raw / (stored + dictionary_bytes), 1) if stored else None,
+        }
+
+
+def span_of(text: Optional[str], part: Optional[str]):
+    """
+    (start, end) character offsets of `part` in `text`, or None if it is
+    not a substring.
+    """
+    if text is None or part is None:
+        return None
+    start = text.find(part)
+    if start < 0:
+        return None
+    return start, start + len(part)
+
+
+def referenced_ids(conn: sqlite3.Connection, columns: List[str]) -> List[int]:
+    """Blob ids referenced from `table.column` entries."""
+    ids = []
+    for column in columns:
+        table, name = column.split(".")
+        ids.extend(row[0] for row in conn.execute(f"SELECT {name} FROM {table} WHERE {name} IS NOT NULL"))
+    return ids
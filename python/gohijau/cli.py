@@ -0,0 +1,767 @@
+"""
+Single command-line entry point for the GoHijau pipeline.
+
+    python -m gohijau --help
+    python -m gohijau pdf
+    python -m gohijau analyze --queue data/output/eudr_jobs.sqlite
+    python -m gohijau expand --dry-run --concurrency 8 --rate-limit 50
+
+Only argparse is imported at startup. Each subcommand imports its stage
+module (and with it pandas and the API SDKs) when it actually runs.
+"""
+
+import argparse
+import contextlib
+import os
+import sys
+
+from gohijau import config
+
+
+def _add_queue_args(parser):
+    parser.add_argument("--queue", help="Share the run through this SQLite job queue file")
+    parser.add_argument("--no-enqueue", action="store_true", help="Only work on jobs already in the queue")
+    parser.add_argument("--enqueue-only", action="store_true", help="Only add jobs to the queue")
+
+
+def _add_store_arg(parser):
+    parser.add_argument("--store", help="Read and write the normalized SQLite store at this path "
+                                        "instead of the Excel files")
+
+
+def _open_store(args):
+    if not getattr(args, "store", None):
+        return None
+    from gohijau.store import PipelineStore
+
+    return PipelineStore(args.store)
+
+
+def _add_concurrency_args(parser):
+    parser.add_argument("--max-concurrency", type=int,
+                        help="Upper bound of the adaptive in-flight request window "
+                             "(default: ADAPTIVE_CONCURRENCY in gohijau/config.py)")
+    parser.add_argument("--hedge", action=argparse.BooleanOptionalAction,
+                        help="Duplicate calls slower than the stage's p95 latency, within a budget "
+                             "(default: ADAPTIVE_TIMEOUTS in gohijau/config.py)")
+
+
+def _configure_stage(stage, args):
+    if args.max_concurrency:
+        from gohijau.concurrency import get_controller
+
+        get_controller(stage, max_window=args.max_concurrency)
+    if args.hedge is not None:
+        from gohijau.hedging import get_latency_policy
+
+        get_latency_policy(stage, hedge=args.hedge)
+
+
+def _add_dry_run_args(parser):
+    group = parser.add_argument_group("dry run", "Build every prompt and project tokens, cost and wall time "
+                                                 "without sending anything")
+    group.add_argument("--dry-run", action="store_true", help="Estimate the run instead of calling the API")
+    group.add_argument("--concurrency", type=int, default=1, help="Parallel workers to project for")
+    group.add_argument("--rate-limit", type=float, help="Provider limit in requests per minute")
+    group.add_argument("--tpm", type=float, help="Provider limit in input tokens per minute")
+    group.add_argument("--latency", type=float, help="Expected seconds per request (default: per-stage estimate)")
+    group.add_argument("--output-tokens", type=int, help="Expected output tokens per request")
+
+
+def _dry_run(args, stage, inputs, limit=None, model=None, sleep=None, **stage_options):
+    from gohijau.dryrun import estimate_stage, print_estimate
+
+    print_estimate(estimate_stage(stage, inputs, limit, model=model, concurrency=args.concurrency,
+                                  rate_limit=args.rate_limit, tokens_per_minute=args.tpm, latency=args.latency,
+                                  output_tokens=args.output_tokens, sleep=sleep, **stage_options))
+    return 0
+
+
+def cmd_pdf(args):
+    if args.engine == "generic":
+        from gohijau.pdf.processor import PDFProcessor
+
+        PDFProcessor(args.pdf_dir, args.output_dir, ocr=args.ocr, ocr_lang=args.ocr_lang,
+                     ocr_workers=args.ocr_workers).process_all_pdfs()
+        return 0
+
+    from gohijau.pdf.eudr_processor import EUDRPDFProcessor
+
+    processor = EUDRPDFProcessor(args.pdf_dir, args.output_dir, ocr=args.ocr, ocr_lang=args.ocr_lang,
+                                 ocr_workers=args.ocr_workers)
+    print("Starting EUDR PDF document processing...")
+    paragraphs = processor.process_all_pdfs()
+    if args.dedup:
+        from gohijau.pdf.dedup import annotate_duplicates
+
+        # Later stages analyze one canonical copy per duplicate group
+        annotate_duplicates(paragraphs, threshold=args.dedup_threshold, near=args.near_duplicates)
+    store = _open_store(args)
+    if store is not None:
+        with store:
+            store.write_paragraphs(paragraphs)
+    else:
+        processor.save_results(paragraphs, "final")
+    return 0
+
+
+def cmd_analyze(args):
+    if args.dry_run:
+        return _dry_run(args, "analyze", {"paragraphs": args.input}, sleep=args.sleep)
+
+    from gohijau.eudr.analysis import EUDRCostAnalyzer
+
+    _configure_stage("paragraph_analysis", args)
+    store = _open_store(args)
+    if store is not None:
+        with store:
+            analyzer = EUDRCostAnalyzer(df=store.paragraphs_frame(), output_dir=args.output_dir)
+            if args.queue:
+                final_df = analyzer.process_with_queue(args.queue, args.output, enqueue=not args.no_enqueue,
+                                                       work=not args.enqueue_only, sleep_interval=args.sleep)
+            else:
+                start_row = None if args.resume else args.start_row
+                final_df = analyzer.process_all_rows(sleep_interval=args.sleep, start_row=start_row)
+            if final_df is not None:
+                store.write_analyses(final_df)
+        return 0
+
+    analyzer = EUDRCostAnalyzer(args.input, output_dir=args.output_dir)
+    if args.queue:
+        analyzer.process_with_queue(args.queue, args.output, enqueue=not args.no_enqueue,
+                                    work=not args.enqueue_only, sleep_interval=args.sleep)
+    else:
+        # --resume detects the latest pickle; otherwise start from --start-row
+        start_row = None if args.resume else args.start_row
+        analyzer.process_and_save(args.output, start_row=start_row, sleep_interval=args.sleep)
+    return 0
+
+
+def cmd_extract(args):
+    from gohijau.eudr.extraction import print_summary, process_excel_file
+
+    store = _open_store(args)
+    if store is not None:
+        with store:
+            store.extract_drivers()
+            print_summary(store.drivers_frame())
+        return 0
+
+    result_df = process_excel_file(args.input, args.output)
+    if result_df is not None:
+        print_summary(result_df)
+    return 0
+
+
+def cmd_expand(args):
+    if args.dry_run:
+        return _dry_run(args, "expand", {"drivers": args.input}, limit=args.test_rows)
+
+    from gohijau.eudr import expansion
+
+    _configure_stage("driver_expansion", args)
+    store = _open_store(args)
+    if store is not None:
+        with store:
+            df = store.drivers_frame()
+            if args.test_rows is not None:
+                df = df.head(args.test_rows)
+            if args.queue:
+                df = expansion.expand_with_queue(df, args.queue, enqueue=not args.no_enqueue,
+                                                 work=not args.enqueue_only)
+            else:
+                df = expansion.expand_dataframe(df, batch_size=args.batch_size,
+                                                checkpoint_prefix=os.path.splitext(args.output)[0])
+            if df is not None:
+                store.write_expansions(df)
+        return 0
+
+    if args.queue:
+        expansion.process_excel_with_queue(args.input, args.output, args.queue,
+                                           enqueue=not args.no_enqueue, work=not args.enqueue_only)
+    else:
+        expansion.process_excel(args.input, args.output, batch_size=args.batch_size, test_rows=args.test_rows)
+    return 0
+
+
+def cmd_pipeline(args):
+    from gohijau.eudr import pipeline
+
+    _configure_stage("paragraph_analysis", args)
+    _configure_stage("driver_expansion", args)
+    store = _open_store(args)
+    if store is not None:
+        with store:
+            result = pipeline.run_pipeline(store.paragraphs_frame(), queue_size=args.queue_size,
+                                           sleep_interval=args.sleep, output_dir=args.output_dir)
+            store.write_analyses(result["analysis"])
+            store.extract_drivers()
+            expanded = result["expanded"]
+            cost_drivers = expanded["cost_driver"].tolist() if len(expanded) else []
+            expanded["driver_id"] = store.driver_ids(result["driver_keys"], cost_drivers)
+            store.write_expansions(expanded)
+        return 0
+
+    pipeline.run(args.input, args.analysis_output, args.drivers_output, args.output,
+                 queue_size=args.queue_size, sleep_interval=args.sleep, output_dir=args.output_dir)
+    return 0
+
+
+def cmd_match(args):
+    if args.dry_run:
+        inputs = {"processes": args.processes, "process_sheet": args.process_sheet,
+                  "cost_drivers": args.cost_drivers, "cost_driver_sheet": args.cost_driver_sheet}
+        return _dry_run(args, "match", inputs, limit=args.limit, model=args.model)
+
+    from gohijau.eudr import process_match
+
+    _configure_stage("process_match", args)
+    store = _open_store(args)
+    with store or contextlib.nullcontext():
+        process_match.run(args.processes, args.cost_drivers, args.output,
+                          process_sheet=args.process_sheet, cost_driver_sheet=args.cost_driver_sheet,
+                          output_sheet=args.output_sheet, model_name=args.model, limit=args.limit,
+                          queue_path=args.queue, enqueue=not args.no_enqueue, work=not args.enqueue_only,
+                          context_cache=not args.no_context_cache, store=store)
+    return 0
+
+
+def cmd_infer(args):
+    if args.dry_run:
+        return _dry_run(args, "infer", {"matched": args.input, "matched_sheet": args.input_sheet},
+                        limit=args.limit, model=args.model, local=not args.no_local,
+                        local_threshold=args.local_threshold)
+
+    from gohijau.eudr import cost_inference
+
+    _configure_stage("cost_inference", args)
+    store = _open_store(args)
+    with store or contextlib.nullcontext():
+        cost_inference.run(args.input, args.output, input_sheet=args.input_sheet, output_sheet=args.output_sheet,
+                           model_name=args.model, limit=args.limit, queue_path=args.queue,
+                           enqueue=not args.no_enqueue, work=not args.enqueue_only,
+                           structured=not args.no_schema, repair_attempts=args.repair_attempts,
+                           retry_failed=args.retry_failed, local=not args.no_local,
+                           local_threshold=args.local_threshold, context_cache=not args.no_context_cache,
+                           store=store)
+    return 0
+
+
+def cmd_tokens(args):
+    from gohijau.dryrun import account_prompts
+    from gohijau.tokens import print_token_report
+
+    inputs = {key: value for key, value in (
+        ("paragraphs", args.paragraphs), ("drivers", args.drivers), ("processes", args.processes),
+        ("cost_drivers", args.cost_drivers), ("matched", args.matched),
+    ) if value}
+    print_token_report(account_prompts(args.stages, inputs, args.limit))
+    return 0
+
+
+def cmd_queue(args):
+    from gohijau.jobqueue import JobQueue
+
+    with JobQueue(args.queue_file) as queue:
+        if args.queue_command == "status":
+            for stage, counts in queue.counts().items():
+                summary = ", ".join(f"{status}={n}" for status, n in counts.items())
+                print(f"{stage}: {summary}")
+        elif args.queue_command == "dead":
+            for job in queue.dead_jobs(args.stage):
+                print(f"[{job['id']}] {job['stage']} {job['job_key']} "
+                      f"(attempts={job['attempts']}): {job['last_error']}")
+        elif args.queue_command == "retry":
+            n = queue.retry_dead(args.stage, args.ids, args.error_contains)
+            print(f"Requeued {n} dead-letter job(s)")
+    return 0
+
+
+def cmd_store(args):
+    from gohijau.store import PipelineStore
+
+    with PipelineStore(args.store_file, codec=args.codec) as store:
+        if args.store_command == "stats":
+            for name, value in store.stats().items():
+                print(f"{name}: {value}")
+        elif args.store_command == "import":
+            import pandas as pd
+
+            if args.paragraphs:
+                store.write_paragraphs(pd.read_excel(args.paragraphs))
+            if args.processes:
+                store.write_processes(pd.read_excel(args.processes, sheet_name=args.process_sheet))
+        elif args.store_command == "export":
+            store.export(args.output_dir)
+        elif args.store_command == "compact":
+            before = os.path.getsize(args.store_file)
+            stats = store.compact(train_dictionary=args.train_dictionary)
+            print(f"Compacted {args.store_file}: {before / 2**20:.2f} MB -> {stats['file_mb']:.2f} MB "
+                  f"(response blobs {stats['blob_text_mb']} MB of text in {stats['blob_stored_mb']} MB)")
+        elif args.store_command == "sources":
+            sources = store.driver_sources(args.cost_driver)
+            if sources.empty:
+                print(f"No paragraphs produced {args.cost_driver!r}")
+            for row in sources.itertuples():
+                print(f"[paragraph {row.paragraph_id}] {row.document_name} p.{row.page_number} "
+                      f"{row.article or ''}: {str(row.text)[:120]}")
+    return 0
+
+
+def cmd_mock_llm(args):
+    from gohijau.mockllm import MockLLM, serve
+
+    mock = MockLLM(mode=args.mode, cassette=args.cassette, latency=args.latency, error_rate=args.error_rate,
+                   rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after,
+                   strict=args.strict, seed=args.seed)
+    serve(mock, args.host, args.port)
+    return 0
+
+
+def cmd_benchmark(args):
+    import json
+
+    from gohijau.benchmark import print_report, run_benchmark
+
+    report = run_benchmark(paragraphs=args.paragraphs, processes=args.processes, work_dir=args.work_dir,
+                           latency=args.latency, error_rate=args.error_rate,
+                           rate_limit_rate=args.rate_limit_rate, output_format=args.format,
+                           trace_memory=args.trace_memory, verbose=args.verbose, seed=args.seed,
+                           duplicate_rate=args.duplicate_rate, dedup=args.dedup, pipelined=args.pipelined,
+                           queue_size=args.queue_size)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json}")
+    return 0
+
+
+def cmd_emissions(args):
+    if args.emissions_command == "factors":
+        from gohijau.emissions.factors import available_versions, load_factors
+
+        versions = available_versions()
+        for version in versions:
+            if args.version and version != args.version:
+                continue
+            print(f"{version}:")
+            print(load_factors(version).to_frame().to_string(index=False))
+        return 0
+    if args.emissions_command == "load":
+        from gohijau.emissions.engine import write_frame
+        from gohijau.emissions.loader import ibs_columns, load_ibs
+
+        if args.list_columns:
+            print(" ".join(ibs_columns(args.value_suffix)))
+            return 0
+        df = load_ibs(args.input, suffix=args.value_suffix, extra_columns=args.extra_columns or ())
+        if args.output:
+            write_frame(df, args.output)
+            print(f"Projected records saved to: {args.output}")
+        return 0
+    if args.emissions_command == "merge":
+        from gohijau.emissions.merge import merge_ibs
+
+        merge_ibs(args.ibs, args.rgs, args.output, suffix=args.value_suffix, duplicates=args.duplicates,
+                  report_file=args.report, compare_string_key=args.compare_string_key)
+        return 0
+    if args.emissions_command == "cube":
+        import numpy as np
+
+        from gohijau.emissions.cube import build_cube
+        from gohijau.emissions.loader import load_ibs
+
+        columns = [f"DPROVI{args.value_suffix}", f"DISIC5{args.value_suffix}", "DISIC2", "YEAR", "INTENSITY",
+                   "TOTAL_CO2", "TOTAL_KWH", "TOTAL_TJ"]
+        df = load_ibs(args.input, suffix=args.value_suffix, columns=columns, float_dtype=np.float64,
+                      report_missing=False).rename(columns={"YEAR": "year", "INTENSITY": "intensity"})
+        cube = build_cube(df, year=args.year, suffix=args.value_suffix, alpha=args.alpha)
+        cube.save(args.output)
+        print(f"Cube saved to: {args.output}")
+        return 0
+    if args.emissions_command == "lookup":
+        from gohijau.emissions.cube import EmissionsCube
+
+        cube = EmissionsCube.load(args.cube)
+        try:
+            cell = cube.lookup(args.year, args.province, args.isic2, args.isic5)
+        except KeyError as e:
+            print(e.args[0])
+            return 1
+        for name, value in cell._asdict().items():
+            print(f"{name}: {value}")
+        for q in args.quantiles or ():
+            print(f"intensity p{q * 100:g}: {cube.quantile(q, args.year, args.province, args.isic2, args.isic5)}")
+        return 0
+    if args.emissions_command == "commodities":
+        from gohijau.emissions.commodities import run as run_commodities
+
+        store = _open_store(args)
+        with store or contextlib.nullcontext():
+            run_commodities(args.drivers, args.cube, args.output, sectors_file=args.sectors, year=args.year,
+                            by_province=args.by_province, commodities=args.commodities,
+                            sheet=args.drivers_sheet, store=store)
+        return 0
+    if args.emissions_command == "bootstrap":
+        from gohijau.emissions.bootstrap import run as run_bootstrap
+
+        run_bootstrap(args.input, args.output, resamples=args.resamples, level=args.level, seed=args.seed,
+                      workers=args.workers, suffix=args.value_suffix)
+        return 0
+    if args.emissions_command == "panel":
+        from gohijau.emissions.panel import run as run_panel
+        from gohijau.emissions.panel import year_specs
+
+        years = []
+        for item in args.years or ():
+            first, _, last = item.partition("-")
+            years += range(int(first), int(last or first) + 1)
+        if years and not args.pattern:
+            print("--years needs --pattern")
+            return 1
+        specs = year_specs(args.inputs or (), args.pattern, years, args.rgs_patterns or (), args.renames)
+        if not specs:
+            print("No survey years given; use --inputs YEAR=PATH or --pattern with --years")
+            return 1
+        run_panel(specs, args.output, args.trends, args.yearly, variant=args.variant,
+                  factors_version=args.factors_version, workers=args.workers)
+        return 0
+    if args.emissions_command == "prices":
+        from gohijau.emissions.engine import write_frame
+        from gohijau.emissions.factors import load_factors
+        from gohijau.emissions.loader import ibs_columns, load_ibs
+        from gohijau.emissions.pricing import build_price_table, parse_table_spec, sensitivity
+
+        factors = load_factors(args.factors_version) if args.factors_version else load_factors()
+        df = load_ibs(args.input, suffix=args.value_suffix, columns=ibs_columns(args.value_suffix, factors))
+        tables = [build_price_table(df, factors, *parse_table_spec(spec), suffix=args.value_suffix)
+                  for spec in args.tables]
+        if args.output:
+            write_frame(tables[0].to_frame(), args.output)
+            print(f"Price table ({tables[0].label}) saved to: {args.output}")
+        summary = sensitivity(df, tables, factors, variant=args.variant, suffix=args.value_suffix)
+        print(summary.to_string(index=False))
+        if args.sensitivity:
+            write_frame(summary, args.sensitivity)
+            print(f"Sensitivity runs saved to: {args.sensitivity}")
+        return 0
+    if args.emissions_command == "run":
+        from gohijau.emissions.engine import run
+
+        run(args.input, args.output, variant=args.variant, factors_version=args.factors_version,
+            collapse_file=args.collapse, value_suffix=args.value_suffix, other_energy_prices=args.other_energy_prices)
+        return 0
+
+    from gohijau.emissions.factors import load_factors
+    from gohijau.emissions.fixture import synthetic_ibs
+    from gohijau.emissions.reference import verify
+
+    factors = load_factors(args.factors_version) if args.factors_version else load_factors()
+    df = synthetic_ibs(args.firms, seed=args.seed, factors=factors)
+    failed = False
+    for variant in args.variants:
+        report = verify(df, factors, variant=variant, rtol=args.rtol)
+        worst = max(report["max_rel_error"], key=report["max_rel_error"].get)
+        mismatches = sum(report["missing_mismatches"].values())
+        print(f"[{variant}] {'OK' if report['ok'] else 'MISMATCH'}: {report['rows']} firms vs "
+              f"{os.path.relpath(report['do_file'], config.PROJECT_ROOT)}, largest relative error "
+              f"{report['max_rel_error'][worst]:.2e} ({worst}), {mismatches} missing-value mismatches; "
+              f"engine {report['engine_seconds']:.3f}s, scalar reference {report['reference_seconds']:.3f}s")
+        failed = failed or not report["ok"]
+    return 1 if failed else 0
+
+
+def build_parser():
+    # Keep in sync with gohijau.jobqueue.STAGES; not imported here to keep startup lean
+    stages = ("paragraph_analysis", "driver_expansion", "process_match", "cost_inference")
+
+    parser = argparse.ArgumentParser(prog="gohijau", description="GoHijau EUDR cost-driver pipeline")
+    sub = parser.add_subparsers(dest="command", metavar="COMMAND", required=True)
+
+    p = sub.add_parser("pdf", help="1. Extract paragraphs from the EUDR PDFs")
+    p.add_argument("--pdf-dir", default=config.PDF_DIR)
+    p.add_argument("--output-dir", default=config.OUTPUT_DIR)
+    p.add_argument("--engine", choices=["eudr", "generic"], default="eudr",
+                   help="eudr: PyPDF2 with article/chapter headers; generic: pdfplumber with batching")
+    p.add_argument("--dedup", action=argparse.BooleanOptionalAction, default=True,
+                   help="Mark exact and near-duplicate paragraphs so they are analyzed once (eudr engine)")
+    p.add_argument("--near-duplicates", action=argparse.BooleanOptionalAction, default=True,
+                   help="Also match near duplicates by MinHash (--no-near-duplicates: exact only)")
+    p.add_argument("--dedup-threshold", type=float, default=0.8,
+                   help="Minimum estimated Jaccard similarity of a near duplicate")
+    p.add_argument("--ocr", action=argparse.BooleanOptionalAction, default=True,
+                   help="OCR pages with no extractable text with Tesseract (cached by page hash)")
+    p.add_argument("--ocr-lang", default="eng", help="Tesseract languages, e.g. eng+ind")
+    p.add_argument("--ocr-workers", type=int, help="OCR worker processes (default: CPU count)")
+    _add_store_arg(p)
+    p.set_defaults(func=cmd_pdf)
+
+    p = sub.add_parser("analyze", help="2. Analyze paragraphs for cost drivers (Perplexity)")
+    p.add_argument("--input", default=config.PARAGRAPHS_FILE)
+    p.add_argument("--output", default=config.RAW_RESPONSES_FILE)
+    p.add_argument("--output-dir", default=config.OUTPUT_DIR, help="Directory for intermediate checkpoints")
+    p.add_argument("--start-row", type=int, default=0)
+    p.add_argument("--resume", action="store_true", help="Resume from the latest intermediate pickle")
+    p.add_argument("--sleep", type=float, default=0,
+                   help="Minimum seconds between API calls (pacing is otherwise adaptive)")
+    _add_queue_args(p)
+    _add_concurrency_args(p)
+    _add_dry_run_args(p)
+    _add_store_arg(p)
+    p.set_defaults(func=cmd_analyze)
+
+    p = sub.add_parser("extract", help="3. Extract cost drivers and reasoning from raw responses")
+    p.add_argument("--input", default=config.RAW_RESPONSES_FILE)
+    p.add_argument("--output", default=config.EXTRACTED_DRIVERS_FILE)
+    _add_store_arg(p)
+    p.set_defaults(func=cmd_extract)
+
+    p = sub.add_parser("expand", help="4. Expand each cost driver (Perplexity deep research)")
+    p.add_argument("--input", default=config.EXTRACTED_DRIVERS_FILE)
+    p.add_argument("--output", default=config.EXPANDED_DRIVERS_FILE)
+    p.add_argument("--batch-size", type=int, default=100, help="Rows between checkpoints")
+    p.add_argument("--test-rows", type=int, help="Only process the first N rows")
+    _add_queue_args(p)
+    _add_concurrency_args(p)
+    _add_dry_run_args(p)
+    _add_store_arg(p)
+    p.set_defaults(func=cmd_expand)
+
+    p = sub.add_parser("pipeline", help="2-4. Analyze, extract and expand as one streaming run")
+    p.add_argument("--input", default=config.PARAGRAPHS_FILE)
+    p.add_argument("--analysis-output", default=config.RAW_RESPONSES_FILE)
+    p.add_argument("--drivers-output", default=config.EXTRACTED_DRIVERS_FILE)
+    p.add_argument("--output", default=config.EXPANDED_DRIVERS_FILE)
+    p.add_argument("--output-dir", default=config.OUTPUT_DIR)
+    p.add_argument("--queue-size", type=int, default=32,
+                   help="Items buffered between stages before the upstream stage waits")
+    p.add_argument("--sleep", type=float, default=0, help="Minimum seconds between analysis calls")
+    _add_concurrency_args(p)
+    _add_store_arg(p)
+    p.set_defaults(func=cmd_pipeline)
+
+    p = sub.add_parser("match", help="5. Match EUDR processes to cost drivers (Gemini)")
+    p.add_argument("--processes", default=config.EUDR_PROCESS_FILE)
+    p.add_argument("--process-sheet", default="Sheet1")
+    p.add_argument("--cost-drivers", default=config.COST_DRIVER_FILE)
+    p.add_argument("--cost-driver-sheet", default="Sheet1")
+    p.add_argument("--output", default=config.PROCESS_MATCH_FILE)
+    p.add_argument("--output-sheet", default="Processed_Results")
+    p.add_argument("--model", default=config.GEMINI_MODEL)
+    p.add_argument("--limit", type=int, help="Only process the first N rows")
+    p.add_argument("--no-context-cache", action="store_true",
+                   help="Send the cost driver list with every request instead of caching it")
+    _add_queue_args(p)
+    _add_concurrency_args(p)
+    _add_dry_run_args(p)
+    _add_store_arg(p)
+    p.set_defaults(func=cmd_match)
+
+    p = sub.add_parser("infer", help="6. Infer nominal costs for matched processes (Gemini)")
+    p.add_argument("--input", default=config.PROCESS_MATCH_FILE)
+    p.add_argument("--input-sheet", default="Processed_Results")
+    p.add_argument("--output", default=config.COST_INFERENCE_FILE)
+    p.add_argument("--output-sheet", default="Cost_Inference_Results")
+    p.add_argument("--model", default=config.GEMINI_MODEL)
+    p.add_argument("--limit", type=int, help="Only process the first N rows")
+    p.add_argument("--no-schema", action="store_true", help="Ask for JSON in the prompt only, without a response schema")
+    p.add_argument("--repair-attempts", type=int, default=2,
+                   help="Re-asks per row whose answer fails to parse or validate")
+    p.add_argument("--retry-failed", action="store_true",
+                   help="Re-run only the failed rows of an existing --output file")
+    p.add_argument("--no-local", action="store_true", help="Send every row to Gemini, skipping the local extractor")
+    p.add_argument("--local-threshold", type=float, default=0.75,
+                   help="Minimum local extraction confidence for a row to skip Gemini")
+    p.add_argument("--no-context-cache", action="store_true",
+                   help="Send the instructions with every request instead of caching them")
+    _add_queue_args(p)
+    _add_concurrency_args(p)
+    _add_dry_run_args(p)
+    _add_store_arg(p)
+    p.set_defaults(func=cmd_infer)
+
+    p = sub.add_parser("tokens", help="Report static vs dynamic prompt tokens per stage (sends nothing)")
+    p.add_argument("--stages", nargs="+", choices=["analyze", "expand", "match", "infer"],
+                   default=["analyze", "expand", "match", "infer"])
+    p.add_argument("--paragraphs", help=f"analyze input (default: {config.PARAGRAPHS_FILE})")
+    p.add_argument("--drivers", help=f"expand input (default: {config.EXTRACTED_DRIVERS_FILE})")
+    p.add_argument("--processes", help=f"match processes (default: {config.EUDR_PROCESS_FILE})")
+    p.add_argument("--cost-drivers", help=f"match cost drivers (default: {config.COST_DRIVER_FILE})")
+    p.add_argument("--matched", help=f"infer input (default: {config.PROCESS_MATCH_FILE})")
+    p.add_argument("--limit", type=int, help="Only read the first N rows of each input")
+    p.set_defaults(func=cmd_tokens)
+
+    p = sub.add_parser("queue", help="Inspect a job queue and requeue dead-letter jobs")
+    p.add_argument("queue_file", help="Path to the queue SQLite file")
+    queue_sub = p.add_subparsers(dest="queue_command", required=True)
+    queue_sub.add_parser("status", help="Show job counts per stage and status")
+    q = queue_sub.add_parser("dead", help="List dead-letter jobs")
+    q.add_argument("--stage", choices=stages)
+    q = queue_sub.add_parser("retry", help="Requeue dead-letter jobs")
+    q.add_argument("--stage", choices=stages)
+    q.add_argument("--ids", type=int, nargs="+", help="Only these job ids")
+    q.add_argument("--error-contains", help="Only jobs whose last error contains this text")
+    p.set_defaults(func=cmd_queue)
+
+    p = sub.add_parser("store", help="Inspect, import into or export the normalized pipeline store")
+    p.add_argument("store_file", help="Path to the store SQLite file")
+    p.add_argument("--codec", choices=["zstd", "zlib"], help="Compression for new response blobs "
+                   "(default: zstd if the zstandard package is installed)")
+    store_sub = p.add_subparsers(dest="store_command", required=True)
+    store_sub.add_parser("stats", help="Show row counts per table and the file size")
+    q = store_sub.add_parser("import", help="Load existing Excel inputs into the store")
+    q.add_argument("--paragraphs", help="Paragraphs file (stage 1 output)")
+    q.add_argument("--processes", help="EUDR process sheet")
+    q.add_argument("--process-sheet", default="Sheet1")
+    q = store_sub.add_parser("export", help="Write every stage's sheet as Excel")
+    q.add_argument("--output-dir", default=config.OUTPUT_DIR)
+    q = store_sub.add_parser("sources", help="List the paragraphs that produced a cost driver")
+    q.add_argument("cost_driver", help="Exact cost driver text")
+    q = store_sub.add_parser("compact", help="Recompress the response blobs and reclaim free space")
+    q.add_argument("--train-dictionary", action="store_true",
+                   help="First train a zstd dictionary on the stored responses")
+    p.set_defaults(func=cmd_store)
+
+    p = sub.add_parser("emissions", help="CO2 emissions and intensity of IBS firms (the Stata do-files in Python)")
+    emissions_sub = p.add_subparsers(dest="emissions_command", required=True)
+    q = emissions_sub.add_parser("run", help="Compute emissions for a merged IBS file")
+    q.add_argument("--input", required=True, help="Merged IBS records (.dta, .csv, .parquet or Excel)")
+    q.add_argument("--output", default=config.EMISSIONS_FILE, help="Firm-level result (format by extension)")
+    q.add_argument("--variant", choices=["firm", "province"], default="firm",
+                   help="firm: Emissions.do; province: emission_intensity_dofile_2digitprov.do")
+    q.add_argument("--collapse", nargs="?", const=config.PROVINCE_EMISSIONS_FILE,
+                   help="Also write the median intensity and totals per province x ISIC2 "
+                        "(default path: CO2_EMISSION_Prov_2digit.dta in the output directory)")
+    q.add_argument("--factors-version", help="Fuel factor set (default: the latest shipped version)")
+    q.add_argument("--value-suffix", default="21", help="Year suffix of the per-fuel value columns")
+    q.add_argument("--other-energy-prices", metavar="SPEC",
+                   help="Impute other energy from a robust price table instead of each firm's meancost: "
+                        "median[:MIN_FIRMS] or trimmed[:TRIM[:MIN_FIRMS]], e.g. median:5")
+    q = emissions_sub.add_parser("prices", help="Robust other-energy price tables and a sensitivity run over them")
+    q.add_argument("--input", required=True, help="IBS firm records")
+    q.add_argument("--tables", nargs="+", default=["median:5", "median:20", "trimmed:0.1:5", "trimmed:0.25:5"],
+                   help="Table specs: median[:MIN_FIRMS] or trimmed[:TRIM[:MIN_FIRMS]]")
+    q.add_argument("--output", help="Write the first table (fuel x province x ISIC2) here")
+    q.add_argument("--sensitivity", help="Write the sensitivity summary here")
+    q.add_argument("--variant", choices=["firm", "province"], default="province")
+    q.add_argument("--factors-version", help="Fuel factor set (default: the latest shipped version)")
+    q.add_argument("--value-suffix", default="21", help="Year suffix of the variable names")
+    q = emissions_sub.add_parser("merge", help="Join the RGS (KBLI) file(s) to the IBS survey on the hashed key")
+    q.add_argument("--ibs", required=True, help="IBS survey file (ibs2021.dta)")
+    q.add_argument("--rgs", nargs="+", required=True,
+                   help="ibs21_kbli_1 (and _2) digit files; two parts are joined on RENUM2 DISIC2 first")
+    q.add_argument("--output", help="Merged records (the do-files' IBS_21; format by extension)")
+    q.add_argument("--duplicates", choices=["exclude", "first", "error"], default="exclude",
+                   help="Rows sharing a key: leave them unmatched (default), keep the first like "
+                        "`duplicates drop, force`, or stop")
+    q.add_argument("--report", help="Write the duplicate and colliding rows left out here")
+    q.add_argument("--compare-string-key", action="store_true",
+                   help="Also count firms the do-files' concatenated string key would confuse")
+    q.add_argument("--value-suffix", default="21", help="Survey year suffix of the variable names")
+    q = emissions_sub.add_parser("cube", help="Precompute intensity and totals for every year/province/KBLI cut")
+    q.add_argument("--input", default=config.EMISSIONS_FILE,
+                   help="Firm-level emissions results (`emissions run --variant province` output)")
+    q.add_argument("--output", default=config.EMISSIONS_CUBE_FILE, help="Cube file (SQLite)")
+    q.add_argument("--year", type=int, default=2021, help="Survey year, if the input has no 'year' column")
+    q.add_argument("--alpha", type=float, default=0.01, help="Relative accuracy of the sketched medians")
+    q.add_argument("--value-suffix", default="21", help="Year suffix of DPROVI/DISIC5")
+    q = emissions_sub.add_parser("lookup", help="Intensity and totals of one cube cell")
+    q.add_argument("--cube", default=config.EMISSIONS_CUBE_FILE)
+    q.add_argument("--year", type=int, help="Survey year (default: all years)")
+    q.add_argument("--province", help="BPS province code (default: all provinces)")
+    q.add_argument("--isic2", help="2-digit KBLI (default: all industries)")
+    q.add_argument("--isic5", help="5-digit KBLI")
+    q.add_argument("--quantiles", nargs="+", type=float, help="Also show these intensity quantiles, e.g. 0.1 0.9")
+    q = emissions_sub.add_parser("commodities", help="Join the EUDR cost drivers to the intensity of each "
+                                                     "commodity's KBLI sector (the CGE input table)")
+    q.add_argument("--drivers", default=config.COST_INFERENCE_FILE, help="Cost inference output (stage 6)")
+    q.add_argument("--drivers-sheet", default=0, help="Sheet of --drivers (default: the first)")
+    q.add_argument("--cube", default=config.EMISSIONS_CUBE_FILE, help="Emissions cube (`emissions cube`)")
+    q.add_argument("--output", default=config.COMMODITY_EMISSIONS_FILE, help="Combined table (format by extension)")
+    q.add_argument("--sectors", help="Also write the intensity and totals per commodity sector here")
+    q.add_argument("--year", type=int, help="Survey year (default: all years in the cube)")
+    q.add_argument("--by-province", action="store_true", help="One row per province for each driver x commodity")
+    q.add_argument("--commodities", nargs="+", help="Only these commodities, e.g. 'palm oil' rubber")
+    _add_store_arg(q)
+    q = emissions_sub.add_parser("bootstrap", help="Bootstrap CIs of the median intensity per province x ISIC2")
+    q.add_argument("--input", default=config.EMISSIONS_FILE,
+                   help="Firm-level emissions results (`emissions run --variant province` output)")
+    q.add_argument("--output", default=config.INTENSITY_CI_FILE, help="Intervals per cell (format by extension)")
+    q.add_argument("--resamples", type=int, default=2000, help="Resamples per cell")
+    q.add_argument("--level", type=float, default=0.95, help="Confidence level")
+    q.add_argument("--seed", type=int, default=0, help="Root seed; results do not depend on --workers")
+    q.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    q.add_argument("--value-suffix", default="21", help="Year suffix of DPROVI/DISIC5")
+    q = emissions_sub.add_parser("panel", help="Run several survey years in parallel into a firm-year panel")
+    q.add_argument("--inputs", nargs="+", help="YEAR=PATH items, e.g. 2020=ibs2020.dta")
+    q.add_argument("--pattern", help="Input path with {year} or {yy}, e.g. data/ibs/ibs{year}.dta")
+    q.add_argument("--years", nargs="+", help="Years for --pattern: 2021 or ranges like 2012-2021")
+    q.add_argument("--rgs-patterns", nargs="+",
+                   help="RGS part paths with {year}/{yy} to merge into each year first (section 1)")
+    q.add_argument("--renames", help="CSV of year,canonical,source for variable names that break the pattern")
+    q.add_argument("--output", default=config.PANEL_FILE, help="Stacked firm-year results")
+    q.add_argument("--trends", default=config.INTENSITY_TRENDS_FILE, help="Intensity trends per cell")
+    q.add_argument("--yearly", help="Also write the yearly medians and totals per level here")
+    q.add_argument("--variant", choices=["firm", "province"], default="province")
+    q.add_argument("--factors-version", help="Fuel factor set (default: the latest shipped version)")
+    q.add_argument("--workers", type=int, help="Worker processes (default: one per year, up to the CPU count)")
+    q = emissions_sub.add_parser("load", help="Read only the emissions columns of an IBS or KBLI file")
+    q.add_argument("--input", help=".dta, .dbf, .csv, .parquet or Excel file")
+    q.add_argument("--output", help="Write the projected records here (format by extension)")
+    q.add_argument("--extra-columns", nargs="+", help="Keep these columns as well")
+    q.add_argument("--value-suffix", default="21", help="Survey year suffix of the variable names")
+    q.add_argument("--list-columns", action="store_true", help="Only print the projected column list")
+    q = emissions_sub.add_parser("verify", help="Check the engine against the do-files on synthetic firms")
+    q.add_argument("--firms", type=int, default=20000)
+    q.add_argument("--seed", type=int, default=0)
+    q.add_argument("--variants", nargs="+", choices=["firm", "province"], default=["firm", "province"])
+    q.add_argument("--factors-version")
+    q.add_argument("--rtol", type=float, default=1e-9, help="Relative tolerance per value")
+    q = emissions_sub.add_parser("factors", help="Show the fuel factor table")
+    q.add_argument("--version", help="Only this factor version")
+    p.set_defaults(func=cmd_emissions)
+
+    p = sub.add_parser("mock-llm", help="Run a local record/replay mock of the Perplexity and Gemini APIs")
+    p.add_argument("--mode", choices=["record", "replay", "synthetic"], default="synthetic")
+    p.add_argument("--cassette", help="JSONL file of recorded responses (record/replay)")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--latency", default="0",
+                   help="fixed:S | uniform:LO,HI | lognormal:MEDIAN,SIGMA | exp:MEAN (seconds)")
+    p.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with HTTP 500")
+    p.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests answered with HTTP 429")
+    p.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds on injected 429s")
+    p.add_argument("--strict", action="store_true", help="Replay misses return 404 instead of synthetic responses")
+    p.add_argument("--seed", type=int, help="Seed for latency and fault injection")
+    p.set_defaults(func=cmd_mock_llm)
+
+    p = sub.add_parser("benchmark", help="Time every stage on a synthetic corpus against the local mock LLM")
+    p.add_argument("--paragraphs", type=int, default=500, help="Paragraphs in the synthetic corpus")
+    p.add_argument("--processes", type=int, default=50, help="Rows in the synthetic EUDR process sheet")
+    p.add_argument("--work-dir", help="Directory for the corpus and stage outputs (default: a temp dir)")
+    p.add_argument("--latency", default="0", help="Mock LLM latency, same format as mock-llm --latency")
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--rate-limit-rate", type=float, default=0.0)
+    p.add_argument("--format", choices=["xlsx", "pickle"], default="xlsx", help="Stage output format")
+    p.add_argument("--trace-memory", action="store_true", help="Also report tracemalloc peaks per stage (slower)")
+    p.add_argument("--verbose", action="store_true", help="Show the stages' own progress output")
+    p.add_argument("--json", help="Also write the report as JSON to this file")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--duplicate-rate", type=float, default=0.0,
+                   help="Share of corpus pages repeating an earlier page (exercises dedup)")
+    p.add_argument("--no-dedup", dest="dedup", action="store_false", help="Analyze duplicate paragraphs again")
+    p.add_argument("--pipelined", action="store_true", help="Stream analysis -> extraction -> expansion")
+    p.add_argument("--queue-size", type=int, default=32, help="Inter-stage queue capacity with --pipelined")
+    p.set_defaults(func=cmd_benchmark)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
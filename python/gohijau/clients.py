@@ -0,0 +1,128 @@
+"""
+Lazily constructed API clients.
+
+The OpenAI and Google SDKs are only imported the first time a client is
+requested, so importing a pipeline module (for tests, benchmarks or the CLI's
+--help) never pays for them or needs API keys.
+
+Set PERPLEXITY_BASE_URL and GEMINI_API_ENDPOINT to send requests to another
+server, e.g. the local mock in `gohijau.mockllm`. With an override in place
+the API keys are optional.
+"""
+
+import datetime
+import functools
+import hashlib
+import os
+import threading
+import time
+
+from gohijau.config import GEMINI_CACHE_MIN_TOKENS, GEMINI_CACHE_TTL_SECONDS, PERPLEXITY_BASE_URL
+
+
+def _load_env():
+    """Read API keys from a .env file if python-dotenv is installed."""
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return
+    load_dotenv()
+
+
+@functools.lru_cache(maxsize=None)
+def get_perplexity_client():
+    """Return the shared OpenAI-compatible client for the Perplexity API."""
+    from openai import OpenAI
+
+    _load_env()
+    base_url = os.environ.get("PERPLEXITY_BASE_URL", PERPLEXITY_BASE_URL)
+    api_key = os.environ.get("PERPLEXITY_API_KEY")
+    if not api_key:
+        if base_url == PERPLEXITY_BASE_URL:
+            raise ValueError("Please set the PERPLEXITY_API_KEY environment variable.")
+        api_key = "mock"
+    return OpenAI(api_key=api_key, base_url=base_url)
+
+
+@functools.lru_cache(maxsize=None)
+def _configure_gemini():
+    import google.generativeai as genai
+
+    _load_env()
+    endpoint = os.environ.get("GEMINI_API_ENDPOINT")
+    api_key = os.environ.get("GOOGLE_API_KEY")
+    if not api_key:
+        if not endpoint:
+            raise ValueError("Please set the GOOGLE_API_KEY environment variable.")
+        api_key = "mock"
+    if endpoint:
+        # The REST transport honours an explicit http:// scheme in the endpoint
+        genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": endpoint})
+    else:
+        genai.configure(api_key=api_key)
+    return genai
+
+
+@functools.lru_cache(maxsize=None)
+def get_gemini_model(model_name: str):
+    """Return a configured `genai.GenerativeModel` for `model_name`."""
+    genai = _configure_gemini()
+    return genai.GenerativeModel(model_name)
+
+
+def gemini_sdk():
+    """Return the configured `google.generativeai` module (for GenerationConfig etc.)."""
+    return _configure_gemini()
+
+
+# (model name, prefix sha256) -> (GenerativeModel or None, CachedContent or None, expiry time)
+_context_caches = {}
+_context_cache_lock = threading.Lock()
+
+
+def get_cached_gemini_model(model_name: str, static_prefix: str, ttl_seconds: int = GEMINI_CACHE_TTL_SECONDS,
+                            min_tokens: int = GEMINI_CACHE_MIN_TOKENS):
+    """
+    Return a `genai.GenerativeModel` bound to a Gemini CachedContent that holds
+    `static_prefix`, creating the cache on first use and again after it expires.
+
+    Returns None when the prefix is below `min_tokens` or the endpoint does
+    not support caching; callers then send the full prompt. A failed attempt
+    is remembered for the cache lifetime so it is not retried on every call.
+    """
+    from gohijau.tokens import count_tokens
+
+    key = (model_name, hashlib.sha256(static_prefix.encode("utf-8")).hexdigest())
+    with _context_cache_lock:
+        cached = _context_caches.get(key)
+        # Renew a minute early so in-flight requests never hit an expired cache
+        if cached and cached[2] - 60 > time.time():
+            return cached[0]
+
+        model, cache = None, None
+        if count_tokens(static_prefix) >= min_tokens:
+            genai = _configure_gemini()
+            try:
+                cache = genai.caching.CachedContent.create(
+                    model=model_name if model_name.startswith("models/") else f"models/{model_name}",
+                    contents=[static_prefix],
+                    ttl=datetime.timedelta(seconds=ttl_seconds),
+                )
+                model = genai.GenerativeModel.from_cached_content(cached_content=cache)
+                print(f"  Created Gemini context cache {cache.name} for a shared prompt prefix.")
+            except Exception as e:
+                print(f"  WARN: Gemini context caching unavailable, sending full prompts: {e}")
+        _context_caches[key] = (model, cache, time.time() + ttl_seconds)
+        return model
+
+
+def release_context_caches():
+    """Delete the Gemini context caches created by this process (they also expire on their own)."""
+    with _context_cache_lock:
+        for _, cache, _ in _context_caches.values():
+            if cache is not None:
+                try:
+                    cache.delete()
+                except Exception as e:
+                    print(f"  WARN: Could not delete context cache {cache.name}: {e}")
+        _context_caches.clear()
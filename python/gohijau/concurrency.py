@@ -0,0 +1,383 @@
+"""
+Adaptive (AIMD) concurrency control for the LLM stages.
+
+Provider limits move with the time of day, so a fixed sleep between calls is
+either too slow or runs into 429s. An `AIMDController` instead keeps a window
+of allowed in-flight requests per stage, the way TCP congestion control does:
+
+- every healthy response grows the window by ``increase / window`` (about
+  +1 per window's worth of responses) while the recent success rate and the
+  smoothed latency stay within bounds;
+- a 429, a 5xx or a timeout multiplies it by ``decrease`` (once per
+  congestion event) and pauses new requests for the Retry-After time or an
+  exponential backoff.
+
+API call sites report outcomes with ``get_controller(stage).observe()``;
+`adaptive_map` and `jobqueue.run_worker` dispatch work within the window:
+
+    controller = get_controller(STAGE_MATCH)
+    for item, result in adaptive_map(match_one, items, controller):
+        ...
+    print(controller.summary())
+"""
+
+import contextlib
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from gohijau.config import ADAPTIVE_CONCURRENCY
+
+# Outcomes that mean "slow down"; anything else (400s, parse errors) leaves the window alone
+CONGESTION_KINDS = ("throttle", "server", "timeout")
+
+_LATENCY_ALPHA = 0.2 # Weight of the newest sample in the smoothed latency
+_LATENCY_WARMUP = 3 # Samples before the latency floor is trusted
+_RECENT_OUTCOMES = 20 # Responses the success rate is computed over
+
+
+def _status_code(exc) -> Optional[int]:
+    for value in (getattr(exc, "status_code", None), getattr(exc, "code", None),
+                  getattr(getattr(exc, "response", None), "status_code", None)):
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def classify_error(exc: BaseException) -> Optional[str]:
+    """
+    Classify an API exception as "throttle" (429), "server" (5xx), "timeout"
+    or None for errors that say nothing about load (e.g. a 400).
+
+    Works on the OpenAI SDK's `APIStatusError` (`status_code`), Google API
+    core errors (`code`) and plain timeouts without importing either SDK.
+    """
+    status = _status_code(exc)
+    if status == 429:
+        return "throttle"
+    if status is not None and status >= 500:
+        return "timeout" if status == 504 else "server"
+    name = type(exc).__name__.lower()
+    if isinstance(exc, TimeoutError) or "timeout" in name or "deadline" in name:
+        return "timeout"
+    if "ratelimit" in name or "resourceexhausted" in name or "toomanyrequests" in name:
+        return "throttle"
+    return None
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """The Retry-After header of the response behind `exc`, in seconds, if any."""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class AIMDController:
+    """
+    Additive-increase/multiplicative-decrease window of in-flight requests.
+
+    Thread-safe; one instance is shared by every worker of a stage.
+
+    Args:
+        name (str): Stage or provider name used in reports
+        initial (float): Starting window
+        min_window (float): Lower bound of the window
+        max_window (float): Upper bound (also the worker thread count)
+        increase (float): Window growth per window's worth of healthy responses
+        decrease (float): Factor applied to the window on congestion
+        latency_tolerance (float): Grow only while smoothed latency is below this multiple of its best value
+        min_success_rate (float): Grow only while this share of recent responses succeeded
+        backoff_base (float): First pause after a congestion signal without Retry-After, in seconds
+        backoff_max (float): Longest pause, in seconds
+    """
+
+    def __init__(self, name: str = "llm", initial: float = 1, min_window: float = 1, max_window: float = 8,
+                 increase: float = 1.0, decrease: float = 0.5, latency_tolerance: float = 2.0,
+                 min_success_rate: float = 0.9, backoff_base: float = 1.0, backoff_max: float = 60.0):
+        if not 1 <= min_window <= max_window:
+            raise ValueError(f"Need 1 <= min_window <= max_window, got {min_window} and {max_window}")
+        self.name = name
+        self.min_window = float(min_window)
+        self.max_window = float(max_window)
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.min_success_rate = min_success_rate
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._lock = threading.Lock()
+        self._window = min(max(float(initial), self.min_window), self.max_window)
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = float("-inf")
+        self._consecutive_failures = 0
+        self._latency_ewma = None
+        self._latency_floor = None
+        self._latency_samples = 0
+        self._recent = deque(maxlen=_RECENT_OUTCOMES)
+        self._started = time.monotonic()
+        self.counters = {"success": 0, "throttle": 0, "server": 0, "timeout": 0, "other_error": 0,
+                         "decreases": 0}
+        self.peak_window = self._window
+        # (seconds since start, window) after every change of the integer limit
+        self.history = deque([(0.0, self._window)], maxlen=1000)
+
+    # --- Window ---
+
+    @property
+    def window(self) -> float:
+        """Current window (fractional; `limit` is what is enforced)."""
+        return self._window
+
+    @property
+    def limit(self) -> int:
+        """Requests allowed in flight right now."""
+        return int(self._window)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def pause_remaining(self) -> float:
+        """Seconds until new requests may start after a backoff (0 if not paused)."""
+        return max(0.0, self._paused_until - time.monotonic())
+
+    def _set_window(self, window: float):
+        old_limit = self.limit
+        self._window = min(max(window, self.min_window), self.max_window)
+        self.peak_window = max(self.peak_window, self._window)
+        if self.limit != old_limit:
+            self.history.append((round(time.monotonic() - self._started, 3), self._window))
+
+    # --- Slots ---
+
+    def try_acquire(self, n: int = 1) -> int:
+        """
+        Take up to `n` free slots without blocking.
+
+        Returns:
+            int: Slots taken (0 while the window is full or paused)
+        """
+        with self._lock:
+            if time.monotonic() < self._paused_until:
+                return 0
+            taken = max(0, min(n, self.limit - self._in_flight))
+            self._in_flight += taken
+            return taken
+
+    def release(self, n: int = 1):
+        """Return `n` slots taken with `try_acquire`."""
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - n)
+
+    # --- Feedback ---
+
+    @contextlib.contextmanager
+    def observe(self):
+        """
+        Time the API call in the block and feed its outcome back into the
+        window. Exceptions are recorded and re-raised.
+        """
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self.record_error(e, started)
+            raise
+        self.record_success(time.monotonic() - started)
+
+    def _healthy(self) -> bool:
+        if self._recent and sum(self._recent) / len(self._recent) < self.min_success_rate:
+            return False
+        if self._latency_samples < _LATENCY_WARMUP or not self._latency_floor:
+            return True
+        return self._latency_ewma <= self.latency_tolerance * self._latency_floor
+
+    def record_success(self, latency: float):
+        """Record a successful response that took `latency` seconds."""
+        with self._lock:
+            self.counters["success"] += 1
+            self._consecutive_failures = 0
+            self._recent.append(True)
+            self._latency_samples += 1
+            if self._latency_ewma is None:
+                self._latency_ewma = latency
+            else:
+                self._latency_ewma += _LATENCY_ALPHA * (latency - self._latency_ewma)
+            if self._latency_samples >= _LATENCY_WARMUP:
+                self._latency_floor = (self._latency_ewma if self._latency_floor is None
+                                       else min(self._latency_floor, self._latency_ewma))
+            if self._healthy():
+                self._set_window(self._window + self.increase / self._window)
+
+    def record_error(self, exc: BaseException, started: Optional[float] = None) -> Optional[str]:
+        """
+        Record a failed call. Congestion signals shrink the window and pause
+        new requests; other errors are only counted.
+
+        Args:
+            exc (Exception): The error raised by the API call
+            started (float): `time.monotonic()` when the call started. Calls that
+                started before the last decrease do not shrink the window again.
+
+        Returns:
+            str: The `classify_error` kind, or None
+        """
+        kind = classify_error(exc)
+        with self._lock:
+            if kind is None:
+                self.counters["other_error"] += 1
+                return None
+            now = time.monotonic()
+            self.counters[kind] += 1
+            self._recent.append(False)
+            self._consecutive_failures += 1
+            # Requests already in flight at the last decrease belong to the same congestion event
+            if started is None or started >= self._last_decrease:
+                self._set_window(self._window * self.decrease)
+                self._last_decrease = now
+                self.counters["decreases"] += 1
+            pause = retry_after_seconds(exc)
+            if pause is None:
+                pause = min(self.backoff_max, self.backoff_base * 2 ** (self._consecutive_failures - 1))
+            self._paused_until = max(self._paused_until, now + pause)
+            return kind
+
+    # --- Metrics ---
+
+    def metrics(self) -> Dict[str, Any]:
+        """Current window, in-flight count, outcome counters and window history."""
+        with self._lock:
+            return {
+                "name": self.name,
+                "window": round(self._window, 3),
+                "limit": self.limit,
+                "in_flight": self._in_flight,
+                "peak_window": round(self.peak_window, 3),
+                "min_window": self.min_window,
+                "max_window": self.max_window,
+                "latency_ewma": None if self._latency_ewma is None else round(self._latency_ewma, 3),
+                "paused_for": round(self.pause_remaining(), 3),
+                **self.counters,
+                "history": list(self.history),
+            }
+
+    def summary(self) -> str:
+        """One-line report for the end of a stage."""
+        m = self.metrics()
+        congestion = ", ".join(f"{kind}={m[kind]}" for kind in CONGESTION_KINDS if m[kind])
+        latency = f", latency~{m['latency_ewma']:.2f}s" if m["latency_ewma"] is not None else ""
+        return (f"Concurrency [{self.name}]: window {m['window']:.2f} (peak {m['peak_window']:.2f}, "
+                f"max {m['max_window']:g}), {m['success']} ok{latency}"
+                + (f", {congestion}, {m['decreases']} back-off(s)" if congestion else ""))
+
+
+_controllers: Dict[str, AIMDController] = {}
+_controllers_lock = threading.Lock()
+
+
+def get_controller(name: str, **settings) -> AIMDController:
+    """
+    Return the shared controller for stage `name`, creating it from
+    `config.ADAPTIVE_CONCURRENCY` on first use.
+
+    Passing settings (e.g. ``max_window=4`` from --max-concurrency) replaces
+    the stage's controller with a new one using them.
+    """
+    settings = {key: value for key, value in settings.items() if value is not None}
+    with _controllers_lock:
+        if settings or name not in _controllers:
+            options = {**ADAPTIVE_CONCURRENCY.get(name, {}), **settings}
+            if "max_window" in settings:
+                options["initial"] = min(options.get("initial", 1), settings["max_window"])
+            _controllers[name] = AIMDController(name, **options)
+        return _controllers[name]
+
+
+def controller_metrics() -> Dict[str, Dict[str, Any]]:
+    """Metrics of every controller created so far, by stage."""
+    with _controllers_lock:
+        controllers = list(_controllers.values())
+    return {controller.name: controller.metrics() for controller in controllers}
+
+
+def reset_controllers():
+    """Forget all controllers (e.g. between benchmark runs)."""
+    with _controllers_lock:
+        _controllers.clear()
+
+
+def adaptive_map(fn: Callable[[Any], Any], items: Iterable[Any], controller: AIMDController,
+                 ordered: bool = True, min_interval: float = 0.0) -> Iterator[Tuple[Any, Any]]:
+    """
+    Call `fn(item)` for every item on worker threads, keeping at most
+    `controller.limit` calls in flight.
+
+    `fn` should report its API calls through `controller.observe()` so the
+    window follows the provider. Exceptions raised by `fn` propagate to the
+    caller when their item is reached.
+
+    Args:
+        fn (callable): Function of one item
+        items (iterable): Work items, consumed lazily
+        controller (AIMDController): Window to dispatch within
+        ordered (bool): Yield in input order (results are buffered) instead of completion order
+        min_interval (float): Minimum seconds between call starts
+
+    Yields:
+        tuple: (item, fn(item))
+    """
+    items = iter(items)
+    running = {} # future -> (position, item)
+    finished = {} # position -> (item, future), ordered mode only
+    next_position = submitted = 0
+    exhausted = False
+    last_start = float("-inf")
+
+    pool = ThreadPoolExecutor(max_workers=int(controller.max_window), thread_name_prefix=controller.name)
+    try:
+        while True:
+            while not exhausted and controller.try_acquire():
+                try:
+                    item = next(items)
+                except StopIteration:
+                    controller.release()
+                    exhausted = True
+                    break
+                delay = last_start + min_interval - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                last_start = time.monotonic()
+                future = pool.submit(fn, item)
+                future.add_done_callback(lambda _: controller.release())
+                running[future] = (submitted, item)
+                submitted += 1
+
+            if not running:
+                if exhausted:
+                    break
+                # Window paused after a congestion signal
+                time.sleep(max(0.05, min(controller.pause_remaining(), 1.0)))
+                continue
+
+            done, _ = wait(running, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in done:
+                position, item = running.pop(future)
+                if ordered:
+                    finished[position] = (item, future)
+                else:
+                    yield item, future.result()
+            while next_position in finished:
+                item, future = finished.pop(next_position)
+                next_position += 1
+                yield item, future.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,83 @@
+"""
+Default locations and model names shared by the pipeline stages.
+
+Everything here is plain data so that importing it costs nothing; every path
+can be overridden from the command line.
+"""
+
+import os
+
+# python/gohijau/config.py -> project root
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DATA_DIR = os.path.join(PROJECT_ROOT, 'data')
+PDF_DIR = os.path.join(DATA_DIR, 'pdfs')
+OUTPUT_DIR = os.path.join(DATA_DIR, 'output')
+OCR_CACHE_DIR = os.path.join(OUTPUT_DIR, 'ocr_cache') # OCR text of pages without a text layer, by page hash
+
+# Emissions (IBS manufacturing survey)
+IBS_DIR = os.path.join(DATA_DIR, 'ibs')
+EMISSIONS_DOFILE = os.path.join(PROJECT_ROOT, 'stata', 'Emissions.do')
+PROVINCE_DOFILE = os.path.join(PROJECT_ROOT, 'emission_intensity_dofile_2digitprov.do')
+EMISSIONS_FILE = os.path.join(OUTPUT_DIR, 'CO2_EMISSION.dta')
+PROVINCE_EMISSIONS_FILE = os.path.join(OUTPUT_DIR, 'CO2_EMISSION_Prov_2digit.dta')
+EMISSIONS_CUBE_FILE = os.path.join(OUTPUT_DIR, 'emissions_cube.sqlite')
+INTENSITY_CI_FILE = os.path.join(OUTPUT_DIR, 'CO2_EMISSION_Prov_2digit_CI.dta')
+PANEL_FILE = os.path.join(OUTPUT_DIR, 'CO2_EMISSION_panel.dta')
+INTENSITY_TRENDS_FILE = os.path.join(OUTPUT_DIR, 'CO2_INTENSITY_trends.dta')
+PRICE_TABLE_DIR = os.path.join(OUTPUT_DIR, 'price_tables') # Cached other-energy price tables
+COMMODITY_EMISSIONS_FILE = os.path.join(OUTPUT_DIR, 'EUDR_cost_drivers_emissions.xlsx') # Cost drivers x commodity sectors
+
+# Perplexity stages
+PARAGRAPHS_FILE = os.path.join(OUTPUT_DIR, 'final_paragraphs_with_xml_tags.xlsx')
+RAW_RESPONSES_FILE = os.path.join(OUTPUT_DIR, 'all_eudr_cost_drivers_raw_responses.xlsx')
+EXTRACTED_DRIVERS_FILE = os.path.join(OUTPUT_DIR, 'extracted_cost_drivers.xlsx')
+EXPANDED_DRIVERS_FILE = os.path.join(OUTPUT_DIR, 'expanded_cost_drivers_2.xlsx')
+
+# Gemini stages
+EUDR_PROCESS_FILE = os.path.join(PROJECT_ROOT, 'EUDR_PROCESS_input.xlsx')
+COST_DRIVER_FILE = os.path.join(PROJECT_ROOT, 'cost_drivers_expanded.xlsx')
+PROCESS_MATCH_FILE = os.path.join(PROJECT_ROOT, 'EUDR_PROCESS_output_all.xlsx')
+COST_INFERENCE_FILE = os.path.join(PROJECT_ROOT, 'EUDR_PROCESS_FINAL_ANALYSIS_all.xlsx')
+
+PERPLEXITY_BASE_URL = "https://api.perplexity.ai"
+ANALYSIS_MODEL = "r1-1776"
+EXPANSION_MODEL = "sonar-deep-research"
+GEMINI_MODEL = "gemini-2.5-pro-preview-03-25"  # Double-check the latest available model name if needed
+
+# Gemini explicit context caching of static prompt prefixes. Prefixes shorter
+# than the model's minimum are not cached (the API rejects them).
+GEMINI_CACHE_MIN_TOKENS = 4096
+GEMINI_CACHE_TTL_SECONDS = 3600
+
+# Pricing used by --dry-run cost projections, in USD per million tokens plus a
+# per-request fee. Check the providers' current price lists before relying on
+# them; Perplexity search and reasoning charges are not included.
+MODEL_PRICING = {
+    "r1-1776": {"input": 2.0, "cached_input": 2.0, "output": 8.0, "per_request": 0.0},
+    "sonar-deep-research": {"input": 2.0, "cached_input": 2.0, "output": 8.0, "per_request": 0.0},
+    "gemini-2.5-pro-preview-03-25": {"input": 1.25, "cached_input": 0.31, "output": 10.0, "per_request": 0.0},
+}
+
+# Adaptive (AIMD) concurrency per LLM stage: the in-flight request window
+# starts at `initial`, grows by one per window of healthy responses up to
+# `max_window`, and is halved on 429s, 5xx responses and timeouts.
+ADAPTIVE_CONCURRENCY = {
+    "paragraph_analysis": {"initial": 2, "max_window": 8},
+    "driver_expansion": {"initial": 1, "max_window": 4},
+    "process_match": {"initial": 2, "max_window": 16},
+    "cost_inference": {"initial": 2, "max_window": 16},
+}
+
+# Per-stage request timeouts and hedging. Until enough latencies are observed
+# the `timeout` is used; afterwards TIMEOUT_MULTIPLIER x p95, clamped to
+# [min_timeout, max_timeout]. With `hedge`, a call still running at p95 gets a
+# duplicate request and the first answer wins, for at most HEDGE_BUDGET of
+# the stage's requests.
+ADAPTIVE_TIMEOUTS = {
+    "paragraph_analysis": {"timeout": 300, "min_timeout": 30, "max_timeout": 600, "hedge": False},
+    "driver_expansion": {"timeout": 900, "min_timeout": 120, "max_timeout": 1800, "hedge": False},
+    "process_match": {"timeout": 120, "min_timeout": 10, "max_timeout": 300, "hedge": True},
+    "cost_inference": {"timeout": 120, "min_timeout": 10, "max_timeout": 300, "hedge": True},
+}
+TIMEOUT_MULTIPLIER = 3.0
+HEDGE_BUDGET = 0.05
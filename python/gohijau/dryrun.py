@@ -0,0 +1,268 @@
+"""
+Build every LLM stage's prompts from its input files without sending them.
+
+    python -m gohijau tokens
+    python -m gohijau tokens --stages analyze match --limit 500
+    python -m gohijau match --dry-run --concurrency 4 --rate-limit 60
+
+Each stage module provides an `iter_prompt_parts` generator yielding the
+(static prefix, dynamic suffix) of every request it would send; this module
+loads the stage inputs and feeds them through a `TokenLedger`.
+`estimate_stage` turns that into a request count, input-token percentiles, a
+projected cost and a projected wall time for sizing batch windows.
+"""
+
+import math
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from gohijau import config
+from gohijau.tokens import TokenLedger, tokenizer_name
+
+# CLI name -> job queue stage name
+STAGES = {
+    "analyze": "paragraph_analysis",
+    "expand": "driver_expansion",
+    "match": "process_match",
+    "infer": "cost_inference",
+}
+
+DEFAULT_INPUTS = {
+    "paragraphs": config.PARAGRAPHS_FILE,
+    "drivers": config.EXTRACTED_DRIVERS_FILE,
+    "processes": config.EUDR_PROCESS_FILE,
+    "process_sheet": "Sheet1",
+    "cost_drivers": config.COST_DRIVER_FILE,
+    "cost_driver_sheet": "Sheet1",
+    "matched": config.PROCESS_MATCH_FILE,
+    "matched_sheet": "Processed_Results",
+}
+
+# Per-stage planning defaults: model, expected output tokens and latency per
+# request, and the stage's minimum spacing between calls. Override them from the CLI
+# once real runs (or the mock's /_stats) give better numbers.
+STAGE_DEFAULTS = {
+    "analyze": {"model": config.ANALYSIS_MODEL, "output_tokens": 700, "latency": 20.0, "sleep": 0.0},
+    "expand": {"model": config.EXPANSION_MODEL, "output_tokens": 3000, "latency": 120.0, "sleep": 0.0},
+    "match": {"model": config.GEMINI_MODEL, "output_tokens": 20, "latency": 6.0, "sleep": 0.0},
+    "infer": {"model": config.GEMINI_MODEL, "output_tokens": 100, "latency": 10.0, "sleep": 0.0},
+}
+
+
+def iter_stage_prompts(stage: str, inputs: Optional[Dict[str, str]] = None, limit: Optional[int] = None,
+                       **stage_options) -> Iterator[Tuple[str, str]]:
+    """
+    Yield (static, dynamic) prompt text for every request `stage` would send.
+
+    Args:
+        stage (str): One of STAGES
+        inputs (dict): Input file and sheet overrides (keys as in DEFAULT_INPUTS)
+        limit (int): Only read the first N input rows, like the stages' --limit
+        **stage_options: Passed to the stage's iter_prompt_parts (e.g. local=False for infer)
+
+    Raises:
+        FileNotFoundError: If an input file of the stage does not exist
+    """
+    import pandas as pd
+
+    paths = {**DEFAULT_INPUTS, **(inputs or {})}
+
+    def read(key, **kwargs):
+        path = paths[key]
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{stage}: input file not found: {path}")
+        df = pd.read_excel(path, **kwargs)
+        return df.head(limit) if limit is not None else df
+
+    if stage == "analyze":
+        from gohijau.eudr.analysis import EUDRCostAnalyzer
+
+        yield from EUDRCostAnalyzer(df=read("paragraphs")).iter_prompt_parts()
+    elif stage == "expand":
+        from gohijau.eudr.expansion import iter_expansion_prompt_parts
+
+        yield from iter_expansion_prompt_parts(read("drivers"))
+    elif stage == "match":
+        from gohijau.eudr import process_match
+
+        if not os.path.exists(paths["cost_drivers"]):
+            raise FileNotFoundError(f"{stage}: input file not found: {paths['cost_drivers']}")
+        _, cost_driver_list, _ = process_match.prepare_cost_drivers(
+            pd.read_excel(paths["cost_drivers"], sheet_name=paths["cost_driver_sheet"]), paths["cost_drivers"]
+        )
+        yield from process_match.iter_prompt_parts(read("processes", sheet_name=paths["process_sheet"]),
+                                                   cost_driver_list)
+    elif stage == "infer":
+        from gohijau.eudr import cost_inference
+
+        yield from cost_inference.iter_prompt_parts(read("matched", sheet_name=paths["matched_sheet"]),
+                                                    **stage_options)
+    else:
+        raise ValueError(f"Unknown stage: {stage}")
+
+
+def account_prompts(stages: Sequence[str] = tuple(STAGES), inputs: Optional[Dict[str, str]] = None,
+                    limit: Optional[int] = None, ledger: Optional[TokenLedger] = None) -> TokenLedger:
+    """
+    Count static and dynamic prompt tokens for each stage whose inputs exist.
+
+    Stages with missing input files are reported and skipped.
+
+    Returns:
+        TokenLedger: One entry per stage that had inputs
+    """
+    ledger = ledger or TokenLedger()
+    for stage in stages:
+        try:
+            for static, dynamic in _progress(iter_stage_prompts(stage, inputs, limit), stage):
+                ledger.add(stage, static, dynamic)
+        except FileNotFoundError as e:
+            print(f"Skipping {e}")
+    return ledger
+
+
+def _progress(items: Iterable, stage: str) -> Iterable:
+    from tqdm import tqdm
+
+    return tqdm(items, desc=f"Building {stage} prompts", unit=" prompts", leave=False)
+
+
+def percentile(sorted_values: List[int], q: float) -> int:
+    """Nearest-rank percentile of an already sorted list (0 for an empty list)."""
+    if not sorted_values:
+        return 0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def project_wall_time(requests: int, concurrency: int, latency: float, sleep: float = 0.0,
+                      rate_limit: Optional[float] = None, tokens_per_minute: Optional[float] = None,
+                      tokens_per_request: float = 0.0) -> Tuple[float, str]:
+    """
+    Project the wall time of `requests` calls.
+
+    Each of `concurrency` workers spends `latency + sleep` per request; the
+    provider caps throughput at `rate_limit` requests/min and
+    `tokens_per_minute` input tokens/min.
+
+    Returns:
+        tuple: (seconds, name of the binding limit)
+    """
+    limits = {"concurrency": concurrency / max(latency + sleep, 1e-9)}
+    if rate_limit:
+        limits["rate limit"] = rate_limit / 60
+    if tokens_per_minute and tokens_per_request:
+        limits["token limit"] = tokens_per_minute / tokens_per_request / 60
+    binding = min(limits, key=limits.get)
+    return requests / limits[binding], binding
+
+
+def estimate_stage(stage: str, inputs: Optional[Dict[str, str]] = None, limit: Optional[int] = None,
+                   model: Optional[str] = None, concurrency: int = 1, rate_limit: Optional[float] = None,
+                   tokens_per_minute: Optional[float] = None, latency: Optional[float] = None,
+                   output_tokens: Optional[int] = None, sleep: Optional[float] = None,
+                   **stage_options) -> Dict[str, Any]:
+    """
+    Dry-run one stage: build every prompt, count tokens locally and project
+    cost and wall time. Nothing is sent.
+
+    Args:
+        stage (str): One of STAGES
+        inputs (dict): Input file and sheet overrides
+        limit (int): Only read the first N input rows
+        model (str): Model whose MODEL_PRICING entry prices the run
+        concurrency (int): Parallel workers
+        rate_limit (float): Provider limit in requests per minute
+        tokens_per_minute (float): Provider limit in input tokens per minute
+        latency (float): Expected seconds per request
+        output_tokens (int): Expected output tokens per request
+        sleep (float): Seconds each worker sleeps between requests
+        **stage_options: Passed to the stage's iter_prompt_parts
+
+    Returns:
+        dict: Requests, token totals and percentiles, cost and wall time
+    """
+    defaults = STAGE_DEFAULTS[stage]
+    model = model or defaults["model"]
+    latency = defaults["latency"] if latency is None else latency
+    output_tokens = defaults["output_tokens"] if output_tokens is None else output_tokens
+    sleep = defaults["sleep"] if sleep is None else sleep
+
+    ledger = TokenLedger()
+    for static, dynamic in _progress(iter_stage_prompts(stage, inputs, limit, **stage_options), stage):
+        ledger.add(stage, static, dynamic)
+    summary = ledger.summary()[0] if ledger.stages else {
+        "requests": 0, "static_tokens": 0, "dynamic_tokens": 0, "total_tokens": 0, "static_share": 0.0,
+    }
+    per_request = sorted(ledger.stages[stage]["per_request"]) if ledger.stages else []
+
+    requests = summary["requests"]
+    pricing = config.MODEL_PRICING.get(model)
+    cost = cached_cost = None
+    if pricing:
+        output_cost = requests * output_tokens * pricing["output"] / 1e6 + requests * pricing["per_request"]
+        cost = summary["total_tokens"] * pricing["input"] / 1e6 + output_cost
+        cached_cost = (summary["static_tokens"] * pricing["cached_input"]
+                       + summary["dynamic_tokens"] * pricing["input"]) / 1e6 + output_cost
+
+    mean_tokens = summary["total_tokens"] / requests if requests else 0.0
+    seconds, binding = project_wall_time(requests, concurrency, latency, sleep, rate_limit, tokens_per_minute,
+                                         mean_tokens)
+    return {
+        "stage": stage,
+        "model": model,
+        "tokenizer": tokenizer_name(),
+        "requests": requests,
+        "input_tokens": summary["total_tokens"],
+        "static_tokens": summary["static_tokens"],
+        "dynamic_tokens": summary["dynamic_tokens"],
+        "input_tokens_p50": percentile(per_request, 50),
+        "input_tokens_p90": percentile(per_request, 90),
+        "input_tokens_p99": percentile(per_request, 99),
+        "input_tokens_max": per_request[-1] if per_request else 0,
+        "output_tokens": requests * output_tokens,
+        "cost_usd": cost,
+        "cost_usd_with_prefix_cache": cached_cost,
+        "wall_seconds": seconds,
+        "binding_limit": binding,
+        "assumptions": {
+            "concurrency": concurrency, "rate_limit_per_min": rate_limit, "tokens_per_min": tokens_per_minute,
+            "latency_seconds": latency, "sleep_seconds": sleep, "output_tokens_per_request": output_tokens,
+        },
+    }
+
+
+def _format_duration(seconds: float) -> str:
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    if minutes:
+        return f"{minutes}m {secs:02d}s"
+    return f"{secs}s"
+
+
+def print_estimate(estimate: Dict[str, Any]):
+    """Print a dry-run estimate."""
+    a = estimate["assumptions"]
+    total = estimate["input_tokens"]
+    static_share = estimate["static_tokens"] / total if total else 0.0
+    print(f"\nDry run: {estimate['stage']} ({estimate['model']}) - nothing was sent")
+    print(f"  Requests:            {estimate['requests']:,}")
+    print(f"  Input tokens:        {total:,} ({static_share:.0%} static prefix; {estimate['tokenizer']})")
+    print(f"  Per request:         p50 {estimate['input_tokens_p50']:,}  p90 {estimate['input_tokens_p90']:,}  "
+          f"p99 {estimate['input_tokens_p99']:,}  max {estimate['input_tokens_max']:,}")
+    print(f"  Output tokens (est): {estimate['output_tokens']:,} ({a['output_tokens_per_request']} per request)")
+    if estimate["cost_usd"] is None:
+        print(f"  Projected cost:      unknown (no MODEL_PRICING entry for {estimate['model']})")
+    else:
+        print(f"  Projected cost:      ${estimate['cost_usd']:,.2f} "
+              f"(${estimate['cost_usd_with_prefix_cache']:,.2f} with a warm prefix cache)")
+    limits = [f"concurrency {a['concurrency']}"]
+    if a["rate_limit_per_min"]:
+        limits.append(f"{a['rate_limit_per_min']:g} req/min")
+    if a["tokens_per_min"]:
+        limits.append(f"{a['tokens_per_min']:,.0f} tokens/min")
+    print(f"  Projected wall time: {_format_duration(estimate['wall_seconds'])} at {', '.join(limits)}, "
+          f"{a['latency_seconds']:g}s latency + {a['sleep_seconds']:g}s sleep (bound by {estimate['binding_limit']})")
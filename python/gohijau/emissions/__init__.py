@@ -0,0 +1,7 @@
+"""
+CO2 emissions and emission intensity of IBS manufacturing firms.
+
+Python port of `stata/Emissions.do` and
+`emission_intensity_dofile_2digitprov.do`. The fuel factors come from the
+versioned table `fuel_factors.csv` instead of Stata globals.
+"""
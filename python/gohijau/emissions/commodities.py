@@ -0,0 +1,221 @@
+"""
+Emission intensity of the EUDR commodity sectors, joined to the cost drivers.
+
+The EUDR cost drivers (stage 6: `Process`, `Cost Driver`, `Inferred Nominal
+Cost`, `Inferred Cost Type`, ...) say what compliance costs, and the IBS
+results say how carbon-intensive the industries that bear it are. This
+module joins the two. `commodity_kbli.csv` maps each EUDR commodity to the
+KBLI codes of the industries that process it, as 5-digit codes or whole
+2-digit divisions:
+
+    commodity    palm oil, rubber, cocoa, coffee, wood, soy, cattle
+    kbli         5-digit KBLI, or a 2-digit division (e.g. 16)
+    description  What the code covers
+
+Each commodity's sector profile comes from the emissions cube: its KBLI
+cells' totals are summed and their intensity sketches merged, so the median
+intensity is that of all of the commodity's firms. There are only a few
+commodities (times provinces), so the profiles are built once and joined
+to the cost driver rows with a single hash join on the commodity.
+
+A cost driver row is assigned the commodities its text names. A row that
+names none, as most EUDR obligations do, applies to every commodity and is
+repeated once per commodity.
+"""
+
+import os
+import re
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from gohijau.emissions.cube import TOTALS, EmissionsCube
+from gohijau.emissions.sketch import QuantileSketch
+
+COMMODITY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'commodity_kbli.csv')
+
+# Words that tie a cost driver row to a commodity (Annex I of the EUDR)
+COMMODITY_PATTERNS = {
+    "palm oil": r"palm\s*(?:oil|kernel)|oil\s*palm|\bcpo\b|kelapa\s*sawit",
+    "rubber": r"\brubber|\bkaret\b",
+    "cocoa": r"\bcocoa|\bcacao|chocolate|\bkakao",
+    "coffee": r"\bcoffee|\bkopi\b",
+    "wood": r"\bwood|\btimber|\blumber|\bplywood|\bpulp\b|\bpaper\b|\bfurniture|\bkayu\b",
+    "soy": r"\bsoy|\bsoya|\bsoybean|\bkedelai",
+    "cattle": r"\bcattle|\bbeef\b|\bbovine|\bleather|\bhides?\b|\bsapi\b",
+}
+TEXT_COLUMNS = ("Process", "Cost Driver")
+
+# Columns added to each cost driver row
+COMMODITY_COLUMN = "Commodity"
+SCOPE_COLUMN = "Commodity Scope" # 'named' (in the row's text) or 'all' (the row names no commodity)
+PROFILE_COLUMNS = ("KBLI", "intensity") + TOTALS + ("firms", "intensity_firms")
+
+
+def load_commodity_map(path: str = COMMODITY_FILE) -> Dict[str, Tuple[str, ...]]:
+    """KBLI codes of each commodity, in file order."""
+    table = pd.read_csv(path, dtype=str)
+    return {commodity: tuple(group["kbli"].str.strip()) for commodity, group in table.groupby("commodity", sort=False)}
+
+
+def _commodity_regex(commodities: Iterable[str]) -> re.Pattern:
+    """One pattern with a named group per commodity."""
+    groups = [f"(?P<c{i}>{COMMODITY_PATTERNS[c]})" for i, c in enumerate(commodities) if c in COMMODITY_PATTERNS]
+    return re.compile("|".join(groups) or r"(?!)", re.IGNORECASE)
+
+
+def named_commodities(texts: Sequence[str], commodities: Sequence[str]) -> List[Tuple[str, ...]]:
+    """
+    The commodities each text names, in `commodities` order.
+
+    Args:
+        texts (list): One text per cost driver row
+        commodities (list): Commodities to look for
+
+    Returns:
+        list: A tuple of commodities per text (empty if it names none)
+    """
+    pattern = _commodity_regex(commodities)
+    index = {f"c{i}": c for i, c in enumerate(commodities)}
+    order = {c: i for i, c in enumerate(commodities)}
+    named = []
+    for text in texts:
+        found = {index[m.lastgroup] for m in pattern.finditer(text)}
+        named.append(tuple(sorted(found, key=order.get)))
+    return named
+
+
+def _industry(code: str) -> Dict[str, str]:
+    """Cube keyword for a KBLI code: a 2-digit division or a 5-digit industry."""
+    return {"isic2": code} if len(code) == 2 else {"isic5": code}
+
+
+def sector_profiles(cube: EmissionsCube, commodity_map: Dict[str, Tuple[str, ...]], year: Optional[int] = None,
+                    by_province: bool = False) -> pd.DataFrame:
+    """
+    Median intensity and totals of each commodity's KBLI sector.
+
+    Args:
+        cube (EmissionsCube): Emissions cube (`emissions cube`)
+        commodity_map (dict): KBLI codes per commodity
+        year (int): Survey year, or None for all years in the cube
+        by_province (bool): One profile per commodity x province
+
+    Returns:
+        DataFrame: commodity (, province), KBLI, intensity, the totals,
+            firms and intensity_firms. Commodities without firms in the cube
+            have NaN intensity and zero totals
+    """
+    provinces: List[Optional[str]] = [None]
+    if by_province:
+        provinces = sorted({str(p) for p in cube.cells_frame["province"].dropna()})
+    rows = []
+    for commodity, codes in commodity_map.items():
+        for province in provinces:
+            sketch = QuantileSketch(alpha=cube.alpha)
+            totals = np.zeros(len(TOTALS))
+            firms = 0
+            for code in codes:
+                cell = cube.get(year, province, **_industry(code))
+                if cell is None:
+                    continue
+                totals += [getattr(cell, column) for column in TOTALS]
+                firms += cell.firms
+                sketch = sketch.merge(cube.sketch(year, province, **_industry(code)))
+            row = {"commodity": commodity, "province": province, "KBLI": " ".join(codes),
+                   "intensity": sketch.quantile(0.5)}
+            row.update(zip(TOTALS, totals))
+            row.update(firms=firms, intensity_firms=sketch.count)
+            rows.append(row)
+    profiles = pd.DataFrame(rows)
+    if not by_province:
+        profiles = profiles.drop(columns="province")
+    empty = profiles.loc[profiles["firms"] == 0, "commodity"].unique()
+    if len(empty):
+        print(f"No firms in the cube for: {', '.join(empty)}")
+    return profiles
+
+
+def join_cost_drivers(drivers: pd.DataFrame, profiles: pd.DataFrame, commodities: Optional[Sequence[str]] = None,
+                      text_columns: Sequence[str] = TEXT_COLUMNS) -> pd.DataFrame:
+    """
+    Attach the sector profile of each commodity to the cost driver rows.
+
+    Args:
+        drivers (DataFrame): Cost driver rows (cost inference output)
+        profiles (DataFrame): `sector_profiles` output
+        commodities (list): Only these commodities (default: all profiled)
+        text_columns (list): Columns searched for commodity names
+
+    Returns:
+        DataFrame: One row per cost driver row x commodity (x province, for
+            per-province profiles): the driver's columns, then Commodity,
+            Commodity Scope and the profile columns
+    """
+    commodities = list(commodities or dict.fromkeys(profiles["commodity"]))
+    present = [c for c in text_columns if c in drivers.columns]
+    texts = drivers[present].fillna("").astype(str).agg(" ".join, axis=1) if present else pd.Series("", drivers.index)
+    named = named_commodities(texts.tolist(), commodities)
+    assigned = [row or tuple(commodities) for row in named]
+    repeats = np.fromiter(map(len, assigned), dtype=np.int64, count=len(assigned))
+    positions = np.repeat(np.arange(len(drivers)), repeats)
+    out = drivers.iloc[positions].reset_index(drop=True)
+    out[COMMODITY_COLUMN] = [c for row in assigned for c in row]
+    out[SCOPE_COLUMN] = np.repeat(np.where([bool(row) for row in named], "named", "all"), repeats)
+
+    # Hash join on the commodity; per-province profiles repeat each row once per province
+    columns = [c for c in ("province",) + PROFILE_COLUMNS if c in profiles.columns]
+    profiles = profiles[["commodity"] + columns].rename(columns={"commodity": COMMODITY_COLUMN})
+    return out.merge(profiles, on=COMMODITY_COLUMN, how="left", sort=False)
+
+
+def run(drivers_file: str, cube_file: str, output_file: str, sectors_file: Optional[str] = None,
+        year: Optional[int] = None, by_province: bool = False, commodities: Optional[Sequence[str]] = None,
+        commodity_file: str = COMMODITY_FILE, sheet=0, store=None) -> pd.DataFrame:
+    """
+    Join the cost drivers to the commodity sector profiles and write the table.
+
+    Args:
+        drivers_file (str): Cost inference output (EUDR_PROCESS_FINAL_ANALYSIS_all.xlsx)
+        cube_file (str): Emissions cube (SQLite)
+        output_file (str): Combined table (format by extension)
+        sectors_file (str): Also write the sector profiles here
+        year (int): Survey year (default: all years in the cube)
+        by_province (bool): One row per province for every cost driver x commodity
+        commodities (list): Only these commodities
+        commodity_file (str): Commodity -> KBLI table
+        sheet: Excel sheet of `drivers_file`
+        store (PipelineStore): Read the cost drivers from the store instead
+
+    Returns:
+        DataFrame: The combined table
+    """
+    from gohijau.emissions.engine import write_frame
+
+    started = time.perf_counter()
+    if store is not None:
+        drivers = store.final_frame()
+        print(f"Loaded {len(drivers)} cost driver rows from {store.path}")
+    else:
+        drivers = pd.read_excel(drivers_file, sheet_name=sheet)
+        print(f"Loaded {len(drivers)} cost driver rows from {drivers_file}")
+    commodity_map = load_commodity_map(commodity_file)
+    if commodities:
+        unknown = sorted(set(commodities) - set(commodity_map))
+        if unknown:
+            raise ValueError(f"No KBLI codes for commodities {unknown}; known: {sorted(commodity_map)}")
+        commodity_map = {c: commodity_map[c] for c in commodities}
+    cube = EmissionsCube.load(cube_file)
+    profiles = sector_profiles(cube, commodity_map, year, by_province)
+    out = join_cost_drivers(drivers, profiles, list(commodity_map))
+    write_frame(out, output_file)
+    named = int((out[SCOPE_COLUMN] == "named").sum())
+    print(f"Joined {len(drivers)} cost driver rows to {len(commodity_map)} commodity sectors: {len(out)} rows "
+          f"({named} for commodities named in the row) in {time.perf_counter() - started:.2f}s")
+    print(f"Combined table saved to: {output_file}")
+    if sectors_file:
+        write_frame(profiles, sectors_file)
+        print(f"Sector profiles saved to: {sectors_file}")
+    return out
@@ -0,0 +1,235 @@
+"""
+Precomputed emission-intensity cube over year, province and KBLI level.
+
+The 2-digit/province do-file collapses once, to `(median) intensity (sum)
+TOTAL_CO2 TOTAL_KWH TOTAL_TJ` by DPROVI21 x DISIC2, and every other cut
+means rerunning it. The cube is built once from the firm-level results. Its
+base cells are (year, province, 5-digit KBLI), and each holds the totals,
+firm counts and a quantile sketch of intensity. Every coarser cell is built
+by adding the base cells' totals and merging their sketches, without going
+back to the firms. There are twelve cuboids: year or all years, times
+province or all provinces, times 5-digit, 2-digit or all industries.
+
+`EmissionsCube.lookup` is a dict access on the cell key, so it takes
+microseconds. The medians are DDSketch estimates, within a relative error of
+`alpha` (1% by default) of the value that `collapse_province_industry`
+computes exactly. Totals are exact.
+
+A cube is saved as a small SQLite file with two tables: `cube_cells`, with
+one row per cell of every cuboid, and `cube_sketches`, with the (cell, key,
+count) buckets of every cell.
+"""
+
+import itertools
+import sqlite3
+import time
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from gohijau.emissions.sketch import DEFAULT_ALPHA, QuantileSketch, grouped_quantiles, sketch_keys
+
+DIMENSIONS = ("year", "province", "isic2", "isic5")
+TOTALS = ("TOTAL_CO2", "TOTAL_KWH", "TOTAL_TJ")
+
+# Industry levels of a cuboid: none, 2-digit, or 5-digit (which fixes the 2-digit code)
+INDUSTRY_LEVELS = ((), ("isic2",), ("isic2", "isic5"))
+
+CellKey = Tuple[Optional[int], Optional[str], Optional[str], Optional[str]]
+
+
+class CubeCell(NamedTuple):
+    """Intensity and totals of one cube cell."""
+
+    intensity: float # Median firm intensity (sketch estimate)
+    TOTAL_CO2: float
+    TOTAL_KWH: float
+    TOTAL_TJ: float
+    firms: int
+    intensity_firms: int # Firms with a non-missing intensity
+
+
+def cuboids() -> Iterator[Tuple[str, ...]]:
+    """The dimensions kept by each of the twelve cuboids, finest first."""
+    for year, province, industry in itertools.product((("year",), ()), (("province",), ()), INDUSTRY_LEVELS[::-1]):
+        yield year + province + industry
+
+
+def _firm_frame(df: pd.DataFrame, year: Optional[int], suffix: str) -> pd.DataFrame:
+    """Firm results reduced to the cube's dimensions and measures."""
+    from gohijau.emissions.engine import isic2
+
+    if "year" in df.columns:
+        years = df["year"].to_numpy(dtype=np.int64)
+    elif year is not None:
+        years = np.full(len(df), int(year), dtype=np.int64)
+    else:
+        raise ValueError("Firm records need a 'year' column, or pass year=")
+    frame = pd.DataFrame({
+        "year": years,
+        "province": df[f"DPROVI{suffix}"].astype(str).to_numpy(),
+        "isic2": isic2(df, suffix).to_numpy(),
+        "isic5": df[f"DISIC5{suffix}"].astype(str).to_numpy(),
+        "intensity": df["intensity"].to_numpy(dtype=np.float64, na_value=np.nan),
+    })
+    for column in TOTALS:
+        frame[column] = df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+    return frame
+
+
+def _rollup(base: pd.DataFrame, sketches: pd.DataFrame, keep: Tuple[str, ...], alpha: float
+            ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Cells and sketches of one cuboid, from the base cells only."""
+    keep = list(keep)
+    if keep:
+        cells = base.groupby(keep, sort=True)[list(TOTALS) + ["firms", "intensity_firms"]].sum().reset_index()
+        buckets = sketches.groupby(keep + ["key"], sort=True)["count"].sum().reset_index()
+    else:
+        cells = base[list(TOTALS) + ["firms", "intensity_firms"]].sum().to_frame().T
+        buckets = sketches.groupby("key", sort=True)["count"].sum().reset_index()
+    for dimension in DIMENSIONS:
+        if dimension not in keep:
+            cells[dimension] = None
+
+    # Medians of all cells of the cuboid at once (buckets are sorted by cell, then key)
+    if keep and len(buckets):
+        groups = buckets.groupby(keep, sort=False).ngroup().to_numpy()
+        medians = grouped_quantiles(groups, buckets["key"].to_numpy(), buckets["count"].to_numpy(), 0.5, alpha)
+        cells = cells.merge(buckets.drop_duplicates(keep)[keep].assign(intensity=medians), on=keep, how="left")
+    elif len(buckets):
+        groups = np.zeros(len(buckets), dtype=np.int64)
+        cells["intensity"] = grouped_quantiles(groups, buckets["key"].to_numpy(), buckets["count"].to_numpy(),
+                                               0.5, alpha)[0]
+    else:
+        cells["intensity"] = np.nan
+    return cells, buckets
+
+
+def _key(year=None, province=None, isic2=None, isic5=None) -> CellKey:
+    if isic5 is not None and isic2 is None:
+        isic2 = str(isic5)[:2]
+    return (int(year) if year is not None else None, None if province is None else str(province),
+            None if isic2 is None else str(isic2), None if isic5 is None else str(isic5))
+
+
+class EmissionsCube:
+    """Cells of every cuboid, looked up by (year, province, isic2, isic5)."""
+
+    def __init__(self, cells: pd.DataFrame, sketches: pd.DataFrame, alpha: float = DEFAULT_ALPHA):
+        self.alpha = alpha
+        self.cells_frame = cells
+        self.sketches_frame = sketches
+        years = [None if y is None or y != y else int(y) for y in cells["year"].tolist()]
+        codes = [[None if v is None or v != v else str(v) for v in cells[c].tolist()] for c in DIMENSIONS[1:]]
+        keys = list(zip(years, *codes))
+        measures = zip(cells["intensity"].astype(float).tolist(), *(cells[c].astype(float).tolist() for c in TOTALS),
+                       cells["firms"].astype(int).tolist(), cells["intensity_firms"].astype(int).tolist())
+        self._cells: Dict[CellKey, CubeCell] = dict(zip(keys, map(CubeCell._make, measures)))
+        self._ids: Dict[CellKey, int] = dict(zip(keys, cells["cell"].astype(int).tolist()))
+        # Bucket rows of each cell id, for `sketch` (sketches are sorted by cell, then key)
+        cell_ids = sketches["cell"].to_numpy(dtype=np.int64)
+        self._starts = np.searchsorted(cell_ids, np.arange(len(cells) + 1))
+        self._bucket_keys = sketches["key"].to_numpy(dtype=np.int64)
+        self._bucket_counts = sketches["count"].to_numpy(dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    def get(self, year=None, province=None, isic2=None, isic5=None) -> Optional[CubeCell]:
+        """The cell for a combination (None = all), or None if the cube has no firms there."""
+        return self._cells.get(_key(year, province, isic2, isic5))
+
+    def lookup(self, year=None, province=None, isic2=None, isic5=None) -> CubeCell:
+        """
+        Intensity and totals for a combination.
+
+        Args:
+            year (int): Survey year, or None for all years
+            province (str): BPS province code (DPROVI), or None for all
+            isic2 (str): 2-digit KBLI, or None for all (implied by isic5)
+            isic5 (str): 5-digit KBLI, or None
+
+        Returns:
+            CubeCell: Median intensity, totals and firm counts
+
+        Raises:
+            KeyError: No firms in that combination
+        """
+        key = _key(year, province, isic2, isic5)
+        try:
+            return self._cells[key]
+        except KeyError:
+            raise KeyError(f"No cube cell for year={key[0]}, province={key[1]}, isic2={key[2]}, "
+                           f"isic5={key[3]}") from None
+
+    def sketch(self, year=None, province=None, isic2=None, isic5=None) -> QuantileSketch:
+        """The intensity sketch of a cell, e.g. to merge cells or read other quantiles."""
+        cell = self._ids.get(_key(year, province, isic2, isic5))
+        if cell is None:
+            return QuantileSketch(alpha=self.alpha)
+        start, end = self._starts[cell], self._starts[cell + 1]
+        return QuantileSketch(self._bucket_keys[start:end], self._bucket_counts[start:end], self.alpha)
+
+    def quantile(self, q: float, year=None, province=None, isic2=None, isic5=None) -> float:
+        """Any intensity quantile of a cell, from its sketch."""
+        return self.sketch(year, province, isic2, isic5).quantile(q)
+
+    def years(self) -> List[int]:
+        return sorted({key[0] for key in self._cells if key[0] is not None})
+
+    def save(self, path: str):
+        """Write the cells and sketches to a SQLite file (replacing it)."""
+        with sqlite3.connect(path) as conn:
+            self.cells_frame.to_sql("cube_cells", conn, if_exists="replace", index=False)
+            self.sketches_frame.to_sql("cube_sketches", conn, if_exists="replace", index=False)
+            conn.execute("CREATE TABLE IF NOT EXISTS cube_meta (alpha REAL)")
+            conn.execute("DELETE FROM cube_meta")
+            conn.execute("INSERT INTO cube_meta VALUES (?)", (self.alpha,))
+
+    @classmethod
+    def load(cls, path: str) -> "EmissionsCube":
+        with sqlite3.connect(path) as conn:
+            cells = pd.read_sql("SELECT * FROM cube_cells ORDER BY cell", conn)
+            sketches = pd.read_sql("SELECT * FROM cube_sketches ORDER BY cell, key", conn)
+            alpha = conn.execute("SELECT alpha FROM cube_meta").fetchone()[0]
+        return cls(cells, sketches, alpha)
+
+
+def build_cube(df: pd.DataFrame, year: Optional[int] = None, suffix: str = "21",
+               alpha: float = DEFAULT_ALPHA) -> EmissionsCube:
+    """
+    Build the cube from firm-level emissions results.
+
+    Args:
+        df (DataFrame): `compute_emissions` output (with DPROVI, DISIC5,
+            intensity and the totals), for one or more years
+        year (int): Survey year, when `df` has no 'year' column
+        suffix (str): Year suffix of DPROVI/DISIC5
+        alpha (float): Relative accuracy of the medians
+
+    Returns:
+        EmissionsCube
+    """
+    started = time.perf_counter()
+    firms = _firm_frame(df, year, suffix)
+    base_keys = list(DIMENSIONS)
+    measured = firms.assign(firms=1, intensity_firms=firms["intensity"].notna().astype(np.int64))
+    # `collapse (sum)` treats missing as 0
+    base = measured.groupby(base_keys, sort=True)[list(TOTALS) + ["firms", "intensity_firms"]].sum().reset_index()
+    finite = firms[np.isfinite(firms["intensity"])]
+    sketches = (finite.assign(key=sketch_keys(finite["intensity"].to_numpy(), alpha))
+                .groupby(base_keys + ["key"], sort=True).size().rename("count").reset_index())
+
+    cells, buckets, offset = [], [], 0
+    for keep in cuboids():
+        c, b = _rollup(base, sketches, keep, alpha)
+        c["cell"] = offset + np.arange(len(c))
+        b = b.merge(c[list(keep) + ["cell"]], on=list(keep)) if keep else b.assign(cell=offset)
+        offset += len(c)
+        cells.append(c[["cell"] + list(DIMENSIONS) + ["intensity"] + list(TOTALS) + ["firms", "intensity_firms"]])
+        buckets.append(b[["cell", "key", "count"]])
+    cube = EmissionsCube(pd.concat(cells, ignore_index=True), pd.concat(buckets, ignore_index=True), alpha)
+    print(f"Built emissions cube: {len(firms)} firms, {len(base)} base cells, {len(cube)} cells in "
+          f"{time.perf_counter() - started:.2f}s")
+    return cube
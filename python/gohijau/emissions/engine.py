@@ -0,0 +1,265 @@
+"""
+Vectorized emissions engine.
+
+The do-files generate every fuel's TJ, CO2 and kWh with one `gen` per fuel.
+Here the fuel quantities form one (firms x fuels) matrix, and each result is
+a single broadcast against the factor vectors:
+
+    TJ  = Q * tj_per_unit          (firms x fuels)
+    CO2 = TJ * ef                  (firms x fuels)
+    KWH = TJ * KWH_PER_TJ
+
+Stata semantics are kept where they change results:
+
+- missing values propagate through arithmetic, and x / 0 is missing;
+- `egen rowmean()` averages the non-missing values; `egen rowtotal(...,
+  missing)` sums them and is missing only when all inputs are missing;
+- other energy (ENCVCU at the mean price per TJ) counts towards TOTAL_TJ and
+  TOTAL_CO2, with gasoline's emission factor.
+
+Two variants match the two do-files:
+
+    firm      Emissions.do: VTLVCU is built from the r100x components,
+              intensity = TOTAL_CO2 / VTLVCU
+    province  emission_intensity_dofile_2digitprov.do: the survey's VTLVCU is
+              scaled by 1000, intensity = TOTAL_CO2 / VTLVCU * 1e6 (per Rp 1
+              million of value added); `collapse_province_industry` then
+              gives the median intensity and summed totals per DPROVI21 x DISIC2
+"""
+
+import os
+import time
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from gohijau.emissions.factors import KWH_PER_TJ, FuelFactors, load_factors
+
+VARIANT_FIRM = "firm"
+VARIANT_PROVINCE = "province"
+VARIANTS = (VARIANT_FIRM, VARIANT_PROVINCE)
+
+OTHER_ENERGY = "OTHERENERGY"
+OTHER_ENERGY_VALUE_COLUMN = "ENCVCU"
+
+# Value added components of Emissions.do (section 6.2)
+R1002 = (("YPRVCU", 1), ("YRSVCU", 1), ("YRNVCU", 1), ("NOPVCU", -1), ("STDVCU", 1), ("STJVCU", -1))
+R1003 = (("ILRVCU", 1), ("ITXVCU", 1), ("IINVCU", 1), ("ICOVCU", 1), ("IDEVCU", 1), ("IPRVCU", 1))
+R1001 = (("ZPDVCU", 1), ("ZNDVCU", 1), ("EFUVCU", 1), ("EPLVCU", 1), ("ENPVCU", 1), ("IOTVCU", 1),
+         ("RDNVCU", 1), ("RIMVCU", 1))
+R1001A = (("ZPDVCU", 1), ("ZNDVCU", 1))
+
+PROVINCE_VALUE_ADDED_SCALE = 1000 # "Convert to thousands"
+PROVINCE_INTENSITY_SCALE = 1e6 # CO2 per Rp 1 million value added
+
+
+def stata_divide(numerator, denominator):
+    """Element-wise division with Stata's rule that x / 0 is missing."""
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = numerator / denominator
+    return np.where(denominator == 0, np.nan, result)
+
+
+def rowtotal(matrix: np.ndarray) -> np.ndarray:
+    """`egen rowtotal(..., missing)`: sum of non-missing values, missing if all are missing."""
+    present = ~np.isnan(matrix)
+    return np.where(present.any(axis=1), np.where(present, matrix, 0.0).sum(axis=1), np.nan)
+
+
+def rowmean(matrix: np.ndarray) -> np.ndarray:
+    """`egen rowmean()`: mean of non-missing values, missing if all are missing."""
+    present = ~np.isnan(matrix)
+    counts = present.sum(axis=1)
+    totals = np.where(present, matrix, 0.0).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(counts > 0, totals / counts, np.nan)
+
+
+def _columns(df: pd.DataFrame, columns) -> np.ndarray:
+    missing = [column for column in columns if column not in df.columns]
+    if missing:
+        raise KeyError(f"Input is missing column(s): {', '.join(missing)}")
+    return df[list(columns)].to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _signed_sum(df: pd.DataFrame, terms) -> np.ndarray:
+    # Plain `+` in Stata: any missing term makes the result missing
+    values = _columns(df, [column for column, _ in terms])
+    return values @ np.array([sign for _, sign in terms], dtype=np.float64)
+
+
+def value_added(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """r1001, r1001a, r1002, r1003 and VTLVCU as built in Emissions.do."""
+    parts = {"r1002": _signed_sum(df, R1002), "r1003": _signed_sum(df, R1003),
+             "r1001": _signed_sum(df, R1001), "r1001a": _signed_sum(df, R1001A)}
+    parts["VTLVCU"] = parts["r1002"] - parts["r1001"] + parts["r1001a"] + parts["r1003"]
+    return parts
+
+
+def compute_emissions(df: pd.DataFrame, factors: Optional[FuelFactors] = None, variant: str = VARIANT_FIRM,
+                      value_suffix: str = "21", keep_input: bool = True,
+                      meancost: Optional[np.ndarray] = None) -> pd.DataFrame:
+    """
+    Compute energy, CO2 and intensity for every firm.
+
+    Args:
+        df (DataFrame): IBS firm records with the fuel quantity columns
+            (EPELIU, ...), their value columns (EPEVCU21, ...), ENCVCU, and
+            either the value added components (firm) or VTLVCU (province)
+        factors (FuelFactors): Factor set (default: `load_factors()`)
+        variant (str): 'firm' (Emissions.do) or 'province' (2digitprov do-file)
+        value_suffix (str): Year suffix of the per-fuel value columns
+        keep_input (bool): Return the input columns too, like the do-files' dataset
+        meancost (ndarray): Price per TJ for other energy per firm, replacing
+            the do-file's rowmean of the firm's own prices (see
+            `pricing.imputed_meancost`)
+
+    Returns:
+        DataFrame: TJ_*, CO2_*, KWH_* per fuel and OTHERENERGY, the
+            *_PER_ENERGY prices, meancost, TOTAL_CO2, TOTAL_TJ, TOTAL_KWH,
+            VTLVCU (and its components for 'firm') and intensity
+    """
+    if variant not in VARIANTS:
+        raise ValueError(f"Unknown variant '{variant}'; choose from {', '.join(VARIANTS)}")
+    factors = factors or load_factors()
+    fuels = list(factors.fuels)
+
+    # (firms x fuels) quantities against the factor vectors
+    quantities = _columns(df, fuels)
+    tj = quantities * factors.tj_per_unit
+    co2 = tj * factors.ef
+
+    value_columns = factors.value_columns(value_suffix)
+    per_energy = stata_divide(_columns(df, value_columns), tj)
+    if meancost is None:
+        meancost = rowmean(per_energy)
+    tj_other = stata_divide(_columns(df, [OTHER_ENERGY_VALUE_COLUMN])[:, 0], meancost)
+    co2_other = tj_other * factors.other_energy_ef
+
+    tj_all = np.column_stack([tj, tj_other])
+    co2_all = np.column_stack([co2, co2_other])
+    kwh_all = tj_all * KWH_PER_TJ
+    total_co2 = rowtotal(co2_all)
+    total_tj = rowtotal(tj_all)
+
+    names = fuels + [OTHER_ENERGY]
+    results: Dict[str, np.ndarray] = {}
+    for prefix, matrix in (("TJ", tj_all), ("CO2", co2_all), ("KWH", kwh_all)):
+        for j, name in enumerate(names):
+            results[f"{prefix}_{name}"] = matrix[:, j]
+    for j, column in enumerate(value_columns):
+        results[f"{column}_PER_ENERGY"] = per_energy[:, j]
+    results["meancost"] = meancost
+    results["TOTAL_CO2"] = total_co2
+    results["TOTAL_TJ"] = total_tj
+    results["TOTAL_KWH"] = total_tj * KWH_PER_TJ
+
+    if variant == VARIANT_FIRM:
+        results.update(value_added(df))
+        results["intensity"] = stata_divide(total_co2, results["VTLVCU"])
+    else:
+        vtlvcu = _columns(df, ["VTLVCU"])[:, 0] * PROVINCE_VALUE_ADDED_SCALE
+        results["VTLVCU"] = vtlvcu
+        results["intensity"] = stata_divide(total_co2, vtlvcu) * PROVINCE_INTENSITY_SCALE
+
+    out = pd.DataFrame(results, index=df.index)
+    if not keep_input:
+        return out
+    return pd.concat([df.drop(columns=[c for c in out.columns if c in df.columns]), out], axis=1)
+
+
+def isic2(df: pd.DataFrame, suffix: str = "21") -> pd.Series:
+    """DISIC2 = substr(DISIC5<suffix>, 1, 2), unless the data already has DISIC2."""
+    if "DISIC2" in df.columns:
+        return df["DISIC2"].astype(str)
+    return df[f"DISIC5{suffix}"].astype(str).str[:2]
+
+
+def collapse_province_industry(df: pd.DataFrame, suffix: str = "21") -> pd.DataFrame:
+    """
+    `collapse (median) intensity (sum) TOTAL_CO2 TOTAL_KWH TOTAL_TJ,
+    by(DPROVI21 DISIC2)`: medians skip missing values, and sums treat them
+    as 0. Also adds `provcode` (DPROVI21 + "00"). With `suffix` "" this
+    works on the multi-year panel's canonical DPROVI/DISIC5 names.
+    """
+    province = f"DPROVI{suffix}"
+    frame = pd.DataFrame({
+        province: df[province].astype(str).to_numpy(),
+        "DISIC2": isic2(df, suffix).to_numpy(),
+        "intensity": df["intensity"].to_numpy(dtype=np.float64),
+        "TOTAL_CO2": df["TOTAL_CO2"].to_numpy(dtype=np.float64),
+        "TOTAL_KWH": df["TOTAL_KWH"].to_numpy(dtype=np.float64),
+        "TOTAL_TJ": df["TOTAL_TJ"].to_numpy(dtype=np.float64),
+    })
+    grouped = frame.groupby([province, "DISIC2"], sort=True)
+    out = grouped.agg(intensity=("intensity", "median"), TOTAL_CO2=("TOTAL_CO2", "sum"),
+                      TOTAL_KWH=("TOTAL_KWH", "sum"), TOTAL_TJ=("TOTAL_TJ", "sum")).reset_index()
+    out["provcode"] = out[province] + "00"
+    return out
+
+
+def write_frame(df: pd.DataFrame, path: str):
+    """Write by extension: .parquet, .csv, .dta or Excel."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".parquet":
+        df.to_parquet(path, index=False)
+    elif ext == ".csv":
+        df.to_csv(path, index=False)
+    elif ext == ".dta":
+        # Categorical codes would become value-labelled numbers; Stata code variables are strings
+        categorical = [c for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)]
+        df.astype({c: object for c in categorical}).to_stata(path, write_index=False)
+    else:
+        df.to_excel(path, index=False)
+
+
+def run(input_file: str, output_file: str, variant: str = VARIANT_FIRM, factors_version: Optional[str] = None,
+        collapse_file: Optional[str] = None, value_suffix: str = "21",
+        other_energy_prices: Optional[str] = None) -> pd.DataFrame:
+    """
+    Compute emissions for a firm file and write the result.
+
+    Args:
+        input_file (str): Merged IBS records (the do-files' IBS_21)
+        output_file (str): Firm-level result (the do-files' CO2_EMISSION)
+        variant (str): 'firm' or 'province'
+        factors_version (str): Factor set (default: the latest shipped version)
+        collapse_file (str): Also write the province x ISIC2 collapse here
+        value_suffix (str): Year suffix of the per-fuel value columns
+        other_energy_prices (str): Impute other energy from a robust price
+            table, e.g. 'median:5' or 'trimmed:0.1:10' (see `pricing`),
+            instead of each firm's own meancost
+
+    Returns:
+        DataFrame: The firm-level result
+    """
+    from gohijau.emissions.loader import load_ibs
+
+    factors = load_factors(factors_version) if factors_version else load_factors()
+    print(f"Reading firm records: {input_file}")
+    df = load_ibs(input_file, suffix=value_suffix)
+    meancost = None
+    if other_energy_prices:
+        from gohijau.emissions.pricing import build_price_table, imputed_meancost, parse_table_spec
+
+        stat, trim, min_firms = parse_table_spec(other_energy_prices)
+        table = build_price_table(df, factors, stat, trim, min_firms, suffix=value_suffix)
+        meancost = imputed_meancost(df, table, factors, value_suffix)
+        print(f"Other energy priced from the {table.label} table")
+    started = time.perf_counter()
+    result = compute_emissions(df, factors, variant=variant, value_suffix=value_suffix, meancost=meancost)
+    print(f"Computed emissions for {len(result)} firms with factors {factors.version} "
+          f"in {time.perf_counter() - started:.3f}s")
+    print(f"TOTAL_CO2: {np.nansum(result['TOTAL_CO2']):,.1f}; firms with an intensity: "
+          f"{int(result['intensity'].notna().sum())}")
+    write_frame(result, output_file)
+    print(f"Results saved to: {output_file}")
+    if collapse_file:
+        collapsed = collapse_province_industry(result, value_suffix)
+        write_frame(collapsed, collapse_file)
+        print(f"Province x ISIC2 collapse ({len(collapsed)} cells) saved to: {collapse_file}")
+    return result
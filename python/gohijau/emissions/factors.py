@@ -0,0 +1,94 @@
+"""
+Versioned fuel conversion and emission factors.
+
+`fuel_factors.csv` has one row per (version, fuel):
+
+    version      Factor set, e.g. 'ibs2021-v1' (the values of the 2021 do-files)
+    fuel         IBS quantity column (EPELIU, ECLKGU, ...)
+    name, unit   Fuel name and the unit of the quantity column
+    tj_per_unit  Energy content, TJ per unit (the do-files' TJ_* globals)
+    ef_tco2_per_tj  Emission factor (the do-files' EF_* globals)
+    value_prefix Prefix of the fuel's purchase value column (EPE -> EPEVCU21)
+
+Changing a factor means adding rows under a new version, so earlier results
+can always be reproduced with `--factors-version`.
+"""
+
+import os
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+FACTORS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fuel_factors.csv')
+DEFAULT_VERSION = "ibs2021-v1"
+
+KWH_PER_TJ = 277777.78 # The do-files' $KWH
+
+# The do-files convert 'other energy' (ENCVCU) to CO2 with gasoline's factor
+# ($EF_EPELIU); their $EF_median (59.29) is defined but never used.
+OTHER_ENERGY_FUEL = "EPELIU"
+EF_MEDIAN = 59.29
+
+
+@dataclass(frozen=True, eq=False)
+class FuelFactors:
+    """One version of the factor table, as arrays in fuel order."""
+    version: str
+    fuels: Tuple[str, ...]
+    names: Tuple[str, ...]
+    units: Tuple[str, ...]
+    tj_per_unit: np.ndarray # (fuels,)
+    ef: np.ndarray # (fuels,) tonnes CO2 per TJ
+    value_prefixes: Tuple[str, ...]
+
+    def value_columns(self, suffix: str = "21") -> List[str]:
+        """Purchase value columns per fuel, e.g. EPEVCU21."""
+        return [f"{prefix}VCU{suffix}" for prefix in self.value_prefixes]
+
+    @property
+    def other_energy_ef(self) -> float:
+        """Emission factor applied to TJ_OTHERENERGY."""
+        return float(self.ef[self.fuels.index(OTHER_ENERGY_FUEL)])
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            "fuel": self.fuels, "name": self.names, "unit": self.units,
+            "tj_per_unit": self.tj_per_unit, "ef_tco2_per_tj": self.ef, "value_prefix": self.value_prefixes,
+        })
+
+
+def available_versions(path: str = FACTORS_FILE) -> List[str]:
+    """Factor versions in the table, in file order."""
+    return list(dict.fromkeys(pd.read_csv(path, dtype=str)['version']))
+
+
+def load_factors(version: str = DEFAULT_VERSION, path: str = FACTORS_FILE) -> FuelFactors:
+    """
+    Load one version of the fuel factor table.
+
+    Args:
+        version (str): Factor set to load
+        path (str): Factor table CSV
+
+    Returns:
+        FuelFactors: Factors in table order
+    """
+    table = pd.read_csv(path, dtype={"version": str, "fuel": str, "name": str, "unit": str, "value_prefix": str})
+    rows = table[table['version'] == version]
+    if rows.empty:
+        raise ValueError(f"Unknown factor version '{version}'; available: {', '.join(available_versions(path))}")
+    if rows['fuel'].duplicated().any():
+        raise ValueError(f"Factor version '{version}' lists a fuel twice")
+    if OTHER_ENERGY_FUEL not in set(rows['fuel']):
+        raise ValueError(f"Factor version '{version}' has no {OTHER_ENERGY_FUEL} row (used for other energy)")
+    return FuelFactors(
+        version=version,
+        fuels=tuple(rows['fuel']),
+        names=tuple(rows['name']),
+        units=tuple(rows['unit']),
+        tj_per_unit=rows['tj_per_unit'].to_numpy(dtype=np.float64),
+        ef=rows['ef_tco2_per_tj'].to_numpy(dtype=np.float64),
+        value_prefixes=tuple(rows['value_prefix']),
+    )
@@ -0,0 +1,76 @@
+"""
+Synthetic IBS-shaped firm records for tests, benchmarks and `emissions verify`.
+
+The columns and their patterns follow the 2021 survey as the do-files use it:
+most firms report only a few fuels, some report a purchase value with a zero
+quantity (so their price per TJ is missing), and a small share of value added
+components are missing. Values are random; only the shape is realistic.
+"""
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from gohijau.emissions.engine import OTHER_ENERGY_VALUE_COLUMN, R1001, R1002, R1003
+from gohijau.emissions.factors import FuelFactors, load_factors
+
+# BPS province codes
+PROVINCES = ("11", "12", "13", "14", "15", "16", "17", "18", "19", "21", "31", "32", "33", "34", "35", "36",
+             "51", "52", "53", "61", "62", "63", "64", "65", "71", "72", "73", "74", "75", "76", "81", "82",
+             "91", "94")
+ISIC2_CODES = tuple(str(code) for code in range(10, 34)) # KBLI manufacturing divisions
+
+# Merge key columns besides DISIC2 (labour counts in the survey)
+KEY_COLUMNS = ("LTLOFF21", "LPRNOL21", "LPRNOF21", "LNPNOL21", "LNPNOF21", "LTLMHS21", "LTLSHS21",
+               "LTLMDI21", "LTLMSM21", "LTLNOU21", "LTLRND21")
+
+FUEL_USE_SHARE = 0.35 # Share of firms reporting any given fuel
+ZERO_QUANTITY_SHARE = 0.03 # Reported value with a zero quantity
+MISSING_COMPONENT_SHARE = 0.01
+
+
+def synthetic_ibs(n_firms: int = 10000, seed: int = 0, factors: Optional[FuelFactors] = None,
+                  value_suffix: str = "21") -> pd.DataFrame:
+    """
+    Generate IBS-shaped firm records.
+
+    Args:
+        n_firms (int): Number of firms
+        seed (int): Random seed
+        factors (FuelFactors): Fuels to generate (default: `load_factors()`)
+        value_suffix (str): Year suffix of the per-fuel value columns
+
+    Returns:
+        DataFrame: One row per firm with PSID, DPROVI21, DISIC521, the merge
+            key columns, fuel quantities and values, ENCVCU, the value added
+            components and VTLVCU
+    """
+    factors = factors or load_factors()
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"PSID": np.arange(1, n_firms + 1)})
+    df["DPROVI21"] = rng.choice(PROVINCES, size=n_firms)
+    isic2 = rng.choice(ISIC2_CODES, size=n_firms)
+    df["DISIC521"] = [f"{code}{suffix:03d}" for code, suffix in zip(isic2, rng.integers(100, 1000, size=n_firms))]
+    for column in KEY_COLUMNS:
+        df[column] = rng.poisson(rng.uniform(1, 40), size=n_firms)
+
+    size = rng.lognormal(0, 1.2, size=n_firms) # Firm scale shared by all its quantities
+    for fuel, prefix, tj_per_unit in zip(factors.fuels, factors.value_prefixes, factors.tj_per_unit):
+        uses = rng.random(n_firms) < FUEL_USE_SHARE
+        # Around 10-1000 GJ of each fuel used
+        quantity = size * rng.lognormal(np.log(1e-3 / tj_per_unit), 1.0, size=n_firms)
+        quantity = np.where(rng.random(n_firms) < ZERO_QUANTITY_SHARE, 0.0, quantity)
+        price = rng.lognormal(np.log(10000), 0.3) * rng.lognormal(0, 0.2, size=n_firms) # Rp per unit
+        df[fuel] = np.where(uses, np.round(quantity), np.nan)
+        df[f"{prefix}VCU{value_suffix}"] = np.where(uses, np.round(quantity * price + rng.uniform(0, 1e5)), np.nan)
+    df[OTHER_ENERGY_VALUE_COLUMN] = np.where(rng.random(n_firms) < 0.5,
+                                             np.round(size * rng.lognormal(np.log(5e6), 1.0, size=n_firms)), np.nan)
+
+    for column, _ in dict.fromkeys(R1001 + R1002 + R1003):
+        values = np.round(size * rng.lognormal(np.log(1e8), 1.0, size=n_firms))
+        df[column] = np.where(rng.random(n_firms) < MISSING_COMPONENT_SHARE, np.nan, values)
+    # Survey value added, in thousand Rp
+    df["VTLVCU"] = np.round(size * rng.lognormal(np.log(5e5), 1.0, size=n_firms))
+    df.loc[rng.random(n_firms) < 0.005, "VTLVCU"] = 0
+    return df
@@ -0,0 +1,346 @@
+"""
+Column-projected, chunked loading of IBS survey files.
+
+The do-files `use` all of ibs2021.dta and `import dbase` all of the KBLI
+digit files, although the emissions calculation needs only about 40
+columns. `load_ibs` keeps just those columns (`ibs_columns`) and reads the
+file in chunks, so the full-width table is never in memory. Each chunk is
+stored compactly as it arrives:
+
+- quantities, values and counts become float32, which keeps about 7
+  significant digits (the same as Stata's default `float` storage);
+- province and ISIC codes become categoricals.
+
+The engine upcasts to float64 before computing. Column names are upper-cased
+on read, like `rename _all, upper`.
+
+Supported inputs are .dta and .dbf, read by small built-in readers that
+decode only the projected fields of each block of records, plus .csv,
+.parquet and Excel. Excel files cannot be streamed, so they are read whole.
+"""
+
+import os
+import struct
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from gohijau.emissions.engine import OTHER_ENERGY_VALUE_COLUMN, R1001, R1002, R1003
+from gohijau.emissions.factors import FuelFactors, load_factors
+
+CHUNK_ROWS = 50000
+CHUNK_BYTES = 16 * 2**20 # Raw record bytes read at once; wide files get fewer rows per chunk
+FLOAT_DTYPE = np.float32
+
+# Merge key columns besides DISIC2 (Emissions.do section 1), without the year suffix
+KEY_STEMS = ("LTLOFF", "LPRNOL", "LPRNOF", "LNPNOL", "LNPNOF", "LTLMHS", "LTLSHS", "LTLMDI", "LTLMSM",
+             "LTLNOU", "LTLRND")
+# Code columns stored as categoricals (year-suffixed where the survey suffixes them)
+CODE_STEMS = ("DPROVI", "DKABUP", "DISIC5")
+CODE_COLUMNS = ("DISIC2",)
+ID_COLUMNS = ("PSID", "RENUM2")
+
+
+def ibs_columns(suffix: str = "21", factors: Optional[FuelFactors] = None) -> List[str]:
+    """
+    The columns the emissions calculation and its merges use, for one
+    survey year.
+
+    Args:
+        suffix (str): Two-digit year suffix of the survey's variable names
+        factors (FuelFactors): Fuels to include (default: `load_factors()`)
+
+    Returns:
+        list: Upper-case column names: ids, codes, merge keys, fuel
+            quantities and values, other energy, value added components and
+            VTLVCU
+    """
+    factors = factors or load_factors()
+    columns = list(ID_COLUMNS)
+    columns += [f"{stem}{suffix}" for stem in CODE_STEMS] + list(CODE_COLUMNS)
+    columns += [f"{stem}{suffix}" for stem in KEY_STEMS]
+    columns += list(factors.fuels) + factors.value_columns(suffix) + [OTHER_ENERGY_VALUE_COLUMN]
+    columns += [column for column, _ in dict.fromkeys(R1002 + R1003 + R1001)]
+    columns.append("VTLVCU")
+    return list(dict.fromkeys(columns))
+
+
+def _code_columns(suffix: str) -> set:
+    # Bare stems too: some survey years (and the multi-year panel) do not suffix the codes
+    return {f"{stem}{suffix}" for stem in CODE_STEMS} | set(CODE_STEMS) | set(CODE_COLUMNS)
+
+
+def _code_strings(series: pd.Series) -> pd.Series:
+    """Codes as strings; numeric codes lose their '.0' (5-digit ISIC stays 5 digits)."""
+    if pd.api.types.is_numeric_dtype(series):
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        return pd.Series([str(int(v)) if v == v else None for v in values], index=series.index, dtype=object)
+    return series.astype(object).where(series.notna(), None).map(
+        lambda v: v.strip() if isinstance(v, str) else v)
+
+
+def compact_chunk(chunk: pd.DataFrame, codes: set, float_dtype=FLOAT_DTYPE) -> pd.DataFrame:
+    """Upper-case names, codes to categoricals, everything else numeric to `float_dtype`."""
+    chunk = chunk.rename(columns=lambda c: str(c).upper())
+    out = {}
+    for column in chunk.columns:
+        series = chunk[column]
+        if column in codes:
+            out[column] = _code_strings(series).astype("category")
+        elif column in ID_COLUMNS:
+            out[column] = series
+        else:
+            out[column] = pd.to_numeric(series, errors="coerce").astype(float_dtype)
+    return pd.DataFrame(out, index=chunk.index)
+
+
+def _concat(chunks: List[pd.DataFrame], codes: set) -> pd.DataFrame:
+    """Concatenate compact chunks, merging the chunks' category sets."""
+    if not chunks:
+        return pd.DataFrame()
+    categorical = {}
+    for column in chunks[0].columns:
+        if column in codes:
+            categorical[column] = pd.api.types.union_categoricals([chunk[column] for chunk in chunks])
+    df = pd.concat([chunk.drop(columns=list(categorical)) for chunk in chunks], ignore_index=True)
+    for column, values in categorical.items():
+        df[column] = values
+    return df[list(chunks[0].columns)]
+
+
+def _select(available: Sequence[str], wanted: Optional[Sequence[str]]) -> Dict[str, str]:
+    """Map wanted upper-case names to the file's own spelling; unknown names are skipped."""
+    by_upper = {str(name).upper(): name for name in available}
+    if wanted is None:
+        return {upper: name for upper, name in by_upper.items()}
+    return {upper: by_upper[upper] for upper in wanted if upper in by_upper}
+
+
+# ---------------------------------------------------------------------------
+# dBase III
+# ---------------------------------------------------------------------------
+def _dbf_header(f):
+    version, _, _, _, n_records, header_size, record_size = struct.unpack('<BBBBIHH20x', f.read(32))
+    fields, offset = [], 1 # Byte 0 of each record is the deletion flag
+    while True:
+        descriptor = f.read(32)
+        if not descriptor or descriptor[0] == 0x0D:
+            break
+        name = descriptor[:11].split(b'\x00')[0].decode('ascii', errors='replace')
+        kind = chr(descriptor[11])
+        length = descriptor[16]
+        fields.append((name, kind, offset, length))
+        offset += length
+    return n_records, header_size, record_size, fields
+
+
+def iter_dbf(path: str, columns: Optional[Sequence[str]] = None, chunksize: int = CHUNK_ROWS,
+             encoding: str = 'latin-1') -> Iterator[pd.DataFrame]:
+    """
+    Stream a dBase III file as DataFrames of at most `chunksize` records.
+
+    Only the requested fields are decoded. Numeric fields (N, F) become
+    float64, and blank numbers become NaN. Deleted records are skipped.
+
+    Args:
+        path (str): .dbf file
+        columns (list): Upper-case field names to keep (default: all)
+        chunksize (int): Records per chunk (at most CHUNK_BYTES of records)
+        encoding (str): Encoding of character fields
+    """
+    with open(path, 'rb') as f:
+        n_records, header_size, record_size, fields = _dbf_header(f)
+        selected = _select([name for name, *_ in fields], columns)
+        wanted = [(upper, field) for upper in selected for field in fields if field[0] == selected[upper]]
+        f.seek(header_size)
+        chunksize = max(1, min(chunksize, CHUNK_BYTES // record_size))
+        remaining = n_records
+        while remaining > 0:
+            n = min(chunksize, remaining)
+            raw = f.read(n * record_size)
+            n = len(raw) // record_size
+            if n == 0:
+                break
+            remaining -= n
+            records = np.frombuffer(raw[:n * record_size], dtype=np.uint8).reshape(n, record_size)
+            keep = records[:, 0] != ord('*')
+            records = records[keep]
+            data = {}
+            for upper, (_, kind, offset, length) in wanted:
+                cells = np.ascontiguousarray(records[:, offset:offset + length]).view(f'S{length}').ravel()
+                cells = np.char.strip(cells)
+                if kind in ('N', 'F'):
+                    values = np.full(len(cells), np.nan)
+                    filled = (cells != b'') & (np.char.find(cells, b'*') < 0)
+                    values[filled] = cells[filled].astype(np.float64)
+                    data[upper] = values
+                else:
+                    data[upper] = [cell.decode(encoding) or None for cell in cells]
+            yield pd.DataFrame(data)
+
+
+# ---------------------------------------------------------------------------
+# Stata .dta (format 117-119, Stata 13 and later)
+# ---------------------------------------------------------------------------
+# Numeric type codes: (numpy kind, size, largest non-missing value)
+_DTA_NUMERIC = {65530: ('i1', 1, 100), 65529: ('i2', 2, 32740), 65528: ('i4', 4, 2147483620),
+                65527: ('f4', 4, 1.701e38), 65526: ('f8', 8, 8.988e307)}
+_DTA_STRL = 32768
+
+
+def _dta_header(f):
+    """(version, byte order, nobs, [(name, type code, offset, size)], record size, data offset) or None."""
+    if f.read(28) != b'<stata_dta><header><release>':
+        return None # Format 114 or older: left to pandas
+    version = int(f.read(3))
+    f.read(21)
+    order = '>' if f.read(3) == b'MSF' else '<'
+    f.read(15)
+    nvar = struct.unpack(order + ('H' if version <= 118 else 'I'), f.read(2 if version <= 118 else 4))[0]
+    f.read(7)
+    nobs = struct.unpack(order + ('I' if version == 117 else 'Q'), f.read(4 if version == 117 else 8))[0]
+    f.read(11)
+    label_length = struct.unpack(order + ('B' if version == 117 else 'H'), f.read(1 if version == 117 else 2))[0]
+    f.read(label_length + 19)
+    f.read(struct.unpack('B', f.read(1))[0] + 26)
+    offsets = struct.unpack(order + '14Q', f.read(14 * 8))
+
+    f.seek(offsets[2] + len(b'<variable_types>'))
+    types = struct.unpack(order + f'{nvar}H', f.read(2 * nvar))
+    f.seek(offsets[3] + len(b'<varnames>'))
+    width = 33 if version == 117 else 129
+    encoding = 'latin-1' if version == 117 else 'utf-8'
+    raw = f.read(width * nvar)
+    names = [raw[i * width:(i + 1) * width].split(b'\x00')[0].decode(encoding) for i in range(nvar)]
+
+    fields, offset = [], 0
+    for name, code in zip(names, types):
+        size = _DTA_NUMERIC[code][1] if code in _DTA_NUMERIC else 8 if code == _DTA_STRL else code
+        fields.append((name, code, offset, size))
+        offset += size
+    return version, order, nobs, fields, offset, offsets[9] + len(b'<data>')
+
+
+def iter_dta(path: str, columns: Optional[Sequence[str]] = None,
+             chunksize: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Stream a Stata file as DataFrames of at most `chunksize` rows.
+
+    For formats 117-119 only the requested variables are decoded from each
+    block of records, and Stata missing values become NaN. Older formats
+    and strL variables go through pandas' reader, which holds the whole
+    file's bytes in memory but still builds only the projected columns.
+
+    Args:
+        path (str): .dta file
+        columns (list): Upper-case variable names to keep (default: all)
+        chunksize (int): Rows per chunk (at most CHUNK_BYTES of records)
+    """
+    with open(path, 'rb') as f:
+        header = _dta_header(f)
+        if header is not None:
+            version, order, nobs, fields, record_size, data_offset = header
+            selected = _select([name for name, *_ in fields], columns)
+            wanted = [(upper, field) for upper in selected for field in fields if field[0] == selected[upper]]
+            if not any(field[1] == _DTA_STRL for _, field in wanted):
+                layout = np.dtype({
+                    'names': [upper for upper, _ in wanted],
+                    'formats': [order + _DTA_NUMERIC[code][0] if code in _DTA_NUMERIC else f'S{size}'
+                                for _, (_, code, _, size) in wanted],
+                    'offsets': [offset for _, (_, _, offset, _) in wanted],
+                    'itemsize': record_size,
+                })
+                f.seek(data_offset)
+                encoding = 'latin-1' if version == 117 else 'utf-8'
+                chunksize = max(1, min(chunksize, CHUNK_BYTES // record_size))
+                for start in range(0, nobs, chunksize):
+                    n = min(chunksize, nobs - start)
+                    records = np.frombuffer(f.read(n * record_size), dtype=layout, count=n)
+                    data = {}
+                    for upper, (_, code, _, _) in wanted:
+                        values = records[upper]
+                        if code in _DTA_NUMERIC:
+                            values = values.astype(np.float64)
+                            values[values > _DTA_NUMERIC[code][2]] = np.nan
+                            data[upper] = values
+                        else:
+                            data[upper] = [value.split(b'\x00')[0].decode(encoding) or None for value in values]
+                    yield pd.DataFrame(data)
+                return
+    with pd.io.stata.StataReader(path) as reader:
+        available = list(reader.variable_labels())
+    selected = _select(available, columns)
+    with pd.read_stata(path, columns=list(selected.values()), chunksize=chunksize, convert_categoricals=False,
+                       convert_dates=False) as reader:
+        yield from reader
+
+
+# ---------------------------------------------------------------------------
+# Any format
+# ---------------------------------------------------------------------------
+def iter_ibs(path: str, columns: Optional[Sequence[str]] = None,
+             chunksize: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Stream the requested columns of an IBS file in raw chunks (upper-case
+    names; columns the file does not have are skipped).
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".dbf":
+        yield from iter_dbf(path, columns, chunksize)
+    elif ext == ".dta":
+        yield from iter_dta(path, columns, chunksize)
+    elif ext == ".csv":
+        header = pd.read_csv(path, nrows=0).columns
+        selected = _select(header, columns)
+        yield from pd.read_csv(path, usecols=list(selected.values()), chunksize=chunksize,
+                               dtype={name: str for upper, name in selected.items()
+                                      if upper.startswith(("DPROVI", "DKABUP", "DISIC"))})
+    elif ext == ".parquet":
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(path)
+        selected = _select(parquet.schema_arrow.names, columns)
+        for batch in parquet.iter_batches(batch_size=chunksize, columns=list(selected.values())):
+            yield batch.to_pandas()
+    else:
+        df = pd.read_excel(path)
+        selected = _select(df.columns, columns)
+        yield df[list(selected.values())]
+
+
+def load_ibs(path: str, suffix: str = "21", columns: Optional[Sequence[str]] = None,
+             extra_columns: Sequence[str] = (), chunksize: int = CHUNK_ROWS,
+             float_dtype=FLOAT_DTYPE, report_missing: bool = True) -> pd.DataFrame:
+    """
+    Load the emissions columns of an IBS file, chunk by chunk, in compact dtypes.
+
+    Args:
+        path (str): .dta, .dbf, .csv, .parquet or Excel file
+        suffix (str): Survey year suffix used by `ibs_columns`
+        columns (list): Columns to keep (default: `ibs_columns(suffix)`)
+        extra_columns (list): Further columns to keep
+        chunksize (int): Rows per chunk
+        float_dtype: dtype of numeric columns (float32; np.float64 for full precision)
+        report_missing (bool): Name the required columns the file does not have
+
+    Returns:
+        DataFrame: Projected columns with upper-case names
+    """
+    wanted = list(dict.fromkeys([c.upper() for c in (columns or ibs_columns(suffix))] +
+                                [c.upper() for c in extra_columns]))
+    codes = _code_columns(suffix)
+    chunks = [compact_chunk(chunk, codes, float_dtype) for chunk in iter_ibs(path, wanted, chunksize)]
+    df = _concat(chunks, codes)
+    # Ids and codes other than province and ISIC-5 are optional
+    optional = set(ID_COLUMNS) | codes - {f"DPROVI{suffix}", f"DISIC5{suffix}"}
+    missing = [column for column in wanted if column not in df.columns and column not in optional
+               and report_missing]
+    print(f"Loaded {len(df)} rows x {len(df.columns)} columns from {os.path.basename(path)} "
+          f"({memory_mb(df):.1f} MB in memory)" + (f"; not in file: {', '.join(missing)}" if missing else ""))
+    return df
+
+
+def memory_mb(df: pd.DataFrame) -> float:
+    """Deep memory use of a DataFrame in MB."""
+    return df.memory_usage(deep=True).sum() / 2**20
@@ -0,0 +1,354 @@
+"""
+Hashed composite-key merges of the IBS and RGS (KBLI) files.
+
+Section 1 of the do-files builds a string `merger` by `tostring`-ing twelve
+variables and concatenating them, then runs `duplicates drop merger, force`
+before a 1:1 merge. The concatenation is ambiguous ("1" + "23" and "12" +
+"3" give the same key), and the forced drop silently removes every firm that
+shares a key with another, keeping whichever came first.
+
+Here the twelve-column tuple (DISIC2 and the eleven labour counts) is hashed
+column by column into one uint64 per row:
+
+    h = mix(h XOR mix(hash(column_i) + i * GOLDEN))
+
+Numeric columns are hashed from their float64 bits, so 5 and 5.0 agree
+across .dta and .dbf files, and code columns are hashed as strings, so "10"
+and 10 agree. Missing values match each other, like Stata's "." does after
+`tostring`. The join is a sort-based hash join on the uint64 keys. Rows whose
+key is not unique, and the (practically never seen) hash collisions, where
+two different tuples share a hash, are counted and listed in the report
+instead of being dropped silently.
+"""
+
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from gohijau.emissions.engine import isic2, write_frame
+from gohijau.emissions.loader import ID_COLUMNS, KEY_STEMS, _code_strings, load_ibs
+
+GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+
+RGS_KEYS = ("RENUM2", "DISIC2") # `merge 1:1 RENUM2 DISIC2` of the two KBLI parts
+
+DUPLICATES_EXCLUDE = "exclude" # Leave every row of a non-unique key out of the match
+DUPLICATES_FIRST = "first" # Keep the first row per key, like `duplicates drop, force`
+DUPLICATES_ERROR = "error" # Refuse to merge, like a 1:1 `merge` on non-unique keys
+DUPLICATE_POLICIES = (DUPLICATES_EXCLUDE, DUPLICATES_FIRST, DUPLICATES_ERROR)
+
+
+def key_columns(suffix: str = "21") -> List[str]:
+    """The do-files' `merger` variables: DISIC2 and the eleven labour counts."""
+    return ["DISIC2"] + [f"{stem}{suffix}" for stem in KEY_STEMS]
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    # splitmix64 finalizer
+    with np.errstate(over='ignore'):
+        x = (x ^ (x >> np.uint64(30))) * _MIX_1
+        x = (x ^ (x >> np.uint64(27))) * _MIX_2
+        return x ^ (x >> np.uint64(31))
+
+
+def _numeric_bits(values: np.ndarray) -> np.ndarray:
+    values = np.asarray(values, dtype=np.float64) + 0.0 # -0.0 becomes 0.0
+    values = np.where(np.isnan(values), np.nan, values) # One NaN bit pattern
+    return values.view(np.uint64)
+
+
+def normalize_keys(frames: Sequence[pd.DataFrame], columns: Sequence[str]) -> List[List[np.ndarray]]:
+    """
+    Key columns of several frames in a form that compares equal across them.
+
+    A column is compared as numbers (float64) when it is numeric in every
+    frame, and as stripped strings otherwise, with numeric codes written
+    without '.0' (as `tostring` does).
+
+    Returns:
+        list: For each frame, one array per key column
+    """
+    out = [[] for _ in frames]
+    for column in columns:
+        missing = [i for i, df in enumerate(frames) if column not in df.columns]
+        if missing:
+            raise KeyError(f"Merge key '{column}' is missing from input {missing[0] + 1}")
+        numeric = all(pd.api.types.is_numeric_dtype(df[column]) for df in frames)
+        for i, df in enumerate(frames):
+            if numeric:
+                out[i].append(df[column].to_numpy(dtype=np.float64, na_value=np.nan))
+            else:
+                out[i].append(_code_strings(df[column]).to_numpy(dtype=object))
+    return out
+
+
+def hash_keys(arrays: Sequence[np.ndarray]) -> np.ndarray:
+    """
+    One uint64 per row from normalized key arrays (see `normalize_keys`).
+
+    Args:
+        arrays (list): Key columns, float64 or object (strings / None)
+
+    Returns:
+        ndarray: uint64 key hashes
+    """
+    h = np.zeros(len(arrays[0]) if arrays else 0, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for i, values in enumerate(arrays):
+            if values.dtype == object:
+                column = pd.util.hash_array(values, categorize=True)
+            else:
+                column = _numeric_bits(values)
+            h = _mix(h ^ _mix(column + GOLDEN * np.uint64(i + 1)))
+    return h
+
+
+def key_hash(df: pd.DataFrame, columns: Sequence[str]) -> np.ndarray:
+    """uint64 hash of each row's key tuple."""
+    return hash_keys(normalize_keys([df], columns)[0])
+
+
+def _same_tuple(a: Sequence[np.ndarray], b: Sequence[np.ndarray], ia: np.ndarray, ib: np.ndarray) -> np.ndarray:
+    """Whether row ia[k] of `a` has the same key tuple as row ib[k] of `b` (missing equals missing)."""
+    same = np.ones(len(ia), dtype=bool)
+    for x, y in zip(a, b):
+        x, y = x[ia], y[ib]
+        if x.dtype == object or y.dtype == object:
+            same &= (pd.isna(x) & pd.isna(y)) | (x == y)
+        else:
+            same &= (x == y) | (np.isnan(x) & np.isnan(y))
+    return same
+
+
+@dataclass(frozen=True)
+class SideStats:
+    """Key statistics of one merge input."""
+
+    rows: int
+    unique_keys: int
+    duplicate_keys: int # Keys held by more than one row
+    duplicate_rows: int # Rows holding such a key
+    collisions: int # Hashes shared by different key tuples
+    kept: int # Rows that take part in the match
+
+
+def _unique_rows(hashes: np.ndarray, arrays: Sequence[np.ndarray], policy: str):
+    """
+    Rows usable in a 1:1 match, and the rows left out.
+
+    Returns:
+        tuple: (kept row positions sorted by hash, their hashes, SideStats,
+            {row: reason} for the duplicate or colliding rows not kept)
+    """
+    order = np.argsort(hashes, kind='stable')
+    sorted_hashes = hashes[order]
+    unique, start, counts = np.unique(sorted_hashes, return_index=True, return_counts=True)
+
+    # Within a run of equal hashes, a tuple that differs from its neighbour is a collision
+    same_hash = np.flatnonzero(sorted_hashes[1:] == sorted_hashes[:-1])
+    differs = ~_same_tuple(arrays, arrays, order[same_hash], order[same_hash + 1])
+    colliding = np.unique(sorted_hashes[same_hash[differs]])
+    is_collision = np.isin(unique, colliding)
+    is_duplicate = (counts > 1) & ~is_collision
+    if policy == DUPLICATES_ERROR and is_duplicate.any():
+        raise ValueError(f"{int(is_duplicate.sum())} merge key(s) are held by more than one row "
+                         f"({int(counts[is_duplicate].sum())} rows)")
+
+    keep = (counts == 1) | (is_duplicate & (policy == DUPLICATES_FIRST))
+    kept_rows = order[start[keep]]
+    left_out: Dict[int, str] = {}
+    first_kept = 1 if policy == DUPLICATES_FIRST else 0
+    for flags, reason, skip in ((is_duplicate, "duplicate", first_kept), (is_collision, "collision", 0)):
+        for s, n in zip(start[flags], counts[flags]):
+            for row in order[s + skip:s + n]:
+                left_out[int(row)] = reason
+    stats = SideStats(rows=len(hashes), unique_keys=len(unique), duplicate_keys=int(is_duplicate.sum()),
+                      duplicate_rows=int(counts[is_duplicate].sum()), collisions=len(colliding),
+                      kept=len(kept_rows))
+    return kept_rows, unique[keep], stats, left_out
+
+
+@dataclass(frozen=True, eq=False)
+class MergeReport:
+    """What a 1:1 merge matched, and what it left out and why."""
+
+    keys: Tuple[str, ...]
+    policy: str
+    master: SideStats
+    using: SideStats
+    matched: int
+    master_only: int
+    using_only: int
+    cross_collisions: int # Matched hashes whose tuples differ between the inputs
+    seconds: float
+    ambiguous: pd.DataFrame = field(repr=False) # side, row, reason, key_hash (hex), ids and keys
+
+    def lines(self) -> List[str]:
+        """Human-readable summary, in the spirit of Stata's merge table."""
+        out = [f"Merge on {len(self.keys)} key column(s) ({self.policy} duplicates) "
+               f"in {self.seconds:.3f}s"]
+        for name, side in (("master", self.master), ("using", self.using)):
+            out.append(f"  {name:6}: {side.rows} rows, {side.unique_keys} keys, {side.duplicate_keys} "
+                       f"duplicated key(s) on {side.duplicate_rows} rows, {side.collisions} collision(s)")
+        out.append(f"  matched: {self.matched}; master only: {self.master_only}; "
+                   f"using only: {self.using_only}; cross-input collisions: {self.cross_collisions}")
+        return out
+
+
+def _ambiguous_frame(side: str, df: pd.DataFrame, left_out: Dict[int, str], hashes: np.ndarray,
+                     keys: Sequence[str]) -> pd.DataFrame:
+    rows = np.fromiter(left_out.keys(), dtype=np.int64, count=len(left_out))
+    columns = list(dict.fromkeys([c for c in ID_COLUMNS if c in df.columns] + list(keys)))
+    out = df.iloc[rows][columns].reset_index(drop=True)
+    out.insert(0, "key_hash", [f"{h:016x}" for h in hashes[rows]]) # Hex: Stata has no uint64
+    out.insert(0, "reason", list(left_out.values()))
+    out.insert(0, "row", rows)
+    out.insert(0, "side", side)
+    return out
+
+
+def merge_1to1(master: pd.DataFrame, using: pd.DataFrame, keys: Sequence[str],
+               duplicates: str = DUPLICATES_EXCLUDE) -> Tuple[pd.DataFrame, MergeReport]:
+    """
+    `merge 1:1 keys using ..., keep(3)` on hashed keys.
+
+    Variables in both inputs keep the master's values, as in Stata.
+
+    Args:
+        master (DataFrame): Master records
+        using (DataFrame): Using records
+        keys (list): Key columns
+        duplicates (str): 'exclude' (default) leaves all rows of a non-unique
+            key unmatched, 'first' keeps the first like `duplicates drop,
+            force`, 'error' raises. Either way they are listed in the report.
+
+    Returns:
+        tuple: (matched records in master order, MergeReport)
+    """
+    if duplicates not in DUPLICATE_POLICIES:
+        raise ValueError(f"Unknown duplicates policy '{duplicates}'; choose from {', '.join(DUPLICATE_POLICIES)}")
+    started = time.perf_counter()
+    master_keys, using_keys = normalize_keys([master, using], keys)
+    master_hashes, using_hashes = hash_keys(master_keys), hash_keys(using_keys)
+    master_rows, master_unique, master_stats, master_out = _unique_rows(master_hashes, master_keys, duplicates)
+    using_rows, using_unique, using_stats, using_out = _unique_rows(using_hashes, using_keys, duplicates)
+
+    _, mi, ui = np.intersect1d(master_unique, using_unique, assume_unique=True, return_indices=True)
+    m, u = master_rows[mi], using_rows[ui]
+    same = _same_tuple(master_keys, using_keys, m, u)
+    for row in m[~same]:
+        master_out[int(row)] = "collision"
+    for row in u[~same]:
+        using_out[int(row)] = "collision"
+    m, u = m[same], u[same]
+    order = np.argsort(m, kind='stable')
+    m, u = m[order], u[order]
+
+    left = master.iloc[m].reset_index(drop=True)
+    right = using.iloc[u].reset_index(drop=True)
+    merged = pd.concat([left, right.drop(columns=[c for c in right.columns if c in left.columns])], axis=1)
+
+    ambiguous = pd.concat([_ambiguous_frame("master", master, master_out, master_hashes, keys),
+                           _ambiguous_frame("using", using, using_out, using_hashes, keys)], ignore_index=True)
+    report = MergeReport(keys=tuple(keys), policy=duplicates, master=master_stats, using=using_stats,
+                         matched=len(m), master_only=len(master) - len(m), using_only=len(using) - len(u),
+                         cross_collisions=int((~same).sum()), seconds=time.perf_counter() - started,
+                         ambiguous=ambiguous)
+    return merged, report
+
+
+def string_key_conflations(df: pd.DataFrame, columns: Sequence[str]) -> int:
+    """
+    How many distinct key tuples share a concatenated `merger` string with a
+    different tuple, i.e. firms the do-file's string key would confuse.
+    """
+    parts = []
+    for values in normalize_keys([df], columns)[0]:
+        if values.dtype == object:
+            parts.append(pd.Series(values).fillna(""))
+        else:
+            # `tostring`: integers without decimals, missing as "."
+            whole = np.isfinite(values) & (values == np.floor(values))
+            text = pd.Series(np.where(whole, values, 0).astype(np.int64)).astype(str)
+            text[~whole] = [f"{v:g}" if v == v else "." for v in values[~whole]]
+            parts.append(text)
+    merger = parts[0].str.cat(parts[1:])
+    frame = pd.DataFrame({"merger": merger.to_numpy(), "hash": key_hash(df, columns)}).drop_duplicates()
+    tuples_per_string = frame.groupby("merger")["hash"].transform("size")
+    return int((tuples_per_string > 1).sum())
+
+
+def merge_rgs_parts(parts: Sequence[pd.DataFrame], duplicates: str = DUPLICATES_EXCLUDE
+                    ) -> Tuple[pd.DataFrame, List[MergeReport]]:
+    """
+    Join the KBLI digit files on RENUM2 DISIC2, as the 2digitprov do-file
+    does (`import dbase` part 2, `merge 1:1 RENUM2 DISIC2 using` part 1).
+
+    Args:
+        parts (list): The parts in file order (kbli_1, kbli_2, ...)
+        duplicates (str): Duplicate policy (see `merge_1to1`)
+
+    Returns:
+        tuple: (joined records, one MergeReport per join)
+    """
+    merged, reports = parts[0], []
+    for part in parts[1:]:
+        merged, report = merge_1to1(part, merged, RGS_KEYS, duplicates)
+        reports.append(report)
+    return merged, reports
+
+
+def _with_isic2(df: pd.DataFrame, suffix: str) -> pd.DataFrame:
+    if "DISIC2" not in df.columns:
+        df = df.assign(DISIC2=isic2(df, suffix).astype("category"))
+    return df
+
+
+def merge_ibs(ibs_file: str, rgs_files: Sequence[str], output_file: Optional[str] = None, suffix: str = "21",
+              duplicates: str = DUPLICATES_EXCLUDE, report_file: Optional[str] = None,
+              compare_string_key: bool = False) -> Tuple[pd.DataFrame, List[MergeReport]]:
+    """
+    Section 1 of the do-files: join the RGS part(s) to the IBS survey on the
+    hashed twelve-column key.
+
+    Args:
+        ibs_file (str): ibs2021.dta (or any format `load_ibs` reads)
+        rgs_files (list): ibs21_kbli_1 (and _2) digit files
+        output_file (str): Write the merged records here (the do-files' IBS_21)
+        suffix (str): Survey year suffix
+        duplicates (str): Duplicate policy (see `merge_1to1`)
+        report_file (str): Write the rows left out of the merges here
+        compare_string_key (bool): Also count the key tuples the do-files'
+            concatenated string would confuse
+
+    Returns:
+        tuple: (merged records, MergeReports of the RGS join and the IBS join)
+    """
+    keys = key_columns(suffix)
+    # Each file holds only part of the projected columns, so absent ones are not reported
+    ibs = _with_isic2(load_ibs(ibs_file, suffix=suffix, report_missing=False), suffix)
+    parts = [_with_isic2(load_ibs(path, suffix=suffix, report_missing=False), suffix) for path in rgs_files]
+    rgs, reports = merge_rgs_parts(parts, duplicates)
+    merged, report = merge_1to1(rgs, ibs, keys, duplicates)
+    reports.append(report)
+    for r in reports:
+        for line in r.lines():
+            print(line)
+    if compare_string_key:
+        for name, df in (("RGS", rgs), ("IBS", ibs)):
+            print(f"{name}: {string_key_conflations(df, keys)} key tuple(s) share the do-file's string "
+                  f"`merger` with another tuple")
+    if report_file:
+        ambiguous = pd.concat([r.ambiguous.assign(merge=" ".join(r.keys)) for r in reports], ignore_index=True)
+        ambiguous = ambiguous[["merge"] + [c for c in ambiguous.columns if c != "merge"]]
+        write_frame(ambiguous, report_file)
+        print(f"{len(ambiguous)} unmatched duplicate/colliding rows saved to: {report_file}")
+    if output_file:
+        write_frame(merged, output_file)
+        print(f"Merged records ({len(merged)}) saved to: {output_file}")
+    return merged, reports
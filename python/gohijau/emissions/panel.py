@@ -0,0 +1,288 @@
+"""
+Multi-year IBS panel: every survey year through the same emissions engine.
+
+The do-files are hard-wired to 2021: ibs2021.dta, the `*21` variable
+suffixes, DPROVI21 and DISIC521. Here each year is described by a `YearSpec`:
+its year, its file (and, optionally, its RGS parts), and any irregular
+variable names. Its columns are then mapped onto one canonical schema, which
+is `ibs_columns()` without the year suffix (DPROVI, DISIC5, LTLOFF, EPEVCU,
+...). For each canonical name, the loader uses the spec's rename if there is
+one, then `<name><yy>`, then the bare name.
+
+Each year is loaded, mapped and computed in its own worker process. Ten
+years therefore take about as long as the slowest one, given ten cores. The
+results are stacked into a firm-year panel with a `year` column, plus:
+
+- `yearly`: median intensity, totals and firm counts per year, at three
+  levels: province x ISIC2, ISIC2, and national;
+- `trends`: per cell of each level, the first and last year, the intensity
+  in both, and the average annual change. That change comes from a
+  log-linear fit of median intensity on year, so it reads as a percentage.
+"""
+
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from gohijau.emissions.engine import VARIANT_PROVINCE, compute_emissions, write_frame
+from gohijau.emissions.factors import load_factors
+from gohijau.emissions.loader import CODE_STEMS, ID_COLUMNS, _code_strings, ibs_columns, load_ibs
+
+LEVELS = (("province_isic2", ("DPROVI", "DISIC2")), ("isic2", ("DISIC2",)), ("national", ()))
+TOTALS = ("TOTAL_CO2", "TOTAL_KWH", "TOTAL_TJ")
+PANEL_CODES = tuple(CODE_STEMS) + ("DISIC2",)
+
+
+@dataclass(frozen=True)
+class YearSpec:
+    """One survey year: its files and any variable names that break the pattern."""
+
+    year: int
+    path: str
+    rgs: Tuple[str, ...] = () # RGS (KBLI) parts to merge in first, as in section 1
+    renames: Dict[str, str] = field(default_factory=dict, hash=False) # canonical -> name in the file
+
+    @property
+    def suffix(self) -> str:
+        return f"{self.year % 100:02d}"
+
+
+def canonical_columns() -> List[str]:
+    """The panel's column names: `ibs_columns` without a year suffix."""
+    return ibs_columns(suffix="")
+
+
+def source_columns(spec: YearSpec, canonical: Sequence[str]) -> Dict[str, List[str]]:
+    """Candidate file names for each canonical column, most specific first."""
+    out = {}
+    for name in canonical:
+        candidates = [spec.renames[name]] if name in spec.renames else []
+        candidates += [f"{name}{spec.suffix}", name]
+        out[name] = [c.upper() for c in dict.fromkeys(candidates)]
+    return out
+
+
+def to_canonical(df: pd.DataFrame, spec: YearSpec, canonical: Sequence[str]) -> Tuple[pd.DataFrame, List[str]]:
+    """
+    Rename one year's columns to the canonical schema.
+
+    Returns:
+        tuple: (frame with the canonical columns found, canonical names not found)
+    """
+    mapped, missing = {}, []
+    for name, candidates in source_columns(spec, canonical).items():
+        found = next((c for c in candidates if c in df.columns), None)
+        if found is None:
+            missing.append(name)
+        elif name in PANEL_CODES and not isinstance(df[found].dtype, pd.CategoricalDtype):
+            mapped[name] = _code_strings(df[found]).astype("category") # A renamed code read as a number
+        else:
+            mapped[name] = df[found]
+    out = pd.DataFrame(mapped, index=df.index)
+    if "DISIC2" not in out.columns and "DISIC5" in out.columns:
+        out["DISIC2"] = out["DISIC5"].astype(str).str[:2].astype("category")
+    return out, missing
+
+
+def _summaries(frame: pd.DataFrame, by: Sequence[str]) -> pd.DataFrame:
+    """Median intensity, summed totals and firm counts, like the do-file's collapse."""
+    agg = dict(intensity=("intensity", "median"), firms=("intensity", "size"),
+               intensity_firms=("intensity", "count"), **{t: (t, "sum") for t in TOTALS})
+    if by:
+        return frame.groupby(list(by), sort=True, observed=True).agg(**agg).reset_index()
+    return frame.groupby(np.zeros(len(frame), dtype=int)).agg(**agg).reset_index(drop=True)
+
+
+def yearly_levels(firms: pd.DataFrame) -> pd.DataFrame:
+    """Summaries at every level for the years in `firms`."""
+    frame = pd.DataFrame({
+        "year": firms["year"].to_numpy(), "DPROVI": firms["DPROVI"].astype(str).to_numpy(),
+        "DISIC2": firms["DISIC2"].astype(str).to_numpy(),
+        "intensity": firms["intensity"].to_numpy(dtype=np.float64, na_value=np.nan),
+        **{t: firms[t].to_numpy(dtype=np.float64, na_value=np.nan) for t in TOTALS}})
+    out = []
+    for level, by in LEVELS:
+        summary = _summaries(frame, ("year",) + by)
+        summary.insert(0, "level", level)
+        out.append(summary)
+    out = pd.concat(out, ignore_index=True)
+    return out[["level", "year", "DPROVI", "DISIC2", "intensity", *TOTALS, "firms", "intensity_firms"]]
+
+
+def intensity_trends(yearly: pd.DataFrame) -> pd.DataFrame:
+    """
+    Change in median intensity over the years, per cell of every level.
+
+    Args:
+        yearly (DataFrame): `yearly_levels` output
+
+    Returns:
+        DataFrame: level, DPROVI, DISIC2, years, first_year, last_year,
+            intensity_first, intensity_last, annual_change (log-linear fit
+            over the years with a positive median) and the CO2 totals of
+            the first and last year
+    """
+    keys = ["level", "DPROVI", "DISIC2"]
+    frame = yearly.assign(DPROVI=yearly["DPROVI"].fillna(""), DISIC2=yearly["DISIC2"].fillna(""))
+    frame = frame.sort_values(keys + ["year"])
+    positive = frame["intensity"] > 0
+    x = frame["year"].astype(np.float64).where(positive)
+    y = np.log(frame["intensity"].where(positive))
+    frame = frame.assign(x=x, y=y, xy=x * y, xx=x * x)
+    grouped = frame.groupby(keys, sort=True)
+    sums = grouped[["x", "y", "xy", "xx"]].sum()
+    n = grouped["x"].count()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (n * sums["xy"] - sums["x"] * sums["y"]) / (n * sums["xx"] - sums["x"] ** 2)
+    out = pd.DataFrame({
+        "years": grouped["year"].size(), "first_year": grouped["year"].first(), "last_year": grouped["year"].last(),
+        "intensity_first": grouped["intensity"].first(), "intensity_last": grouped["intensity"].last(),
+        "annual_change": np.expm1(slope.where(n >= 2)),
+        "TOTAL_CO2_first": grouped["TOTAL_CO2"].first(), "TOTAL_CO2_last": grouped["TOTAL_CO2"].last(),
+    }).reset_index()
+    for column in ("DPROVI", "DISIC2"):
+        out[column] = out[column].replace("", None)
+    return out
+
+
+@dataclass(frozen=True, eq=False)
+class YearResult:
+    """What one worker returns for its year."""
+
+    year: int
+    firms: pd.DataFrame
+    missing: Tuple[str, ...] # Canonical columns the year's file lacks
+    seconds: float
+
+
+def process_year(spec: YearSpec, variant: str = VARIANT_PROVINCE,
+                 factors_version: Optional[str] = None) -> YearResult:
+    """
+    Load, map and compute one survey year (runs in a worker process).
+
+    Args:
+        spec (YearSpec): The year and its files
+        variant (str): 'firm' or 'province'
+        factors_version (str): Fuel factor set (default: the latest)
+
+    Returns:
+        YearResult: Firm results with ids, canonical codes and a `year` column
+    """
+    started = time.perf_counter()
+    factors = load_factors(factors_version) if factors_version else load_factors()
+    canonical = canonical_columns()
+    if spec.rgs:
+        from gohijau.emissions.merge import merge_ibs
+
+        df, _ = merge_ibs(spec.path, spec.rgs, suffix=spec.suffix)
+    else:
+        wanted = [c for candidates in source_columns(spec, canonical).values() for c in candidates]
+        df = load_ibs(spec.path, suffix=spec.suffix, columns=wanted, report_missing=False)
+    df, missing = to_canonical(df, spec, canonical)
+    optional = set(ID_COLUMNS) | {"DKABUP", "DISIC2"}
+    missing = [name for name in missing if name not in optional]
+    result = compute_emissions(df, factors, variant=variant, value_suffix="", keep_input=False)
+    keep = [c for c in ID_COLUMNS + PANEL_CODES if c in df.columns]
+    firms = pd.concat([df[keep], result], axis=1)
+    firms.insert(0, "year", spec.year)
+    return YearResult(spec.year, firms, tuple(missing), time.perf_counter() - started)
+
+
+def _stack(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    panel = pd.concat(frames, ignore_index=True)
+    for column in PANEL_CODES:
+        if column in panel.columns:
+            panel[column] = panel[column].astype(str).where(panel[column].notna()).astype("category")
+    return panel
+
+
+def run_panel(specs: Sequence[YearSpec], variant: str = VARIANT_PROVINCE, factors_version: Optional[str] = None,
+              workers: Optional[int] = None) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Run every year in parallel and stack the results.
+
+    Args:
+        specs (list): One YearSpec per survey year
+        variant (str): 'firm' or 'province'
+        factors_version (str): Fuel factor set
+        workers (int): Worker processes (default: one per year, up to the CPU count; 1 runs inline)
+
+    Returns:
+        tuple: (firm-year panel, yearly summaries, intensity trends)
+    """
+    started = time.perf_counter()
+    workers = min(workers or os.cpu_count() or 1, len(specs))
+    if workers <= 1:
+        results = [process_year(spec, variant, factors_version) for spec in specs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(process_year, spec, variant, factors_version) for spec in specs]
+            results = [future.result() for future in futures]
+    for r in sorted(results, key=lambda r: r.year):
+        note = f"; not in file: {', '.join(r.missing)}" if r.missing else ""
+        print(f"{r.year}: {len(r.firms)} firms in {r.seconds:.1f}s{note}")
+    panel = _stack([r.firms for r in sorted(results, key=lambda r: r.year)])
+    yearly = yearly_levels(panel)
+    trends = intensity_trends(yearly)
+    print(f"Panel of {len(panel)} firm-years over {len(specs)} year(s) with {max(workers, 1)} worker(s) in "
+          f"{time.perf_counter() - started:.1f}s (slowest year {max(r.seconds for r in results):.1f}s)")
+    return panel, yearly, trends
+
+
+def year_specs(inputs: Sequence[str] = (), pattern: Optional[str] = None, years: Sequence[int] = (),
+               rgs_patterns: Sequence[str] = (), renames_file: Optional[str] = None) -> List[YearSpec]:
+    """
+    Build YearSpecs from 'YEAR=PATH' items and/or a path pattern.
+
+    Args:
+        inputs (list): 'YEAR=PATH' strings
+        pattern (str): Path with {year} and/or {yy}, filled in for each of `years`
+        years (list): Years for `pattern`
+        rgs_patterns (list): RGS part paths with {year}/{yy}, used for every year
+        renames_file (str): CSV with year, canonical and source columns for
+            irregular variable names
+
+    Returns:
+        list: YearSpecs sorted by year
+    """
+    paths: Dict[int, str] = {}
+    for item in inputs:
+        year, _, path = item.partition("=")
+        if not path or not re.fullmatch(r"\d{4}", year.strip()):
+            raise ValueError(f"Expected YEAR=PATH, got '{item}'")
+        paths[int(year)] = path
+    for year in years:
+        paths.setdefault(year, pattern.format(year=year, yy=f"{year % 100:02d}"))
+    renames: Dict[int, Dict[str, str]] = {}
+    if renames_file:
+        for row in pd.read_csv(renames_file, dtype=str).itertuples(index=False):
+            renames.setdefault(int(row.year), {})[row.canonical.upper()] = row.source.upper()
+    return [YearSpec(year, path, tuple(p.format(year=year, yy=f"{year % 100:02d}") for p in rgs_patterns),
+                     renames.get(year, {}))
+            for year, path in sorted(paths.items())]
+
+
+def run(specs: Sequence[YearSpec], output_file: str, trends_file: str, yearly_file: Optional[str] = None,
+        variant: str = VARIANT_PROVINCE, factors_version: Optional[str] = None,
+        workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    Run the panel and write the panel, the trends and the yearly summaries.
+
+    Returns:
+        DataFrame: The firm-year panel
+    """
+    panel, yearly, trends = run_panel(specs, variant, factors_version, workers)
+    write_frame(panel, output_file)
+    print(f"Firm-year panel saved to: {output_file}")
+    write_frame(trends, trends_file)
+    print(f"Intensity trends ({len(trends)} cells) saved to: {trends_file}")
+    if yearly_file:
+        write_frame(yearly, yearly_file)
+        print(f"Yearly summaries saved to: {yearly_file}")
+    return panel
@@ -0,0 +1,288 @@
+"""
+Robust price-per-TJ tables for the "other energy" imputation.
+
+Section 5 of the do-files divides each fuel's purchase value by its TJ,
+averages those prices per firm (`egen meancost = rowmean(*_PER_ENERGY)`),
+and converts ENCVCU into TJ_OTHERENERGY = ENCVCU / meancost. A single firm's
+prices are fragile. A zero quantity makes the price missing, a value typed
+in the wrong unit makes it absurd, and a firm that reports ENCVCU but no
+fuels gets no other energy at all.
+
+Here the firm-level prices of everyone in a cell are pooled instead. A
+`PriceTable` holds a robust price (the median, or a trimmed mean) per
+fuel x 2-digit industry x province. Each table is a small dense array. A
+cell with fewer than `min_firms` prices falls back to the fuel x industry
+price, then to the national fuel price. A firm's meancost is then the mean
+table price of the fuels it reports. The pseudo-fuel ANY, the pooled
+do-file meancost of the cell, covers firms that report no fuels.
+
+Building a table means one pass over the firms, and the result is cached in
+memory and on disk. The disk copy is keyed by a digest of the input columns
+and the table parameters. Applying a table is fancy indexing into the dense
+arrays, so a sensitivity run over many tables costs one engine pass each.
+"""
+
+import hashlib
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from gohijau import config
+from gohijau.emissions.engine import (OTHER_ENERGY, VARIANT_PROVINCE, _columns, compute_emissions, isic2, rowmean,
+                                      stata_divide)
+from gohijau.emissions.factors import FuelFactors, load_factors
+
+ANY_FUEL = "ANY" # Pseudo-fuel: the do-file's per-firm meancost, pooled
+STAT_MEDIAN = "median"
+STAT_TRIMMED = "trimmed"
+STATS = (STAT_MEDIAN, STAT_TRIMMED)
+DEFAULT_MIN_FIRMS = 5
+DEFAULT_TRIM = 0.1 # Share cut from each end for the trimmed mean
+
+_tables: Dict[str, "PriceTable"] = {} # In-process cache by digest
+
+
+@dataclass(frozen=True, eq=False)
+class PriceTable:
+    """Robust price per TJ (Rp) at three levels, as dense arrays."""
+
+    fuels: Tuple[str, ...] # Factor fuels, then ANY
+    provinces: Tuple[str, ...]
+    industries: Tuple[str, ...] # 2-digit KBLI
+    cell: np.ndarray # (fuels, provinces, industries); NaN where the cell has too few firms
+    cell_firms: np.ndarray
+    industry: np.ndarray # (fuels, industries)
+    industry_firms: np.ndarray
+    national: np.ndarray # (fuels,)
+    national_firms: np.ndarray
+    stat: str
+    trim: float
+    min_firms: int
+    digest: str = ""
+
+    @property
+    def label(self) -> str:
+        stat = f"trimmed {self.trim:g}" if self.stat == STAT_TRIMMED else self.stat
+        return f"{stat}, min {self.min_firms} firms"
+
+    def prices(self, provinces: np.ndarray, industries: np.ndarray) -> np.ndarray:
+        """
+        Price per TJ of every fuel for firms in the given cells, with fallbacks.
+
+        Args:
+            provinces (ndarray): Province code per firm
+            industries (ndarray): 2-digit KBLI per firm
+
+        Returns:
+            ndarray: (firms x fuels) prices; cells unknown to the table use
+                the coarser levels
+        """
+        p = pd.Categorical(provinces, categories=list(self.provinces)).codes
+        i = pd.Categorical(industries, categories=list(self.industries)).codes
+        out = np.broadcast_to(self.national, (len(p), len(self.fuels))).copy()
+        known_i = i >= 0
+        out[known_i] = np.where(np.isnan(self.industry[:, i[known_i]].T), out[known_i],
+                                self.industry[:, i[known_i]].T)
+        known = known_i & (p >= 0)
+        cell = self.cell[:, p[known], i[known]].T
+        out[known] = np.where(np.isnan(cell), out[known], cell)
+        return out
+
+    def to_frame(self) -> pd.DataFrame:
+        """Long table: fuel, DPROVI21, DISIC2, price_per_tj, firms, level used."""
+        f, p, i = np.meshgrid(np.arange(len(self.fuels)), np.arange(len(self.provinces)),
+                              np.arange(len(self.industries)), indexing='ij')
+        f, p, i = f.ravel(), p.ravel(), i.ravel()
+        cell, industry, national = self.cell[f, p, i], self.industry[f, i], self.national[f]
+        level = np.where(~np.isnan(cell), "province_isic2", np.where(~np.isnan(industry), "isic2", "national"))
+        price = np.where(~np.isnan(cell), cell, np.where(~np.isnan(industry), industry, national))
+        return pd.DataFrame({"fuel": np.asarray(self.fuels)[f], "DPROVI21": np.asarray(self.provinces)[p],
+                             "DISIC2": np.asarray(self.industries)[i], "price_per_tj": price,
+                             "cell_firms": self.cell_firms[f, p, i], "level": level})
+
+    def save(self, path: str):
+        arrays = {name: getattr(self, name) for name in ("cell", "cell_firms", "industry", "industry_firms",
+                                                         "national", "national_firms")}
+        np.savez_compressed(path, fuels=np.array(self.fuels), provinces=np.array(self.provinces),
+                            industries=np.array(self.industries), stat=np.array(self.stat),
+                            trim=np.array(self.trim), min_firms=np.array(self.min_firms),
+                            digest=np.array(self.digest), **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "PriceTable":
+        with np.load(path) as z:
+            return cls(fuels=tuple(z["fuels"].tolist()), provinces=tuple(z["provinces"].tolist()),
+                       industries=tuple(z["industries"].tolist()), cell=z["cell"], cell_firms=z["cell_firms"],
+                       industry=z["industry"], industry_firms=z["industry_firms"], national=z["national"],
+                       national_firms=z["national_firms"], stat=str(z["stat"]), trim=float(z["trim"]),
+                       min_firms=int(z["min_firms"]), digest=str(z["digest"]))
+
+
+def firm_prices(df: pd.DataFrame, factors: FuelFactors, suffix: str = "21") -> np.ndarray:
+    """
+    The do-file's *_PER_ENERGY prices plus its meancost as the ANY column.
+
+    Returns:
+        ndarray: (firms x fuels+1) price per TJ; missing where the do-file's is
+    """
+    tj = _columns(df, list(factors.fuels)) * factors.tj_per_unit
+    per_energy = stata_divide(_columns(df, factors.value_columns(suffix)), tj)
+    return np.column_stack([per_energy, rowmean(per_energy)])
+
+
+def _robust(groups: np.ndarray, values: np.ndarray, n_groups: int, stat: str, trim: float
+            ) -> Tuple[np.ndarray, np.ndarray]:
+    """Median or trimmed mean of `values` per group, and the group sizes."""
+    order = np.lexsort((values, groups))
+    groups, values = groups[order], values[order]
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    position = np.arange(len(groups)) - starts[groups]
+    n = counts[groups]
+    if stat == STAT_MEDIAN:
+        keep = (position == (n - 1) // 2) | (position == n // 2)
+    else:
+        cut = np.floor(trim * n)
+        keep = (position >= cut) & (position < n - cut)
+    sums = np.bincount(groups[keep], weights=values[keep], minlength=n_groups)
+    kept = np.bincount(groups[keep], minlength=n_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(kept > 0, sums / kept, np.nan), counts
+
+
+def _digest(df: pd.DataFrame, columns: Sequence[str], factors: FuelFactors, stat: str, trim: float,
+            min_firms: int) -> str:
+    h = hashlib.sha1(f"{factors.version}|{stat}|{trim}|{min_firms}".encode())
+    for column in columns:
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype) or not pd.api.types.is_numeric_dtype(values):
+            h.update("\x1f".join(values.astype(str)).encode())
+        else:
+            h.update(values.to_numpy(dtype=np.float64, na_value=np.nan).tobytes())
+    return h.hexdigest()[:16]
+
+
+def build_price_table(df: pd.DataFrame, factors: Optional[FuelFactors] = None, stat: str = STAT_MEDIAN,
+                      trim: float = DEFAULT_TRIM, min_firms: int = DEFAULT_MIN_FIRMS, suffix: str = "21",
+                      cache_dir: Optional[str] = config.PRICE_TABLE_DIR) -> PriceTable:
+    """
+    Build (or fetch from cache) the price table of a set of firms.
+
+    Args:
+        df (DataFrame): IBS firm records with fuel quantities and values
+        factors (FuelFactors): Fuel factors (default: `load_factors()`)
+        stat (str): 'median' or 'trimmed'
+        trim (float): Share trimmed from each end for 'trimmed'
+        min_firms (int): Fewest prices for a cell to be used; thinner cells fall back
+        suffix (str): Year suffix of the value and code columns
+        cache_dir (str): Directory of cached tables (None: in-process cache only)
+
+    Returns:
+        PriceTable
+    """
+    if stat not in STATS:
+        raise ValueError(f"Unknown statistic '{stat}'; choose from {', '.join(STATS)}")
+    factors = factors or load_factors()
+    province_column = f"DPROVI{suffix}"
+    code_columns = [province_column, "DISIC2" if "DISIC2" in df.columns else f"DISIC5{suffix}"]
+    digest = _digest(df, code_columns + list(factors.fuels) + factors.value_columns(suffix), factors, stat, trim,
+                     min_firms)
+    if digest in _tables:
+        return _tables[digest]
+    path = os.path.join(cache_dir, f"{digest}.npz") if cache_dir else None
+    if path and os.path.exists(path):
+        table = PriceTable.load(path)
+        _tables[digest] = table
+        return table
+
+    started = time.perf_counter()
+    prices = firm_prices(df, factors, suffix)
+    province_codes, provinces = pd.factorize(df[province_column].astype(str), sort=True)
+    industry_codes, industries = pd.factorize(isic2(df, suffix), sort=True)
+    # Only positive, finite prices are evidence of a price
+    firm, fuel = np.nonzero(np.isfinite(prices) & (prices > 0))
+    values = prices[firm, fuel]
+    P, I, F = len(provinces), len(industries), prices.shape[1]
+    p, i = province_codes[firm], industry_codes[firm]
+    valid = (p >= 0) & (i >= 0)
+    firm, fuel, values, p, i = firm[valid], fuel[valid], values[valid], p[valid], i[valid]
+
+    cell, cell_firms = _robust((fuel * P + p) * I + i, values, F * P * I, stat, trim)
+    industry, industry_firms = _robust(fuel * I + i, values, F * I, stat, trim)
+    national, national_firms = _robust(fuel, values, F, stat, trim)
+    cell, industry = cell.reshape(F, P, I), industry.reshape(F, I)
+    cell_firms, industry_firms = cell_firms.reshape(F, P, I), industry_firms.reshape(F, I)
+    table = PriceTable(fuels=tuple(factors.fuels) + (ANY_FUEL,), provinces=tuple(provinces),
+                       industries=tuple(industries),
+                       cell=np.where(cell_firms >= min_firms, cell, np.nan), cell_firms=cell_firms,
+                       industry=np.where(industry_firms >= min_firms, industry, np.nan),
+                       industry_firms=industry_firms, national=national, national_firms=national_firms,
+                       stat=stat, trim=trim, min_firms=min_firms, digest=digest)
+    print(f"Built price table ({table.label}) from {len(values)} firm prices in "
+          f"{time.perf_counter() - started:.2f}s")
+    _tables[digest] = table
+    if path:
+        os.makedirs(cache_dir, exist_ok=True)
+        table.save(path)
+    return table
+
+
+def imputed_meancost(df: pd.DataFrame, table: PriceTable, factors: Optional[FuelFactors] = None,
+                     suffix: str = "21") -> np.ndarray:
+    """
+    Table-based meancost per firm: the mean table price of the fuels it
+    reports (a positive quantity or value), or the ANY price if it reports none.
+    """
+    factors = factors or load_factors()
+    prices = table.prices(df[f"DPROVI{suffix}"].astype(str).to_numpy(), isic2(df, suffix).to_numpy())
+    quantities = _columns(df, list(factors.fuels))
+    values = _columns(df, factors.value_columns(suffix))
+    reports = (np.nan_to_num(quantities) > 0) | (np.nan_to_num(values) > 0)
+    fuel_prices = np.where(reports, prices[:, :len(factors.fuels)], np.nan)
+    meancost = rowmean(fuel_prices)
+    return np.where(np.isnan(meancost), prices[:, -1], meancost)
+
+
+def sensitivity(df: pd.DataFrame, tables: Sequence[PriceTable], factors: Optional[FuelFactors] = None,
+                variant: str = VARIANT_PROVINCE, suffix: str = "21") -> pd.DataFrame:
+    """
+    Emissions under the do-file's per-firm meancost and under each table.
+
+    Returns:
+        DataFrame: One row per run with the other-energy TJ, TOTAL_CO2, the
+            median intensity, firms with other energy, the change in
+            TOTAL_CO2 against the do-file, and the run time
+    """
+    factors = factors or load_factors()
+    runs: List[Tuple[str, Optional[PriceTable]]] = [("do-file (per-firm meancost)", None)]
+    runs += [(table.label, table) for table in tables]
+    rows = []
+    for label, table in runs:
+        started = time.perf_counter()
+        meancost = imputed_meancost(df, table, factors, suffix) if table else None
+        result = compute_emissions(df, factors, variant=variant, value_suffix=suffix, keep_input=False,
+                                   meancost=meancost)
+        rows.append({"prices": label, f"TJ_{OTHER_ENERGY}": np.nansum(result[f"TJ_{OTHER_ENERGY}"]),
+                     "TOTAL_CO2": np.nansum(result["TOTAL_CO2"]), "median_intensity": result["intensity"].median(),
+                     "firms_with_other_energy": int(result[f"TJ_{OTHER_ENERGY}"].notna().sum()),
+                     "seconds": round(time.perf_counter() - started, 3)})
+    out = pd.DataFrame(rows)
+    out["TOTAL_CO2_change"] = out["TOTAL_CO2"] / out["TOTAL_CO2"].iloc[0] - 1
+    return out
+
+
+def parse_table_spec(spec: str) -> Tuple[str, float, int]:
+    """'median:5' or 'trimmed:0.1:10' -> (stat, trim, min_firms)."""
+    parts = spec.split(":")
+    stat = parts[0]
+    if stat == STAT_TRIMMED:
+        trim = float(parts[1]) if len(parts) > 1 else DEFAULT_TRIM
+        min_firms = int(parts[2]) if len(parts) > 2 else DEFAULT_MIN_FIRMS
+    else:
+        trim, min_firms = DEFAULT_TRIM, int(parts[1]) if len(parts) > 1 else DEFAULT_MIN_FIRMS
+    return stat, trim, min_firms
+
@@ -0,0 +1,160 @@
+"""
+Scalar reference implementation of the do-files, for verifying the engine.
+
+It reads the TJ_*, EF_* and KWH globals out of the do-file itself, then
+walks the firms one at a time, transcribing each `gen` and `egen` line with
+Stata's missing-value rules. It is slow on purpose: it is meant to be
+obviously the do-file, not to be fast. `verify` runs both on the same
+records and reports the largest relative difference per output column.
+"""
+
+import math
+import re
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from gohijau import config
+from gohijau.emissions.engine import (OTHER_ENERGY, OTHER_ENERGY_VALUE_COLUMN, PROVINCE_INTENSITY_SCALE,
+                                      PROVINCE_VALUE_ADDED_SCALE, VARIANT_FIRM,
+                                      compute_emissions)
+from gohijau.emissions.factors import FuelFactors, load_factors
+
+_GLOBAL = re.compile(r'^\s*global\s+(\w+)\s+([-+0-9.eE]+)', re.MULTILINE)
+
+MISSING = float('nan')
+
+
+def do_file_globals(path: str) -> Dict[str, float]:
+    """Numeric `global NAME value` definitions of a do-file."""
+    with open(path, encoding='utf-8') as f:
+        return {name: float(value) for name, value in _GLOBAL.findall(f.read())}
+
+
+def _missing(x) -> bool:
+    return x is None or (isinstance(x, float) and math.isnan(x))
+
+
+def _mul(a, b):
+    return MISSING if _missing(a) or _missing(b) else a * b
+
+
+def _div(a, b):
+    # Stata: missing operands or a zero divisor give missing
+    return MISSING if _missing(a) or _missing(b) or b == 0 else a / b
+
+
+def _add(*terms):
+    return MISSING if any(_missing(t) for t in terms) else sum(terms)
+
+
+def _sub(a, b):
+    return MISSING if _missing(a) or _missing(b) else a - b
+
+
+def _rowtotal_missing(values):
+    present = [v for v in values if not _missing(v)]
+    return sum(present) if present else MISSING
+
+
+def _rowmean(values):
+    present = [v for v in values if not _missing(v)]
+    return sum(present) / len(present) if present else MISSING
+
+
+def reference_emissions(df: pd.DataFrame, do_file: str, fuels: List[str], variant: str = VARIANT_FIRM,
+                        value_suffix: str = "21") -> pd.DataFrame:
+    """
+    Run the do-file's sections 2-6 row by row.
+
+    Args:
+        df (DataFrame): Firm records
+        do_file (str): Do-file whose globals supply the factors
+        fuels (list): The do-file's `energy_types`, in order
+        variant (str): 'firm' (Emissions.do) or 'province' (2digitprov do-file)
+        value_suffix (str): Year suffix of the per-fuel value columns
+
+    Returns:
+        DataFrame: TOTAL_CO2, TOTAL_TJ, TOTAL_KWH, VTLVCU, intensity and the
+            per-fuel TJ_* / CO2_* / KWH_* columns
+    """
+    g = do_file_globals(do_file)
+    records = df.to_dict(orient='records')
+    out = []
+    for r in records:
+        v = {k: (MISSING if _missing(x) else float(x)) if isinstance(x, (int, float, np.number)) or x is None
+             else x for k, x in r.items()}
+        row = {}
+        # Sections 3-4: gen TJ_`type' / CO2_`type' ... if `type' != .
+        for fuel in fuels:
+            row[f"TJ_{fuel}"] = _mul(v[fuel], g[f"TJ_{fuel}"])
+            row[f"CO2_{fuel}"] = _mul(row[f"TJ_{fuel}"], g[f"EF_{fuel}"])
+        # Section 5: value per TJ, other energy
+        per_energy = [_div(v[f"{fuel[:3]}VCU{value_suffix}"], row[f"TJ_{fuel}"]) for fuel in fuels]
+        meancost = _rowmean(per_energy)
+        row[f"TJ_{OTHER_ENERGY}"] = _div(v[OTHER_ENERGY_VALUE_COLUMN], meancost)
+        row[f"CO2_{OTHER_ENERGY}"] = _mul(row[f"TJ_{OTHER_ENERGY}"], g["EF_EPELIU"])
+        for name in fuels + [OTHER_ENERGY]:
+            row[f"KWH_{name}"] = _mul(row[f"TJ_{name}"], g["KWH"])
+        # Section 6: totals, value added, intensity
+        row["TOTAL_CO2"] = _rowtotal_missing([row[f"CO2_{name}"] for name in fuels + [OTHER_ENERGY]])
+        row["TOTAL_TJ"] = _rowtotal_missing([row[f"TJ_{name}"] for name in fuels + [OTHER_ENERGY]])
+        row["TOTAL_KWH"] = _mul(row["TOTAL_TJ"], g["KWH"])
+        if variant == VARIANT_FIRM:
+            r1002 = _add(v["YPRVCU"], v["YRSVCU"], _sub(v["YRNVCU"], v["NOPVCU"]), _sub(v["STDVCU"], v["STJVCU"]))
+            r1003 = _add(v["ILRVCU"], v["ITXVCU"], v["IINVCU"], v["ICOVCU"], v["IDEVCU"], v["IPRVCU"])
+            r1001 = _add(v["ZPDVCU"], v["ZNDVCU"], v["EFUVCU"], v["EPLVCU"], v["ENPVCU"], v["IOTVCU"],
+                         v["RDNVCU"], v["RIMVCU"])
+            r1001a = _add(v["ZPDVCU"], v["ZNDVCU"])
+            row["VTLVCU"] = _add(_sub(r1002, r1001), r1001a, r1003)
+            row["intensity"] = _div(row["TOTAL_CO2"], row["VTLVCU"])
+        else:
+            row["VTLVCU"] = _mul(v["VTLVCU"], PROVINCE_VALUE_ADDED_SCALE)
+            row["intensity"] = _mul(_div(row["TOTAL_CO2"], row["VTLVCU"]), PROVINCE_INTENSITY_SCALE)
+        out.append(row)
+    return pd.DataFrame(out, index=df.index)
+
+
+def verify(df: pd.DataFrame, factors: Optional[FuelFactors] = None, variant: str = VARIANT_FIRM,
+           do_file: Optional[str] = None, rtol: float = 1e-9) -> Dict[str, object]:
+    """
+    Compare `compute_emissions` with the scalar do-file transcription.
+
+    Args:
+        df (DataFrame): Firm records (e.g. `fixture.synthetic_ibs()`)
+        factors (FuelFactors): Factor set for the engine
+        variant (str): 'firm' or 'province'
+        do_file (str): Do-file for the reference (default: the variant's do-file)
+        rtol (float): Relative tolerance per value
+
+    Returns:
+        dict: 'ok', 'max_rel_error' per column, 'missing_mismatches' per
+            column (missing in one result only), and both run times
+    """
+    factors = factors or load_factors()
+    do_file = do_file or (config.EMISSIONS_DOFILE if variant == VARIANT_FIRM else config.PROVINCE_DOFILE)
+
+    started = time.perf_counter()
+    engine = compute_emissions(df, factors, variant=variant, keep_input=False)
+    engine_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    reference = reference_emissions(df, do_file, list(factors.fuels), variant=variant)
+    reference_seconds = time.perf_counter() - started
+
+    max_rel_error, missing_mismatches = {}, {}
+    for column in reference.columns:
+        a = engine[column].to_numpy(dtype=np.float64)
+        b = reference[column].to_numpy(dtype=np.float64)
+        both = ~np.isnan(a) & ~np.isnan(b)
+        missing_mismatches[column] = int((np.isnan(a) != np.isnan(b)).sum())
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rel = np.abs(a[both] - b[both]) / np.maximum(np.abs(b[both]), np.finfo(np.float64).tiny)
+        max_rel_error[column] = float(rel.max()) if rel.size else 0.0
+    ok = all(error <= rtol for error in max_rel_error.values()) and not any(missing_mismatches.values())
+    return {
+        "ok": ok, "variant": variant, "rows": len(df), "factors_version": factors.version, "do_file": do_file,
+        "max_rel_error": max_rel_error, "missing_mismatches": missing_mismatches,
+        "engine_seconds": round(engine_seconds, 4), "reference_seconds": round(reference_seconds, 4),
+    }
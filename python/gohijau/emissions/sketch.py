@@ -0,0 +1,111 @@
+"""
+Mergeable quantile sketches with a relative-error guarantee (DDSketch).
+
+A value x is counted in the logarithmic bucket ceil(log_gamma |x|), with
+gamma = (1 + alpha) / (1 - alpha). The bucket's representative value is then
+within a relative error alpha of every value in it. Two sketches are merged
+by adding their bucket counts, so the median of a province, or of all of
+Indonesia, comes from merging cell sketches rather than rescanning firms.
+
+Keys are signed so that they sort in value order: positive values map to
+`OFFSET + bucket`, negative values to `-(OFFSET + bucket)`, and zero (and
+|x| below MIN_VALUE) to 0. Intensity is negative when value added is.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+DEFAULT_ALPHA = 0.01 # Relative accuracy of quantiles
+MIN_VALUE = 1e-300 # Smaller magnitudes count as zero
+OFFSET = 1 << 20 # Keeps bucket keys of values below 1 positive
+
+
+def gamma(alpha: float = DEFAULT_ALPHA) -> float:
+    return (1 + alpha) / (1 - alpha)
+
+
+def sketch_keys(values: np.ndarray, alpha: float = DEFAULT_ALPHA) -> np.ndarray:
+    """Signed bucket key of each (finite) value."""
+    values = np.asarray(values, dtype=np.float64)
+    magnitude = np.abs(values)
+    nonzero = magnitude >= MIN_VALUE
+    with np.errstate(divide='ignore'):
+        buckets = np.ceil(np.log(np.where(nonzero, magnitude, 1.0)) / np.log(gamma(alpha))).astype(np.int64)
+    return np.where(nonzero, np.sign(values).astype(np.int64) * (buckets + OFFSET), 0)
+
+
+def key_values(keys: np.ndarray, alpha: float = DEFAULT_ALPHA) -> np.ndarray:
+    """Representative value of each bucket key."""
+    keys = np.asarray(keys, dtype=np.int64)
+    g = gamma(alpha)
+    magnitude = 2 * np.power(g, np.abs(keys) - OFFSET, dtype=np.float64) / (g + 1)
+    return np.where(keys == 0, 0.0, np.sign(keys) * magnitude)
+
+
+def grouped_quantiles(groups: np.ndarray, keys: np.ndarray, counts: np.ndarray, q: float = 0.5,
+                      alpha: float = DEFAULT_ALPHA) -> np.ndarray:
+    """
+    Quantile of many sketches at once.
+
+    The rows must be sorted by group, then by key. Like Stata's median, the
+    result interpolates between the two nearest ranks, so an even count gives
+    the mean of the two middle values.
+
+    Args:
+        groups (ndarray): Group number of each row (0..n_groups-1, non-decreasing)
+        keys (ndarray): Bucket keys
+        counts (ndarray): Values in each bucket
+        q (float): Quantile in [0, 1]
+
+    Returns:
+        ndarray: One quantile per group
+    """
+    n_groups = int(groups[-1]) + 1 if len(groups) else 0
+    totals = np.bincount(groups, weights=counts, minlength=n_groups)
+    cumulative = np.cumsum(counts)
+    before = np.concatenate([[0], np.cumsum(totals)[:-1]]) # Values in earlier groups
+    position = q * (totals - 1)
+    lower, upper = np.floor(position), np.ceil(position)
+    lo = np.searchsorted(cumulative, before + lower, side='right')
+    hi = np.searchsorted(cumulative, before + upper, side='right')
+    values = key_values(keys, alpha)
+    return values[lo] + (values[hi] - values[lo]) * (position - lower)
+
+
+class QuantileSketch:
+    """A DDSketch: sorted bucket keys with their counts."""
+
+    def __init__(self, keys: Optional[np.ndarray] = None, counts: Optional[np.ndarray] = None,
+                 alpha: float = DEFAULT_ALPHA):
+        self.alpha = alpha
+        self.keys = np.asarray(keys if keys is not None else [], dtype=np.int64)
+        self.counts = np.asarray(counts if counts is not None else [], dtype=np.int64)
+
+    @classmethod
+    def from_values(cls, values, alpha: float = DEFAULT_ALPHA) -> "QuantileSketch":
+        values = np.asarray(values, dtype=np.float64)
+        keys, counts = np.unique(sketch_keys(values[np.isfinite(values)], alpha), return_counts=True)
+        return cls(keys, counts, alpha)
+
+    @property
+    def count(self) -> int:
+        return int(self.counts.sum())
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """Sketch of the union of both value sets."""
+        if other.alpha != self.alpha:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        keys, inverse = np.unique(np.concatenate([self.keys, other.keys]), return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate([self.counts, other.counts]), minlength=len(keys))
+        return QuantileSketch(keys, counts.astype(np.int64), self.alpha)
+
+    def quantile(self, q: float = 0.5) -> float:
+        """Approximate quantile (NaN for an empty sketch)."""
+        if not len(self.keys):
+            return float('nan')
+        return float(grouped_quantiles(np.zeros(len(self.keys), dtype=np.int64), self.keys, self.counts, q,
+                                       self.alpha)[0])
+
+    def __repr__(self):
+        return f"QuantileSketch(count={self.count}, buckets={len(self.keys)}, alpha={self.alpha})"
@@ -0,0 +1 @@
+"""EUDR cost-driver pipeline stages (Perplexity and Gemini)."""
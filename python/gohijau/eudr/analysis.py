@@ -0,0 +1,491 @@
+"""
+Stage 2: analyze EUDR paragraphs for cost drivers with the Perplexity API.
+"""
+
+import os
+import re
+import pickle
+import glob
+
+import pandas as pd
+from tqdm import tqdm
+
+from gohijau.clients import get_perplexity_client
+from gohijau.concurrency import adaptive_map, get_controller
+from gohijau.config import ANALYSIS_MODEL, OUTPUT_DIR, PARAGRAPHS_FILE
+from gohijau.hedging import get_latency_policy
+from gohijau.jobqueue import STAGE_ANALYSIS, process_via_queue
+from gohijau.pdf.dedup import duplicate_rows
+
+ANALYSIS_SYSTEM_PROMPT = "You are a precise analyst that identifies ONLY explicit cost drivers from EUDR documentation that directly impact non-EU exporters. Only extract cost drivers CLEARLY mentioned in the text. Provide reasoned explanations for each cost driver identified."
+
+# Instructions and worked examples sent before every paragraph. Kept first and
+# byte-identical across requests so provider-side prefix caches can reuse it.
+ANALYSIS_PROMPT_PREFIX = """You are an analyst from a non-EU exporting country (like Indonesia) reviewing EUDR regulations. Your task is to:
+
+1. Analyze the provided text segment to identify explicit cost drivers that would directly impact non-EU exporters.
+2. For each identified cost driver, provide clear reasoning explaining why it represents a direct cost impact for non-EU exporters.
+
+Important Guidelines:
+- Only include cost drivers that are EXPLICITLY mentioned in the text
+- Consider ONLY costs that directly affect non-EU exporters
+- Even if you understand what EUDR requires in general, ONLY analyze what is explicitly stated in this specific text segment
+- Exclude costs that:
+  * Are borne by EU operators
+  * Come from other regulations/policies
+  * Are implicit or assumed
+  * Are known EUDR requirements but not mentioned in this specific text
+- Analyze from a non-EU country perspective
+- Include ALL relevant cost drivers found, no matter how many
+- Each cost driver must have its own numbered XML tags and corresponding reasoning
+- You may discuss your analysis process or explain your thinking BEFORE providing the output
+- ALWAYS include the <output> section, even after discussion
+- Keep all analysis and discussion BEFORE the <output> tags
+
+Return your analysis in the following XML format:
+
+[Optional: Add any analysis, discussion, or explanation here, BEFORE the output tags]
+
+<output>
+[If cost drivers are found:]
+<cost_driver1>
+[First cost driver identified]
+</cost_driver1>
+<reasoning1>
+- Text reference: [exact quote or specific reference]
+- Direct cost impact: [explanation]
+- Operational impact: [specific effect on export operations]
+</reasoning1>
+
+<cost_driver2>
+[Second cost driver identified]
+</cost_driver2>
+<reasoning2>
+- Text reference: [exact quote or specific reference]
+- Direct cost impact: [explanation]
+- Operational impact: [specific effect on export operations]
+</reasoning2>
+
+[Continue pattern for all identified cost drivers...]
+
+[If no cost drivers are found:]
+NA
+</output>
+
+Example Output with Discussion:
+Let me analyze this text carefully. I notice several key requirements that would create direct costs for non-EU exporters. I'll focus particularly on explicit mentions of new systems or processes that would require investment...
+
+<output>
+<cost_driver1>
+Supply chain traceability systems
+</cost_driver1>
+<reasoning1>
+- Text reference: "operators must implement comprehensive traceability systems"
+- Direct cost impact: Investment in new tracking technologies and software
+- Operational impact: Implementation of new digital tracking processes
+</reasoning1>
+
+<cost_driver2>
+Due diligence documentation
+</cost_driver2>
+<reasoning2>
+- Text reference: "maintain detailed documentation of supply chain"
+- Direct cost impact: Additional administrative staff and documentation systems
+- Operational impact: New documentation workflow and storage requirements
+</reasoning2>
+</output>
+
+Example Output with No Costs:
+I've reviewed the text and found no explicit mentions of requirements that would create direct costs for non-EU exporters. While there are some regulatory requirements mentioned, they don't translate to direct costs for exporters.
+
+<output>
+NA
+</output>
+
+NOW DO THAT FOR THIS FOLLOWING DOCUMENT'S ARTICLE/SECTION
+
+"""
+
+class EUDRCostAnalyzer:
+    def __init__(self, input_file=PARAGRAPHS_FILE, output_dir=OUTPUT_DIR, df=None):
+        """
+        Initialize the EUDR cost analyzer.
+        
+        Args:
+            input_file (str): Excel file with one paragraph (or <paragraph>-tagged block) per row
+            output_dir (str): Directory for intermediate pickles and Excel checkpoints
+            df (DataFrame): Use this frame instead of reading `input_file`
+        """
+        self.df = df if df is not None else pd.read_excel(input_file)
+        self.output_dir = output_dir
+        
+    def extract_paragraph_text(self, text):
+        """Extract text between <paragraph> and </paragraph> tags."""
+        paragraphs = re.findall(r'<paragraph>(.*?)</paragraph>', text, re.DOTALL)
+        return paragraphs
+    
+    def build_prompt_parts(self, text, doc_name=None, article=None):
+        """
+        Split the analysis prompt into its static prefix (instructions and
+        examples, identical for every paragraph) and the dynamic input.
+        
+        Returns:
+            tuple: (static prefix, dynamic suffix)
+        """
+        dynamic = f"""<input>
+Document: {doc_name if doc_name else 'Unknown'}
+Article/Section: {article if article else 'Unknown'}
+TEXT: {text}
+</input>"""
+        return ANALYSIS_PROMPT_PREFIX, dynamic
+    
+    def build_prompt(self, text, doc_name=None, article=None):
+        """Build the cost driver analysis prompt for one paragraph (static prefix first)."""
+        static, dynamic = self.build_prompt_parts(text, doc_name, article)
+        return static + dynamic
+    
+    def get_cost_driver_analysis(self, text, doc_name=None, article=None):
+        """
+        Use Perplexity API to get cost driver analysis.
+        Returns the raw response content.
+        
+        Args:
+            text (str): The text to analyze
+            doc_name (str): Document name for reference
+            article (str): Article number/section for reference
+            
+        Returns:
+            str: The raw response content
+        """
+        prompt = self.build_prompt(text, doc_name, article)
+
+
+        try:
+            response = self.request_analysis(prompt)
+            
+            content = response
+            
+            # Just extract the content between <output> tags without further parsing
+            
+            if content:
+                return content
+            else:
+                # If no output tags found, return the full response
+                return "NA"
+            
+        except Exception as e:
+            print(f"Error getting cost driver analysis: {e}")
+            return f"Error: {str(e)}"
+    
+    def request_analysis(self, prompt):
+        """
+        Send the analysis prompt to Perplexity under the stage's adaptive
+        timeout (hedged if enabled). Raises on API errors and timeouts.
+        """
+        def send(timeout):
+            with get_controller(STAGE_ANALYSIS).observe():
+                return get_perplexity_client().chat.completions.create(
+                    model=ANALYSIS_MODEL,
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": ANALYSIS_SYSTEM_PROMPT
+                        },
+                        {
+                            "role": "user",
+                            "content": prompt
+                        }
+                    ],
+                    temperature=0,
+                    timeout=timeout
+                )
+        
+        return get_latency_policy(STAGE_ANALYSIS).call(send)
+    
+    def find_latest_pickle(self):
+        """Find the latest pickle file and the number of rows processed."""
+        pickle_pattern = os.path.join(self.output_dir, "eudr_analysis_rows_*_*.pkl")
+        pickle_files = glob.glob(pickle_pattern)
+        
+        if not pickle_files:
+            return None, 0
+            
+        # Sort by modification time (newest first)
+        pickle_files.sort(key=os.path.getmtime, reverse=True)
+        latest_pickle = pickle_files[0]
+        
+        # Extract row count from filename
+        try:
+            # Pattern is eudr_analysis_rows_NUMBER_timestamp.pkl
+            row_count = int(os.path.basename(latest_pickle).split('_')[3])
+            return latest_pickle, row_count
+        except:
+            # If we can't extract row count, assume 0
+            return latest_pickle, 0
+    
+    def process_all_rows(self, sleep_interval=0, start_row=None, pickle_every=20, excel_every=100):
+        """
+        Process rows and store the raw response in the dataframe.
+        Can resume from a previous run.
+        
+        Args:
+            sleep_interval (float): Minimum seconds between API calls; concurrency
+                is otherwise paced by the stage's adaptive controller
+            start_row (int): Row index to start processing from (for resuming)
+            pickle_every (int): Rows between intermediate pickles (0 disables)
+            excel_every (int): Rows between intermediate Excel files (0 disables)
+            
+        Returns:
+            DataFrame: Processed dataframe with raw responses
+        """
+        # If no start_row specified, try to find latest pickle and resume
+        if start_row is None:
+            latest_pickle, row_count = self.find_latest_pickle()
+            if latest_pickle:
+                print(f"Found latest pickle: {latest_pickle} with {row_count} rows processed")
+                try:
+                    with open(latest_pickle, 'rb') as f:
+                        df_to_process = pickle.load(f)
+                    print(f"Successfully loaded {len(df_to_process)} rows from pickle")
+                    
+                    # Make sure we have all the original rows (might need to merge with self.df)
+                    if len(df_to_process) < len(self.df):
+                        # Get the remaining rows from self.df that aren't in df_to_process
+                        remaining_df = self.df.iloc[len(df_to_process):].copy()
+                        # Add the cost_driver_analysis column if it doesn't exist
+                        if 'cost_driver_analysis' not in remaining_df.columns:
+                            remaining_df['cost_driver_analysis'] = None
+                        # Combine the processed rows with the remaining rows
+                        df_to_process = pd.concat([df_to_process, remaining_df])
+                        print(f"Added {len(remaining_df)} remaining rows from original dataset")
+                    
+                    start_row = row_count
+                except Exception as e:
+                    print(f"Error loading pickle: {e}")
+                    df_to_process = self.df.copy()
+                    start_row = 0
+            else:
+                df_to_process = self.df.copy()
+                start_row = 0
+        else:
+            df_to_process = self.df.copy()
+        
+        # Ensure the cost_driver_analysis column exists
+        if 'cost_driver_analysis' not in df_to_process.columns:
+            df_to_process['cost_driver_analysis'] = None
+            
+        rows_to_process = len(df_to_process)
+        print(f"Total rows in dataset: {rows_to_process}")
+        print(f"Resuming processing from row {start_row}/{rows_to_process}")
+        
+        # One job per paragraph; rows are finished (and checkpointed) in order.
+        # Duplicate rows (see gohijau.pdf.dedup) reuse their canonical row's
+        # analyses, which always come earlier.
+        duplicates = duplicate_rows(df_to_process)
+        if duplicates:
+            print(f"Reusing analyses for {len(duplicates)} duplicate rows")
+        jobs = []
+        paragraph_counts = {}
+        for i, row in df_to_process.iloc[start_row:].iterrows():
+            text = row['text']
+            if i in duplicates or not isinstance(text, str) or len(text) < 10:
+                paragraph_counts[i] = None
+                continue
+            
+            paragraphs = self.extract_paragraph_text(text)
+            if not paragraphs:
+                paragraphs = [text]
+            
+            doc_name = row.get('document_name', None)
+            article = row.get('article', None)
+            valid = [p for p in paragraphs if isinstance(p, str) and len(p) >= 10]
+            paragraph_counts[i] = len(valid)
+            jobs.extend((i, paragraph, doc_name, article) for paragraph in valid)
+        
+        def analyze(job):
+            i, paragraph, doc_name, article = job
+            return self.get_cost_driver_analysis(paragraph, doc_name, article)
+        
+        controller = get_controller(STAGE_ANALYSIS)
+        results = adaptive_map(analyze, jobs, controller, min_interval=sleep_interval)
+        progress = tqdm(total=rows_to_process, initial=start_row, desc="Processing rows")
+        for i, count in paragraph_counts.items():
+            progress.update(1)
+            if i in duplicates:
+                canonical = df_to_process.at[duplicates[i], 'cost_driver_analysis']
+                if not isinstance(canonical, list):
+                    continue
+                all_analyses = list(canonical)
+            elif count is None:
+                continue
+            else:
+                # Results arrive in job order, so this row's paragraphs are next
+                all_analyses = []
+                for _ in range(count):
+                    _, analysis = next(results)
+                    print(f"Row {i}: Processed analysis")
+                    all_analyses.append(analysis)
+            
+            # Store all analyses for this row
+            df_to_process.at[i, 'cost_driver_analysis'] = all_analyses
+            
+            # Current row count (1-based)
+            current_row_count = i + 1
+            
+            # Save intermediate results every `pickle_every` rows as pickle
+            if pickle_every and (current_row_count % pickle_every == 0 or current_row_count == rows_to_process):
+                self.save_intermediate_pickle(df_to_process, current_row_count)
+            
+            # Save intermediate results every `excel_every` rows to Excel
+            if excel_every and (current_row_count % excel_every == 0 or current_row_count == rows_to_process):
+                self.save_intermediate_excel(df_to_process, current_row_count)
+        results.close()
+        progress.close()
+        print(controller.summary())
+        print(get_latency_policy(STAGE_ANALYSIS).summary())
+        
+        return df_to_process
+    
+    def save_intermediate_pickle(self, df, row_count):
+        """Save intermediate results to pickle file after processing a certain number of rows."""
+        timestamp = pd.Timestamp.now().strftime("%Y%m%d_%H%M%S")
+        pickle_path = os.path.join(self.output_dir, f"eudr_analysis_rows_{row_count}_{timestamp}.pkl")
+        
+        with open(pickle_path, "wb") as f:
+            pickle.dump(df, f)
+        
+        print(f"Intermediate pickle saved to {pickle_path}")
+        
+        # Print information about the saved pickle
+        print(f"Saved DataFrame with {len(df)} rows and {len(df.columns)} columns")
+        print(f"Columns: {df.columns.tolist()}")
+    
+    def save_intermediate_excel(self, df, row_count):
+        """Save intermediate results to Excel file after processing a certain number of rows."""
+        timestamp = pd.Timestamp.now().strftime("%Y%m%d_%H%M%S")
+        excel_path = os.path.join(self.output_dir, f"eudr_analysis_rows_{row_count}_{timestamp}.xlsx")
+        
+        df.to_excel(excel_path, index=False)
+        
+        print(f"Intermediate Excel saved to {excel_path}")
+        print(f"Saved Excel with {len(df)} rows and {len(df.columns)} columns")
+    
+    def process_and_save(self, output_file, start_row=None, sleep_interval=0):
+        """Process all rows and save the final results to both pickle and Excel."""
+        final_df = self.process_all_rows(sleep_interval=sleep_interval, start_row=start_row)
+        
+        # Save to final pickle
+        timestamp = pd.Timestamp.now().strftime("%Y%m%d_%H%M%S")
+        pickle_path = os.path.join(self.output_dir, f"eudr_analysis_final_{timestamp}.pkl")
+        with open(pickle_path, "wb") as f:
+            pickle.dump(final_df, f)
+        print(f"Final DataFrame saved to {pickle_path}")
+        
+        # Save to Excel
+        final_df.to_excel(output_file, index=False)
+        print(f"Results also saved to Excel: {output_file}")
+        
+        # Print summary of final results
+        print(f"Processed {len(final_df)} rows with {len(final_df.columns)} columns")
+        print(f"Columns: {final_df.columns.tolist()}")
+
+    def iter_jobs(self):
+        """
+        Yield one (job_key, payload) pair per paragraph for the job queue.
+        
+        Job keys are "<row index>:<paragraph index>", so enqueueing the same
+        input again does not duplicate work that is already queued or done.
+        Duplicate rows get no jobs; `collect_results` copies their canonical
+        row's analyses.
+        """
+        duplicates = duplicate_rows(self.df)
+        for i, row in self.df.iterrows():
+            text = row['text']
+            if i in duplicates or not isinstance(text, str) or len(text) < 10:
+                continue
+            
+            paragraphs = self.extract_paragraph_text(text)
+            if not paragraphs:
+                paragraphs = [text]
+            
+            doc_name = row.get('document_name', None)
+            article = row.get('article', None)
+            for j, paragraph in enumerate(paragraphs):
+                if not isinstance(paragraph, str) or len(paragraph) < 10:
+                    continue
+                yield f"{i}:{j}", {
+                    'text': paragraph,
+                    'document_name': None if pd.isna(doc_name) else doc_name,
+                    'article': None if pd.isna(article) else article,
+                }
+    
+    def iter_prompt_parts(self):
+        """
+        Yield (static, dynamic) prompt text for every request the stage would
+        send, without sending anything. The system message counts as static.
+        """
+        for _, payload in self.iter_jobs():
+            static, dynamic = self.build_prompt_parts(payload['text'], payload.get('document_name'),
+                                                      payload.get('article'))
+            yield ANALYSIS_SYSTEM_PROMPT + "\n" + static, dynamic
+    
+    def analyze_job(self, payload):
+        """Job handler: analyze one paragraph. Raises on API errors so the queue can retry."""
+        prompt = self.build_prompt(payload['text'], payload.get('document_name'), payload.get('article'))
+        return str(self.request_analysis(prompt))
+    
+    def collect_results(self, results):
+        """
+        Assemble finished paragraph jobs back into the row-level
+        'cost_driver_analysis' column, in paragraph order.
+        
+        Args:
+            results (dict): {job_key: analysis} as returned by the job queue
+            
+        Returns:
+            DataFrame: Copy of the input with the analyses attached
+        """
+        df = self.df.copy()
+        df['cost_driver_analysis'] = None
+        
+        analyses = {}
+        for job_key, result in results.items():
+            row, paragraph = (int(x) for x in job_key.split(':'))
+            analyses.setdefault(row, []).append((paragraph, result))
+        
+        for row, items in analyses.items():
+            df.at[row, 'cost_driver_analysis'] = [result for _, result in sorted(items)]
+        
+        duplicates = duplicate_rows(df)
+        for row, canonical in duplicates.items():
+            if canonical in analyses:
+                df.at[row, 'cost_driver_analysis'] = [result for _, result in sorted(analyses[canonical])]
+        
+        print(f"Collected results for {len(analyses)} rows"
+              + (f" ({len(duplicates)} duplicate rows reuse them)" if duplicates else ""))
+        return df
+    
+    def process_with_queue(self, queue_path, output_file, enqueue=True, work=True, sleep_interval=0):
+        """
+        Run the analysis through a shared job queue.
+        
+        Start this in several processes (or on several machines sharing the
+        queue file); each one pulls paragraphs until none are left. Whichever
+        worker finds the queue drained writes the combined output file.
+        
+        Args:
+            queue_path (str): Path to the SQLite queue file
+            output_file (str): Path of the final Excel file
+            enqueue (bool): Add this input's paragraphs to the queue first
+            work (bool): Process jobs in this process
+            sleep_interval (float): Minimum seconds between API calls
+        """
+        results = process_via_queue(queue_path, STAGE_ANALYSIS, self.iter_jobs(), self.analyze_job,
+                                    enqueue=enqueue, work=work, sleep_interval=sleep_interval)
+        if results is None:
+            return None
+        
+        final_df = self.collect_results(results)
+        final_df.to_excel(output_file, index=False)
+        print(f"Results saved to Excel: {output_file}")
+        return final_df
@@ -0,0 +1,198 @@
+"""
+Deterministic nominal-cost extraction for the cost inference stage.
+
+Expanded cost drivers often state their figures explicitly, e.g.
+"EUR 5,000–20,000 per year [3][7]". This module finds currency amounts,
+ranges and percentages together with the citation markers next to them and
+scores how unambiguous the result is, so only low-confidence rows need to go
+to Gemini. The same input always gives the same output.
+"""
+
+import re
+from dataclasses import asdict, dataclass
+
+# --- Patterns ---
+# Currency words must stand alone: the "rm" in "form 12" is not ringgit
+_CURRENCY = r'(?:US\$|€|\$|£|(?<![A-Za-z])(?:EUR|USD|GBP|IDR|MYR|Rp\.?|RM|euros?|dollars?)(?![A-Za-z]))'
+_NUMBER = r'\d{1,3}(?:[,.]\d{3})+(?:\.\d+)?|\d+(?:[.,]\d+)?'
+_MULTIPLIER = r'(?:\s?(?:thousand|million|billion|mn|bn|k|M)\b)?'
+_DASH = r'\s?(?:–|—|-|to)\s?'
+_AMOUNT = rf'(?:{_CURRENCY}\s?(?:{_NUMBER}){_MULTIPLIER}|(?:{_NUMBER}){_MULTIPLIER}\s?{_CURRENCY})'
+_RANGE = rf'(?:{_CURRENCY}\s?)?(?:{_NUMBER}){_MULTIPLIER}(?:\s?{_CURRENCY})?{_DASH}(?:{_CURRENCY}\s?)?(?:{_NUMBER}){_MULTIPLIER}(?:\s?{_CURRENCY})?'
+_PERCENT = rf'(?:{_NUMBER})(?:\s?%?{_DASH}(?:{_NUMBER}))?\s?(?:%|percent\b|per cent\b)'
+_UNIT = (
+    r'(?:\s?(?:per|/|a|each)\s(?:year|annum|month|week|day|hectare|ha|audit|shipment|consignment|tonne|ton|'
+    r'farm|farmer|supplier|plot|operator|company|employee|statement|product|batch)\b'
+    r'|\s?annually|\s?yearly|\s?monthly|\s?one-off|\s?one-time'
+    r'|\s?of\s(?:(?:annual|total|their)\s)?(?:revenues?|turnover|sales|costs|production costs|export value|profits?)\b)?'
+)
+FIGURE_PATTERN = re.compile(
+    rf'(?P<figure>(?P<percent>{_PERCENT})|(?P<range>{_RANGE})|(?P<amount>{_AMOUNT}))(?P<unit>{_UNIT})',
+    re.IGNORECASE,
+)
+ADJACENT_MARKERS_PATTERN = re.compile(r'^\s*[,;:)]?\s*((?:\s?\[\d+\])+)')
+MARKERS_PATTERN = re.compile(r'(?:\s?\[\d+\])+')
+SENTENCE_END_PATTERN = re.compile(r'(?<=[.!?])\s+(?=[A-Z\[(])|\n')
+
+# A range needs a currency or unit somewhere to count as a cost rather than e.g. a year span,
+# and a currency to be trusted without the LLM ("Article 3 to 5 per operator" has only a unit)
+_HAS_CURRENCY = re.compile(_CURRENCY, re.IGNORECASE)
+
+# --- Keyword Vocabularies (first match wins) ---
+COST_TYPE_KEYWORDS = [
+    ("Audit Fees", ("audit", "verification", "certification", "inspection")),
+    ("Software licensing", ("software", "licen", "platform", "subscription")),
+    ("Data collection", ("geolocation", "satellite", "mapping", "gps", "polygon", "data collection", "monitoring")),
+    ("Staff training", ("training", "capacity building", "staff")),
+    ("Compliance Setup", ("due diligence", "set-up", "setup", "implementation", "system")),
+    ("Legal", ("legal", "lawyer", "counsel")),
+    ("Penalties", ("penalt", "fine")),
+    ("Operational", ("logistics", "segregation", "traceability", "record", "operational", "administrative")),
+]
+COST_IMPACT_KEYWORDS = [
+    ("Disproportionate burden", ("disproportionate",)),
+    ("High", ("prohibitive", "significant", "substantial", "high", "major", "considerable")),
+    ("Medium", ("moderate", "medium")),
+    ("Low", ("low", "minor", "negligible", "marginal")),
+]
+
+# --- Scoring ---
+LOCAL_CONFIDENCE_THRESHOLD = 0.75 # Rows scoring below this are sent to the LLM
+_BASE_SCORE = {"range": 0.45, "amount": 0.45, "percent": 0.4}
+_ADJACENT_MARKER_BONUS = 0.3
+_SENTENCE_MARKER_BONUS = 0.15
+_UNIT_BONUS = 0.1
+_CONTEXT_BONUS = 0.1
+_COST_TYPE_BONUS = 0.05
+_AMBIGUITY_PENALTY = 0.2 # Per additional cited figure in the text
+_NO_CURRENCY_MAX_SCORE = 0.5 # Ranges with a unit but no currency always go to the LLM
+
+
+@dataclass(frozen=True)
+class LocalCostExtraction:
+    """Result of the deterministic extractor; fields mirror the Gemini answer."""
+    nominal_cost: str
+    cost_impact: str
+    cost_type: str
+    nominal_cost_citation: str
+    confidence: float
+    candidates: int
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def _sentence_bounds(text, start, end):
+    """Start and end offsets of the sentence containing text[start:end]."""
+    sentence_start = 0
+    for match in SENTENCE_END_PATTERN.finditer(text, 0, start):
+        sentence_start = match.end()
+    following = SENTENCE_END_PATTERN.search(text, end)
+    return sentence_start, following.start() if following else len(text)
+
+
+def _keyword_label(text, vocabulary):
+    lowered = text.lower()
+    for label, keywords in vocabulary:
+        if any(keyword in lowered for keyword in keywords):
+            return label
+    return "N/A"
+
+
+def _normalize_markers(markers):
+    return "".join(re.findall(r'\[\d+\]', markers))
+
+
+def _context_words(*context):
+    words = set()
+    for value in context:
+        if isinstance(value, str):
+            words.update(w for w in re.findall(r'[a-z]{4,}', value.lower()))
+    return words
+
+
+def find_cost_figures(text, context_words=frozenset()):
+    """
+    Find every cost figure in `text` with its citation markers and score.
+
+    Returns:
+        list: One dict per figure with figure, kind, markers, sentence and score
+    """
+    figures = []
+    for match in FIGURE_PATTERN.finditer(text):
+        kind = next(k for k in ("range", "percent", "amount") if match.group(k))
+        figure = match.group('figure').strip()
+        unit = match.group('unit').strip()
+        has_currency = kind != "range" or bool(_HAS_CURRENCY.search(figure))
+        if not (has_currency or unit):
+            continue
+
+        sentence_start, sentence_end = _sentence_bounds(text, match.start(), match.end())
+        sentence = text[sentence_start:sentence_end]
+        score = _BASE_SCORE[kind]
+
+        adjacent = ADJACENT_MARKERS_PATTERN.match(text[match.end():match.end() + 40])
+        markers = ""
+        if adjacent:
+            markers = _normalize_markers(adjacent.group(1))
+            score += _ADJACENT_MARKER_BONUS
+        else:
+            later = MARKERS_PATTERN.search(text, match.end(), sentence_end)
+            if later:
+                markers = _normalize_markers(later.group(0))
+                score += _SENTENCE_MARKER_BONUS
+        if unit:
+            score += _UNIT_BONUS
+        if context_words and context_words & _context_words(sentence):
+            score += _CONTEXT_BONUS
+        if not has_currency:
+            score = min(score, _NO_CURRENCY_MAX_SCORE)
+
+        figures.append({
+            "figure": f"{figure} {unit}".strip(),
+            "kind": kind,
+            "markers": markers,
+            "sentence": sentence,
+            "score": score,
+        })
+    return figures
+
+
+def extract_nominal_cost(text, cost_driver=None, process=None):
+    """
+    Extract the most likely nominal cost, its citation and a confidence score.
+
+    Args:
+        text (str): The expanded 'Output Content' text
+        cost_driver (str): Matched cost driver, used to prefer relevant sentences
+        process (str): Process description, used the same way
+
+    Returns:
+        LocalCostExtraction: "N/A" fields and confidence 0 if no figure was found
+    """
+    if not isinstance(text, str) or not text.strip():
+        return LocalCostExtraction("N/A", "N/A", "N/A", "N/A", 0.0, 0)
+
+    figures = find_cost_figures(text, _context_words(cost_driver, process))
+    if not figures:
+        return LocalCostExtraction("N/A", "N/A", "N/A", "N/A", 0.0, 0)
+
+    best = max(figures, key=lambda f: f["score"])
+    # Several distinct cited figures mean the choice depends on context the LLM handles better
+    cited = {f["figure"] for f in figures if f["markers"]}
+    confidence = best["score"] - _AMBIGUITY_PENALTY * max(0, len(cited) - 1)
+
+    cost_type = _keyword_label(best["sentence"], COST_TYPE_KEYWORDS)
+    if cost_type == "N/A" and isinstance(cost_driver, str):
+        cost_type = _keyword_label(cost_driver, COST_TYPE_KEYWORDS)
+    if cost_type != "N/A":
+        confidence += _COST_TYPE_BONUS
+
+    return LocalCostExtraction(
+        nominal_cost=best["figure"],
+        cost_impact=_keyword_label(best["sentence"], COST_IMPACT_KEYWORDS),
+        cost_type=cost_type,
+        nominal_cost_citation=best["markers"] or "N/A",
+        confidence=round(max(0.0, min(1.0, confidence)), 3),
+        candidates=len(figures),
+    )
@@ -0,0 +1,710 @@
+"""
+Stage 6: infer nominal cost, cost impact and cost type for every matched
+process with Gemini, then map the nominal-cost citation markers to URLs.
+"""
+
+import ast
+import json
+import os
+import re
+from dataclasses import asdict, dataclass
+
+import pandas as pd
+from tqdm import tqdm # Optional: for a progress bar
+
+from gohijau.clients import gemini_sdk, get_cached_gemini_model, get_gemini_model, release_context_caches
+from gohijau.concurrency import adaptive_map, get_controller
+from gohijau.config import COST_INFERENCE_FILE, GEMINI_MODEL, PROCESS_MATCH_FILE
+from gohijau.eudr.cost_extractor import LOCAL_CONFIDENCE_THRESHOLD, extract_nominal_cost
+from gohijau.hedging import get_latency_policy
+from gohijau.jobqueue import STAGE_COST, JobQueue, process_via_queue
+
+# --- File and Sheet Configuration ---
+INPUT_SHEET = 'Processed_Results'       # The sheet name from the PREVIOUS step's output
+FINAL_OUTPUT_SHEET = 'Cost_Inference_Results'
+
+# --- Column Name Configuration ---
+# Input columns from INPUT_FILE needed for analysis and context
+OUTPUT_CONTENT_TO_ANALYZE_COLUMN = 'Output Content' # Text to analyze
+CONTEXT_COST_DRIVER_COLUMN = 'Cost Driver'          # Context
+CONTEXT_ROLES_COLUMN = 'Roles'                      # Context - **ENSURE THIS COLUMN EXISTS**
+CONTEXT_STAGE_COLUMN = 'Stage'                      # Context - **ENSURE THIS COLUMN EXISTS**
+CONTEXT_PROCESS_COLUMN = 'Process'             # Context - **ENSURE THIS COLUMN EXISTS (Original Process Desc)**
+# This column contains the list-like string of URLs, e.g., "['url1', 'url2']"
+# It's needed for the *final mapping step*, not the AI call itself.
+SOURCE_CITATIONS_LIST_COLUMN = 'Citations'          # **ENSURE THIS COLUMN EXISTS**
+
+# New output columns created by AI inference
+NEW_NOMINAL_COST_COLUMN = 'Inferred Nominal Cost'
+NEW_COST_IMPACT_COLUMN = 'Inferred Cost Impact'
+NEW_COST_TYPE_COLUMN = 'Inferred Cost Type'
+NEW_NOMINAL_COST_REF_COLUMN = 'reference of nominal value' # Citation marker (e.g., "[3][7]")
+INFERENCE_SOURCE_COLUMN = 'Inference Source' # "local" (deterministic extractor) or "gemini"
+LOCAL_CONFIDENCE_COLUMN = 'Local Extraction Confidence'
+
+# New column created by post-processing (mapping markers to URLs)
+MAPPED_NOMINAL_COST_URLS_COLUMN = 'Mapped Nominal Cost Citations' # <-- New final column
+
+# --- API Settings ---
+API_DELAY_SECONDS = 0 # Minimum seconds between calls; concurrency adapts to the API (gohijau.concurrency)
+
+# --- Local Extraction Settings ---
+LOCAL_EXTRACTION = True # Rows whose figures the local extractor is confident about skip Gemini
+
+# --- Structured Output Settings ---
+STRUCTURED_OUTPUT = True # Pass COST_INFERENCE_SCHEMA as the response schema
+REPAIR_ATTEMPTS = 2 # Re-asks per row whose answer fails to parse or validate
+COST_INFERENCE_FIELDS = ("nominal_cost", "cost_impact", "cost_type", "nominal_cost_citation")
+COST_INFERENCE_SCHEMA = {
+    "type": "object",
+    "properties": {field: {"type": "string"} for field in COST_INFERENCE_FIELDS},
+    "required": list(COST_INFERENCE_FIELDS),
+}
+# Errors worth re-asking the model about; API/safety failures are not
+REPAIRABLE_ERRORS = ("JSON_DECODE_ERROR", "INVALID_JSON_STRUCTURE", "JSON_PROCESSING_ERROR",
+                     "SCHEMA_VALIDATION_ERROR")
+FAILED_PREFIX = "Failed ("
+CITATION_MARKERS_PATTERN = re.compile(r'^(\[\d+\])+$')
+
+safety_settings = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+    # ... other settings ...
+]
+
+
+def load_input(path=PROCESS_MATCH_FILE, sheet=INPUT_SHEET):
+    """Load the process-match output and check the columns needed for inference and mapping."""
+    # Check if input file exists
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Input file not found: {path}. Make sure the output from the previous script exists.")
+
+    print(f"Loading data from: {path} (Sheet: {sheet})")
+    df = pd.read_excel(path, sheet_name=sheet)
+    # Check if all required input columns exist for AI + Mapping
+    required_input_cols = [
+        OUTPUT_CONTENT_TO_ANALYZE_COLUMN,
+        CONTEXT_COST_DRIVER_COLUMN,
+        CONTEXT_ROLES_COLUMN,
+        CONTEXT_STAGE_COLUMN,
+        CONTEXT_PROCESS_COLUMN,
+        SOURCE_CITATIONS_LIST_COLUMN # Needed for final mapping
+    ]
+    missing_cols = [col for col in required_input_cols if col not in df.columns]
+    if missing_cols:
+        raise ValueError(f"Missing required columns in {path} (Sheet: {sheet}): {', '.join(missing_cols)}. Please ensure these columns exist.")
+
+    print(f"Loaded {len(df)} rows for cost inference.")
+    return df
+
+
+# --- Prompt Functions ---
+# Task and format instructions shared by every row. They come first so the
+# prompt prefix is byte-identical across requests and cacheable.
+COST_INFERENCE_PROMPT_PREFIX = """
+    Analyze the 'Output Content' text given at the end to extract cost information, using the provided context.
+
+    **Your Task:**
+    Extract the following information from the 'Output Content', ensuring it is **directly relevant** to the provided Context (Cost Driver, Roles, Stage, Process). If multiple costs are mentioned, prioritize the one most applicable to the context.
+
+    1.  **Nominal Cost:** Identify any specific monetary values, ranges, percentages, or quantitative cost figures mentioned (e.g., "€10,000–€150,000 annually", "0.1% of annual revenues", "$500 per audit"). If no relevant nominal cost is found, use "N/A".
+    2.  **Cost Impact:** Describe the qualitative impact or level of the cost (e.g., "Medium to high", "Disproportionate burdens for smaller exporters", "Significant operational adjustment"). If no relevant impact description is found, use "N/A".
+    3.  **Cost Type:** Categorize the type of cost described (e.g., "Software licensing", "Data collection", "Staff training", "Operational", "Compliance Setup", "Audit Fees"). If no relevant cost type can be clearly identified, use "N/A".
+    4.  **Nominal Cost Citation:** Identify the citation marker (e.g., "[1]", "[3][7]") found *within the 'Output Content' text* that is directly associated with the extracted Nominal Cost value from step 1. Look for the marker immediately following or very close to the cost figure. If the nominal cost itself is "N/A" or has no clear citation marker nearby or associated with it in the text, use "N/A".
+
+    **Output Format:**
+    Return your answer ONLY as a valid JSON object with the following keys: "nominal_cost", "cost_impact", "cost_type", "nominal_cost_citation". Use "N/A" as the string value for any field where relevant information cannot be extracted based on the text and the provided context.
+
+    Example Output 1:
+    {
+      "nominal_cost": "€10,000–€150,000 annually",
+      "cost_impact": "Medium to high",
+      "cost_type": "Software licensing",
+      "nominal_cost_citation": "[3][7]"
+    }
+"""
+
+
+def build_cost_inference_prompt_parts(output_content_text, cost_driver, roles, stage, process):
+    """
+    Split the cost inference prompt into (static prefix, dynamic suffix).
+    """
+    cost_driver = str(cost_driver) if pd.notna(cost_driver) else "N/A"
+    roles = str(roles) if pd.notna(roles) else "N/A"
+    stage = str(stage) if pd.notna(stage) else "N/A"
+    process = str(process) if pd.notna(process) else "N/A"
+
+    dynamic = f"""
+    **Context for Relevance (Use this to guide your extraction):**
+    *   **Cost Driver:** {cost_driver}
+    *   **Company Role(s):** {roles}
+    *   **Process Stage:** {stage}
+    *   **Specific Process:** {process}
+
+    **Output Content to Analyze:**
+    \"\"\"
+    {output_content_text}
+    \"\"\"
+    """
+    return COST_INFERENCE_PROMPT_PREFIX, dynamic
+
+
+def build_cost_inference_prompt(output_content_text, cost_driver, roles, stage, process):
+    """Creates the prompt for Gemini cost inference (static instructions first)."""
+    static, dynamic = build_cost_inference_prompt_parts(output_content_text, cost_driver, roles, stage, process)
+    return static + dynamic
+
+
+@dataclass(frozen=True)
+class CostInference:
+    """One validated cost inference answer; "N/A" marks missing information."""
+    nominal_cost: str
+    cost_impact: str
+    cost_type: str
+    nominal_cost_citation: str
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Validate and normalize a parsed JSON answer.
+
+        Numbers are accepted as strings, empty values become "N/A" and
+        citation markers are normalized to the "[3][7]" form.
+
+        Raises:
+            ValueError: If a field is missing or has an unusable value
+        """
+        if not isinstance(data, dict):
+            raise ValueError(f"expected a JSON object, got {type(data).__name__}")
+        problems = []
+        values = {}
+        for field in COST_INFERENCE_FIELDS:
+            if field not in data:
+                problems.append(f"missing '{field}'")
+                continue
+            value = data[field]
+            if value is None:
+                value = "N/A"
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                value = str(value)
+            elif not isinstance(value, str):
+                problems.append(f"'{field}' must be a string, got {type(value).__name__}")
+                continue
+            values[field] = value.strip() or "N/A"
+
+        citation = values.get("nominal_cost_citation")
+        if citation is not None and citation != "N/A":
+            citation = re.sub(r'\s+', '', citation)
+            if citation.isdigit():
+                citation = f"[{citation}]"
+            if not CITATION_MARKERS_PATTERN.match(citation):
+                problems.append(f"'nominal_cost_citation' must be \"N/A\" or markers like \"[3][7]\", got {citation!r}")
+            values["nominal_cost_citation"] = citation
+        if problems:
+            raise ValueError("; ".join(problems))
+
+        # A citation without a nominal cost has nothing to refer to
+        if values["nominal_cost"] == "N/A":
+            values["nominal_cost_citation"] = "N/A"
+        return cls(**values)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def validate_inference(inference_result):
+    """
+    Check a `get_gemini_cost_inference` result against `CostInference`.
+
+    Returns:
+        dict: The normalized fields, or an {"error": ...} dict. Existing
+        errors are passed through unchanged.
+    """
+    if isinstance(inference_result, dict) and "error" in inference_result:
+        return inference_result
+    try:
+        return CostInference.from_dict(inference_result).to_dict()
+    except ValueError as e:
+        return {"error": "SCHEMA_VALIDATION_ERROR", "detail": str(e),
+                "raw_text": json.dumps(inference_result, ensure_ascii=False)}
+
+
+def build_repair_prompt(prompt_text, failed_result):
+    """Re-ask with the original prompt plus the invalid answer and what was wrong with it."""
+    problem = failed_result.get("detail") or failed_result["error"]
+    previous = failed_result.get("raw_text", "")
+    return f"""{prompt_text}
+
+    Your previous answer could not be used ({problem}):
+    \"\"\"
+    {previous}
+    \"\"\"
+
+    Return ONLY a valid JSON object with exactly the string keys "nominal_cost", "cost_impact", "cost_type" and "nominal_cost_citation". Use "N/A" where information is missing, and only markers such as "[3]" or "[3][7]" for the citation.
+    """
+
+
+def infer_row(prompt_text, model_name=GEMINI_MODEL, structured=STRUCTURED_OUTPUT, repair_attempts=REPAIR_ATTEMPTS,
+              context_cache=True):
+    """
+    Infer and validate one row, re-asking up to `repair_attempts` times when
+    the answer fails to parse or validate.
+
+    Returns:
+        dict: Validated fields, or the last {"error": ...} dict
+    """
+    cached_prefix = COST_INFERENCE_PROMPT_PREFIX if context_cache else None
+    result = validate_inference(get_gemini_cost_inference(prompt_text, model_name, structured, cached_prefix))
+    for attempt in range(repair_attempts):
+        if result.get("error") not in REPAIRABLE_ERRORS:
+            break
+        print(f"  REPAIR {attempt + 1}/{repair_attempts}: {result.get('detail') or result['error']}")
+        # The repair prompt starts with the original one, so it shares the cached prefix too
+        repair_prompt = build_repair_prompt(prompt_text, result)
+        result = validate_inference(get_gemini_cost_inference(repair_prompt, model_name, structured, cached_prefix))
+    return result
+
+
+def get_gemini_cost_inference(prompt_text, model_name=GEMINI_MODEL, structured=STRUCTURED_OUTPUT,
+                              cached_prefix=None):
+    """
+    Sends prompt to Gemini and attempts to parse the JSON response.
+
+    If `cached_prefix` is given and a Gemini context cache can hold it, only
+    the rest of the prompt is sent.
+    """
+    # (Error handling remains the same as before)
+    try:
+        model = None
+        if cached_prefix and prompt_text.startswith(cached_prefix):
+            model = get_cached_gemini_model(model_name, cached_prefix)
+            if model is not None:
+                prompt_text = prompt_text[len(cached_prefix):]
+        if model is None:
+            model = get_gemini_model(model_name)
+        generation_config = gemini_sdk().GenerationConfig(
+            response_mime_type="application/json",
+            # Constrain decoding to the four string fields instead of relying on the prompt alone
+            response_schema=COST_INFERENCE_SCHEMA if structured else None,
+            temperature=0
+        )
+        def send(timeout):
+            with get_controller(STAGE_COST).observe():
+                return model.generate_content(
+                    prompt_text,
+                    generation_config=generation_config,
+                    safety_settings=safety_settings,
+                    request_options={'timeout': timeout}
+                )
+
+        # Adaptive timeout from the stage's latency percentiles; slow calls may be hedged
+        response = get_latency_policy(STAGE_COST).call(send)
+        # ... (rest of the function is identical to the previous version) ...
+        if response.parts:
+            try:
+                cost_data = json.loads(response.text)
+                if isinstance(cost_data, dict):
+                    return cost_data
+                else:
+                    return {"error": "INVALID_JSON_STRUCTURE", "raw_text": response.text}
+            except json.JSONDecodeError as json_err:
+                return {"error": "JSON_DECODE_ERROR", "raw_text": response.text}
+            except Exception as e:
+                 return {"error": "JSON_PROCESSING_ERROR", "raw_text": response.text}
+        elif response.prompt_feedback and response.prompt_feedback.block_reason:
+             return {"error": "BLOCKED_BY_SAFETY"}
+        else:
+             if response.candidates and response.candidates[0].finish_reason.name != "STOP":
+                 reason = response.candidates[0].finish_reason.name
+                 return {"error": f"GENERATION_STOPPED_{reason}"}
+             return {"error": "NO_RESPONSE"}
+    except Exception as e:
+        return {"error": "API_ERROR"}
+
+
+def _has_content(output_content):
+    return pd.notna(output_content) and str(output_content).strip()
+
+
+def _row_prompt(row):
+    return build_cost_inference_prompt(
+        row[OUTPUT_CONTENT_TO_ANALYZE_COLUMN],
+        row[CONTEXT_COST_DRIVER_COLUMN],
+        row[CONTEXT_ROLES_COLUMN],
+        row[CONTEXT_STAGE_COLUMN],
+        row[CONTEXT_PROCESS_COLUMN],
+    )
+
+
+def iter_prompt_parts(df, local=LOCAL_EXTRACTION, local_threshold=LOCAL_CONFIDENCE_THRESHOLD):
+    """
+    Yield (static, dynamic) prompt text for every row that would be sent to
+    Gemini, i.e. rows with content that the local extractor does not handle.
+    """
+    for _, row in df.iterrows():
+        if not _has_content(row[OUTPUT_CONTENT_TO_ANALYZE_COLUMN]):
+            continue
+        if local:
+            extraction = extract_nominal_cost(row[OUTPUT_CONTENT_TO_ANALYZE_COLUMN], row[CONTEXT_COST_DRIVER_COLUMN],
+                                              row[CONTEXT_PROCESS_COLUMN])
+            if extraction.confidence >= local_threshold:
+                continue
+        yield build_cost_inference_prompt_parts(
+            row[OUTPUT_CONTENT_TO_ANALYZE_COLUMN],
+            row[CONTEXT_COST_DRIVER_COLUMN],
+            row[CONTEXT_ROLES_COLUMN],
+            row[CONTEXT_STAGE_COLUMN],
+            row[CONTEXT_PROCESS_COLUMN],
+        )
+
+
+def parse_inference_result(inference_result):
+    """
+    Turn a Gemini inference result into the four output values.
+
+    Returns:
+        tuple: (nominal cost, cost impact, cost type, citation marker)
+    """
+    # Parse results
+    if isinstance(inference_result, dict) and "error" not in inference_result:
+        nominal_cost = inference_result.get("nominal_cost", "N/A")
+        cost_impact = inference_result.get("cost_impact", "N/A")
+        cost_type = inference_result.get("cost_type", "N/A")
+        nominal_cost_ref_marker = inference_result.get("nominal_cost_citation", "N/A") # Get the marker "[x][y]"
+        print(f"  SUCCESS: Extracted - Cost: '{nominal_cost}', Impact: '{cost_impact}', Type: '{cost_type}', Marker: '{nominal_cost_ref_marker}'")
+        return nominal_cost, cost_impact, cost_type, nominal_cost_ref_marker
+    elif isinstance(inference_result, dict) and "error" in inference_result:
+        status = f"Failed ({inference_result['error']})"
+        print(f"  FAILED: Reason: {status}")
+    else:
+        status = "Failed (Unknown Error)"
+        print(f"  FAILED: Unknown error state. Result: {inference_result}")
+    # Mark marker as failed too
+    return status, status, status, status
+
+
+def attach_results(df, results, sources=None, confidences=None):
+    """Add AI inference results (and where each came from) to the DataFrame."""
+    df[NEW_NOMINAL_COST_COLUMN] = [r[0] for r in results]
+    df[NEW_COST_IMPACT_COLUMN] = [r[1] for r in results]
+    df[NEW_COST_TYPE_COLUMN] = [r[2] for r in results]
+    df[NEW_NOMINAL_COST_REF_COLUMN] = [r[3] for r in results] # Store the marker
+    if sources is not None:
+        df[INFERENCE_SOURCE_COLUMN] = sources
+        df[LOCAL_CONFIDENCE_COLUMN] = confidences
+    return df
+
+
+def local_inference(row, threshold=LOCAL_CONFIDENCE_THRESHOLD):
+    """
+    Run the deterministic extractor on a row.
+
+    Returns:
+        tuple: (result tuple or None if below `threshold`, confidence)
+    """
+    extraction = extract_nominal_cost(row[OUTPUT_CONTENT_TO_ANALYZE_COLUMN], row[CONTEXT_COST_DRIVER_COLUMN],
+                                      row[CONTEXT_PROCESS_COLUMN])
+    if extraction.confidence < threshold:
+        return None, extraction.confidence
+    print(f"  LOCAL: Extracted - Cost: '{extraction.nominal_cost}', Marker: '{extraction.nominal_cost_citation}' "
+          f"(confidence {extraction.confidence})")
+    result = (extraction.nominal_cost, extraction.cost_impact, extraction.cost_type,
+              extraction.nominal_cost_citation)
+    return result, extraction.confidence
+
+
+def _previous_source(row):
+    return row.get(INFERENCE_SOURCE_COLUMN, ""), row.get(LOCAL_CONFIDENCE_COLUMN)
+
+
+def is_failed_row(row):
+    """True if a previous run left this row with a "Failed (...)" result."""
+    value = row.get(NEW_NOMINAL_COST_COLUMN)
+    return isinstance(value, str) and value.startswith(FAILED_PREFIX)
+
+
+def _previous_result(row):
+    return tuple(row[column] for column in (NEW_NOMINAL_COST_COLUMN, NEW_COST_IMPACT_COLUMN,
+                                            NEW_COST_TYPE_COLUMN, NEW_NOMINAL_COST_REF_COLUMN))
+
+
+def infer_costs(df, model_name=GEMINI_MODEL, delay_seconds=API_DELAY_SECONDS, structured=STRUCTURED_OUTPUT,
+                repair_attempts=REPAIR_ATTEMPTS, only_failed=False, local=LOCAL_EXTRACTION,
+                local_threshold=LOCAL_CONFIDENCE_THRESHOLD, context_cache=True):
+    """
+    Run cost inference over every row with non-empty 'Output Content'.
+
+    Rows the local extractor handles with at least `local_threshold`
+    confidence are filled without an API call; the rest go to Gemini,
+    concurrently within the stage's adaptive window.
+
+    Args:
+        df (DataFrame): Matched processes (or a previous inference output if `only_failed`)
+        model_name (str): Gemini model
+        delay_seconds (float): Minimum seconds between API calls
+        structured (bool): Constrain the answer with COST_INFERENCE_SCHEMA
+        repair_attempts (int): Re-asks per row whose answer fails to parse or validate
+        only_failed (bool): Keep existing results and only re-run rows that failed
+        local (bool): Try the deterministic extractor before Gemini
+        local_threshold (float): Minimum local confidence to skip Gemini
+        context_cache (bool): Put the shared instruction prefix in a Gemini context cache
+
+    Returns:
+        DataFrame: `df` with the inference columns
+    """
+    results = []
+    sources = []
+    confidences = []
+    only_failed = only_failed and NEW_NOMINAL_COST_COLUMN in df.columns
+
+    print("\nStarting cost inference using Gemini...")
+    gemini_rows = []
+    for position, (index, row) in enumerate(df.iterrows()):
+        # Set default values for this row's results
+        result = ("N/A", "N/A", "N/A", "N/A")
+        source, confidence = "", None
+
+        if only_failed and not is_failed_row(row):
+            # Keep the earlier result
+            result = _previous_result(row)
+            source, confidence = _previous_source(row)
+        # Only process if 'Output Content' is not empty/NaN
+        elif _has_content(row[OUTPUT_CONTENT_TO_ANALYZE_COLUMN]):
+            local_result = None
+            if local:
+                local_result, confidence = local_inference(row, local_threshold)
+            if local_result is not None:
+                result, source = local_result, "local"
+            else:
+                # Filled in below once Gemini answers
+                gemini_rows.append((position, _row_prompt(row)))
+                source = "gemini"
+        else:
+            print(f"\nSkipping row {index+1}/{len(df)}: Empty '{OUTPUT_CONTENT_TO_ANALYZE_COLUMN}'.")
+            # Defaults are already N/A
+
+        # Append results for this row
+        results.append(result)
+        sources.append(source)
+        confidences.append(confidence)
+
+    def infer(job):
+        return infer_row(job[1], model_name, structured, repair_attempts, context_cache)
+
+    controller = get_controller(STAGE_COST)
+    for (position, _), inference_result in tqdm(
+            adaptive_map(infer, gemini_rows, controller, ordered=False, min_interval=delay_seconds),
+            total=len(gemini_rows), desc="Inferring Costs"):
+        print(f"\nProcessed row {position+1}/{len(df)}...")
+        results[position] = parse_inference_result(inference_result)
+    print(controller.summary())
+    print(get_latency_policy(STAGE_COST).summary())
+
+    failed = sum(1 for result in results if isinstance(result[0], str) and result[0].startswith(FAILED_PREFIX))
+    if failed:
+        print(f"\n{failed} row(s) failed; rerun with only_failed=True (infer --retry-failed) to retry just those.")
+    _print_source_summary(sources)
+    return attach_results(df, results, sources, confidences)
+
+
+def _print_source_summary(sources):
+    local_rows = sources.count("local")
+    gemini_rows = sources.count("gemini")
+    if local_rows + gemini_rows:
+        print(f"Local extraction handled {local_rows} of {local_rows + gemini_rows} rows; "
+              f"{gemini_rows} went to Gemini.")
+
+
+def infer_costs_with_queue(df, queue_path, model_name=GEMINI_MODEL, enqueue=True, work=True,
+                           delay_seconds=API_DELAY_SECONDS, structured=STRUCTURED_OUTPUT,
+                           repair_attempts=REPAIR_ATTEMPTS, only_failed=False, local=LOCAL_EXTRACTION,
+                           local_threshold=LOCAL_CONFIDENCE_THRESHOLD, context_cache=True):
+    """
+    Run cost inference through a shared job queue, one job per non-empty row
+    that the local extractor cannot handle.
+
+    Returns:
+        DataFrame: `df` with the inference columns, or None while other
+        workers are still running
+    """
+    def handler(payload):
+        inference_result = infer_row(payload['prompt'], model_name, structured, repair_attempts, context_cache)
+        if "error" in inference_result:
+            raise RuntimeError(json.dumps(inference_result))
+        return inference_result
+
+    only_failed = only_failed and NEW_NOMINAL_COST_COLUMN in df.columns
+
+    def wanted(row):
+        return _has_content(row[OUTPUT_CONTENT_TO_ANALYZE_COLUMN]) and (not only_failed or is_failed_row(row))
+
+    # Local extraction is cheap and deterministic, so every worker can repeat it
+    local_results = {}
+    if local:
+        for index, row in df.iterrows():
+            if wanted(row):
+                local_results[str(index)] = local_inference(row, local_threshold)
+
+    jobs = [
+        (str(index), {'prompt': _row_prompt(row)})
+        for index, row in df.iterrows()
+        if wanted(row) and local_results.get(str(index), (None, None))[0] is None
+    ]
+    if only_failed and enqueue and jobs:
+        # The failed rows' jobs are dead in the queue, and enqueueing their keys again is a no-op
+        with JobQueue(queue_path) as queue:
+            requeued = queue.retry_dead(STAGE_COST, job_keys=[key for key, _ in jobs])
+        print(f"Requeued {requeued} dead {STAGE_COST} job(s) for the failed rows")
+    inferences = process_via_queue(queue_path, STAGE_COST, jobs, handler,
+                                   enqueue=enqueue, work=work, sleep_interval=delay_seconds)
+    if inferences is None:
+        return None
+
+    results = []
+    sources = []
+    confidences = []
+    for index, row in df.iterrows():
+        local_result, confidence = local_results.get(str(index), (None, None))
+        source = "gemini"
+        if only_failed and not is_failed_row(row):
+            results.append(_previous_result(row))
+            source, confidence = _previous_source(row)
+        elif not _has_content(row[OUTPUT_CONTENT_TO_ANALYZE_COLUMN]):
+            results.append(("N/A", "N/A", "N/A", "N/A"))
+            source = ""
+        elif local_result is not None:
+            results.append(local_result)
+            source = "local"
+        elif str(index) in inferences:
+            results.append(parse_inference_result(inferences[str(index)]))
+        else:
+            # Job is in the dead-letter state
+            results.append(parse_inference_result({"error": "API_ERROR"}))
+        sources.append(source)
+        confidences.append(confidence)
+    _print_source_summary(sources)
+    return attach_results(df, results, sources, confidences)
+
+
+# --- Post-Processing: Map Markers to URLs ---
+def map_markers_to_urls(marker_string, citation_list_string):
+    """Parses marker string (e.g., '[3][7]') and maps indices to URLs
+       from the parsed citation_list_string (e.g., "['url1', 'url2', ...]").
+    """
+    if pd.isna(marker_string) or not isinstance(marker_string, str) or marker_string.strip() == "" or marker_string == "N/A" or "Failed" in marker_string:
+        return "N/A"
+    if pd.isna(citation_list_string) or not isinstance(citation_list_string, str) or citation_list_string.strip() == "" or citation_list_string == "N/A":
+        return "N/A (Missing Citation List)"
+
+    # 1. Parse the citation list string into a Python list
+    try:
+        # Use ast.literal_eval for safe evaluation of list string
+        url_list = ast.literal_eval(citation_list_string)
+        if not isinstance(url_list, list):
+            return "N/A (Citation column not a valid list)"
+    except (ValueError, SyntaxError, TypeError):
+        return "N/A (Error parsing citation list)"
+
+    # 2. Parse the marker string to find numbers
+    try:
+        # Find all sequences of digits in the marker string
+        indices_str = re.findall(r'\d+', marker_string)
+        if not indices_str:
+            return f"N/A (No numbers found in marker: {marker_string})"
+        # Convert to 1-based integer indices
+        citation_indices = [int(i) for i in indices_str]
+    except ValueError:
+        return f"N/A (Error converting marker numbers: {marker_string})"
+    except Exception as e:
+         return f"N/A (Error parsing marker: {e})"
+
+
+    # 3. Map indices to URLs
+    mapped_urls = []
+    list_len = len(url_list)
+    for index_1based in citation_indices:
+        index_0based = index_1based - 1 # Adjust for 0-based list indexing
+        if 0 <= index_0based < list_len:
+            mapped_urls.append(f"[{index_1based}]: {url_list[index_0based]}")
+        else:
+            mapped_urls.append(f"[{index_1based}]: Error - Index out of bounds (List size: {list_len})")
+
+    return "\n".join(mapped_urls) if mapped_urls else "N/A (No valid indices mapped)"
+
+
+def map_citations(df):
+    """Apply the mapping function to create the mapped-citations column."""
+    print("\nMapping citation markers to URLs...")
+    df[MAPPED_NOMINAL_COST_URLS_COLUMN] = df.apply(
+        lambda row: map_markers_to_urls(
+            row[NEW_NOMINAL_COST_REF_COLUMN],    # The marker string "[x][y]"
+            row[SOURCE_CITATIONS_LIST_COLUMN]    # The string "['url1', 'url2', ...]"
+        ),
+        axis=1 # Apply function row-wise
+    )
+    print("Citation mapping complete.")
+    return df
+
+
+def save_results(df, output_file=COST_INFERENCE_FILE, sheet_name=FINAL_OUTPUT_SHEET):
+    """Write the final analysis to Excel and print a sample."""
+    print(f"\nSaving final analysis results to: {output_file} (Sheet: {sheet_name})")
+    try:
+        with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+        print("Processing complete. Final output file saved.")
+    except Exception as e:
+        print(f"Error saving output file: {e}")
+
+    # Display some results (optional)
+    print("\nSample of final results:")
+    print(df[[
+        # OUTPUT_CONTENT_TO_ANALYZE_COLUMN, # Maybe too long
+        CONTEXT_COST_DRIVER_COLUMN,
+        NEW_NOMINAL_COST_COLUMN,
+        # NEW_COST_IMPACT_COLUMN,
+        # NEW_COST_TYPE_COLUMN,
+        NEW_NOMINAL_COST_REF_COLUMN,       # Show the marker "[x][y]"
+        MAPPED_NOMINAL_COST_URLS_COLUMN    # Show the mapped URLs
+    ]].head())
+
+
+def run(input_file=PROCESS_MATCH_FILE, output_file=COST_INFERENCE_FILE, input_sheet=INPUT_SHEET,
+        output_sheet=FINAL_OUTPUT_SHEET, model_name=GEMINI_MODEL, limit=None, queue_path=None,
+        enqueue=True, work=True, structured=STRUCTURED_OUTPUT, repair_attempts=REPAIR_ATTEMPTS,
+        retry_failed=False, local=LOCAL_EXTRACTION, local_threshold=LOCAL_CONFIDENCE_THRESHOLD,
+        context_cache=True, store=None):
+    """
+    Load the matched processes, infer costs, map citations and save.
+
+    With `retry_failed`, the previous output file is loaded instead and only
+    its failed rows are sent to Gemini again. With a `store`
+    (gohijau.store.PipelineStore), input and output are the store's matches
+    and inferences instead of the Excel files.
+    """
+    if store is not None:
+        df = store.final_frame() if retry_failed else store.matched_frame()
+        print(f"Loaded {len(df)} rows for cost inference from {store.path}.")
+    elif retry_failed:
+        df = load_input(output_file, output_sheet)
+    else:
+        df = load_input(input_file, input_sheet)
+    if limit is not None:
+        df = df.head(limit)
+
+    options = dict(structured=structured, repair_attempts=repair_attempts, only_failed=retry_failed,
+                   local=local, local_threshold=local_threshold, context_cache=context_cache)
+    if queue_path:
+        df = infer_costs_with_queue(df, queue_path, model_name, enqueue=enqueue, work=work, **options)
+        release_context_caches()
+        if df is None:
+            return None
+    else:
+        df = infer_costs(df, model_name, **options)
+        release_context_caches()
+
+    df = map_citations(df)
+    if store is not None:
+        store.write_inferences(df)
+    else:
+        save_results(df, output_file, output_sheet)
+    return df
@@ -0,0 +1,317 @@
+"""
+Stage 4: expand each extracted cost driver with the Perplexity deep-research
+model.
+"""
+
+import os
+import re
+from typing import Dict
+
+import pandas as pd
+from tqdm import tqdm
+
+from gohijau.clients import get_perplexity_client
+from gohijau.concurrency import adaptive_map, get_controller
+from gohijau.config import EXPANSION_MODEL
+from gohijau.hedging import get_latency_policy
+from gohijau.jobqueue import STAGE_EXPANSION, process_via_queue
+
+EXPANSION_SYSTEM_PROMPT = "You are an expert in EUDR compliance, international trade, and cost analysis for non-EU exporters. Provide detailed, well-cited responses with practical insights. Always include your final response within <output></output> XML tags."
+
+# Instructions shared by every expansion request. They come before the cost
+# driver so the prompt prefix is byte-identical across requests and cacheable.
+EXPANSION_PROMPT_PREFIX = """I am analyzing cost drivers for EUDR (European Union Deforestation Regulation) compliance and their potential ad valorem rate implications for non-EU exporters.
+
+You can think through your analysis first before providing the final output. 
+
+Your final response MUST be wrapped in <output></output> XML tags. Only the content within these tags will be shown to the end user.
+
+Within your <output> tags, please provide:
+1. A detailed explanation of what the cost driver below means in the context of EUDR compliance
+2. Potential cost items that would be incurred by non-EU exporters
+3. Estimated impact on operational costs for exporters (low/medium/high)
+4. A "Citations" section with relevant sources from EUDR documentation
+
+Please structure your response with clear sections.
+
+"""
+
+def extract_output_content(raw_response):
+    """Extract content between <output> and </output> tags."""
+    if not raw_response:
+        return None
+        
+    output_match = re.search(r'<output>(.*?)</output>', raw_response, re.DOTALL)
+    if output_match:
+        return output_match.group(1).strip()
+    return None
+
+def expand_cost_driver(cost_driver: str, reasoning: str, document_name: str = None, article: str = None):
+    """
+    Use Perplexity API to expand on a cost driver using its reasoning and context.
+    
+    Args:
+        cost_driver (str): The cost driver to expand
+        reasoning (str): The reasoning/explanation for the cost driver
+        document_name (str): Optional document name for context
+        article (str): Optional article reference for context
+        
+    Returns:
+        tuple: (raw response, output content, citations)
+    """
+    if not cost_driver or pd.isna(cost_driver) or cost_driver == 'NA':
+        return None, None, None
+        
+    prompt = build_expansion_prompt(cost_driver, reasoning, document_name, article)
+
+    try:
+        return request_expansion(prompt)
+    except Exception as e:
+        print(f"Error expanding cost driver: {e}")
+        return None, None, None
+
+def build_expansion_prompt_parts(cost_driver: str, reasoning: str, document_name: str = None, article: str = None):
+    """
+    Split the expansion prompt into the static instructions (identical for
+    every driver) and the dynamic cost driver and context.
+    
+    Returns:
+        tuple: (static prefix, dynamic suffix)
+    """
+    # Build context string including document and article info if available
+    context = ""
+    if document_name and not pd.isna(document_name):
+        context += f"Document: {document_name}\n"
+    if article and not pd.isna(article):
+        context += f"Article: {article}\n"
+    context += f"Reasoning: {reasoning}"
+    
+    dynamic = f"""Cost Driver: {cost_driver}
+Context: {context}"""
+    return EXPANSION_PROMPT_PREFIX, dynamic
+
+def build_expansion_prompt(cost_driver: str, reasoning: str, document_name: str = None, article: str = None):
+    """Build the expansion prompt for one cost driver (static instructions first)."""
+    static, dynamic = build_expansion_prompt_parts(cost_driver, reasoning, document_name, article)
+    return static + dynamic
+
+def request_expansion(prompt: str):
+    """
+    Send an expansion prompt to Perplexity under the stage's adaptive
+    timeout. Raises on API errors and timeouts.
+    
+    Returns:
+        tuple: (raw response, output content, citations)
+    """
+    def send(timeout):
+        with get_controller(STAGE_EXPANSION).observe():
+            return get_perplexity_client().chat.completions.create(
+                model=EXPANSION_MODEL,  # Using Perplexity's research model
+                messages=[
+                    {
+                        "role": "system",
+                        "content": EXPANSION_SYSTEM_PROMPT
+                    },
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ],
+                temperature=0.1,
+                timeout=timeout
+            )
+    
+    # One stuck deep-research call must not stall the run: adaptive timeout, optional hedging
+    response = get_latency_policy(STAGE_EXPANSION).call(send)
+    
+    # Get the text content
+    raw_response = response.choices[0].message.content.strip()
+    
+    # Extract the content between <output> tags
+    output_content = extract_output_content(raw_response)
+    
+    # Get the citations as a string
+    citations = None
+    if hasattr(response, 'citations'):
+        citations = str(response.citations)
+    
+    # Return all three components
+    return raw_response, output_content, citations
+
+def process_excel(input_file: str, output_file: str, batch_size: int = 10, test_rows: int = None):
+    """
+    Process the Excel file and expand cost drivers using Perplexity API.
+    
+    Args:
+        input_file (str): Path to input Excel file
+        output_file (str): Path to output Excel file
+        batch_size (int): Number of rows to process before saving checkpoint
+        test_rows (int): Number of rows to process for testing, if None process all rows
+    """
+    # Read the Excel file
+    print(f"Reading Excel file: {input_file}")
+    df = pd.read_excel(input_file)
+    
+    # Ensure required columns exist
+    required_cols = ['cost_driver', 'reasoning']
+    if not all(col in df.columns for col in required_cols):
+        raise ValueError(f"Missing required columns: {required_cols}")
+    
+    # Limit rows for testing if specified
+    if test_rows is not None:
+        df = df.head(test_rows)
+    
+    checkpoint_prefix = os.path.splitext(output_file)[0]
+    df = expand_dataframe(df, batch_size=batch_size, checkpoint_prefix=checkpoint_prefix)
+    
+    # Save final results
+    df.to_excel(output_file, index=False)
+    print(f"\nProcessing complete. Results saved to {output_file}")
+
+def expand_dataframe(df: pd.DataFrame, batch_size: int = 10, checkpoint_prefix: str = None,
+                     sleep_interval: float = 0) -> pd.DataFrame:
+    """
+    Expand every non-NA cost driver row of `df`.
+    
+    Args:
+        df (DataFrame): Extracted cost drivers with 'cost_driver' and 'reasoning'
+        batch_size (int): Number of rows to process before saving checkpoint
+        checkpoint_prefix (str): Checkpoint path prefix; no checkpoints if None
+        sleep_interval (float): Minimum seconds between API calls; concurrency
+            is otherwise paced by the stage's adaptive controller
+        
+    Returns:
+        DataFrame: `df` with raw_response, output_content and citations columns
+    """
+    df = df.reset_index(drop=True)
+    
+    # Add new columns
+    df['raw_response'] = None
+    df['output_content'] = None
+    df['citations'] = None
+    
+    total_rows = len(df)
+    print(f"Processing {total_rows} rows...")
+    
+    # Skip rows with NA cost drivers; workers get plain values, not the DataFrame being written
+    rows = []
+    for idx in range(len(df)):
+        row = df.iloc[idx]
+        if row['cost_driver'] == 'NA' or pd.isna(row['cost_driver']):
+            continue
+        # Get document info for context if available
+        rows.append((idx, row['cost_driver'], row['reasoning'],
+                     row.get('document_name', None), row.get('article', None)))
+    
+    # Rows run concurrently within the adaptive window but come back in order
+    controller = get_controller(STAGE_EXPANSION)
+    results = adaptive_map(lambda job: expand_cost_driver(*job[1:]), rows, controller, min_interval=sleep_interval)
+    for (idx, *_), (raw_response, output_content, citations) in tqdm(results, total=len(rows),
+                                                                     desc="Expanding cost drivers"):
+        # Store all three components
+        df.at[idx, 'raw_response'] = raw_response
+        df.at[idx, 'output_content'] = output_content
+        df.at[idx, 'citations'] = citations
+        
+        # Print the first response to see the format
+        if idx == 0:
+            print("\nExample of raw response format:\n")
+            print(raw_response)
+            print("\nExample of output content:\n")
+            print(output_content)
+            print("\nCitations:\n")
+            print(citations)
+            print("\n" + "-"*80 + "\n")
+        
+        # Save checkpoint every batch_size rows
+        if checkpoint_prefix and (idx + 1) % batch_size == 0:
+            checkpoint_file = f"{checkpoint_prefix}_checkpoint_{idx+1}.xlsx"
+            df.to_excel(checkpoint_file, index=False)
+            print(f"\nCheckpoint saved to {checkpoint_file}")
+    
+    print(controller.summary())
+    print(get_latency_policy(STAGE_EXPANSION).summary())
+    return df
+
+def expansion_job(payload: Dict):
+    """Job handler: expand one cost driver. Raises on API errors so the queue can retry."""
+    prompt = build_expansion_prompt(
+        payload['cost_driver'], payload['reasoning'], payload.get('document_name'), payload.get('article')
+    )
+    raw_response, output_content, citations = request_expansion(prompt)
+    return {'raw_response': raw_response, 'output_content': output_content, 'citations': citations}
+
+def iter_expansion_jobs(df: pd.DataFrame):
+    """Yield one (job_key, payload) pair per non-NA cost driver row, keyed by row index."""
+    for idx, row in df.iterrows():
+        if row['cost_driver'] == 'NA' or pd.isna(row['cost_driver']):
+            continue
+        document_name = row.get('document_name', None)
+        article = row.get('article', None)
+        yield str(idx), {
+            'cost_driver': row['cost_driver'],
+            'reasoning': row['reasoning'],
+            'document_name': None if pd.isna(document_name) else document_name,
+            'article': None if pd.isna(article) else article,
+        }
+
+def iter_expansion_prompt_parts(df: pd.DataFrame):
+    """Yield (static, dynamic) prompt text for every expansion request, without sending anything."""
+    for _, payload in iter_expansion_jobs(df):
+        static, dynamic = build_expansion_prompt_parts(
+            payload['cost_driver'], payload['reasoning'], payload.get('document_name'), payload.get('article')
+        )
+        yield EXPANSION_SYSTEM_PROMPT + "\n" + static, dynamic
+
+def process_excel_with_queue(input_file: str, output_file: str, queue_path: str,
+                             enqueue: bool = True, work: bool = True, sleep_interval: float = 0):
+    """
+    Expand cost drivers through a shared job queue so several workers can
+    split one run. Each non-NA row becomes one job keyed by its row index.
+    Whichever worker finds the queue drained writes the output file.
+    
+    Args:
+        input_file (str): Path to input Excel file
+        output_file (str): Path to output Excel file
+        queue_path (str): Path to the SQLite queue file
+        enqueue (bool): Add this input's rows to the queue first
+        work (bool): Process jobs in this process
+        sleep_interval (float): Minimum seconds between API calls
+    """
+    print(f"Reading Excel file: {input_file}")
+    df = pd.read_excel(input_file)
+    
+    required_cols = ['cost_driver', 'reasoning']
+    if not all(col in df.columns for col in required_cols):
+        raise ValueError(f"Missing required columns: {required_cols}")
+    
+    df = expand_with_queue(df, queue_path, enqueue=enqueue, work=work, sleep_interval=sleep_interval)
+    if df is None:
+        return
+    
+    df.to_excel(output_file, index=False)
+    print(f"\nProcessing complete. Results saved to {output_file}")
+
+def expand_with_queue(df: pd.DataFrame, queue_path: str, enqueue: bool = True, work: bool = True,
+                      sleep_interval: float = 0):
+    """
+    Expand the cost drivers of `df` through a shared job queue.
+    
+    Returns:
+        DataFrame: `df` with raw_response, output_content and citations
+        columns, or None while other workers are still running
+    """
+    results = process_via_queue(queue_path, STAGE_EXPANSION, iter_expansion_jobs(df), expansion_job,
+                                enqueue=enqueue, work=work, sleep_interval=sleep_interval)
+    if results is None:
+        return None
+    
+    df['raw_response'] = None
+    df['output_content'] = None
+    df['citations'] = None
+    for job_key, result in results.items():
+        idx = int(job_key)
+        df.at[idx, 'raw_response'] = result['raw_response']
+        df.at[idx, 'output_content'] = result['output_content']
+        df.at[idx, 'citations'] = result['citations']
+    return df
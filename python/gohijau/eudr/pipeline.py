@@ -0,0 +1,266 @@
+"""
+Stages 2-4 pipelined: analysis -> extraction -> expansion.
+
+In batch mode each stage waits for the whole previous stage. Here a
+paragraph's analysis is parsed into cost driver rows as soon as it
+arrives, and every driver row goes straight to the expansion workers.
+Bounded queues sit between the stages. When expansion falls behind,
+extraction blocks on the full driver queue, analysis blocks on the full
+analysis queue, and no new paragraphs are sent until space frees up.
+
+    python -m gohijau pipeline --queue-size 32
+
+Both API stages keep their own adaptive controllers and latency policies.
+The outputs are the same three files the batch stages write, in the same
+row order.
+"""
+
+import queue
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import pandas as pd
+from tqdm import tqdm
+
+from gohijau.concurrency import adaptive_map, get_controller
+from gohijau.eudr.analysis import EUDRCostAnalyzer
+from gohijau.eudr.expansion import expand_cost_driver
+from gohijau.eudr.extraction import extract_response_rows, row_metadata
+from gohijau.hedging import get_latency_policy
+from gohijau.jobqueue import STAGE_ANALYSIS, STAGE_EXPANSION
+from gohijau.pdf.dedup import duplicate_rows
+
+QUEUE_SIZE = 32 # Items buffered between two stages before the upstream stage blocks
+
+POLL_SECONDS = 0.1 # How often a blocked queue wait checks whether another stage failed
+
+_DONE = object() # End-of-stream marker
+
+
+class _Stopped(Exception):
+    """Raised in a stage thread once another stage has failed."""
+
+
+def run_pipeline(df: pd.DataFrame, queue_size: int = QUEUE_SIZE, sleep_interval: float = 0,
+                 output_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Analyze, extract and expand `df`'s paragraphs as one streaming run.
+
+    Args:
+        df (DataFrame): Paragraphs, as read for `gohijau analyze`
+        queue_size (int): Capacity of each inter-stage queue
+        sleep_interval (float): Minimum seconds between analysis calls
+        output_dir (str): Passed to the analyzer (unused without checkpoints)
+
+    Returns:
+        dict: 'analysis', 'drivers' and 'expanded' DataFrames (as the batch
+            stages would write them), 'driver_keys' and 'metrics'. The keys
+            are (row, analysis position, driver position) per driver row,
+            the positions counted as `PipelineStore` counts them
+    """
+    analyzer = EUDRCostAnalyzer(df=df, output_dir=output_dir)
+    duplicates = duplicate_rows(df)
+    copies = {} # canonical row -> duplicate rows sharing its analyses
+    for row, canonical in duplicates.items():
+        copies.setdefault(canonical, []).append(row)
+    metadata = {i: row_metadata(row, df.columns) for i, row in df.iterrows()}
+
+    analysis_queue = queue.Queue(maxsize=queue_size)
+    driver_queue = queue.Queue(maxsize=queue_size)
+    analyses = {} # (row, paragraph) -> raw analysis
+    drivers = {} # (row, paragraph, n) -> driver row dict
+    expansions = {} # (row, paragraph, n) -> (raw_response, output_content, citations)
+    lock = threading.Lock()
+    metrics = {"paragraph_jobs": 0, "driver_rows": 0, "expansion_jobs": 0,
+               "analysis_queue_peak": 0, "driver_queue_peak": 0,
+               "first_analysis_seconds": None, "first_driver_seconds": None, "first_result_seconds": None}
+    started = time.perf_counter()
+
+    def mark(name: str):
+        with lock:
+            if metrics[name] is None:
+                metrics[name] = round(time.perf_counter() - started, 3)
+
+    # The first stage to fail records its error and sets `stop`; every queue
+    # wait polls it, so no stage stays blocked on a neighbour that has exited
+    stop = threading.Event()
+    errors = []
+
+    def fail(error: BaseException):
+        with lock:
+            errors.append(error)
+        stop.set()
+
+    def put(q: queue.Queue, item, peak: str):
+        while True: # Blocks while the downstream stage is behind
+            if stop.is_set():
+                raise _Stopped
+            try:
+                q.put(item, timeout=POLL_SECONDS)
+                break
+            except queue.Full:
+                pass
+        with lock:
+            metrics[peak] = max(metrics[peak], q.qsize())
+
+    def get(q: queue.Queue):
+        while True:
+            if stop.is_set():
+                raise _Stopped
+            try:
+                return q.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                pass
+
+    # --- Stage 2: analysis ---
+    def analyze(job):
+        _, payload = job
+        return analyzer.get_cost_driver_analysis(payload['text'], payload.get('document_name'),
+                                                 payload.get('article'))
+
+    def run_analysis():
+        try:
+            jobs = list(analyzer.iter_jobs())
+            metrics["paragraph_jobs"] = len(jobs)
+            results = adaptive_map(analyze, jobs, get_controller(STAGE_ANALYSIS), ordered=False,
+                                   min_interval=sleep_interval)
+            for (job_key, _), analysis in results:
+                mark("first_analysis_seconds")
+                put(analysis_queue, (job_key, analysis), "analysis_queue_peak")
+            put(analysis_queue, _DONE, "analysis_queue_peak")
+        except _Stopped:
+            pass
+        except BaseException as e:
+            fail(e)
+
+    # --- Stage 3: extraction ---
+    def run_extraction():
+        try:
+            while True:
+                item = get(analysis_queue)
+                if item is _DONE:
+                    put(driver_queue, item, "driver_queue_peak")
+                    return
+                job_key, analysis = item
+                row, paragraph = (int(x) for x in job_key.split(':'))
+                # Duplicate rows get the same drivers under their own document and page
+                for target in [row] + copies.get(row, []):
+                    with lock:
+                        analyses[(target, paragraph)] = analysis
+                    for n, driver in enumerate(extract_response_rows(analysis, metadata[target])):
+                        key = (target, paragraph, n)
+                        with lock:
+                            drivers[key] = driver
+                            metrics["driver_rows"] += 1
+                        mark("first_driver_seconds")
+                        if driver['cost_driver'] != 'NA' and not pd.isna(driver['cost_driver']):
+                            put(driver_queue, (key, driver), "driver_queue_peak")
+        except _Stopped:
+            pass
+        except BaseException as e:
+            fail(e)
+
+    # --- Stage 4: expansion ---
+    def driver_stream():
+        while True:
+            try:
+                item = get(driver_queue)
+            except _Stopped:
+                return
+            if item is _DONE:
+                return
+            yield item
+
+    def expand(item):
+        key, driver = item
+        result = expand_cost_driver(driver['cost_driver'], driver['reasoning'], driver.get('document_name'),
+                                    driver.get('article'))
+        # Recorded on the worker thread: the stream may be blocked waiting for the next driver
+        with lock:
+            expansions[key] = result
+        mark("first_result_seconds")
+        return result
+
+    threads = [threading.Thread(target=run_analysis, name="pipeline-analysis", daemon=True),
+               threading.Thread(target=run_extraction, name="pipeline-extraction", daemon=True)]
+    for thread in threads:
+        thread.start()
+    progress = tqdm(desc="Expanding cost drivers (pipelined)", unit=" drivers")
+    try:
+        for _ in adaptive_map(expand, driver_stream(), get_controller(STAGE_EXPANSION), ordered=False):
+            progress.update(1)
+    except BaseException as e:
+        fail(e) # Stops the upstream stages
+    finally:
+        progress.close()
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+
+    metrics["expansion_jobs"] = len(expansions)
+    metrics["makespan_seconds"] = round(time.perf_counter() - started, 3)
+
+    # Reassemble in batch order: rows, then paragraphs, then drivers
+    df_analysis = df.copy()
+    df_analysis['cost_driver_analysis'] = None
+    by_row = {}
+    analysis_position = {} # (row, paragraph) -> position in the row's analysis list
+    for (row, paragraph), analysis in sorted(analyses.items()):
+        items = by_row.setdefault(row, [])
+        analysis_position[(row, paragraph)] = len(items)
+        items.append(analysis)
+    for row, items in by_row.items():
+        df_analysis.at[row, 'cost_driver_analysis'] = items
+
+    keys = sorted(drivers)
+    df_drivers = pd.DataFrame([drivers[key] for key in keys])
+    driver_keys = [(row, analysis_position[(row, paragraph)], n) for row, paragraph, n in keys]
+    df_expanded = df_drivers.copy()
+    for column, position in (('raw_response', 0), ('output_content', 1), ('citations', 2)):
+        df_expanded[column] = [expansions[key][position] if key in expansions else None for key in keys]
+
+    print(get_controller(STAGE_ANALYSIS).summary())
+    print(get_controller(STAGE_EXPANSION).summary())
+    print(get_latency_policy(STAGE_ANALYSIS).summary())
+    print(get_latency_policy(STAGE_EXPANSION).summary())
+    print(pipeline_summary(metrics))
+    return {"analysis": df_analysis, "drivers": df_drivers, "expanded": df_expanded, "driver_keys": driver_keys,
+            "metrics": metrics}
+
+
+def pipeline_summary(metrics: Dict[str, Any]) -> str:
+    """One-line report of a pipelined run."""
+    first = metrics["first_result_seconds"]
+    first = f"{first:.1f}s" if first is not None else "none"
+    return (f"Pipeline: {metrics['paragraph_jobs']} paragraphs -> {metrics['driver_rows']} driver rows -> "
+            f"{metrics['expansion_jobs']} expansions; first expansion after {first}, "
+            f"makespan {metrics['makespan_seconds']:.1f}s (queue peaks {metrics['analysis_queue_peak']}/"
+            f"{metrics['driver_queue_peak']})")
+
+
+def run(input_file: str, analysis_output: str, drivers_output: str, output_file: str,
+        queue_size: int = QUEUE_SIZE, sleep_interval: float = 0, output_dir: Optional[str] = None):
+    """
+    Run stages 2-4 pipelined from the paragraphs file and write all three
+    stage outputs.
+
+    Args:
+        input_file (str): Paragraphs Excel file (stage 1 output)
+        analysis_output (str): Raw analyses Excel file (stage 2 output)
+        drivers_output (str): Extracted cost drivers Excel file (stage 3 output)
+        output_file (str): Expanded cost drivers Excel file (stage 4 output)
+        queue_size (int): Capacity of each inter-stage queue
+        sleep_interval (float): Minimum seconds between analysis calls
+        output_dir (str): Analyzer output directory
+    """
+    print(f"Reading Excel file: {input_file}")
+    df = pd.read_excel(input_file)
+    result = run_pipeline(df, queue_size=queue_size, sleep_interval=sleep_interval, output_dir=output_dir)
+
+    for frame, path in ((result["analysis"], analysis_output), (result["drivers"], drivers_output),
+                        (result["expanded"], output_file)):
+        frame.to_excel(path, index=False)
+        print(f"Results saved to Excel: {path}")
+    return result
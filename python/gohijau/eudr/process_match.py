@@ -0,0 +1,491 @@
+"""
+Stage 5: match each EUDR process description to its most relevant expanded
+cost driver with Gemini, and attach the driver's references, content,
+citations and source paragraphs.
+"""
+
+import os
+from collections import Counter
+
+import pandas as pd
+from tqdm import tqdm # Optional: for a progress bar
+
+from gohijau.clients import gemini_sdk, get_cached_gemini_model, get_gemini_model, release_context_caches
+from gohijau.concurrency import adaptive_map, get_controller
+from gohijau.config import COST_DRIVER_FILE, EUDR_PROCESS_FILE, GEMINI_MODEL, PROCESS_MATCH_FILE
+from gohijau.hedging import get_latency_policy
+from gohijau.jobqueue import STAGE_MATCH, process_via_queue
+
+# --- File and Sheet Configuration ---
+EUDR_PROCESS_SHEET = 'Sheet1'
+COST_DRIVER_SHEET = 'Sheet1' # Assuming cost drivers are also on Sheet1
+OUTPUT_SHEET_NAME = 'Processed_Results' # Name for the sheet in the output file
+
+# --- Column Name Configuration ---
+# Column in EUDR_PROCESS_FILE containing the process descriptions to analyze
+EUDR_PROCESS_INPUT_COLUMN = 'Process' # *** ADJUST THIS if your process description column has a different name ***
+
+# Columns in COST_DRIVER_FILE
+COST_DRIVER_UNIVERSE_COLUMN = 'cost_driver'
+REFERENCE_COLUMN = 'document_name'
+OUTPUT_CONTENT_COLUMN = 'output_content'
+CITATIONS_COLUMN = 'citations'
+TEXT_COLUMN = 'text'                       # <-- New input column name for reference text
+
+# --- Output Column Names ---
+# These columns will be ADDED or OVERWRITTEN in the output file
+OUTPUT_COST_DRIVER_COLUMN = 'Cost Driver'
+OUTPUT_REFERENCE_COLUMN = 'Reference on Cost Driver'
+OUTPUT_OUTPUT_CONTENT_COLUMN = 'Output Content'
+OUTPUT_CITATIONS_COLUMN = 'Citations'
+OUTPUT_REFERENCE_TEXT_COLUMN = 'citations from reference' # <-- New output column name
+
+# --- API Settings ---
+API_DELAY_SECONDS = 0 # Minimum seconds between calls; concurrency adapts to the API (gohijau.concurrency)
+TEXT_SEPARATOR = "\n\n---\n\n" # Separator for multiple text paragraphs
+DETAIL_SEPARATOR = "; " # Separator for joining unique references/content/citations
+
+# Statuses returned by get_gemini_match instead of a driver
+API_FAILURE_STATUSES = ["API_ERROR", "NO_RESPONSE", "BLOCKED_BY_SAFETY"]
+
+safety_settings = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+    # ... other settings ...
+]
+
+
+def load_processes(path=EUDR_PROCESS_FILE, sheet=EUDR_PROCESS_SHEET):
+    """Load the EUDR process descriptions to match."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"EUDR process file not found: {path}")
+
+    print(f"Loading EUDR processes from: {path} (Sheet: {sheet})")
+    df_processes = pd.read_excel(path, sheet_name=sheet)
+    if EUDR_PROCESS_INPUT_COLUMN not in df_processes.columns:
+        raise ValueError(f"Column '{EUDR_PROCESS_INPUT_COLUMN}' not found in {path} (Sheet: {sheet}). Please adjust 'EUDR_PROCESS_INPUT_COLUMN' in the script.")
+    return df_processes
+
+
+def load_cost_drivers(path=COST_DRIVER_FILE, sheet=COST_DRIVER_SHEET):
+    """
+    Load the expanded cost drivers.
+
+    Returns:
+        tuple: (cost driver DataFrame without incomplete rows,
+                unique cost driver list for the prompt,
+                lookup dict of driver text -> aggregated detail dict)
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Cost driver file not found: {path}")
+
+    print(f"Loading Cost Drivers from: {path} (Sheet: {sheet})")
+    df_cost_drivers = pd.read_excel(path, sheet_name=sheet)
+    return prepare_cost_drivers(df_cost_drivers, f"{path} (Sheet: {sheet})")
+
+
+def prepare_cost_drivers(df_cost_drivers, source="cost driver data"):
+    """
+    Build the prompt list and lookup dict from an expanded cost driver DataFrame.
+
+    Returns:
+        tuple: Same as `load_cost_drivers`
+    """
+    # Check all required columns from the cost driver file
+    required_driver_cols = [
+        COST_DRIVER_UNIVERSE_COLUMN, REFERENCE_COLUMN,
+        OUTPUT_CONTENT_COLUMN, CITATIONS_COLUMN, TEXT_COLUMN # Added TEXT_COLUMN
+    ]
+    for col in required_driver_cols:
+        if col not in df_cost_drivers.columns:
+            raise ValueError(f"Column '{col}' not found in {source}.")
+
+    # Prepare cost driver data
+    # Ensure no NaN values interfere (check all needed columns from cost driver file)
+    df_cost_drivers = df_cost_drivers.dropna(subset=required_driver_cols)
+    cost_driver_list = df_cost_drivers[COST_DRIVER_UNIVERSE_COLUMN].astype(str).unique().tolist() # Get unique drivers for the prompt
+
+    # Aggregate the details of every row per driver once, so resolving a match is a dict lookup:
+    # Cost Driver Text -> {reference, content, citations, text, rows}
+    details = df_cost_drivers[required_driver_cols].astype(str)
+    aggregated = details.groupby(COST_DRIVER_UNIVERSE_COLUMN, sort=False).agg(
+        reference=(REFERENCE_COLUMN, _join_unique),
+        content=(OUTPUT_CONTENT_COLUMN, _join_unique),
+        citations=(CITATIONS_COLUMN, _join_unique),
+        text=(TEXT_COLUMN, TEXT_SEPARATOR.join), # Keep every text paragraph
+        rows=(TEXT_COLUMN, 'size'),
+    )
+    cost_driver_lookup_dict = aggregated.to_dict(orient='index')
+
+    print(f"Loaded {len(cost_driver_list)} unique potential cost drivers.")
+    print(f"Processed {len(df_cost_drivers)} total cost driver entries with details.")
+    if not cost_driver_list:
+        print("Warning: No cost drivers loaded. Check the cost driver file and sheet.")
+    return df_cost_drivers, cost_driver_list, cost_driver_lookup_dict
+
+
+def _join_unique(values):
+    """Sorted unique values joined with DETAIL_SEPARATOR."""
+    return DETAIL_SEPARATOR.join(sorted(set(values)))
+
+
+def build_match_prefix(available_cost_drivers):
+    """
+    Static part of the match prompt: the cost driver list and the rules. It is
+    the same for every process row, so it comes first and can be cached.
+    """
+    # Use the unique list of drivers for the prompt
+    driver_list_str = "\n".join([f"- {driver}" for driver in available_cost_drivers])
+    return f"""
+    Review the following list of potential Cost Drivers:
+    --- START COST DRIVER LIST ---
+    {driver_list_str}
+    --- END COST DRIVER LIST ---
+
+    Your task is to select the *single most relevant* Cost Driver from the provided list that directly corresponds to the EUDR Process Description given below.
+
+    **Output Rules:**
+    1.  Choose ONLY ONE cost driver from the list.
+    2.  Output the EXACT text of the selected Cost Driver as it appears in the list.
+    3.  Do NOT include any explanation, commentary, or extra text before or after the selected cost driver. Just the cost driver text itself.
+
+    """
+
+
+def build_prompt_parts(eudr_process_text, available_cost_drivers, static_prefix=None):
+    """
+    Split the match prompt into (static prefix, dynamic suffix).
+
+    Pass `static_prefix` from `build_match_prefix` to avoid rebuilding the
+    driver list for every row.
+    """
+    if static_prefix is None:
+        static_prefix = build_match_prefix(available_cost_drivers)
+    dynamic = f"""Analyze the following EUDR Process Description:
+    \"\"\"
+    {eudr_process_text}
+    \"\"\"
+
+    Selected Cost Driver:"""
+    return static_prefix, dynamic
+
+
+def build_prompt(eudr_process_text, available_cost_drivers, static_prefix=None):
+    """Creates the prompt for the Gemini model (static driver list first)."""
+    static, dynamic = build_prompt_parts(eudr_process_text, available_cost_drivers, static_prefix)
+    return static + dynamic
+
+
+def iter_prompt_parts(df_processes, cost_driver_list):
+    """
+    Yield (static, dynamic) prompt text for every distinct non-empty process
+    description, i.e. every request `match_processes` would send.
+    """
+    if not cost_driver_list:
+        return
+    static_prefix = build_match_prefix(cost_driver_list)
+    seen = set()
+    for value in df_processes[EUDR_PROCESS_INPUT_COLUMN]:
+        process_text = _process_text(value)
+        if process_text and process_text not in seen:
+            seen.add(process_text)
+            yield build_prompt_parts(process_text, cost_driver_list, static_prefix)
+
+
+def get_gemini_match(prompt_text, model_name=GEMINI_MODEL, cached_prefix=None):
+    """
+    Sends prompt to Gemini and attempts to parse the best match.
+
+    If `cached_prefix` is given and a Gemini context cache can hold it, only
+    the rest of the prompt is sent with each request.
+    """
+    # (Error handling remains the same as before)
+    try:
+        model = None
+        if cached_prefix and prompt_text.startswith(cached_prefix):
+            model = get_cached_gemini_model(model_name, cached_prefix)
+            if model is not None:
+                prompt_text = prompt_text[len(cached_prefix):]
+        if model is None:
+            model = get_gemini_model(model_name)
+        def send(timeout):
+            with get_controller(STAGE_MATCH).observe():
+                return model.generate_content(
+                    prompt_text,
+                    generation_config=gemini_sdk().GenerationConfig(), # Keep default for now
+                    safety_settings=safety_settings,
+                    request_options={'timeout': timeout}
+                )
+
+        # Adaptive timeout from the stage's latency percentiles; slow calls may be hedged
+        response = get_latency_policy(STAGE_MATCH).call(send)
+        if response.parts:
+             match = response.text.strip().strip('"').strip("'").strip()
+             if match.startswith("- "):
+                 match = match[2:]
+             return match
+        elif response.prompt_feedback and response.prompt_feedback.block_reason:
+             print(f"  WARN: Prompt blocked. Reason: {response.prompt_feedback.block_reason}")
+             return "BLOCKED_BY_SAFETY"
+        else:
+             if response.candidates and response.candidates[0].finish_reason.name != "STOP":
+                 print(f"  WARN: Generation stopped. Reason: {response.candidates[0].finish_reason.name}")
+                 return f"GENERATION_STOPPED_{response.candidates[0].finish_reason.name}"
+             print(f"  WARN: Received empty response or unexpected format: {response}")
+             return "NO_RESPONSE"
+    except Exception as e:
+        print(f"  ERROR: API call failed: {e}")
+        # ... (rest of error handling) ...
+        return "API_ERROR"
+
+
+def is_match_failure(matched_driver_text):
+    """True if get_gemini_match returned an error status instead of a driver."""
+    return matched_driver_text in API_FAILURE_STATUSES or matched_driver_text.startswith("GENERATION_STOPPED")
+
+
+def resolve_match(matched_driver_text, cost_driver_lookup_dict):
+    """
+    Turn Gemini's answer into the output columns for one process row.
+
+    Returns:
+        tuple: (driver, reference, output content, citations, reference text)
+    """
+    final_reference = "N/A"
+    final_output_content = "N/A"
+    final_citations = "N/A"
+    final_reference_text = "N/A" # <-- Default for new column
+
+    if not is_match_failure(matched_driver_text):
+        # The lookup dictionary already holds the aggregated details of all entries for this driver
+        if matched_driver_text in cost_driver_lookup_dict:
+            details = cost_driver_lookup_dict[matched_driver_text]
+
+            # Assign the matched driver text
+            final_driver = matched_driver_text
+            final_reference = details['reference']
+            final_output_content = details['content']
+            final_citations = details['citations']
+            final_reference_text = details['text']
+
+            print(f"  SUCCESS: Matched '{final_driver}' -> Found {details['rows']} source row(s).")
+        else:
+            # Handle cases where Gemini response not exactly in list
+            print(f"  WARN: Gemini response '{matched_driver_text}' not found exactly in the cost driver list.")
+            final_driver = f"MATCH_FAILED ({matched_driver_text})"
+            # Keep N/A for other fields
+    else: # Handle API errors / No response / Blocked / Stopped
+        final_driver = matched_driver_text # Store the error/status code
+        # Keep N/A for other fields
+        print(f"  FAILED: Reason: {matched_driver_text}")
+
+    return final_driver, final_reference, final_output_content, final_citations, final_reference_text
+
+
+def _process_text(value):
+    return str(value) if pd.notna(value) else ""
+
+
+def attach_results(df_processes, results):
+    """Add the per-row result tuples to the DataFrame (overwriting if columns exist)."""
+    columns = [
+        OUTPUT_COST_DRIVER_COLUMN,
+        OUTPUT_REFERENCE_COLUMN,
+        OUTPUT_OUTPUT_CONTENT_COLUMN,
+        OUTPUT_CITATIONS_COLUMN,
+        OUTPUT_REFERENCE_TEXT_COLUMN, # <-- Add new column
+    ]
+    for position, column in enumerate(columns):
+        df_processes[column] = [result[position] for result in results]
+    return df_processes
+
+
+def match_processes(df_processes, cost_driver_list, cost_driver_lookup_dict, model_name=GEMINI_MODEL,
+                    delay_seconds=API_DELAY_SECONDS, context_cache=True):
+    """
+    Match every process description to a cost driver. Distinct descriptions
+    are matched concurrently within the stage's adaptive window.
+
+    Args:
+        delay_seconds (float): Minimum seconds between API calls
+        context_cache (bool): Put the shared driver-list prefix in a Gemini context cache
+
+    Returns:
+        DataFrame: `df_processes` with the cost driver output columns added
+    """
+    static_prefix = build_match_prefix(cost_driver_list)
+    cached_prefix = static_prefix if context_cache else None
+    process_texts = [_process_text(value) for value in df_processes[EUDR_PROCESS_INPUT_COLUMN]]
+    occurrences = Counter(text for text in process_texts if text)
+    resolved_by_text = {} # Identical process descriptions are matched only once
+    attempts = Counter()
+    api_calls = 0
+
+    def match(process_text):
+        # Pass the unique list of drivers to the prompt function
+        prompt = build_prompt(process_text, cost_driver_list, static_prefix)
+        return get_gemini_match(prompt, model_name, cached_prefix)
+
+    print("\nStarting EUDR Process analysis using Gemini...")
+    controller = get_controller(STAGE_MATCH)
+    pending = list(occurrences) if cost_driver_list else [] # Only process if there's text and drivers exist
+    progress = tqdm(total=len(pending), desc="Processing")
+    while pending:
+        retry = []
+        for process_text, matched_driver_text in adaptive_map(match, pending, controller, ordered=False,
+                                                              min_interval=delay_seconds):
+            api_calls += 1
+            attempts[process_text] += 1
+            print(f"\nProcessed '{process_text[:100]}...'")
+            result = resolve_match(matched_driver_text, cost_driver_lookup_dict)
+            # A failed description gets another attempt for each duplicate row it has
+            if is_match_failure(matched_driver_text) and attempts[process_text] < occurrences[process_text]:
+                retry.append(process_text)
+                continue
+            resolved_by_text[process_text] = result
+            progress.update(1)
+        pending = retry
+    progress.close()
+
+    results = []
+    for index, process_text in enumerate(process_texts):
+        if not process_text:
+            print(f"Skipping row {index+1}/{len(df_processes)}: Empty process description.")
+            result = ("SKIPPED_EMPTY_PROCESS", "N/A", "N/A", "N/A", "N/A")
+        elif not cost_driver_list:
+            print(f"Skipping row {index+1}/{len(df_processes)}: No cost drivers loaded.")
+            result = ("SKIPPED_NO_DRIVERS", "N/A", "N/A", "N/A", "N/A")
+        else:
+            result = resolved_by_text[process_text]
+        # Append results for this row (including defaults if skipped/failed)
+        results.append(result)
+
+    print(f"\nMade {api_calls} API call(s) for {len(df_processes)} process rows.")
+    print(controller.summary())
+    print(get_latency_policy(STAGE_MATCH).summary())
+    return attach_results(df_processes, results)
+
+
+def match_processes_with_queue(df_processes, cost_driver_list, cost_driver_lookup_dict, queue_path,
+                               model_name=GEMINI_MODEL, enqueue=True, work=True,
+                               delay_seconds=API_DELAY_SECONDS, context_cache=True):
+    """
+    Match processes through a shared job queue, one job per distinct non-empty
+    process description.
+
+    Returns:
+        DataFrame: `df_processes` with the output columns, or None while other
+        workers are still running
+    """
+    static_prefix = build_match_prefix(cost_driver_list)
+    cached_prefix = static_prefix if context_cache else None
+
+    def handler(payload):
+        prompt = build_prompt(payload['process'], cost_driver_list, static_prefix)
+        matched = get_gemini_match(prompt, model_name, cached_prefix)
+        if is_match_failure(matched):
+            raise RuntimeError(matched)
+        return matched
+
+    # One job per distinct process description, keyed by the first row that has it
+    process_texts = df_processes[EUDR_PROCESS_INPUT_COLUMN].map(_process_text)
+    job_key_by_text = {}
+    for index, process_text in process_texts.items():
+        if process_text and process_text not in job_key_by_text:
+            job_key_by_text[process_text] = str(index)
+
+    jobs = (
+        (job_key, {'process': process_text})
+        for process_text, job_key in job_key_by_text.items()
+        if cost_driver_list
+    )
+    matches = process_via_queue(queue_path, STAGE_MATCH, jobs, handler,
+                                enqueue=enqueue, work=work, sleep_interval=delay_seconds)
+    if matches is None:
+        return None
+
+    results = []
+    resolved_by_text = {}
+    for process_text in process_texts:
+        if not process_text:
+            results.append(("SKIPPED_EMPTY_PROCESS", "N/A", "N/A", "N/A", "N/A"))
+        elif not cost_driver_list:
+            results.append(("SKIPPED_NO_DRIVERS", "N/A", "N/A", "N/A", "N/A"))
+        elif job_key_by_text[process_text] in matches:
+            if process_text not in resolved_by_text:
+                resolved_by_text[process_text] = resolve_match(matches[job_key_by_text[process_text]],
+                                                               cost_driver_lookup_dict)
+            results.append(resolved_by_text[process_text])
+        else:
+            # Job is in the dead-letter state
+            results.append(("API_ERROR", "N/A", "N/A", "N/A", "N/A"))
+    return attach_results(df_processes, results)
+
+
+def save_results(df_processes, output_file=PROCESS_MATCH_FILE, sheet_name=OUTPUT_SHEET_NAME):
+    """Write the matched processes to Excel and print a sample."""
+    print(f"\nSaving results to: {output_file} (Sheet: {sheet_name})")
+    try:
+        with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+            df_processes.to_excel(writer, sheet_name=sheet_name, index=False)
+        print("Processing complete. Output file saved.")
+    except Exception as e:
+        print(f"Error saving output file: {e}")
+
+    # Display some results (optional)
+    print("\nSample of results:")
+    print(df_processes[[
+        EUDR_PROCESS_INPUT_COLUMN,
+        OUTPUT_COST_DRIVER_COLUMN,
+        OUTPUT_REFERENCE_COLUMN,
+        OUTPUT_OUTPUT_CONTENT_COLUMN,
+        OUTPUT_CITATIONS_COLUMN,
+        OUTPUT_REFERENCE_TEXT_COLUMN # <-- Show new column
+    ]].head())
+
+
+def run(process_file=EUDR_PROCESS_FILE, cost_driver_file=COST_DRIVER_FILE, output_file=PROCESS_MATCH_FILE,
+        process_sheet=EUDR_PROCESS_SHEET, cost_driver_sheet=COST_DRIVER_SHEET, output_sheet=OUTPUT_SHEET_NAME,
+        model_name=GEMINI_MODEL, limit=None, queue_path=None, enqueue=True, work=True, context_cache=True,
+        store=None):
+    """
+    Load both inputs, match every process and save the results.
+
+    With a `store` (gohijau.store.PipelineStore), processes come from the
+    store (imported from `process_file` on first use), drivers are looked up
+    with indexed queries and the matches are written back to the store
+    instead of `output_file`.
+    """
+    if store is not None:
+        df_processes = store.processes_frame()
+        if df_processes.empty:
+            store.write_processes(load_processes(process_file, process_sheet), EUDR_PROCESS_INPUT_COLUMN)
+            df_processes = store.processes_frame()
+    else:
+        df_processes = load_processes(process_file, process_sheet)
+    if limit is not None:
+        df_processes = df_processes.head(limit)
+    print(f"Processing all {len(df_processes)} rows of the input file.")
+
+    if store is not None:
+        cost_driver_list, cost_driver_lookup_dict = store.driver_catalog()
+    else:
+        _, cost_driver_list, cost_driver_lookup_dict = load_cost_drivers(cost_driver_file, cost_driver_sheet)
+    print(f"Loaded {len(df_processes)} EUDR processes.")
+
+    if queue_path:
+        df_processes = match_processes_with_queue(df_processes, cost_driver_list, cost_driver_lookup_dict,
+                                                  queue_path, model_name, enqueue=enqueue, work=work,
+                                                  context_cache=context_cache)
+        release_context_caches()
+        if df_processes is None:
+            return None
+    else:
+        df_processes = match_processes(df_processes, cost_driver_list, cost_driver_lookup_dict, model_name,
+                                       context_cache=context_cache)
+        release_context_caches()
+
+    if store is not None:
+        store.write_matches(df_processes, OUTPUT_COST_DRIVER_COLUMN)
+    else:
+        save_results(df_processes, output_file, output_sheet)
+    return df_processes
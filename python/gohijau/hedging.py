@@ -0,0 +1,228 @@
+"""
+Adaptive per-stage timeouts and hedged requests.
+
+A fixed timeout is either far too long for a stage whose calls usually take
+five seconds or too short for deep research. A `LatencyPolicy` keeps the
+recent latencies of one stage and derives its timeout from them:
+`TIMEOUT_MULTIPLIER` x p95, clamped to the stage's bounds in
+`config.ADAPTIVE_TIMEOUTS` (the configured `timeout` applies until enough
+samples exist).
+
+With hedging on, a call still running at the stage's p95 gets a duplicate
+request; whichever answers first wins and the other is cancelled. At most
+`HEDGE_BUDGET` of a stage's requests may be hedged. A duplicate that has
+already started cannot be interrupted from Python: its result is discarded
+and the SDK timeout bounds it.
+
+API call sites pass a function of the timeout:
+
+    def send(timeout):
+        return client.chat.completions.create(..., timeout=timeout)
+
+    response = get_latency_policy(STAGE_ANALYSIS).call(send)
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+
+from gohijau.concurrency import classify_error
+from gohijau.config import ADAPTIVE_TIMEOUTS, HEDGE_BUDGET, TIMEOUT_MULTIPLIER
+
+MIN_SAMPLES = 20 # Latencies needed before percentiles replace the configured timeout
+LATENCY_WINDOW = 500 # Most recent latencies kept per stage
+DEADLINE_GRACE = 5.0 # Seconds past the timeout before a call is abandoned without the SDK noticing
+
+# Attempts run here so the caller can wait on the first of two
+_pool = ThreadPoolExecutor(max_workers=128, thread_name_prefix="llm-call")
+
+
+class LatencyPolicy:
+    """
+    Timeout and hedging policy of one stage. Thread-safe.
+
+    Args:
+        name (str): Stage name used in reports
+        timeout (float): Timeout until MIN_SAMPLES latencies are observed
+        min_timeout (float): Lower bound of the derived timeout
+        max_timeout (float): Upper bound of the derived timeout
+        hedge (bool): Send a duplicate request for calls slower than p95
+        multiplier (float): Timeout as a multiple of p95
+        budget (float): Largest share of requests that may be hedged
+        min_samples (int): Latencies needed before percentiles are used
+    """
+
+    def __init__(self, name: str, timeout: float = 120, min_timeout: float = 10, max_timeout: float = 300,
+                 hedge: bool = False, multiplier: float = TIMEOUT_MULTIPLIER, budget: float = HEDGE_BUDGET,
+                 min_samples: int = MIN_SAMPLES):
+        self.name = name
+        self.initial_timeout = float(timeout)
+        self.min_timeout = float(min_timeout)
+        self.max_timeout = float(max_timeout)
+        self.hedge = hedge
+        self.multiplier = multiplier
+        self.budget = budget
+        self.min_samples = min_samples
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self.counters = {"requests": 0, "timeouts": 0, "abandoned": 0, "hedges": 0, "hedge_wins": 0}
+
+    # --- Percentiles ---
+
+    def record(self, latency: float):
+        """Record one call's latency (timed-out calls record their timeout)."""
+        with self._lock:
+            self._latencies.append(latency)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Nearest-rank percentile of the recent latencies, or None before MIN_SAMPLES."""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+    def timeout(self) -> float:
+        """Current timeout in seconds."""
+        p95 = self.percentile(95)
+        if p95 is None:
+            return self.initial_timeout
+        return min(max(self.multiplier * p95, self.min_timeout), self.max_timeout)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds after which a call is hedged, or None if hedging is off or not yet calibrated."""
+        return self.percentile(95) if self.hedge else None
+
+    def _try_hedge(self) -> bool:
+        with self._lock:
+            if self.counters["hedges"] + 1 > self.budget * self.counters["requests"]:
+                return False
+            self.counters["hedges"] += 1
+            return True
+
+    # --- Calls ---
+
+    def _attempt(self, fn: Callable[[float], Any], timeout: float):
+        started = time.monotonic()
+        try:
+            result = fn(timeout)
+        except Exception as e:
+            if classify_error(e) == "timeout":
+                # Censored sample: the call took at least this long
+                self.record(timeout)
+                with self._lock:
+                    self.counters["timeouts"] += 1
+            raise
+        self.record(time.monotonic() - started)
+        return result
+
+    def call(self, fn: Callable[[float], Any]) -> Any:
+        """
+        Run `fn(timeout)` under the stage's current timeout, hedging it if it
+        outlives p95 and the budget allows.
+
+        Returns:
+            The first successful result
+
+        Raises:
+            TimeoutError: If no attempt finished within the timeout plus DEADLINE_GRACE
+            Exception: The first attempt's error if every attempt failed
+        """
+        timeout = self.timeout()
+        deadline = time.monotonic() + timeout + DEADLINE_GRACE
+        with self._lock:
+            self.counters["requests"] += 1
+
+        primary = _pool.submit(self._attempt, fn, timeout)
+        pending = {primary}
+        delay = self.hedge_delay()
+        if delay is not None and delay < timeout:
+            done, _ = wait(pending, timeout=delay)
+            if not done and self._try_hedge():
+                pending.add(_pool.submit(self._attempt, fn, timeout))
+
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    if future is not primary:
+                        with self._lock:
+                            self.counters["hedge_wins"] += 1
+                    return future.result()
+                error = error or future.exception()
+
+        if pending:
+            for future in pending:
+                future.cancel()
+            with self._lock:
+                self.counters["abandoned"] += 1
+            raise TimeoutError(f"{self.name}: no response within {timeout:.1f}s")
+        raise error
+
+    # --- Metrics ---
+
+    def metrics(self) -> Dict[str, Any]:
+        """Latency percentiles, current timeout and hedging counters."""
+        with self._lock:
+            samples = len(self._latencies)
+            counters = dict(self.counters)
+        return {
+            "name": self.name,
+            "samples": samples,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "timeout": round(self.timeout(), 3),
+            "hedge": self.hedge,
+            **counters,
+        }
+
+    def summary(self) -> str:
+        """One-line report for the end of a stage."""
+        m = self.metrics()
+        if m["p95"] is None:
+            latency = f"{m['samples']} sample(s)"
+        else:
+            latency = f"p50 {m['p50']:.2f}s, p95 {m['p95']:.2f}s, p99 {m['p99']:.2f}s"
+        hedging = f", hedged {m['hedges']}/{m['requests']} ({m['hedge_wins']} won)" if m["hedge"] else ""
+        timeouts = f", {m['timeouts']} timeout(s)" if m["timeouts"] else ""
+        return f"Latency [{self.name}]: {latency}, timeout now {m['timeout']:.1f}s{timeouts}{hedging}"
+
+
+_policies: Dict[str, LatencyPolicy] = {}
+_policies_lock = threading.Lock()
+
+
+def get_latency_policy(name: str, **settings) -> LatencyPolicy:
+    """
+    Return the shared policy of stage `name`, creating it from
+    `config.ADAPTIVE_TIMEOUTS` on first use. Passing settings (e.g.
+    ``hedge=False`` from --no-hedge) replaces it with a new one.
+    """
+    settings = {key: value for key, value in settings.items() if value is not None}
+    with _policies_lock:
+        if settings or name not in _policies:
+            _policies[name] = LatencyPolicy(name, **{**ADAPTIVE_TIMEOUTS.get(name, {}), **settings})
+        return _policies[name]
+
+
+def latency_metrics() -> Dict[str, Dict[str, Any]]:
+    """Metrics of every policy created so far, by stage."""
+    with _policies_lock:
+        policies = list(_policies.values())
+    return {policy.name: policy.metrics() for policy in policies}
+
+
+def reset_latency_policies():
+    """Forget all policies (e.g. between benchmark runs)."""
+    with _policies_lock:
+        _policies.clear()
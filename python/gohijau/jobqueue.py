@@ -0,0 +1,489 @@
+"""
+Durable SQLite-backed job queue with leases.
+
+Every unit of LLM work (paragraph analysis, driver expansion, process match,
+cost inference) is stored as one row in a ``jobs`` table together with its
+status, lease, attempt count and result. Any number of worker processes can
+pull from the same file, on one machine or on several machines sharing it:
+
+    queue = JobQueue("data/output/eudr_jobs.sqlite")
+    queue.enqueue(STAGE_ANALYSIS, "row-12-p0", {"text": "..."})
+    run_worker(queue, STAGE_ANALYSIS, handler)
+
+Job life cycle::
+
+    pending --lease--> leased --complete--> done
+                         |
+                         +--fail--> pending   (attempts < max_attempts)
+                         +--fail--> dead      (attempts >= max_attempts)
+
+A lease that expires (worker crashed or lost the network share) makes the job
+eligible for leasing again. `run_worker` renews the leases of the jobs it is
+still running, so a call that runs longer than one lease keeps its job. Dead jobs stay put until ``retry_dead`` is called,
+which never touches ``done`` rows.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from gohijau.concurrency import AIMDController, get_controller
+from gohijau.hedging import get_latency_policy
+
+# Work unit kinds used by the pipeline stages
+STAGE_ANALYSIS = "paragraph_analysis"
+STAGE_EXPANSION = "driver_expansion"
+STAGE_MATCH = "process_match"
+STAGE_COST = "cost_inference"
+
+STAGES = (STAGE_ANALYSIS, STAGE_EXPANSION, STAGE_MATCH, STAGE_COST)
+
+STATUS_PENDING = "pending"
+STATUS_LEASED = "leased"
+STATUS_DONE = "done"
+STATUS_DEAD = "dead"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    stage         TEXT    NOT NULL,
+    job_key       TEXT    NOT NULL,
+    payload       TEXT    NOT NULL,
+    status        TEXT    NOT NULL DEFAULT 'pending',
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    max_attempts  INTEGER NOT NULL DEFAULT 3,
+    lease_owner   TEXT,
+    lease_expires REAL,
+    result        TEXT,
+    last_error    TEXT,
+    created_at    REAL    NOT NULL,
+    updated_at    REAL    NOT NULL,
+    UNIQUE (stage, job_key)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_stage_status ON jobs (stage, status, lease_expires);
+"""
+
+
+def default_worker_id() -> str:
+    """Return a worker id that is unique across processes and machines."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class JobQueue:
+    def __init__(self, path: str, busy_timeout: float = 60.0, journal_mode: str = "DELETE"):
+        """
+        Open (and create if needed) a job queue stored in a SQLite file.
+
+        Args:
+            path (str): Path to the SQLite file
+            busy_timeout (float): Seconds to wait for a competing writer's lock
+            journal_mode (str): SQLite journal mode. The default rollback journal
+                works on shared network drives; use "WAL" only when every
+                worker runs on the same machine.
+        """
+        self.path = path
+        self.busy_timeout = busy_timeout
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # Autocommit mode: transactions are opened explicitly with BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout * 1000)}")
+        self.conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _transaction(self):
+        """Take the write lock up front so lease selection and update are atomic."""
+        return _Transaction(self.conn)
+
+    # ------------------------------------------------------------------
+    # Producing work
+    # ------------------------------------------------------------------
+    def enqueue(self, stage: str, job_key: str, payload: Dict[str, Any], max_attempts: int = 3) -> bool:
+        """
+        Add one job. Enqueueing an existing (stage, job_key) is a no-op, so the
+        same run can be enqueued repeatedly without duplicating work.
+
+        Returns:
+            bool: True if a new job was created
+        """
+        return self.enqueue_many(stage, [(job_key, payload)], max_attempts) == 1
+
+    def enqueue_many(self, stage: str, jobs: Iterable[Tuple[str, Dict[str, Any]]], max_attempts: int = 3) -> int:
+        """
+        Add many jobs in a single transaction.
+
+        Args:
+            stage (str): Work unit kind, one of STAGES
+            jobs (iterable): (job_key, payload) pairs; payloads must be JSON serializable
+            max_attempts (int): Attempts before a job is moved to the dead-letter state
+
+        Returns:
+            int: Number of newly created jobs
+        """
+        now = time.time()
+        rows = [
+            (stage, str(key), json.dumps(payload, default=str), max_attempts, now, now)
+            for key, payload in jobs
+        ]
+        with self._transaction():
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO jobs (stage, job_key, payload, max_attempts, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            return self.conn.total_changes - before
+
+    # ------------------------------------------------------------------
+    # Consuming work
+    # ------------------------------------------------------------------
+    def lease(self, stage: str, worker_id: str, lease_seconds: float = 300, limit: int = 1) -> List[Dict[str, Any]]:
+        """
+        Lease up to `limit` jobs for a worker.
+
+        Pending jobs and leased jobs whose lease has expired are eligible. Each
+        lease increments the attempt counter, so a job that keeps killing its
+        worker eventually lands in the dead-letter state.
+
+        Returns:
+            list: Leased jobs as dicts with id, job_key, payload and attempts
+        """
+        now = time.time()
+        with self._transaction():
+            # Expired leases that have used up their attempts are dead, not retried
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires = NULL, "
+                "last_error = COALESCE(last_error, 'lease expired'), updated_at = ? "
+                "WHERE stage = ? AND status = ? AND lease_expires < ? AND attempts >= max_attempts",
+                (STATUS_DEAD, now, stage, STATUS_LEASED, now),
+            )
+            rows = self.conn.execute(
+                "SELECT id, job_key, payload, attempts FROM jobs "
+                "WHERE stage = ? AND (status = ? OR (status = ? AND lease_expires < ?)) "
+                "ORDER BY id LIMIT ?",
+                (stage, STATUS_PENDING, STATUS_LEASED, now, limit),
+            ).fetchall()
+            if not rows:
+                return []
+            self.conn.executemany(
+                "UPDATE jobs SET status = ?, lease_owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                [(STATUS_LEASED, worker_id, now + lease_seconds, now, row["id"]) for row in rows],
+            )
+        return [
+            {
+                "id": row["id"],
+                "job_key": row["job_key"],
+                "payload": json.loads(row["payload"]),
+                "attempts": row["attempts"] + 1,
+            }
+            for row in rows
+        ]
+
+    def extend_lease(self, job_id: int, worker_id: str, lease_seconds: float = 300) -> bool:
+        """Heartbeat for long-running jobs. Returns False if the lease was lost."""
+        now = time.time()
+        with self._transaction():
+            cur = self.conn.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? "
+                "WHERE id = ? AND status = ? AND lease_owner = ?",
+                (now + lease_seconds, now, job_id, STATUS_LEASED, worker_id),
+            )
+            return cur.rowcount == 1
+
+    def complete(self, job_id: int, worker_id: str, result: Any) -> bool:
+        """
+        Store a job's result and mark it done.
+
+        Only the current lease holder can complete a job; a worker whose lease
+        expired and was taken over gets False and its result is discarded.
+        """
+        now = time.time()
+        with self._transaction():
+            cur = self.conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, last_error = NULL, lease_owner = NULL, "
+                "lease_expires = NULL, updated_at = ? WHERE id = ? AND status = ? AND lease_owner = ?",
+                (STATUS_DONE, json.dumps(result, default=str), now, job_id, STATUS_LEASED, worker_id),
+            )
+            return cur.rowcount == 1
+
+    def fail(self, job_id: int, worker_id: str, error: str) -> Optional[str]:
+        """
+        Record a failed attempt. The job goes back to pending, or to the
+        dead-letter state once it has used all of its attempts.
+
+        Returns:
+            str: The job's new status, or None if the lease was no longer held
+        """
+        now = time.time()
+        with self._transaction():
+            row = self.conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND status = ? AND lease_owner = ?",
+                (job_id, STATUS_LEASED, worker_id),
+            ).fetchone()
+            if row is None:
+                return None
+            status = STATUS_DEAD if row["attempts"] >= row["max_attempts"] else STATUS_PENDING
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, last_error = ?, lease_owner = NULL, lease_expires = NULL, "
+                "updated_at = ? WHERE id = ?",
+                (status, str(error)[:2000], now, job_id),
+            )
+            return status
+
+    # ------------------------------------------------------------------
+    # Inspection and recovery
+    # ------------------------------------------------------------------
+    def counts(self, stage: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+        """Return {stage: {status: count}} for one or all stages."""
+        query = "SELECT stage, status, COUNT(*) AS n FROM jobs"
+        params: Tuple = ()
+        if stage:
+            query += " WHERE stage = ?"
+            params = (stage,)
+        query += " GROUP BY stage, status ORDER BY stage, status"
+        counts: Dict[str, Dict[str, int]] = {}
+        for row in self.conn.execute(query, params):
+            counts.setdefault(row["stage"], {})[row["status"]] = row["n"]
+        return counts
+
+    def is_drained(self, stage: str) -> bool:
+        """True when the stage has no pending or leased jobs left."""
+        row = self.conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE stage = ? AND status IN (?, ?)",
+            (stage, STATUS_PENDING, STATUS_LEASED),
+        ).fetchone()
+        return row[0] == 0
+
+    def results(self, stage: str) -> Iterator[Tuple[str, Any]]:
+        """Yield (job_key, result) for every done job of a stage, in enqueue order."""
+        for row in self.conn.execute(
+            "SELECT job_key, result FROM jobs WHERE stage = ? AND status = ? ORDER BY id",
+            (stage, STATUS_DONE),
+        ):
+            yield row["job_key"], json.loads(row["result"])
+
+    def dead_jobs(self, stage: Optional[str] = None) -> List[Dict[str, Any]]:
+        """List dead-letter jobs with their last error."""
+        query = "SELECT id, stage, job_key, attempts, last_error FROM jobs WHERE status = ?"
+        params: List[Any] = [STATUS_DEAD]
+        if stage:
+            query += " AND stage = ?"
+            params.append(stage)
+        return [dict(row) for row in self.conn.execute(query + " ORDER BY id", params)]
+
+    def retry_dead(self, stage: Optional[str] = None, job_ids: Optional[Iterable[int]] = None,
+                   error_contains: Optional[str] = None, job_keys: Optional[Iterable[str]] = None) -> int:
+        """
+        Move dead-letter jobs back to pending with a fresh attempt budget.
+
+        Filters combine: e.g. retry only the cost-inference jobs that died with
+        a rate-limit error. Successful (done) rows are never touched.
+
+        Returns:
+            int: Number of jobs requeued
+        """
+        query = "UPDATE jobs SET status = ?, attempts = 0, updated_at = ? WHERE status = ?"
+        params: List[Any] = [STATUS_PENDING, time.time(), STATUS_DEAD]
+        if stage:
+            query += " AND stage = ?"
+            params.append(stage)
+        if job_ids is not None:
+            ids = [int(i) for i in job_ids]
+            if not ids:
+                return 0
+            query += f" AND id IN ({','.join('?' * len(ids))})"
+            params.extend(ids)
+        if error_contains:
+            query += " AND last_error LIKE ?"
+            params.append(f"%{error_contains}%")
+        if job_keys is not None:
+            keys = [str(key) for key in job_keys]
+            if not keys:
+                return 0
+            query += f" AND job_key IN ({','.join('?' * len(keys))})"
+            params.extend(keys)
+        with self._transaction():
+            return self.conn.execute(query, params).rowcount
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK context manager."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
+        return False
+
+
+def run_worker(queue: JobQueue, stage: str, handler: Callable[[Dict[str, Any]], Any],
+               worker_id: Optional[str] = None, lease_seconds: float = 600,
+               batch_size: int = 1, poll_interval: float = 5.0, exit_when_idle: bool = True,
+               sleep_interval: float = 0, controller: Optional[AIMDController] = None) -> Dict[str, int]:
+    """
+    Pull jobs of one stage and run `handler(payload)` on each until the stage
+    is drained.
+
+    The handler returns a JSON-serializable result, or raises to record a
+    failed attempt. Start this in as many processes or machines as needed.
+    Handlers run on worker threads, as many at a time as `controller`
+    allows; jobs are only leased when a slot is free, and all queue access
+    stays on the calling thread.
+
+    Args:
+        queue (JobQueue): Queue to pull from
+        stage (str): Work unit kind to process
+        handler (callable): Function taking the job payload and returning its result
+        worker_id (str): Lease owner id; generated if not given
+        lease_seconds (float): How long a job stays leased before others may take it;
+            running jobs are renewed every half lease
+        batch_size (int): Most jobs leased per round trip to the database
+        poll_interval (float): Seconds to wait when other workers still hold leases
+        exit_when_idle (bool): Return once nothing is pending or leased
+        sleep_interval (float): Minimum seconds between job starts
+        controller (AIMDController): Adaptive window of concurrent jobs; one at a time if not given
+
+    Returns:
+        dict: Counts of done, retried and dead jobs handled by this worker
+    """
+    worker_id = worker_id or default_worker_id()
+    controller = controller or AIMDController(stage, initial=1, max_window=1)
+    stats = {"done": 0, "retried": 0, "dead": 0, "lost": 0}
+    print(f"Worker {worker_id} processing stage '{stage}' from {queue.path}")
+
+    running = {} # future -> job
+    renew_at = {} # job id -> monotonic time of its next lease renewal
+    last_start = float("-inf")
+    with ThreadPoolExecutor(max_workers=int(controller.max_window), thread_name_prefix=stage) as pool:
+        while True:
+            # Lease only as many jobs as the controller lets run right now
+            while True:
+                slots = controller.try_acquire(batch_size)
+                if not slots:
+                    break
+                jobs = queue.lease(stage, worker_id, lease_seconds=lease_seconds, limit=slots)
+                controller.release(slots - len(jobs))
+                for job in jobs:
+                    delay = last_start + sleep_interval - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    last_start = time.monotonic()
+                    future = pool.submit(handler, job["payload"])
+                    future.add_done_callback(lambda _: controller.release())
+                    running[future] = job
+                    renew_at[job["id"]] = time.monotonic() + lease_seconds / 2
+                if len(jobs) < slots:
+                    break
+
+            if not running:
+                if controller.pause_remaining():
+                    time.sleep(min(controller.pause_remaining(), poll_interval))
+                    continue
+                if exit_when_idle and queue.is_drained(stage):
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            done, _ = wait(running, timeout=min(1.0, lease_seconds / 4), return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                renew_at.pop(job["id"], None)
+                e = future.exception()
+                if e is not None:
+                    status = queue.fail(job["id"], worker_id, f"{type(e).__name__}: {e}")
+                    if status == STATUS_DEAD:
+                        stats["dead"] += 1
+                        print(f"Job {job['job_key']} moved to dead-letter after {job['attempts']} attempts: {e}")
+                    elif status == STATUS_PENDING:
+                        stats["retried"] += 1
+                        print(f"Job {job['job_key']} failed (attempt {job['attempts']}), will retry: {e}")
+                    else:
+                        stats["lost"] += 1
+                elif queue.complete(job["id"], worker_id, future.result()):
+                    stats["done"] += 1
+                else:
+                    stats["lost"] += 1
+                    print(f"Job {job['job_key']}: lease lost before completion, result discarded")
+
+            # Heartbeat: jobs still running keep their leases however long the call takes
+            now = time.monotonic()
+            for job in running.values():
+                if now < renew_at.get(job["id"], float("inf")):
+                    continue
+                if queue.extend_lease(job["id"], worker_id, lease_seconds=lease_seconds):
+                    renew_at[job["id"]] = now + lease_seconds / 2
+                else:
+                    del renew_at[job["id"]]
+                    print(f"Job {job['job_key']}: lease lost while running")
+
+    print(f"Worker {worker_id} finished: {stats}")
+    print(controller.summary())
+    return stats
+
+
+
+def process_via_queue(queue_path: str, stage: str, jobs: Iterable[Tuple[str, Dict[str, Any]]],
+                      handler: Callable[[Dict[str, Any]], Any], enqueue: bool = True, work: bool = True,
+                      sleep_interval: float = 0, max_attempts: int = 3) -> Optional[Dict[str, Any]]:
+    """
+    Run one stage through a shared queue file.
+
+    Every process started with the same input enqueues the same job keys (a
+    no-op after the first), works until the stage is drained, and returns the
+    collected results. Processes that stop while other workers still hold
+    leases return None; the last one to finish gets the results.
+
+    Args:
+        queue_path (str): Path to the SQLite queue file
+        stage (str): Work unit kind
+        jobs (iterable): (job_key, payload) pairs to enqueue
+        handler (callable): Job handler passed to `run_worker`
+        enqueue (bool): Add `jobs` to the queue first
+        work (bool): Process jobs in this process
+        sleep_interval (float): Minimum seconds between job starts
+        max_attempts (int): Attempts before a job is moved to the dead-letter state
+
+    Returns:
+        dict: {job_key: result} for every done job, or None if not drained yet
+    """
+    with JobQueue(queue_path) as queue:
+        if enqueue:
+            jobs = list(jobs)
+            created = queue.enqueue_many(stage, jobs, max_attempts=max_attempts)
+            print(f"Enqueued {created} new {stage} jobs ({len(jobs) - created} already queued)")
+        if work:
+            run_worker(queue, stage, handler, sleep_interval=sleep_interval, controller=get_controller(stage))
+            print(get_latency_policy(stage).summary())
+        if not queue.is_drained(stage):
+            print(f"Stage '{stage}' still has jobs in flight; another worker will write the results")
+            return None
+
+        dead = queue.dead_jobs(stage)
+        if dead:
+            print(f"{len(dead)} {stage} job(s) in dead-letter state; requeue them with: "
+                  f"python -m gohijau queue {queue_path} retry --stage {stage}")
+        return dict(queue.results(stage))
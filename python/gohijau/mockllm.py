@@ -0,0 +1,529 @@
+"""
+Local mock LLM server for offline benchmarks and regression runs.
+
+Speaks the two APIs the pipeline uses:
+
+* OpenAI-compatible chat completions (Perplexity), ``POST /chat/completions``
+* Gemini ``POST /v1beta/models/{model}:generateContent``, plus
+  ``/v1beta/cachedContents`` context caching (emulated locally; requests that
+  reference a cache are expanded to the full prompt before lookup)
+
+Modes:
+
+* ``record``    forward every request to the real provider and append the
+                response to a JSONL cassette
+* ``replay``    answer from the cassette; misses fall back to synthetic
+                responses (or a 404 with ``--strict``)
+* ``synthetic`` generate deterministic, well-formed responses for every
+                prompt, so every stage can run without any recordings
+
+Replay and synthetic responses can be delayed by a latency distribution, and
+a configurable share of requests fail with 500s or 429s, to exercise the
+concurrency, retry and caching behaviour of each stage. Point the pipeline at
+the server with::
+
+    export PERPLEXITY_BASE_URL=http://127.0.0.1:8765
+    export GEMINI_API_ENDPOINT=http://127.0.0.1:8765
+
+``GET /_stats`` returns request counts, status codes and peak concurrency;
+``POST /_reset`` clears them.
+"""
+
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+PERPLEXITY_UPSTREAM = "https://api.perplexity.ai"
+GEMINI_UPSTREAM = "https://generativelanguage.googleapis.com"
+
+API_CHAT = "chat"
+API_GEMINI = "gemini"
+
+_GEMINI_PATH = re.compile(r"^/(v1beta|v1)/models/([^:/]+):generateContent$")
+_CACHE_PATH = re.compile(r"^/(v1beta|v1)/(cachedContents)(?:/([^/]+))?$")
+
+
+class LatencyModel:
+    """
+    Latency distribution parsed from a spec string:
+
+        "0"                    no delay
+        "fixed:0.5"            always 0.5 s
+        "uniform:0.2,1.5"      uniform between 0.2 and 1.5 s
+        "lognormal:0.8,0.6"    median 0.8 s, log-space sigma 0.6 (long tail)
+        "exp:1.0"              exponential with mean 1.0 s
+    """
+
+    def __init__(self, spec: str = "0", rng: Optional[random.Random] = None):
+        self.spec = spec
+        self.rng = rng or random.Random()
+        kind, _, params = spec.partition(":")
+        self.kind = kind.strip().lower()
+        self.params = [float(p) for p in params.split(",") if p.strip()]
+        if self.kind not in ("0", "", "none", "fixed", "uniform", "lognormal", "exp"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self) -> float:
+        if self.kind in ("0", "", "none"):
+            return 0.0
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return self.rng.uniform(self.params[0], self.params[1])
+        if self.kind == "lognormal":
+            median, sigma = self.params
+            return self.rng.lognormvariate(math.log(median), sigma)
+        return self.rng.expovariate(1.0 / self.params[0])
+
+
+def request_key(api: str, model: str, body: Dict[str, Any]) -> str:
+    """Stable cassette key: the API, model and prompt content, ignoring transport details."""
+    if api == API_CHAT:
+        content = {"messages": body.get("messages"), "temperature": body.get("temperature")}
+    else:
+        content = {
+            "contents": body.get("contents"),
+            "systemInstruction": body.get("systemInstruction"),
+            "generationConfig": body.get("generationConfig"),
+            "cachedContent": body.get("cachedContent"),
+        }
+    canonical = json.dumps({"api": api, "model": model, **content}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _prompt_text(api: str, body: Dict[str, Any]) -> str:
+    """Concatenate the user-visible prompt text of a request."""
+    if api == API_CHAT:
+        return "\n".join(str(m.get("content", "")) for m in body.get("messages", []) if m.get("role") == "user")
+    parts = []
+    for content in body.get("contents", []):
+        for part in content.get("parts", []):
+            if "text" in part:
+                parts.append(part["text"])
+    return "\n".join(parts)
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+# ----------------------------------------------------------------------
+# Synthetic responses
+# ----------------------------------------------------------------------
+_DRIVER_VOCABULARY = [
+    (("geolocation", "plot", "coordinates"), "Geolocation data collection for production plots"),
+    (("due diligence",), "Due diligence statement preparation"),
+    (("traceab", "supply chain"), "Supply chain traceability systems"),
+    (("risk assessment", "risk"), "Risk assessment and mitigation procedures"),
+    (("record", "documentation", "information"), "Documentation and record keeping"),
+    (("audit", "verification", "check"), "Third-party verification and audits"),
+    (("satellite", "monitoring", "deforestation"), "Deforestation monitoring"),
+    (("penalt", "sanction", "fine"), "Exposure to penalties and shipment rejection"),
+]
+
+_COST_TYPES = ["Software licensing", "Data collection", "Staff training", "Audit Fees", "Compliance Setup"]
+_IMPACTS = ["Low", "Medium", "Medium to high", "High"]
+
+
+def _seeded(text: str) -> random.Random:
+    return random.Random(int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:16], 16))
+
+
+def synthetic_chat_content(prompt: str) -> Tuple[str, list]:
+    """
+    Generate a well-formed Perplexity answer for an analysis or expansion
+    prompt. Returns (content, citations).
+    """
+    rng = _seeded(prompt)
+    if "<input>" in prompt:
+        # Paragraph analysis: cost drivers named after keywords in the input text
+        text = prompt[prompt.rindex("<input>"):].lower()
+        drivers = [name for keywords, name in _DRIVER_VOCABULARY if any(k in text for k in keywords)]
+        if not drivers:
+            return "I found no explicit cost drivers in this text.\n\n<output>\nNA\n</output>", []
+        blocks = []
+        for n, driver in enumerate(drivers[:4], 1):
+            blocks.append(
+                f"<cost_driver{n}>\n{driver}\n</cost_driver{n}>\n"
+                f"<reasoning{n}>\n- Text reference: \"{driver.lower()}\"\n"
+                f"- Direct cost impact: New spending on {driver.lower()}\n"
+                f"- Operational impact: Additional processes for exporters\n</reasoning{n}>"
+            )
+        return "Let me analyze this text.\n\n<output>\n" + "\n\n".join(blocks) + "\n</output>", []
+
+    # Expansion: cost items with explicit figures next to citation markers
+    low = rng.choice([500, 1000, 2500, 5000, 10000])
+    high = low * rng.choice([2, 4, 10])
+    citations = [f"https://example.org/eudr/source-{rng.randint(1, 500)}" for _ in range(rng.randint(3, 6))]
+    marker = f"[{rng.randint(1, len(citations))}]"
+    content = (
+        "Thinking through the requirement first.\n\n<output>\n"
+        "## Explanation\nThis cost driver requires exporters to adapt their compliance processes.\n\n"
+        f"## Potential cost items\n- Implementation costs of EUR {low:,}–{high:,} per year {marker}\n"
+        f"- Staff time for ongoing reporting{marker}\n\n"
+        f"## Estimated impact\n{rng.choice(_IMPACTS)}\n\n"
+        "## Citations\n" + "\n".join(f"[{i}] {url}" for i, url in enumerate(citations, 1)) +
+        "\n</output>"
+    )
+    return content, citations
+
+
+def synthetic_gemini_text(prompt: str) -> str:
+    """Generate a Gemini answer for a process-match or cost-inference prompt."""
+    rng = _seeded(prompt)
+    if "START COST DRIVER LIST" in prompt:
+        listing = prompt.split("--- START COST DRIVER LIST ---", 1)[1].split("--- END COST DRIVER LIST ---", 1)[0]
+        drivers = [line.strip()[2:] for line in listing.splitlines() if line.strip().startswith("- ")]
+        quoted = re.findall(r'"""(.*?)"""', prompt, re.DOTALL)
+        process_words = set(re.findall(r"\w+", (quoted[0] if quoted else prompt).lower()))
+        if not drivers:
+            return "N/A"
+        return max(drivers, key=lambda d: len(process_words & set(re.findall(r"\w+", d.lower()))))
+
+    # Only look at the content under analysis, not the examples in the instructions
+    content_at = prompt.rfind("Output Content to Analyze")
+    content = prompt[content_at:] if content_at >= 0 else prompt
+    amount = re.search(r"((?:EUR|USD|€|\$)\s?[\d,.]+(?:\s?[–-]\s?[\d,.]+)?[^\[\n]*?)\s*(\[\d+\](?:\[\d+\])*)", content)
+    return json.dumps({
+        "nominal_cost": amount.group(1).strip() if amount else "N/A",
+        "cost_impact": rng.choice(_IMPACTS),
+        "cost_type": rng.choice(_COST_TYPES),
+        "nominal_cost_citation": amount.group(2) if amount else "N/A",
+    })
+
+
+def chat_completion_body(model: str, content: str, citations: list, prompt: str) -> Dict[str, Any]:
+    prompt_tokens = _estimate_tokens(prompt)
+    completion_tokens = _estimate_tokens(content)
+    return {
+        "id": f"mock-{hashlib.md5(content.encode('utf-8')).hexdigest()[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+        "citations": citations,
+    }
+
+
+def gemini_body(text: str, prompt: str) -> Dict[str, Any]:
+    prompt_tokens = _estimate_tokens(prompt)
+    completion_tokens = _estimate_tokens(text)
+    return {
+        "candidates": [{
+            "content": {"parts": [{"text": text}], "role": "model"},
+            "finishReason": "STOP",
+            "index": 0,
+        }],
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": completion_tokens,
+            "totalTokenCount": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+# ----------------------------------------------------------------------
+# Server
+# ----------------------------------------------------------------------
+class MockLLM:
+    def __init__(self, mode: str = "synthetic", cassette: Optional[str] = None, latency: str = "0",
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, retry_after: float = 1.0,
+                 strict: bool = False, seed: Optional[int] = None,
+                 perplexity_upstream: str = PERPLEXITY_UPSTREAM, gemini_upstream: str = GEMINI_UPSTREAM):
+        """
+        Shared state behind the HTTP handler.
+
+        Args:
+            mode (str): "record", "replay" or "synthetic"
+            cassette (str): JSONL file of recorded responses (required for record/replay)
+            latency (str): LatencyModel spec applied to replayed and synthetic responses
+            error_rate (float): Share of requests answered with HTTP 500
+            rate_limit_rate (float): Share of requests answered with HTTP 429
+            retry_after (float): Retry-After seconds sent with injected 429s
+            strict (bool): In replay mode, answer cassette misses with 404 instead of synthetic
+            seed (int): Seed for latency and fault injection
+        """
+        if mode not in ("record", "replay", "synthetic"):
+            raise ValueError(f"Unknown mode: {mode}")
+        if mode in ("record", "replay") and not cassette:
+            raise ValueError(f"Mode '{mode}' needs a cassette file")
+        self.mode = mode
+        self.cassette = cassette
+        self.rng = random.Random(seed)
+        self.latency = LatencyModel(latency, self.rng)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.strict = strict
+        self.upstreams = {API_CHAT: perplexity_upstream, API_GEMINI: gemini_upstream}
+        self.lock = threading.Lock()
+        self.recordings: Dict[str, Dict[str, Any]] = {}
+        self.cached_contents: Dict[str, Dict[str, Any]] = {}
+        if cassette and mode == "replay":
+            self._load_cassette()
+        self.reset_stats()
+
+    def _load_cassette(self):
+        with open(self.cassette, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.recordings[entry["key"]] = entry
+        print(f"Loaded {len(self.recordings)} recorded responses from {self.cassette}")
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {
+                "requests": 0, "by_api": {}, "by_status": {}, "replay_hits": 0, "replay_misses": 0,
+                "recorded": 0, "in_flight": 0, "peak_in_flight": 0, "prompt_chars": 0,
+                "context_caches": 0, "cached_prompt_chars": 0,
+            }
+
+    def _count(self, field: str, key: Optional[str] = None, n: int = 1):
+        with self.lock:
+            if key is None:
+                self.stats[field] += n
+            else:
+                self.stats[field][key] = self.stats[field].get(key, 0) + n
+
+    def _enter(self):
+        with self.lock:
+            self.stats["in_flight"] += 1
+            self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.stats["in_flight"])
+
+    def _leave(self):
+        with self.lock:
+            self.stats["in_flight"] -= 1
+
+    def _inject_fault(self) -> Optional[Tuple[int, Dict[str, Any], Dict[str, str]]]:
+        with self.lock:
+            draw = self.rng.random()
+        if draw < self.rate_limit_rate:
+            return 429, {"error": {"code": 429, "message": "Rate limit exceeded (injected)", "status": "RESOURCE_EXHAUSTED"}}, \
+                {"Retry-After": str(self.retry_after)}
+        if draw < self.rate_limit_rate + self.error_rate:
+            return 500, {"error": {"code": 500, "message": "Internal error (injected)", "status": "INTERNAL"}}, {}
+        return None
+
+    def _record(self, key: str, api: str, model: str, status: int, response: Dict[str, Any]):
+        entry = {"key": key, "api": api, "model": model, "status": status, "response": response}
+        with self.lock:
+            with open(self.cassette, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.recordings[key] = entry
+            self.stats["recorded"] += 1
+
+    def _forward(self, api: str, path: str, query: str, headers: Dict[str, str], raw_body: bytes):
+        url = self.upstreams[api].rstrip("/") + path + (f"?{query}" if query else "")
+        forward_headers = {k: v for k, v in headers.items()
+                           if k.lower() in ("authorization", "x-goog-api-key", "content-type")}
+        request = urllib.request.Request(url, data=raw_body, headers=forward_headers, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=600) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read() or b"{}")
+
+    def create_cached_content(self, raw_body: bytes) -> Tuple[int, Dict[str, Any]]:
+        """
+        Emulate Gemini context caching. Not available while recording, so
+        cassettes always hold full prompts and replay works with or without it.
+        """
+        if self.mode == "record":
+            return 501, {"error": {"code": 501, "message": "Context caching is not recorded by the mock"}}
+        body = json.loads(raw_body or b"{}")
+        text = _prompt_text(API_GEMINI, body)
+        name = f"cachedContents/mock-{hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]}"
+        now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        resource = {
+            "name": name, "model": body.get("model", ""), "createTime": now, "updateTime": now,
+            "expireTime": now, "usageMetadata": {"totalTokenCount": _estimate_tokens(text)},
+        }
+        with self.lock:
+            self.cached_contents[name] = {"text": text, "resource": resource}
+            self.stats["context_caches"] += 1
+        return 200, resource
+
+    def delete_cached_content(self, name: str) -> Tuple[int, Dict[str, Any]]:
+        with self.lock:
+            self.cached_contents.pop(name, None)
+        return 200, {}
+
+    def _expand_cached_content(self, body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Inline a cachedContent reference, so keys and synthetic answers see the full prompt."""
+        with self.lock:
+            cached = self.cached_contents.get(body["cachedContent"])
+        if cached is None:
+            return None
+        self._count("cached_prompt_chars", n=len(cached["text"]))
+        body = {k: v for k, v in body.items() if k != "cachedContent"}
+        body["contents"] = [{"parts": [{"text": cached["text"] + _prompt_text(API_GEMINI, body)}], "role": "user"}]
+        return body
+
+    def handle(self, api: str, model: str, path: str, query: str, headers: Dict[str, str],
+               raw_body: bytes) -> Tuple[int, Dict[str, Any], Dict[str, str]]:
+        body = json.loads(raw_body or b"{}")
+        if api == API_CHAT:
+            model = body.get("model", model)
+        elif body.get("cachedContent") and self.mode != "record":
+            expanded = self._expand_cached_content(body)
+            if expanded is None:
+                return 404, {"error": {"code": 404, "message": f"CachedContent not found: {body['cachedContent']}",
+                                       "status": "NOT_FOUND"}}, {}
+            body = expanded
+        key = request_key(api, model, body)
+        prompt = _prompt_text(api, body)
+        self._count("requests")
+        self._count("by_api", api)
+        self._count("prompt_chars", n=len(prompt))
+
+        if self.mode == "record":
+            status, response = self._forward(api, path, query, headers, raw_body)
+            if status == 200:
+                self._record(key, api, model, status, response)
+            return status, response, {}
+
+        time.sleep(self.latency.sample())
+        fault = self._inject_fault()
+        if fault:
+            return fault
+
+        if self.mode == "replay":
+            entry = self.recordings.get(key)
+            if entry:
+                self._count("replay_hits")
+                return entry["status"], entry["response"], {}
+            self._count("replay_misses")
+            if self.strict:
+                return 404, {"error": {"code": 404, "message": f"No recording for request {key[:12]}"}}, {}
+
+        if api == API_CHAT:
+            content, citations = synthetic_chat_content(prompt)
+            return 200, chat_completion_body(model, content, citations, prompt), {}
+        return 200, gemini_body(synthetic_gemini_text(prompt), prompt), {}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        mock = self.server.mock
+        if self.path.startswith("/_stats"):
+            with mock.lock:
+                self._send(200, json.loads(json.dumps(mock.stats)))
+        else:
+            self._send(404, {"error": {"code": 404, "message": "Not found"}})
+
+    def do_DELETE(self):
+        mock = self.server.mock
+        cache_match = _CACHE_PATH.match(self.path.partition("?")[0])
+        if cache_match and cache_match.group(3):
+            self._send(*mock.delete_cached_content(f"cachedContents/{cache_match.group(3)}"))
+        else:
+            self._send(404, {"error": {"code": 404, "message": "Not found"}})
+
+    def do_POST(self):
+        mock = self.server.mock
+        path, _, query = self.path.partition("?")
+        raw_body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        if path == "/_reset":
+            mock.reset_stats()
+            self._send(200, {"ok": True})
+            return
+
+        cache_match = _CACHE_PATH.match(path)
+        if cache_match and not cache_match.group(3):
+            status, body = mock.create_cached_content(raw_body)
+            mock._count("by_status", str(status))
+            self._send(status, body)
+            return
+
+        if path.rstrip("/") in ("/chat/completions", "/v1/chat/completions"):
+            api, model = API_CHAT, ""
+            upstream_path = "/chat/completions"
+        else:
+            match = _GEMINI_PATH.match(path)
+            if not match:
+                self._send(404, {"error": {"code": 404, "message": f"Unknown endpoint {path}"}})
+                return
+            api, model = API_GEMINI, match.group(2)
+            upstream_path = path
+
+        mock._enter()
+        try:
+            status, body, headers = mock.handle(api, model, upstream_path, query, dict(self.headers.items()), raw_body)
+        except Exception as e:
+            status, body, headers = 500, {"error": {"code": 500, "message": f"Mock server error: {e}"}}, {}
+        finally:
+            mock._leave()
+        mock._count("by_status", str(status))
+        self._send(status, body, headers)
+
+
+def start_server(mock: MockLLM, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    """
+    Start the mock server on a background thread and return it. Use port 0
+    to pick a free port; `server.server_address` has the one chosen.
+    Stop with `server.shutdown()`.
+    """
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.mock = mock
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def server_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def serve(mock: MockLLM, host: str = "127.0.0.1", port: int = 8765):
+    """Run the mock server in the foreground until interrupted."""
+    server = start_server(mock, host, port)
+    url = server_url(server)
+    print(f"Mock LLM server ({mock.mode}) listening on {url}")
+    print("Point the pipeline at it with:")
+    print(f"  export PERPLEXITY_BASE_URL={url}")
+    print(f"  export GEMINI_API_ENDPOINT={url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        with mock.lock:
+            print(f"Stats: {json.dumps(mock.stats)}")
@@ -0,0 +1 @@
+"""PDF to paragraph extraction."""
@@ -0,0 +1,211 @@
+"""
+Exact and near-duplicate paragraph detection across PDFs.
+
+The same recitals and article texts recur in the regulation, its corrigenda,
+guidance documents and FAQs. Every paragraph gets a `canonical_row`: the row
+of the first paragraph with the same text. Two paragraphs count as the same
+text in two cases:
+
+- exact: the SHA-1 of the normalized text (Unicode NFKC, lower case,
+  punctuation and whitespace collapsed) is identical;
+- near: the estimated Jaccard similarity of the word 5-shingles is at least
+  `NEAR_DUPLICATE_THRESHOLD`. The estimate comes from a MinHash signature,
+  and candidate pairs come from LSH banding, so paragraphs are never
+  compared all-against-all.
+
+Near duplicates are always compared with a canonical paragraph, never with
+another duplicate, so clusters cannot drift through chains of small edits.
+The analysis stage only sends canonical rows and copies their results to
+every duplicate, which keeps its own document_name and page_number.
+"""
+
+import hashlib
+import re
+import unicodedata
+import zlib
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from gohijau.pdf.records import ParagraphRecords
+
+NEAR_DUPLICATE_THRESHOLD = 0.8 # Estimated Jaccard similarity of word shingles
+SHINGLE_SIZE = 5 # Words per shingle
+NUM_PERM = 128 # MinHash signature length
+LSH_BANDS = 16 # Bands x rows = NUM_PERM; 16 x 8 puts the LSH threshold near 0.7
+MIN_NEAR_WORDS = 8 # Shorter paragraphs (headers etc.) are only deduplicated exactly
+
+# Columns added to the paragraph records
+CANONICAL_COLUMN = 'canonical_row'
+DUPLICATE_KIND_COLUMN = 'duplicate_kind'
+SIMILARITY_COLUMN = 'duplicate_similarity'
+
+_NON_WORD = re.compile(r'[^\w\s]+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_text(text) -> str:
+    """Normalize text for duplicate detection (NFKC, lower case, no punctuation, single spaces)."""
+    if not isinstance(text, str):
+        return ""
+    text = unicodedata.normalize('NFKC', text).lower()
+    # Rejoin words hyphenated across PDF line breaks
+    text = re.sub(r'(\w)-\s+(\w)', r'\1\2', text)
+    text = _NON_WORD.sub(' ', text)
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+class MinHasher:
+    """
+    MinHash signatures over 32-bit shingle hashes with `num_perm`
+    multiply-shift hash functions ``((a * x + b) mod 2^64) >> 32``.
+    """
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        # Random 64-bit a and b; uint64 arithmetic wraps, which is the mod 2^64
+        self.a = rng.integers(0, 1 << 64, size=num_perm, dtype=np.uint64, endpoint=False)
+        self.b = rng.integers(0, 1 << 64, size=num_perm, dtype=np.uint64, endpoint=False)
+
+    @staticmethod
+    def shingle_hashes(words: Sequence[str], size: int = SHINGLE_SIZE) -> np.ndarray:
+        """Distinct CRC32 hashes of the word `size`-shingles (the whole text if shorter)."""
+        if len(words) <= size:
+            shingles = {' '.join(words)}
+        else:
+            shingles = {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+        return np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64,
+                           count=len(shingles))
+
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        """MinHash signature of a set of shingle hashes."""
+        return ((hashes[:, None] * self.a + self.b) >> np.uint64(32)).min(axis=0)
+
+
+def find_duplicates(texts: Sequence[str], threshold: float = NEAR_DUPLICATE_THRESHOLD, near: bool = True,
+                    num_perm: int = NUM_PERM, bands: int = LSH_BANDS, shingle_size: int = SHINGLE_SIZE,
+                    min_words: int = MIN_NEAR_WORDS) -> Tuple[List[int], List[str], List[float]]:
+    """
+    Assign every text to the position of its canonical copy.
+
+    The first occurrence of a text is canonical; later exact or near copies
+    point at it.
+
+    Args:
+        texts (list): Paragraph texts in document order
+        threshold (float): Minimum estimated Jaccard similarity for a near duplicate
+        near (bool): Also detect near duplicates (exact only if False)
+        num_perm (int): MinHash signature length
+        bands (int): LSH bands; must divide `num_perm`
+        shingle_size (int): Words per shingle
+        min_words (int): Shorter texts are only matched exactly
+
+    Returns:
+        tuple: (canonical position, "" / "exact" / "near", similarity) per text
+    """
+    if num_perm % bands:
+        raise ValueError(f"bands ({bands}) must divide num_perm ({num_perm})")
+    rows = num_perm // bands
+    hasher = MinHasher(num_perm)
+
+    canonical = list(range(len(texts)))
+    kinds = [""] * len(texts)
+    similarity = [1.0] * len(texts)
+    first_by_digest: Dict[bytes, int] = {}
+    signatures: Dict[int, np.ndarray] = {}
+    buckets = [{} for _ in range(bands)]
+
+    for i, text in enumerate(texts):
+        normalized = normalize_text(text)
+        digest = hashlib.sha1(normalized.encode('utf-8')).digest()
+        if digest in first_by_digest:
+            canonical[i] = first_by_digest[digest]
+            kinds[i] = "exact"
+            continue
+        first_by_digest[digest] = i
+
+        words = normalized.split()
+        if not near or len(words) < min_words:
+            continue
+        signature = hasher.signature(MinHasher.shingle_hashes(words, shingle_size))
+        keys = [signature[band * rows:(band + 1) * rows].tobytes() for band in range(bands)]
+
+        candidates = set()
+        for band, key in enumerate(keys):
+            candidates.update(buckets[band].get(key, ()))
+        if candidates:
+            best = min(candidates) # Earliest canonical wins ties
+            best_similarity = -1.0
+            for j in sorted(candidates):
+                estimate = float(np.mean(signatures[j] == signature))
+                if estimate > best_similarity:
+                    best, best_similarity = j, estimate
+            if best_similarity >= threshold:
+                canonical[i] = best
+                kinds[i] = "near"
+                similarity[i] = round(best_similarity, 3)
+                # Exact copies of a near duplicate point at its canonical, which is analyzed
+                first_by_digest[digest] = best
+                continue
+
+        # Only canonical paragraphs are indexed
+        signatures[i] = signature
+        for band, key in enumerate(keys):
+            buckets[band].setdefault(key, []).append(i)
+
+    return canonical, kinds, similarity
+
+
+def annotate_duplicates(paragraphs, threshold: float = NEAR_DUPLICATE_THRESHOLD,
+                        near: bool = True) -> Dict[str, int]:
+    """
+    Add `canonical_row`, `duplicate_kind` and `duplicate_similarity` to
+    paragraph records in place: the `ParagraphRecords` returned by
+    `process_all_pdfs`, or a list of dicts.
+
+    `canonical_row` is the 0-based position of the canonical record, i.e.
+    its row index once the records are saved and read back.
+
+    Returns:
+        dict: Counts of paragraphs, canonical paragraphs, exact and near duplicates
+    """
+    if isinstance(paragraphs, ParagraphRecords):
+        canonical, kinds, similarity = find_duplicates(paragraphs.texts, threshold, near)
+        paragraphs.set_column(CANONICAL_COLUMN, canonical)
+        paragraphs.set_column(DUPLICATE_KIND_COLUMN, kinds)
+        paragraphs.set_column(SIMILARITY_COLUMN, similarity)
+    else:
+        canonical, kinds, similarity = find_duplicates([p.get('text') for p in paragraphs], threshold, near)
+        for paragraph, row, kind, score in zip(paragraphs, canonical, kinds, similarity):
+            paragraph[CANONICAL_COLUMN] = row
+            paragraph[DUPLICATE_KIND_COLUMN] = kind
+            paragraph[SIMILARITY_COLUMN] = score
+    stats = {
+        "paragraphs": len(paragraphs),
+        "canonical": sum(1 for kind in kinds if not kind),
+        "exact": kinds.count("exact"),
+        "near": kinds.count("near"),
+    }
+    print(f"Deduplication: {stats['paragraphs']} paragraphs -> {stats['canonical']} canonical "
+          f"({stats['exact']} exact, {stats['near']} near duplicates)")
+    return stats
+
+
+def duplicate_rows(df) -> Dict:
+    """
+    Map each duplicate row label of `df` to its canonical row label.
+
+    Rows without a `canonical_row` value, and rows whose canonical row is not
+    in `df` (e.g. after --limit), count as canonical and are left out.
+    """
+    if CANONICAL_COLUMN not in df.columns:
+        return {}
+    index = set(df.index)
+    duplicates = {}
+    for label, canonical in df[CANONICAL_COLUMN].items():
+        if canonical != canonical or canonical is None: # NaN
+            continue
+        canonical = int(canonical)
+        if canonical != label and canonical in index:
+            duplicates[label] = canonical
+    return duplicates
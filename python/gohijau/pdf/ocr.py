@@ -0,0 +1,140 @@
+"""
+OCR fallback for PDF pages without a text layer.
+
+Scanned annexes and image-only national regulations have pages from which
+PyPDF2 and pdfplumber extract nothing, or only a stray page number. Only
+those pages are rendered (pypdfium2, which pdfplumber already installs) and
+read with Tesseract (pytesseract plus the `tesseract` binary). Pages are OCRed
+in a process pool. Each result is cached under a key made from the PDF
+file's sha256, the page index, the DPI and the languages. The key is known
+before anything is rendered, so a rerun over an unchanged file opens
+nothing and renders nothing for the cached pages.
+
+Without pytesseract or the binary, the fallback prints one warning and the
+pages stay empty, as before.
+"""
+
+import functools
+import hashlib
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+from gohijau.config import OCR_CACHE_DIR
+
+MIN_TEXT_CHARS = 20 # Pages with fewer non-blank characters are OCRed
+DEFAULT_LANG = "eng" # Tesseract languages, e.g. "eng+ind" with the Indonesian data installed
+DEFAULT_DPI = 300
+
+
+@functools.lru_cache(maxsize=None)
+def ocr_available() -> bool:
+    """Whether pytesseract and the tesseract binary are installed (warns once if not)."""
+    try:
+        import pytesseract # noqa: F401
+    except ImportError:
+        print("Warning: pytesseract is not installed; pages without text are not OCRed")
+        return False
+    if shutil.which("tesseract") is None:
+        print("Warning: the tesseract binary is not on PATH; pages without text are not OCRed")
+        return False
+    return True
+
+
+def needs_ocr(text: Optional[str], min_chars: int = MIN_TEXT_CHARS) -> bool:
+    """Whether extracted page text is empty or near-empty."""
+    return not text or len("".join(text.split())) < min_chars
+
+
+def file_digest(path: str) -> str:
+    """sha256 of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def page_key(pdf_digest: str, page_index: int, lang: str, dpi: int) -> str:
+    """Cache key of one page's OCR text."""
+    return hashlib.sha256(f"{pdf_digest}|{page_index}|{dpi}|{lang}".encode()).hexdigest()
+
+
+def _read_cache(cache_path: Optional[str]) -> Optional[str]:
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, encoding="utf-8") as f:
+            return f.read()
+    return None
+
+
+def _ocr_page(task) -> str:
+    """Worker: render and OCR one page, then cache its text."""
+    import pypdfium2
+    import pytesseract
+
+    pdf_path, page_index, lang, dpi, cache_path = task
+    pdf = pypdfium2.PdfDocument(pdf_path)
+    try:
+        image = pdf[page_index].render(scale=dpi / 72).to_pil().convert("L")
+    finally:
+        pdf.close()
+    text = pytesseract.image_to_string(image, lang=lang)
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, cache_path)
+    return text
+
+
+def ocr_empty_pages(pdf_path: str, texts: Sequence[Optional[str]], lang: str = DEFAULT_LANG, dpi: int = DEFAULT_DPI,
+                    workers: Optional[int] = None, cache_dir: Optional[str] = OCR_CACHE_DIR,
+                    min_chars: int = MIN_TEXT_CHARS) -> List[Optional[str]]:
+    """
+    Fill in the empty or near-empty pages of a document by OCR.
+
+    Args:
+        pdf_path (str): The PDF
+        texts (list): Extracted text per page (None or '' for none)
+        lang (str): Tesseract languages
+        dpi (int): Render resolution
+        workers (int): Worker processes (default: CPU count; 1 runs inline)
+        cache_dir (str): OCR cache directory (None: no cache)
+        min_chars (int): Pages with fewer non-blank characters are OCRed
+
+    Returns:
+        list: Page texts, with OCR text where it found more than the text layer
+    """
+    pages = [i for i, text in enumerate(texts) if needs_ocr(text, min_chars)]
+    texts = list(texts)
+    if not pages or not ocr_available():
+        return texts
+    results: Dict[int, str] = {}
+    tasks = []
+    digest = file_digest(pdf_path) if cache_dir else None
+    for i in pages:
+        cache_path = os.path.join(cache_dir, f"{page_key(digest, i, lang, dpi)}.txt") if cache_dir else None
+        cached = _read_cache(cache_path)
+        if cached is not None:
+            results[i] = cached
+        else:
+            tasks.append((pdf_path, i, lang, dpi, cache_path))
+    name = os.path.basename(pdf_path)
+    if tasks:
+        workers = min(workers or os.cpu_count() or 1, len(tasks))
+        print(f"OCR of {len(tasks)} page(s) without text in {name} with {workers} worker(s) "
+              f"({len(results)} cached)")
+        if workers == 1:
+            ocr_texts = list(map(_ocr_page, tasks))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                ocr_texts = list(pool.map(_ocr_page, tasks))
+        results.update(zip((task[1] for task in tasks), ocr_texts))
+    else:
+        print(f"OCR text of {len(results)} page(s) without text in {name} read from the cache")
+    for i, text in sorted(results.items()):
+        if len(text.strip()) > len((texts[i] or "").strip()):
+            texts[i] = text
+    return texts
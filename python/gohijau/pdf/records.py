@@ -0,0 +1,148 @@
+"""
+Compact, column-oriented paragraph records for the PDF processors.
+
+The processors used to keep one dict per paragraph, with the document name
+and the article string repeated in every one. `ParagraphRecords` keeps one
+column per field instead. Document names and articles are interned into
+small tables and stored as int32 ids, and the numbers are int32 arrays, so a
+paragraph costs a few dozen bytes besides its text, against several hundred
+for a dict. `to_dataframe` builds every column by array indexing, without
+going through per-row dicts.
+
+Indexing a single record still returns the old dict, so code that reads
+records one at a time keeps working.
+"""
+
+from array import array
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ('document_name', 'page_number', 'paragraph_number', 'article', 'text', 'word_count')
+
+
+class ParagraphRecords:
+    """Paragraphs as parallel columns, with interned document names and articles."""
+
+    def __init__(self):
+        self.documents: List[str] = []
+        self.articles: List[str] = []
+        self._document_ids: Dict[str, int] = {}
+        self._article_ids: Dict[str, int] = {}
+        self.document_id = array('i')
+        self.page_number = array('i')
+        self.paragraph_number = array('i')
+        self.article_id = array('i') # -1: no article yet
+        self.word_count = array('i')
+        self.texts: List[str] = []
+        self.extra: Dict[str, list] = {} # Columns added later, e.g. by dedup
+
+    def _intern_document(self, name: str) -> int:
+        document = self._document_ids.get(name)
+        if document is None:
+            document = self._document_ids[name] = len(self.documents)
+            self.documents.append(name)
+        return document
+
+    def _intern_article(self, article: Optional[str]) -> int:
+        if article is None:
+            return -1
+        article_id = self._article_ids.get(article)
+        if article_id is None:
+            article_id = self._article_ids[article] = len(self.articles)
+            self.articles.append(article)
+        return article_id
+
+    def append(self, document_name: str, page_number: int, article: Optional[str], text: str,
+               word_count: Optional[int] = None, paragraph_number: Optional[int] = None):
+        """
+        Add one paragraph.
+
+        Args:
+            document_name (str): PDF file name
+            page_number (int): 1-based page
+            article (str): Current article header, or None
+            text (str): Paragraph text
+            word_count (int): Words in `text` (counted if not given)
+            paragraph_number (int): Default: the paragraph's 1-based position
+        """
+        if self.extra:
+            raise ValueError("Cannot append to records with added columns")
+        self.document_id.append(self._intern_document(document_name))
+        self.page_number.append(page_number)
+        self.paragraph_number.append(len(self.texts) + 1 if paragraph_number is None else paragraph_number)
+        self.article_id.append(self._intern_article(article))
+        self.word_count.append(len(text.split()) if word_count is None else word_count)
+        self.texts.append(text)
+
+    def extend(self, other: "ParagraphRecords"):
+        """Append all of `other`'s paragraphs, keeping their paragraph numbers."""
+        if self.extra or other.extra:
+            raise ValueError("Cannot extend records with added columns")
+        documents = array('i', [self._intern_document(name) for name in other.documents])
+        articles = array('i', [self._intern_article(article) for article in other.articles])
+        self.document_id.extend(documents[i] for i in other.document_id)
+        self.article_id.extend(articles[i] if i >= 0 else -1 for i in other.article_id)
+        self.page_number.extend(other.page_number)
+        self.paragraph_number.extend(other.paragraph_number)
+        self.word_count.extend(other.word_count)
+        self.texts.extend(other.texts)
+
+    def set_column(self, name: str, values: Sequence):
+        """Add (or replace) a column with one value per paragraph."""
+        if len(values) != len(self):
+            raise ValueError(f"Column {name!r} has {len(values)} values for {len(self)} paragraphs")
+        self.extra[name] = list(values)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._take(index)
+        if index < 0:
+            index += len(self)
+        article = self.article_id[index]
+        record = {
+            'document_name': self.documents[self.document_id[index]],
+            'page_number': self.page_number[index],
+            'paragraph_number': self.paragraph_number[index],
+            'article': self.articles[article] if article >= 0 else None,
+            'text': self.texts[index],
+            'word_count': self.word_count[index],
+        }
+        record.update((name, values[index]) for name, values in self.extra.items())
+        return record
+
+    def __iter__(self) -> Iterator[dict]:
+        return (self[i] for i in range(len(self)))
+
+    def _take(self, rows: slice) -> "ParagraphRecords":
+        out = ParagraphRecords()
+        out.documents, out.articles = list(self.documents), list(self.articles)
+        out._document_ids, out._article_ids = dict(self._document_ids), dict(self._article_ids)
+        for name in ('document_id', 'page_number', 'paragraph_number', 'article_id', 'word_count'):
+            getattr(out, name).extend(getattr(self, name)[rows])
+        out.texts = self.texts[rows]
+        out.extra = {name: values[rows] for name, values in self.extra.items()}
+        return out
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """The paragraph sheet: the `COLUMNS`, then any added columns."""
+        def ints(values: array) -> np.ndarray:
+            return np.frombuffer(values, dtype=np.intc).astype(np.int64) if len(values) else np.empty(0, np.int64)
+
+        documents = np.array(self.documents, dtype=object)
+        articles = np.array(self.articles + [None], dtype=object) # id -1 picks the trailing None
+        df = pd.DataFrame({
+            'document_name': documents[ints(self.document_id)],
+            'page_number': ints(self.page_number),
+            'paragraph_number': ints(self.paragraph_number),
+            'article': articles[ints(self.article_id)],
+            'text': np.array(self.texts, dtype=object),
+            'word_count': ints(self.word_count),
+        })
+        for name, values in self.extra.items():
+            df[name] = values
+        return df
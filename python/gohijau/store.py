@@ -0,0 +1,739 @@
+"""
+Normalized SQLite store for the pipeline's data.
+
+The Excel hand-offs between stages are wide sheets. Paragraph metadata is
+copied onto every cost driver row, citation lists are Python-repr strings,
+and matches are joined back to drivers by raw text. With `--store`, the
+stages read and write these tables instead:
+
+    documents    (id, name)
+    paragraphs   (id, document_id, page_number, ..., text, canonical_id)
+    analyses     (id, paragraph_id, position, response_blob)
+    drivers      (id, paragraph_id, analysis_id, position, number, cost_driver, reasoning)
+    expansions   (driver_id, raw_blob, output_start, output_end, output_blob, has_citations)
+    urls         (id, url)
+    citations    (driver_id, position, url_id)
+    processes    (id, process, data)
+    matches      (process_id, cost_driver, driver_text)
+    inferences   (process_id, nominal_cost, cost_impact, cost_type, citation_marker, ...)
+
+Keys are integers and every join column is indexed. Paragraph and process ids
+are their row positions in the stage inputs, so `canonical_row` and the
+stage frames line up. The `*_frame` methods rebuild exactly the DataFrames
+the stages already consume; `export` writes them as the usual Excel files.
+
+Raw responses live in the compressed blob table of `gohijau.blobs`.
+Identical responses are stored once. `output_content` is kept as a span into
+its raw response. Responses are decompressed only when a frame or lookup
+needs them.
+
+    python -m gohijau pdf --store ../data/output/eudr.sqlite
+    python -m gohijau analyze --store ../data/output/eudr.sqlite
+    ...
+    python -m gohijau store ../data/output/eudr.sqlite sources "Geolocation data collection"
+"""
+
+import ast
+import json
+import os
+import sqlite3
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from gohijau.blobs import BlobStore, referenced_ids, span_of
+
+SCHEMA_VERSION = 2 # Bumped when a table changes shape; older files must be re-imported
+
+# Columns holding blob ids; blobs no longer referenced from them are pruned
+_BLOB_COLUMNS = ["analyses.response_blob", "expansions.raw_blob", "expansions.output_blob"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id   INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS paragraphs (
+    id                   INTEGER PRIMARY KEY,
+    document_id          INTEGER REFERENCES documents (id),
+    page_number          INTEGER,
+    paragraph_number     INTEGER,
+    article              TEXT,
+    text                 TEXT,
+    word_count           INTEGER,
+    canonical_id         INTEGER REFERENCES paragraphs (id),
+    duplicate_kind       TEXT,
+    duplicate_similarity REAL
+);
+CREATE INDEX IF NOT EXISTS idx_paragraphs_document ON paragraphs (document_id, page_number);
+CREATE INDEX IF NOT EXISTS idx_paragraphs_canonical ON paragraphs (canonical_id);
+CREATE TABLE IF NOT EXISTS analyses (
+    id           INTEGER PRIMARY KEY,
+    paragraph_id INTEGER NOT NULL REFERENCES paragraphs (id),
+    position     INTEGER NOT NULL,
+    response_blob INTEGER REFERENCES blobs (id),
+    UNIQUE (paragraph_id, position)
+);
+CREATE TABLE IF NOT EXISTS drivers (
+    id           INTEGER PRIMARY KEY,
+    paragraph_id INTEGER NOT NULL REFERENCES paragraphs (id),
+    analysis_id  INTEGER NOT NULL REFERENCES analyses (id),
+    position     INTEGER NOT NULL,
+    number       TEXT,
+    cost_driver  TEXT,
+    reasoning    TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_drivers_paragraph ON drivers (paragraph_id);
+CREATE INDEX IF NOT EXISTS idx_drivers_analysis ON drivers (analysis_id);
+CREATE INDEX IF NOT EXISTS idx_drivers_text ON drivers (cost_driver);
+CREATE TABLE IF NOT EXISTS expansions (
+    driver_id      INTEGER PRIMARY KEY REFERENCES drivers (id),
+    raw_blob       INTEGER REFERENCES blobs (id),
+    output_start   INTEGER,                     -- output_content = raw text [output_start:output_end]
+    output_end     INTEGER,
+    output_blob    INTEGER REFERENCES blobs (id), -- output_content when it is not a slice of the raw text
+    has_citations  INTEGER NOT NULL DEFAULT 0, -- 0: the response had no citation list
+    citations_text TEXT                         -- citation value that was not a list, kept verbatim
+);
+CREATE TABLE IF NOT EXISTS urls (
+    id  INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS citations (
+    driver_id INTEGER NOT NULL REFERENCES expansions (driver_id),
+    position  INTEGER NOT NULL,
+    url_id    INTEGER NOT NULL REFERENCES urls (id),
+    PRIMARY KEY (driver_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_citations_url ON citations (url_id);
+CREATE TABLE IF NOT EXISTS processes (
+    id      INTEGER PRIMARY KEY,
+    process TEXT,
+    data    TEXT NOT NULL -- JSON object of the input row, columns in sheet order
+);
+CREATE INDEX IF NOT EXISTS idx_processes_process ON processes (process);
+CREATE TABLE IF NOT EXISTS matches (
+    process_id  INTEGER PRIMARY KEY REFERENCES processes (id),
+    cost_driver TEXT,      -- Matched driver, or the failure status
+    driver_text TEXT       -- Matched driver text when the match succeeded
+);
+CREATE INDEX IF NOT EXISTS idx_matches_driver ON matches (driver_text);
+CREATE TABLE IF NOT EXISTS inferences (
+    process_id       INTEGER PRIMARY KEY REFERENCES processes (id),
+    nominal_cost     TEXT,
+    cost_impact      TEXT,
+    cost_type        TEXT,
+    citation_marker  TEXT,
+    source           TEXT,
+    confidence       REAL,
+    mapped_citations TEXT
+);
+"""
+
+# Tables in dependency order; clearing one also clears everything derived from it
+_DERIVED = {
+    "paragraphs": ("analyses", "drivers", "expansions", "citations"),
+    "analyses": ("drivers", "expansions", "citations"),
+    "drivers": ("expansions", "citations"),
+    "expansions": ("citations",),
+    "processes": ("matches", "inferences"),
+    "matches": ("inferences",),
+}
+
+
+def _value(value):
+    """DataFrame cell -> SQLite value (NaN and NA become NULL, numpy scalars plain Python)."""
+    if value is None:
+        return None
+    if isinstance(value, (list, dict, tuple)):
+        return str(value)
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return value.item() if hasattr(value, "item") else value
+
+
+def response_text(response) -> Optional[str]:
+    """Text of one analysis response: the message content of SDK objects, strings as they are."""
+    if response is None:
+        return None
+    if isinstance(response, str):
+        return response
+    choices = getattr(response, "choices", None)
+    if choices:
+        return choices[0].message.content or ""
+    return str(response)
+
+
+def parse_citations(value) -> Tuple[bool, Optional[List[str]], Optional[str]]:
+    """
+    Split a citations cell into (has citations, URL list, verbatim text).
+
+    Lists (or their repr strings, as written to Excel) become URL lists;
+    anything else non-empty is kept verbatim.
+    """
+    value = _value(value)
+    if value is None:
+        return False, None, None
+    if isinstance(value, str):
+        try:
+            parsed = ast.literal_eval(value)
+        except (ValueError, SyntaxError, TypeError):
+            return True, None, value
+        if isinstance(parsed, (list, tuple)):
+            return True, [str(url) for url in parsed], None
+    return True, None, str(value)
+
+
+class PipelineStore:
+    def __init__(self, path: str, codec: Optional[str] = None):
+        """
+        Open (and create if needed) a pipeline store.
+
+        Args:
+            path (str): Path to the SQLite file
+            codec (str): Compression for new response blobs, 'zstd' or 'zlib'
+                (default: zstd if installed)
+        """
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        tables = self.conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'analyses'").fetchone()[0]
+        if tables and version < SCHEMA_VERSION:
+            self.conn.close()
+            raise RuntimeError(f"{path} was written by an older version of the store (schema {version}, "
+                               f"need {SCHEMA_VERSION}); export it with that version and import into a new file")
+        self.blobs = BlobStore(self.conn, codec)
+        self.conn.executescript(_SCHEMA)
+        self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _clear(self, table: str):
+        """Delete `table` and every table derived from it (children first)."""
+        for name in reversed((table,) + _DERIVED.get(table, ())):
+            self.conn.execute(f"DELETE FROM {name}")
+
+    def _prune_blobs(self):
+        """Drop response blobs that no table references any more."""
+        self.blobs.prune(referenced_ids(self.conn, _BLOB_COLUMNS))
+
+    def _count(self, table: str) -> int:
+        return self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    # ------------------------------------------------------------------
+    # Stage 1: paragraphs
+    # ------------------------------------------------------------------
+    def write_paragraphs(self, paragraphs) -> int:
+        """
+        Replace the paragraphs (and everything derived from them).
+
+        Args:
+            paragraphs: DataFrame, ParagraphRecords or list of dicts as produced
+                by the pdf stage; the row position becomes the paragraph id
+
+        Returns:
+            int: Paragraphs written
+        """
+        if isinstance(paragraphs, pd.DataFrame):
+            df = paragraphs
+        elif hasattr(paragraphs, 'to_dataframe'):
+            df = paragraphs.to_dataframe()
+        else:
+            df = pd.DataFrame(paragraphs)
+        df = df.reset_index(drop=True)
+        with self.conn:
+            self._clear("paragraphs")
+            self.conn.execute("DELETE FROM documents")
+            documents = {}
+            for name in df.get('document_name', pd.Series(dtype=object)).dropna().unique():
+                documents[name] = self.conn.execute("INSERT INTO documents (name) VALUES (?)",
+                                                    (str(name),)).lastrowid
+
+            def column(name):
+                return df[name] if name in df.columns else pd.Series([None] * len(df))
+
+            rows = zip(range(len(df)), column('document_name'), column('page_number'), column('paragraph_number'),
+                       column('article'), column('text'), column('word_count'), column('canonical_row'),
+                       column('duplicate_kind'), column('duplicate_similarity'))
+            self.conn.executemany(
+                "INSERT INTO paragraphs (id, document_id, page_number, paragraph_number, article, text, word_count, "
+                "canonical_id, duplicate_kind, duplicate_similarity) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ((i, documents.get(doc), _value(page), _value(number), _value(article), _value(text),
+                  _value(words), _value(canonical), _value(kind) or None, _value(similarity))
+                 for i, doc, page, number, article, text, words, canonical, kind, similarity in rows)
+            )
+        print(f"Store: wrote {len(df)} paragraphs from {len(documents)} documents to {self.path}")
+        return len(df)
+
+    def paragraphs_frame(self) -> pd.DataFrame:
+        """The paragraphs sheet, as written by `gohijau pdf`."""
+        df = pd.read_sql_query(
+            "SELECT p.id, d.name AS document_name, p.page_number, p.paragraph_number, p.article, p.text, "
+            "p.word_count, p.canonical_id AS canonical_row, p.duplicate_kind, p.duplicate_similarity "
+            "FROM paragraphs p LEFT JOIN documents d ON d.id = p.document_id ORDER BY p.id",
+            self.conn, index_col="id",
+        )
+        df.index.name = None
+        if df['canonical_row'].isna().all():
+            df = df.drop(columns=['canonical_row', 'duplicate_kind', 'duplicate_similarity'])
+        else:
+            df['duplicate_kind'] = df['duplicate_kind'].fillna("")
+        return df
+
+    # ------------------------------------------------------------------
+    # Stages 2-3: analyses and drivers
+    # ------------------------------------------------------------------
+    def write_analyses(self, df: pd.DataFrame) -> int:
+        """
+        Replace the analyses with the 'cost_driver_analysis' lists of `df`
+        (the analysis stage output, indexed like `paragraphs_frame`).
+
+        Returns:
+            int: Analyses written
+        """
+        rows = []
+        for paragraph_id, responses in df['cost_driver_analysis'].items():
+            if responses is None or (not isinstance(responses, list) and pd.isna(responses)):
+                continue
+            if not isinstance(responses, list):
+                responses = [responses]
+            rows.extend((int(paragraph_id), position, response_text(response))
+                        for position, response in enumerate(responses))
+        with self.conn:
+            self._clear("analyses")
+            # Duplicate paragraphs carry the same responses; put() stores each text once
+            self.conn.executemany(
+                "INSERT INTO analyses (paragraph_id, position, response_blob) VALUES (?, ?, ?)",
+                [(paragraph_id, position, self.blobs.put(text)) for paragraph_id, position, text in rows])
+            self._prune_blobs()
+        print(f"Store: wrote {len(rows)} analyses")
+        return len(rows)
+
+    def analysis_frame(self) -> pd.DataFrame:
+        """The raw responses sheet: paragraphs plus a 'cost_driver_analysis' list per row."""
+        df = self.paragraphs_frame()
+        df['cost_driver_analysis'] = None
+        rows = self.conn.execute(
+            "SELECT paragraph_id, response_blob FROM analyses ORDER BY paragraph_id, position").fetchall()
+        texts = self.blobs.get_many(blob_id for _, blob_id in rows)
+        by_paragraph: Dict[int, List[str]] = {}
+        for paragraph_id, blob_id in rows:
+            by_paragraph.setdefault(paragraph_id, []).append(texts.get(blob_id))
+        for paragraph_id, responses in by_paragraph.items():
+            df.at[paragraph_id, 'cost_driver_analysis'] = responses
+        return df
+
+    def extract_drivers(self) -> int:
+        """
+        Stage 3 on the store: parse every analysis into driver rows with the
+        same logic as `extraction.extract_cost_drivers`. Metadata stays on
+        the paragraph; drivers only reference it.
+
+        Returns:
+            int: Driver rows written (NA rows included)
+        """
+        from gohijau.eudr.extraction import extract_cost_drivers_and_reasoning
+
+        rows = []
+        for analysis_id, paragraph_id, blob_id in self.conn.execute(
+                "SELECT id, paragraph_id, response_blob FROM analyses ORDER BY paragraph_id, position").fetchall():
+            # Responses are stored as their message content already; one decompressed at a time
+            for position, item in enumerate(extract_cost_drivers_and_reasoning(self.blobs.get(blob_id) or "")):
+                if item.get('is_na', False):
+                    rows.append((paragraph_id, analysis_id, position, 'NA', 'NA', 'NA'))
+                else:
+                    rows.append((paragraph_id, analysis_id, position, item['cost_driver_number'],
+                                 item['cost_driver'], item['reasoning']))
+        with self.conn:
+            self._clear("drivers")
+            self.conn.executemany(
+                "INSERT INTO drivers (paragraph_id, analysis_id, position, number, cost_driver, reasoning) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+        print(f"Store: extracted {len(rows)} driver rows")
+        return len(rows)
+
+    _DRIVER_QUERY = (
+        "SELECT r.id AS driver_id, d.name AS document_name, p.page_number, p.article, p.text, "
+        "r.number AS cost_driver_number, r.cost_driver, r.reasoning "
+        "FROM drivers r JOIN paragraphs p ON p.id = r.paragraph_id "
+        "LEFT JOIN documents d ON d.id = p.document_id"
+    )
+
+    def drivers_frame(self) -> pd.DataFrame:
+        """The extracted drivers sheet, plus the 'driver_id' key."""
+        return pd.read_sql_query(self._DRIVER_QUERY + " ORDER BY r.paragraph_id, r.analysis_id, r.position",
+                                 self.conn)
+
+    def driver_ids(self, keys: Sequence[Tuple[int, int, int]],
+                   cost_drivers: Optional[Sequence[str]] = None) -> List[int]:
+        """
+        Look up driver ids by (paragraph id, analysis position, driver
+        position), e.g. the pipeline's 'driver_keys'.
+
+        Args:
+            keys (list): One key per driver row
+            cost_drivers (list): The rows' cost_driver text, checked against the store
+
+        Returns:
+            list: Driver id per key
+
+        Raises:
+            ValueError: If a key is not in the store, or names a different driver
+        """
+        stored = {(paragraph_id, analysis_position, position): (driver_id, cost_driver)
+                  for driver_id, paragraph_id, analysis_position, position, cost_driver in self.conn.execute(
+                      "SELECT r.id, r.paragraph_id, a.position, r.position, r.cost_driver "
+                      "FROM drivers r JOIN analyses a ON a.id = r.analysis_id")}
+        ids, missing, mismatched = [], [], []
+        for i, key in enumerate(keys):
+            key = tuple(int(k) for k in key)
+            if key not in stored:
+                missing.append(key)
+                continue
+            driver_id, cost_driver = stored[key]
+            if cost_drivers is not None and cost_drivers[i] != cost_driver:
+                mismatched.append(key)
+            ids.append(driver_id)
+        if missing or mismatched:
+            raise ValueError(f"{len(missing)} driver row(s) not in the store (first: {missing[:3]}) and "
+                             f"{len(mismatched)} with a different cost driver (first: {mismatched[:3]})")
+        return ids
+
+    # ------------------------------------------------------------------
+    # Stage 4: expansions and citations
+    # ------------------------------------------------------------------
+    def write_expansions(self, df: pd.DataFrame) -> int:
+        """
+        Store the expansion columns of `df` (the expansion stage output of
+        `drivers_frame`, keyed by its 'driver_id' column). Rows without a raw
+        response (NA drivers, failed calls) are left out.
+
+        Returns:
+            int: Expansions written
+        """
+        expansions, links = [], []
+        urls: Dict[str, int] = dict(self.conn.execute("SELECT url, id FROM urls"))
+        with self.conn:
+            self._clear("expansions")
+            for driver_id, raw, content, citations in zip(df['driver_id'], df['raw_response'],
+                                                          df['output_content'], df['citations']):
+                if _value(raw) is None:
+                    continue
+                has_citations, url_list, text = parse_citations(citations)
+                raw, content = _value(raw), _value(content)
+                # output_content is normally the <output> section of the raw response: keep only its offsets
+                span = span_of(raw, content)
+                output_blob = self.blobs.put(content) if span is None else None
+                start, end = span or (None, None)
+                expansions.append((int(driver_id), self.blobs.put(raw), start, end, output_blob,
+                                   int(has_citations), text))
+                for position, url in enumerate(url_list or []):
+                    if url not in urls:
+                        urls[url] = self.conn.execute("INSERT INTO urls (url) VALUES (?)", (url,)).lastrowid
+                    links.append((int(driver_id), position, urls[url]))
+            self.conn.executemany(
+                "INSERT INTO expansions (driver_id, raw_blob, output_start, output_end, output_blob, has_citations, "
+                "citations_text) VALUES (?, ?, ?, ?, ?, ?, ?)", expansions)
+            self.conn.executemany("INSERT INTO citations (driver_id, position, url_id) VALUES (?, ?, ?)", links)
+            self._prune_blobs()
+        print(f"Store: wrote {len(expansions)} expansions with {len(links)} citations ({len(urls)} distinct URLs)")
+        return len(expansions)
+
+    def _citation_lists(self) -> Dict[int, List[str]]:
+        lists: Dict[int, List[str]] = {}
+        for driver_id, url in self.conn.execute(
+                "SELECT c.driver_id, u.url FROM citations c JOIN urls u ON u.id = c.url_id "
+                "ORDER BY c.driver_id, c.position"):
+            lists.setdefault(driver_id, []).append(url)
+        return lists
+
+    def _citations_cell(self, has_citations, text, urls) -> Optional[str]:
+        # The stage writes str(response.citations), i.e. the repr of a list
+        if not has_citations:
+            return None
+        return text if text is not None else str(urls or [])
+
+    def _output_contents(self, rows) -> Dict[int, Optional[str]]:
+        """
+        driver_id -> output_content for (driver_id, raw_blob, output_start,
+        output_end, output_blob) rows, decompressing only the blobs involved.
+        """
+        texts = self.blobs.get_many(blob for row in rows for blob in (row[1] if row[2] is not None else None,
+                                                                      row[4]))
+        contents = {}
+        for driver_id, raw_blob, start, end, output_blob in rows:
+            if start is not None:
+                contents[driver_id] = texts[raw_blob][start:end]
+            else:
+                contents[driver_id] = texts.get(output_blob)
+        return contents
+
+    def expanded_frame(self, raw: bool = True) -> pd.DataFrame:
+        """
+        The expanded drivers sheet (stage 4 output), plus the 'driver_id' key.
+
+        Args:
+            raw (bool): Include 'raw_response'. Without it only the blobs
+                that hold a non-slice output_content are decompressed
+        """
+        df = self.drivers_frame()
+        rows = self.conn.execute("SELECT driver_id, raw_blob, output_start, output_end, output_blob, has_citations, "
+                                 "citations_text FROM expansions").fetchall()
+        expansions = {row[0]: row for row in rows}
+        contents = self._output_contents([row[:5] for row in rows])
+        lists = self._citation_lists()
+        empty = (None, None, None, None, None, 0, None)
+        values = [expansions.get(driver_id, empty) for driver_id in df['driver_id']]
+        if raw:
+            texts = self.blobs.get_many(v[1] for v in values)
+            df['raw_response'] = [texts.get(v[1]) for v in values]
+        df['output_content'] = [contents.get(driver_id) for driver_id in df['driver_id']]
+        df['citations'] = [self._citations_cell(v[5], v[6], lists.get(driver_id))
+                           for driver_id, v in zip(df['driver_id'], values)]
+        return df
+
+    def driver_catalog(self) -> Tuple[List[str], "DriverLookup"]:
+        """
+        The match stage's driver list and lookup, answered from indexed
+        queries instead of an aggregated copy of the expanded sheet.
+
+        Returns:
+            tuple: (unique driver texts in first-seen order, DriverLookup)
+        """
+        texts = self.driver_texts()
+        print(f"Loaded {len(texts)} unique potential cost drivers from {self.path}.")
+        return texts, DriverLookup(self)
+
+    def driver_texts(self) -> List[str]:
+        """Distinct expanded driver texts in first-seen order."""
+        return [row[0] for row in self.conn.execute(
+            "SELECT r.cost_driver FROM drivers r JOIN expansions e ON e.driver_id = r.id "
+            "JOIN paragraphs p ON p.id = r.paragraph_id JOIN documents d ON d.id = p.document_id "
+            f"WHERE {DriverLookup.COMPLETE} AND p.text IS NOT NULL GROUP BY r.cost_driver ORDER BY MIN(r.id)")]
+
+    def driver_sources(self, cost_driver: str) -> pd.DataFrame:
+        """Every paragraph that produced `cost_driver`, with its document and page."""
+        return pd.read_sql_query(
+            "SELECT r.id AS driver_id, r.paragraph_id, d.name AS document_name, p.page_number, p.article, "
+            "p.canonical_id, p.text FROM drivers r JOIN paragraphs p ON p.id = r.paragraph_id "
+            "LEFT JOIN documents d ON d.id = p.document_id WHERE r.cost_driver = ? ORDER BY r.id",
+            self.conn, params=(cost_driver,),
+        )
+
+    # ------------------------------------------------------------------
+    # Stages 5-6: processes, matches and inferences
+    # ------------------------------------------------------------------
+    def write_processes(self, df: pd.DataFrame, process_column: str = 'Process') -> int:
+        """Replace the process sheet rows (and their matches and inferences)."""
+        df = df.reset_index(drop=True)
+        records = df.to_dict(orient='records')
+        with self.conn:
+            self._clear("processes")
+            self.conn.executemany(
+                "INSERT INTO processes (id, process, data) VALUES (?, ?, ?)",
+                ((i, _value(record.get(process_column)),
+                  json.dumps({key: _value(value) for key, value in record.items()}, default=str))
+                 for i, record in enumerate(records))
+            )
+        print(f"Store: wrote {len(records)} processes")
+        return len(records)
+
+    def processes_frame(self) -> pd.DataFrame:
+        """The process sheet, columns in their original order."""
+        rows = self.conn.execute("SELECT data FROM processes ORDER BY id").fetchall()
+        return pd.DataFrame([json.loads(data) for data, in rows])
+
+    def write_matches(self, df: pd.DataFrame, driver_column: str = 'Cost Driver') -> int:
+        """
+        Store the matched driver of every process row of `df` (the match
+        stage output of `processes_frame`). Reference, content and citation
+        columns are not stored: they are joins on the driver text.
+        """
+        known = {row[0] for row in self.conn.execute("SELECT DISTINCT cost_driver FROM drivers")}
+        rows = [(i, _value(driver), _value(driver) if driver in known else None)
+                for i, driver in enumerate(df[driver_column])]
+        with self.conn:
+            self._clear("matches")
+            self.conn.executemany("INSERT INTO matches (process_id, cost_driver, driver_text) VALUES (?, ?, ?)",
+                                  rows)
+        print(f"Store: wrote {len(rows)} matches ({sum(1 for r in rows if r[2] is not None)} to known drivers)")
+        return len(rows)
+
+    def matched_frame(self) -> pd.DataFrame:
+        """The process match sheet: processes plus the five match output columns."""
+        from gohijau.eudr import process_match
+
+        df = self.processes_frame()
+        matches = dict(self.conn.execute("SELECT process_id, cost_driver FROM matches"))
+        lookup = DriverLookup(self)
+        results = []
+        for i in range(len(df)):
+            driver = matches.get(i)
+            if driver is not None and driver in lookup:
+                details = lookup[driver]
+                results.append((driver, details['reference'], details['content'], details['citations'],
+                                details['text']))
+            else:
+                results.append((driver, "N/A", "N/A", "N/A", "N/A"))
+        return process_match.attach_results(df, results)
+
+    def write_inferences(self, df: pd.DataFrame) -> int:
+        """Store the cost inference columns of `df` (the infer stage output of `matched_frame`)."""
+        from gohijau.eudr import cost_inference as ci
+
+        def column(name):
+            return df[name] if name in df.columns else pd.Series([None] * len(df))
+
+        rows = zip(range(len(df)), column(ci.NEW_NOMINAL_COST_COLUMN), column(ci.NEW_COST_IMPACT_COLUMN),
+                   column(ci.NEW_COST_TYPE_COLUMN), column(ci.NEW_NOMINAL_COST_REF_COLUMN),
+                   column(ci.INFERENCE_SOURCE_COLUMN), column(ci.LOCAL_CONFIDENCE_COLUMN),
+                   column(ci.MAPPED_NOMINAL_COST_URLS_COLUMN))
+        rows = [tuple(_value(value) for value in row) for row in rows]
+        with self.conn:
+            self.conn.execute("DELETE FROM inferences")
+            self.conn.executemany("INSERT INTO inferences VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        print(f"Store: wrote {len(rows)} inferences")
+        return len(rows)
+
+    def final_frame(self) -> pd.DataFrame:
+        """The final analysis sheet: matched processes plus the inference columns."""
+        from gohijau.eudr import cost_inference as ci
+
+        df = self.matched_frame()
+        inferences = {row[0]: row[1:] for row in self.conn.execute("SELECT * FROM inferences")}
+        if not inferences:
+            return df
+        columns = (ci.NEW_NOMINAL_COST_COLUMN, ci.NEW_COST_IMPACT_COLUMN, ci.NEW_COST_TYPE_COLUMN,
+                   ci.NEW_NOMINAL_COST_REF_COLUMN, ci.INFERENCE_SOURCE_COLUMN, ci.LOCAL_CONFIDENCE_COLUMN,
+                   ci.MAPPED_NOMINAL_COST_URLS_COLUMN)
+        for position, column in enumerate(columns):
+            df[column] = [inferences[i][position] if i in inferences else None for i in range(len(df))]
+        return df
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        """Row counts per table and the file size."""
+        tables = ("documents", "paragraphs", "analyses", "drivers", "expansions", "urls", "citations",
+                  "processes", "matches", "inferences")
+        stats: Dict[str, Any] = {table: self._count(table) for table in tables}
+        stats.update({f"blob_{key}": value for key, value in self.blobs.stats().items()})
+        stats["file_mb"] = round(os.path.getsize(self.path) / 2**20, 3)
+        return stats
+
+    def compact(self, train_dictionary: bool = False) -> Dict[str, Any]:
+        """
+        Recompress the response blobs (optionally with a freshly trained zstd
+        dictionary) and reclaim free pages.
+
+        Returns:
+            dict: `stats()` after compaction
+        """
+        self._prune_blobs()
+        self.conn.commit()
+        # Training recompresses on success; otherwise recompress with the current codec
+        if not train_dictionary or self.blobs.train_dictionary() is None:
+            self.blobs.recompress()
+        self.conn.execute("VACUUM")
+        return self.stats()
+
+    def export(self, output_dir: str) -> Dict[str, str]:
+        """
+        Write every stage's sheet that has data as Excel, under the default
+        file names in `output_dir`.
+
+        Returns:
+            dict: Sheet name -> written path
+        """
+        from gohijau import config
+
+        frames = [
+            ("paragraphs", "paragraphs", config.PARAGRAPHS_FILE, self.paragraphs_frame),
+            ("analyses", "analyses", config.RAW_RESPONSES_FILE, self.analysis_frame),
+            ("drivers", "drivers", config.EXTRACTED_DRIVERS_FILE, self.drivers_frame),
+            ("expanded", "expansions", config.EXPANDED_DRIVERS_FILE, self.expanded_frame),
+            ("matched", "matches", config.PROCESS_MATCH_FILE, self.matched_frame),
+            ("final", "inferences", config.COST_INFERENCE_FILE, self.final_frame),
+        ]
+        os.makedirs(output_dir, exist_ok=True)
+        written = {}
+        for name, table, default_path, build in frames:
+            if not self._count(table):
+                continue
+            path = os.path.join(output_dir, os.path.basename(default_path))
+            df = build()
+            df.drop(columns=['driver_id'], errors='ignore').to_excel(path, index=False)
+            written[name] = path
+            print(f"Exported {name} ({len(df)} rows) to {path}")
+        return written
+
+
+class DriverLookup:
+    """
+    Read-only mapping of driver text -> aggregated details, with the same
+    values as `process_match.prepare_cost_drivers` builds from the expanded
+    sheet. Each lookup is one indexed query, cached per text.
+    """
+
+    # Rows the expanded-sheet path keeps after dropna on its required columns
+    COMPLETE = ("(e.output_start IS NOT NULL OR e.output_blob IS NOT NULL) AND e.has_citations = 1 "
+                "AND r.cost_driver IS NOT NULL AND r.cost_driver != 'NA'")
+
+    def __init__(self, store: PipelineStore):
+        self.store = store
+        self._cache: Dict[str, Optional[Dict[str, Any]]] = {}
+
+    def _details(self, text: str) -> Optional[Dict[str, Any]]:
+        if text in self._cache:
+            return self._cache[text]
+        from gohijau.eudr.process_match import DETAIL_SEPARATOR, TEXT_SEPARATOR
+
+        rows = self.store.conn.execute(
+            "SELECT r.id, d.name, e.raw_blob, e.output_start, e.output_end, e.output_blob, e.citations_text, p.text "
+            "FROM drivers r JOIN expansions e ON e.driver_id = r.id JOIN paragraphs p ON p.id = r.paragraph_id "
+            f"LEFT JOIN documents d ON d.id = p.document_id WHERE r.cost_driver = ? AND {self.COMPLETE} "
+            "AND d.name IS NOT NULL AND p.text IS NOT NULL ORDER BY r.id", (text,)).fetchall()
+        details = None
+        if rows:
+            urls: Dict[int, List[str]] = {}
+            marks = ",".join("?" * len(rows))
+            for driver_id, url in self.store.conn.execute(
+                    f"SELECT c.driver_id, u.url FROM citations c JOIN urls u ON u.id = c.url_id "
+                    f"WHERE c.driver_id IN ({marks}) ORDER BY c.driver_id, c.position", [r[0] for r in rows]):
+                urls.setdefault(driver_id, []).append(url)
+            contents = self.store._output_contents([(r[0],) + r[2:6] for r in rows])
+            citations = [self.store._citations_cell(1, r[6], urls.get(r[0])) for r in rows]
+            details = {
+                'reference': DETAIL_SEPARATOR.join(sorted({str(r[1]) for r in rows})),
+                'content': DETAIL_SEPARATOR.join(sorted({str(contents[r[0]]) for r in rows})),
+                'citations': DETAIL_SEPARATOR.join(sorted(set(citations))),
+                'text': TEXT_SEPARATOR.join(str(r[7]) for r in rows),
+                'rows': len(rows),
+            }
+        self._cache[text] = details
+        return details
+
+    def __contains__(self, text) -> bool:
+        return isinstance(text, str) and self._details(text) is not None
+
+    def __getitem__(self, text) -> Dict[str, Any]:
+        details = self._details(text) if isinstance(text, str) else None
+        if details is None:
+            raise KeyError(text)
+        return details
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.store.driver_texts())
@@ -0,0 +1,117 @@
+"""
+Local token counting and static/dynamic prompt accounting.
+
+Every LLM stage builds its prompt as a static prefix (system message,
+instructions, examples, the cost driver list) followed by a dynamic suffix
+(the paragraph, driver or process being processed). Keeping the static part
+first lets provider-side prefix caches reuse it; `TokenLedger` measures how
+much of each stage's input that is.
+
+Counts use tiktoken when it is installed, and otherwise a word-piece
+approximation that is usually within ~10% of BPE tokenizers on English text.
+"""
+
+import functools
+import hashlib
+import re
+from typing import Dict, List, Optional
+
+_WORD_PIECES = re.compile(r"\w{1,4}|[^\w\s]")
+
+
+@functools.lru_cache(maxsize=None)
+def _tiktoken_encoding():
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def tokenizer_name() -> str:
+    """Name of the tokenizer `count_tokens` uses."""
+    return "tiktoken cl100k_base" if _tiktoken_encoding() is not None else "word-piece approximation"
+
+
+def count_tokens(text: Optional[str]) -> int:
+    """Count the tokens of `text` with the local tokenizer."""
+    if not text:
+        return 0
+    encoding = _tiktoken_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(_WORD_PIECES.findall(text))
+
+
+class TokenLedger:
+    """
+    Accumulate static and dynamic prompt tokens per stage.
+
+    Static prefixes are counted once per distinct text and then looked up
+    by hash, so recording thousands of requests that share a long prefix
+    stays cheap.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Dict] = {}
+        self._prefix_tokens: Dict[str, int] = {}
+
+    def _static_tokens(self, static: str) -> int:
+        digest = hashlib.sha1(static.encode("utf-8")).hexdigest()
+        if digest not in self._prefix_tokens:
+            self._prefix_tokens[digest] = count_tokens(static)
+        return self._prefix_tokens[digest]
+
+    def add(self, stage: str, static: str, dynamic: str) -> int:
+        """
+        Record one request of `stage`.
+
+        Returns:
+            int: The request's total input tokens
+        """
+        entry = self.stages.setdefault(stage, {
+            "requests": 0, "static_tokens": 0, "dynamic_tokens": 0, "prefixes": set(), "per_request": [],
+        })
+        static_tokens = self._static_tokens(static)
+        dynamic_tokens = count_tokens(dynamic)
+        entry["requests"] += 1
+        entry["static_tokens"] += static_tokens
+        entry["dynamic_tokens"] += dynamic_tokens
+        entry["prefixes"].add(hashlib.sha1(static.encode("utf-8")).hexdigest())
+        entry["per_request"].append(static_tokens + dynamic_tokens)
+        return static_tokens + dynamic_tokens
+
+    def summary(self) -> List[Dict]:
+        """
+        Per-stage totals.
+
+        Returns:
+            list: One dict per stage with requests, static/dynamic/total tokens,
+            the static share and the distinct static prefixes
+        """
+        rows = []
+        for stage, entry in self.stages.items():
+            total = entry["static_tokens"] + entry["dynamic_tokens"]
+            rows.append({
+                "stage": stage,
+                "requests": entry["requests"],
+                "static_tokens": entry["static_tokens"],
+                "dynamic_tokens": entry["dynamic_tokens"],
+                "total_tokens": total,
+                "static_share": entry["static_tokens"] / total if total else 0.0,
+                "distinct_prefixes": len(entry["prefixes"]),
+            })
+        return rows
+
+
+def print_token_report(ledger: TokenLedger):
+    """Print static vs dynamic input tokens per stage."""
+    print(f"\nPrompt tokens per stage ({tokenizer_name()}):")
+    header = f"{'stage':<20}{'requests':>10}{'static':>14}{'dynamic':>14}{'total':>14}{'static %':>10}{'prefixes':>10}"
+    print(header)
+    print("-" * len(header))
+    for row in ledger.summary():
+        print(f"{row['stage']:<20}{row['requests']:>10}{row['static_tokens']:>14,}{row['dynamic_tokens']:>14,}"
+              f"{row['total_tokens']:>14,}{row['static_share']:>10.1%}{row['distinct_prefixes']:>10}")
+    print("\n'static' is the shared prefix re-sent with every request; with a warm prefix or")
+    print("context cache those tokens are billed at the provider's cached-input rate.")
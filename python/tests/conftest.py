@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Import the in-tree gohijau package however pytest is invoked
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,59 @@
+"""What the local nominal-cost extractor accepts, and what it leaves to the LLM."""
+
+import pytest
+
+from gohijau.eudr.cost_extractor import LOCAL_CONFIDENCE_THRESHOLD, extract_nominal_cost, find_cost_figures
+
+
+@pytest.mark.parametrize("text, nominal_cost, citation", [
+    ("Third-party audits cost EUR 5,000–20,000 per year [3][7].", "EUR 5,000–20,000 per year", "[3][7]"),
+    ("Satellite mapping costs USD 1.5 million annually [1].", "USD 1.5 million annually", "[1]"),
+    ("Traceability software costs Rp 50 million per company [5].", "Rp 50 million per company", "[5]"),
+    ("Geolocation surveys cost Rp50.000 per plot [5].", "Rp50.000 per plot", "[5]"),
+    ("Certification adds 2-5% of export value [2].", "2-5% of export value", "[2]"),
+    ("Verification fees of 1,000-2,000 euros per year [4] are typical.", "1,000-2,000 euros per year", "[4]"),
+    ("Inspection fees are 20 EUR per shipment [2].", "20 EUR per shipment", "[2]"),
+])
+def test_explicit_cited_costs_are_extracted_locally(text, nominal_cost, citation):
+    result = extract_nominal_cost(text)
+    assert result.nominal_cost == nominal_cost
+    assert result.nominal_cost_citation == citation
+    assert result.confidence >= LOCAL_CONFIDENCE_THRESHOLD
+
+
+@pytest.mark.parametrize("text", [
+    "Operators must comply with Article 3 to 5 per operator [1].", # article span with a unit
+    "See Articles 10-12 annually [3].",
+    "Exporters fill in form 12 per shipment [2].", # "rm" inside a word is not ringgit
+    "The due diligence statement applies from 30 December 2024 [1].",
+    "Regulation (EU) 2023/1115 covers 7 commodities [1].",
+    "Farmers need 2-3 days per plot [4].",
+    "Costs range from 2019 to 2021 [6].", # year span
+    "",
+])
+def test_false_positives_go_to_the_llm(text):
+    assert extract_nominal_cost(text).confidence < LOCAL_CONFIDENCE_THRESHOLD
+
+
+def test_ranges_need_a_currency_or_unit():
+    assert find_cost_figures("Between 2019-2021 [1] audits rose.") == []
+    [figure] = find_cost_figures("Operators must comply with Article 3 to 5 per operator [1].")
+    assert figure["kind"] == "range" and figure["score"] < LOCAL_CONFIDENCE_THRESHOLD
+
+
+def test_several_cited_figures_lower_the_confidence():
+    single = extract_nominal_cost("Audits cost EUR 5,000 per audit [1].")
+    several = extract_nominal_cost("Audits cost EUR 5,000 per audit [1]. Mapping costs EUR 900 per plot [2].")
+    assert single.confidence >= LOCAL_CONFIDENCE_THRESHOLD
+    assert several.confidence < LOCAL_CONFIDENCE_THRESHOLD
+    assert several.candidates == 2
+
+
+def test_uncited_figure_is_not_trusted():
+    assert extract_nominal_cost("Audits cost EUR 5,000 per audit.").confidence < LOCAL_CONFIDENCE_THRESHOLD
+
+
+def test_labels_come_from_the_sentence():
+    result = extract_nominal_cost("A significant audit fee of EUR 3,000 per audit [2] applies.")
+    assert result.cost_type == "Audit Fees"
+    assert result.cost_impact == "High"
@@ -0,0 +1,40 @@
+"""Cost inference through the job queue, including --retry-failed."""
+
+import pandas as pd
+
+from gohijau.eudr import cost_inference
+from gohijau.eudr.cost_inference import NEW_NOMINAL_COST_COLUMN, infer_costs_with_queue, is_failed_row
+
+
+def _drivers():
+    return pd.DataFrame({
+        "Output Content": ["Operators keep records for years.", "Training staff is needed.",
+                           "Audits cost EUR 5,000 per audit [1]."],
+        "Cost Driver": ["Record keeping", "Staff training", "Audit fees"],
+        "Roles": ["Exporter"] * 3,
+        "Stage": ["Export"] * 3,
+        "Process": ["Keep records", "Train staff", "Audit"],
+    })
+
+
+def test_retry_failed_requeues_the_dead_jobs(monkeypatch, tmp_path):
+    queue_path = str(tmp_path / "jobs.sqlite")
+    sent = []
+
+    def failing(prompt, *args):
+        sent.append(prompt)
+        return {"error": "API_ERROR"}
+
+    monkeypatch.setattr(cost_inference, "infer_row", failing)
+    first = infer_costs_with_queue(_drivers(), queue_path, delay_seconds=0)
+    assert [is_failed_row(row) for _, row in first.iterrows()] == [True, True, False] # Row 2 is local
+    assert len(sent) == 6 # Two rows, three attempts each
+
+    answer = {"nominal_cost": "EUR 100 per year", "cost_impact": "Low", "cost_type": "Operational",
+              "nominal_cost_citation": "[2]"}
+    sent.clear()
+    monkeypatch.setattr(cost_inference, "infer_row", lambda prompt, *args: sent.append(prompt) or answer)
+    retried = infer_costs_with_queue(first, queue_path, delay_seconds=0, only_failed=True)
+    assert len(sent) == 2
+    assert retried[NEW_NOMINAL_COST_COLUMN].tolist() == ["EUR 100 per year", "EUR 100 per year",
+                                                         "EUR 5,000 per audit"]
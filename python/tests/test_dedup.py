@@ -0,0 +1,104 @@
+"""Canonical rows of duplicate paragraphs, and copying the canonical row's results to its duplicates."""
+
+import pandas as pd
+import pytest
+
+from gohijau.eudr import pipeline
+from gohijau.eudr.analysis import EUDRCostAnalyzer
+from gohijau.pdf.dedup import annotate_duplicates, duplicate_rows, find_duplicates
+from gohijau.pdf.records import ParagraphRecords
+
+WORDS = ("operators shall collect adequately conclusive and verifiable information on the geolocation of all "
+         "plots of land where the relevant commodities were produced and keep that information for five years "
+         "from the date of placing on the market and make it available to competent authorities on request").split()
+A = " ".join(WORDS)
+B = " ".join(WORDS[:-1] + ["promptly"]) # Near duplicate of A
+C = ("Each Member State shall designate one or more competent authorities responsible for the checks "
+     "carried out under this Regulation")
+
+
+def _response(text: str) -> str:
+    """An analysis response, as stored by the analysis stage, naming one driver per paragraph."""
+    content = f"<output>\n<cost_driver1>\nDriver for {text[:20]}\n</cost_driver1>\n<reasoning1>\nbecause\n</reasoning1>\n</output>"
+    return str({"choices": [{"message": {"content": content}}]})
+
+
+def _paragraphs(texts):
+    records = ParagraphRecords()
+    for page, text in enumerate(texts, start=1):
+        records.append(f"doc{page}.pdf", page, "Article 9", text)
+    annotate_duplicates(records)
+    return records.to_dataframe()
+
+
+def test_exact_and_near_duplicates():
+    canonical, kinds, similarity = find_duplicates([A, C, A.upper() + " !", B])
+    assert canonical == [0, 1, 0, 0]
+    assert kinds == ["", "", "exact", "near"]
+    assert similarity[3] >= 0.8
+
+
+def test_exact_copy_of_a_near_duplicate_points_at_the_canonical():
+    canonical, kinds, _ = find_duplicates([A, B, B, C, B])
+    assert canonical == [0, 0, 0, 3, 0]
+    assert kinds == ["", "near", "exact", "", "exact"]
+
+
+def test_duplicate_rows_only_map_to_canonical_rows():
+    df = _paragraphs([A, B, B, C])
+    duplicates = duplicate_rows(df)
+    assert duplicates == {1: 0, 2: 0}
+    assert not set(duplicates.values()) & set(duplicates)
+
+
+def test_duplicate_rows_skip_canonicals_outside_the_frame():
+    df = _paragraphs([A, B, C]).iloc[1:]
+    assert duplicate_rows(df) == {}
+
+
+def _analyzer(df, monkeypatch):
+    analyzer = EUDRCostAnalyzer(df=df)
+    monkeypatch.setattr(analyzer, "request_analysis", lambda prompt: _response(prompt.split("TEXT: ")[1]))
+    return analyzer
+
+
+def test_collect_results_copies_to_every_duplicate(monkeypatch):
+    df = _paragraphs([A, B, B, C])
+    analyzer = _analyzer(df, monkeypatch)
+    jobs = dict(analyzer.iter_jobs())
+    assert sorted(jobs) == ["0:0", "3:0"] # Only canonical rows are sent
+    out = analyzer.collect_results({key: analyzer.analyze_job(payload) for key, payload in jobs.items()})
+    assert out["cost_driver_analysis"].notna().all()
+    assert out.at[1, "cost_driver_analysis"] == out.at[0, "cost_driver_analysis"]
+    assert out.at[2, "cost_driver_analysis"] == out.at[0, "cost_driver_analysis"]
+
+
+def test_queue_run_copies_to_every_duplicate(monkeypatch, tmp_path):
+    df = _paragraphs([A, B, B, C])
+    analyzer = _analyzer(df, monkeypatch)
+    out = analyzer.process_with_queue(str(tmp_path / "jobs.sqlite"), str(tmp_path / "analysis.xlsx"))
+    assert out["cost_driver_analysis"].notna().all()
+    assert out.at[2, "cost_driver_analysis"] == out.at[0, "cost_driver_analysis"]
+
+
+def test_pipeline_copies_drivers_to_every_duplicate(monkeypatch):
+    df = _paragraphs([A, B, B, C])
+    monkeypatch.setattr(EUDRCostAnalyzer, "get_cost_driver_analysis",
+                        lambda self, text, doc_name=None, article=None: _response(text))
+    monkeypatch.setattr(pipeline, "expand_cost_driver",
+                        lambda driver, reasoning, document_name=None, article=None:
+                        (f"raw {driver}", f"expanded {driver}", []))
+    result = pipeline.run_pipeline(df, queue_size=2)
+
+    assert result["analysis"]["cost_driver_analysis"].notna().all()
+    drivers = result["drivers"]
+    assert drivers["document_name"].tolist() == ["doc1.pdf", "doc2.pdf", "doc3.pdf", "doc4.pdf"]
+    assert drivers["cost_driver"].tolist() == [f"Driver for {A[:20]}"] * 3 + [f"Driver for {C[:20]}"]
+    assert result["expanded"]["output_content"].notna().all()
+
+
+@pytest.mark.parametrize("texts", [[A, B, B], [A, C, B, B, A]])
+def test_every_duplicate_has_an_analyzed_canonical(texts):
+    canonical, kinds, _ = find_duplicates(texts)
+    for row, kind in zip(canonical, kinds):
+        assert kinds[row] == "" # the canonical row itself is analyzed
@@ -0,0 +1,51 @@
+"""The vectorized engine against the scalar transcription of the do-files."""
+
+import numpy as np
+import pytest
+
+from gohijau.emissions.engine import compute_emissions
+from gohijau.emissions.factors import load_factors
+from gohijau.emissions.fixture import synthetic_ibs
+from gohijau.emissions.reference import reference_emissions, verify
+from gohijau import config
+
+RTOL = 1e-9
+DO_FILES = {"firm": config.EMISSIONS_DOFILE, "province": config.PROVINCE_DOFILE}
+
+
+@pytest.fixture(scope="module")
+def factors():
+    return load_factors()
+
+
+@pytest.fixture(scope="module")
+def firms(factors):
+    return synthetic_ibs(2000, seed=0, factors=factors)
+
+
+def _compared_columns(columns):
+    return [c for c in columns if c.startswith(("TJ_", "CO2_", "KWH_", "TOTAL_")) or c == "intensity"]
+
+
+@pytest.mark.parametrize("variant", ["firm", "province"])
+def test_engine_matches_do_file(firms, factors, variant):
+    engine = compute_emissions(firms, factors, variant=variant, keep_input=False)
+    reference = reference_emissions(firms, DO_FILES[variant], list(factors.fuels), variant=variant)
+    columns = _compared_columns(reference.columns)
+    for fuel in factors.fuels:
+        assert {f"TJ_{fuel}", f"CO2_{fuel}", f"KWH_{fuel}"} <= set(columns)
+    assert {"TOTAL_CO2", "TOTAL_TJ", "TOTAL_KWH", "intensity"} <= set(columns)
+    for column in columns:
+        a = engine[column].to_numpy(dtype=np.float64)
+        b = reference[column].to_numpy(dtype=np.float64)
+        np.testing.assert_array_equal(np.isnan(a), np.isnan(b), err_msg=f"{variant}: missing values of {column}")
+        np.testing.assert_allclose(a, b, rtol=RTOL, equal_nan=True, err_msg=f"{variant}: {column}")
+    # The fixture must exercise the comparison, not just produce missing values
+    assert np.isfinite(engine["intensity"].to_numpy(dtype=np.float64)).sum() > len(firms) // 2
+
+
+@pytest.mark.parametrize("variant", ["firm", "province"])
+def test_verify_reports_ok(firms, factors, variant):
+    report = verify(firms, factors, variant=variant, rtol=RTOL)
+    assert report["ok"], report["max_rel_error"]
+    assert not any(report["missing_mismatches"].values())
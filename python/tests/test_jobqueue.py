@@ -0,0 +1,101 @@
+"""Leases, expiry, dead-letter and retry of the SQLite job queue."""
+
+import time
+
+import pytest
+
+from gohijau.jobqueue import (STAGE_ANALYSIS, STATUS_DEAD, STATUS_DONE, STATUS_PENDING, JobQueue,
+                              run_worker)
+
+SHORT_LEASE = 0.05
+
+
+@pytest.fixture
+def queue(tmp_path):
+    with JobQueue(str(tmp_path / "jobs.sqlite")) as q:
+        yield q
+
+
+def _status(queue, key):
+    return queue.conn.execute("SELECT status FROM jobs WHERE job_key = ?", (key,)).fetchone()[0]
+
+
+def test_enqueue_is_idempotent(queue):
+    assert queue.enqueue_many(STAGE_ANALYSIS, [("a", {"n": 1}), ("b", {"n": 2})]) == 2
+    assert queue.enqueue_many(STAGE_ANALYSIS, [("a", {"n": 1}), ("c", {"n": 3})]) == 1
+    assert queue.counts(STAGE_ANALYSIS) == {STAGE_ANALYSIS: {STATUS_PENDING: 3}}
+
+
+def test_leased_job_is_not_leased_twice(queue):
+    queue.enqueue(STAGE_ANALYSIS, "a", {})
+    [job] = queue.lease(STAGE_ANALYSIS, "w1", lease_seconds=60)
+    assert job["job_key"] == "a" and job["attempts"] == 1
+    assert queue.lease(STAGE_ANALYSIS, "w2", lease_seconds=60) == []
+    assert not queue.is_drained(STAGE_ANALYSIS)
+
+
+def test_expired_lease_is_taken_over(queue):
+    queue.enqueue(STAGE_ANALYSIS, "a", {})
+    [job] = queue.lease(STAGE_ANALYSIS, "w1", lease_seconds=SHORT_LEASE)
+    time.sleep(SHORT_LEASE * 2)
+    [again] = queue.lease(STAGE_ANALYSIS, "w2", lease_seconds=60)
+    assert again["id"] == job["id"] and again["attempts"] == 2
+    # The first worker's lease is gone: it can neither renew nor complete
+    assert not queue.extend_lease(job["id"], "w1")
+    assert not queue.complete(job["id"], "w1", "stale")
+    assert queue.complete(again["id"], "w2", "fresh")
+    assert dict(queue.results(STAGE_ANALYSIS)) == {"a": "fresh"}
+
+
+def test_extend_lease_keeps_the_job(queue):
+    queue.enqueue(STAGE_ANALYSIS, "a", {})
+    [job] = queue.lease(STAGE_ANALYSIS, "w1", lease_seconds=SHORT_LEASE)
+    assert queue.extend_lease(job["id"], "w1", lease_seconds=60)
+    time.sleep(SHORT_LEASE * 2)
+    assert queue.lease(STAGE_ANALYSIS, "w2", lease_seconds=60) == []
+    assert queue.complete(job["id"], "w1", "ok")
+
+
+def test_failures_end_in_dead_letter_and_retry_dead_requeues(queue):
+    queue.enqueue(STAGE_ANALYSIS, "a", {}, max_attempts=2)
+    queue.enqueue(STAGE_ANALYSIS, "b", {})
+    job_a, job_b = queue.lease(STAGE_ANALYSIS, "w", limit=2)
+    assert queue.complete(job_b["id"], "w", "ok")
+    assert queue.fail(job_a["id"], "w", "rate limit") == STATUS_PENDING
+    [again] = queue.lease(STAGE_ANALYSIS, "w")
+    assert queue.fail(again["id"], "w", "rate limit") == STATUS_DEAD
+    assert [job["job_key"] for job in queue.dead_jobs(STAGE_ANALYSIS)] == ["a"]
+    assert queue.is_drained(STAGE_ANALYSIS)
+
+    assert queue.retry_dead(STAGE_ANALYSIS, error_contains="timeout") == 0
+    assert queue.retry_dead(STAGE_ANALYSIS, error_contains="rate limit") == 1
+    assert _status(queue, "a") == STATUS_PENDING
+    assert _status(queue, "b") == STATUS_DONE # done rows are never requeued
+    [fresh] = queue.lease(STAGE_ANALYSIS, "w")
+    assert fresh["attempts"] == 1
+
+
+def test_expired_lease_without_attempts_left_is_dead(queue):
+    queue.enqueue(STAGE_ANALYSIS, "a", {}, max_attempts=1)
+    queue.lease(STAGE_ANALYSIS, "w1", lease_seconds=SHORT_LEASE)
+    time.sleep(SHORT_LEASE * 2)
+    assert queue.lease(STAGE_ANALYSIS, "w2") == []
+    [dead] = queue.dead_jobs(STAGE_ANALYSIS)
+    assert dead["last_error"] == "lease expired"
+
+
+def test_worker_renews_leases_of_long_jobs(queue):
+    lease_seconds = 0.4
+    taken_over = []
+
+    def handler(payload):
+        time.sleep(lease_seconds * 2.5) # Outlives the first lease several times
+        with JobQueue(queue.path) as other:
+            taken_over.extend(other.lease(STAGE_ANALYSIS, "other", lease_seconds=60))
+        return payload["n"]
+
+    queue.enqueue(STAGE_ANALYSIS, "a", {"n": 1})
+    stats = run_worker(queue, STAGE_ANALYSIS, handler, lease_seconds=lease_seconds, poll_interval=0.05)
+    assert taken_over == []
+    assert stats == {"done": 1, "retried": 0, "dead": 0, "lost": 0}
+    assert dict(queue.results(STAGE_ANALYSIS)) == {"a": 1}
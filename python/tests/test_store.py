@@ -0,0 +1,66 @@
+"""The pipelined run against the normalized store."""
+
+import pandas as pd
+import pytest
+
+from gohijau import cli
+from gohijau.eudr import pipeline
+from gohijau.eudr.analysis import EUDRCostAnalyzer
+from gohijau.store import PipelineStore
+
+PARAGRAPHS = pd.DataFrame({
+    "document_name": ["reg.pdf", "reg.pdf", "faq.pdf"],
+    "page_number": [1, 2, 1],
+    "paragraph_number": [1, 2, 3],
+    "article": ["Article 9", "Article 10", None],
+    # The middle paragraph of row 1 is too short to analyze, so its analyses are numbered 0, 1
+    "text": ["Operators shall collect the geolocation of all plots of land.",
+             "<paragraph>Operators shall keep records for five years.</paragraph><paragraph>See 4.</paragraph>"
+             "<paragraph>Competent authorities shall carry out checks on operators.</paragraph>",
+             "No obligations are set out here for exporters."],
+    "word_count": [11, 14, 8],
+})
+
+
+def _response(text):
+    if text.startswith("No obligations"):
+        return "<output>\nNA\n</output>"
+    drivers = "".join(f"<cost_driver{n}>\n{text[:12]} driver {n}\n</cost_driver{n}>\n<reasoning{n}>\nr\n</reasoning{n}>\n"
+                      for n in (1, 2))
+    return f"<output>\n{drivers}</output>"
+
+
+@pytest.fixture
+def store_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "eudr.sqlite")
+    with PipelineStore(path) as store:
+        store.write_paragraphs(PARAGRAPHS)
+    monkeypatch.setattr(EUDRCostAnalyzer, "get_cost_driver_analysis",
+                        lambda self, text, doc_name=None, article=None: _response(text))
+    monkeypatch.setattr(pipeline, "expand_cost_driver",
+                        lambda driver, reasoning, document_name=None, article=None:
+                        (f"<output>expanded {driver}</output>", f"expanded {driver}", ["https://example.org"]))
+    return path
+
+
+def test_pipeline_attaches_expansions_to_their_drivers(store_path):
+    assert cli.main(["pipeline", "--store", store_path, "--queue-size", "2"]) == 0
+    with PipelineStore(store_path) as store:
+        expanded = store.expanded_frame()
+    drivers = expanded[expanded["cost_driver"] != "NA"]
+    assert len(drivers) == 6
+    assert (drivers["output_content"] == "expanded " + drivers["cost_driver"]).all()
+    assert expanded.loc[expanded["cost_driver"] == "NA", "output_content"].isna().all()
+
+
+def test_driver_ids_reject_rows_that_do_not_line_up(store_path):
+    with PipelineStore(store_path) as store:
+        result = pipeline.run_pipeline(store.paragraphs_frame(), queue_size=2)
+        keys, cost_drivers = result["driver_keys"], result["drivers"]["cost_driver"].tolist()
+        store.write_analyses(result["analysis"])
+        store.extract_drivers()
+        assert store.driver_ids(keys, cost_drivers) == store.drivers_frame()["driver_id"].tolist()
+        with pytest.raises(ValueError, match="1 driver row"):
+            store.driver_ids(keys + [(2, 5, 0)], cost_drivers + ["Unknown"])
+        with pytest.raises(ValueError, match="1 with a different cost driver"):
+            store.driver_ids(keys, cost_drivers[:-2] + ["Other", cost_drivers[-1]])